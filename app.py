@@ -24,6 +24,7 @@ from functools import wraps
 
 # Import configuration
 from config import API_PREFIX, HOST, PORT, DEBUG, CORS_ALLOWED_ORIGINS, ENV
+from utils.compression import compress_response
 
 # Import route modules
 from routes.health import health_bp
@@ -122,6 +123,11 @@ def create_app():
         logger.error(f"Failed to initialize database on startup: {e}")
         # Continue without failing - the service might be able to start without DB initially
     
+    # Keep this worker's privacy cache coherent with updates from other workers;
+    # the listener reconnects on its own if the database is not up yet
+    from utils.privacy import start_privacy_listener
+    start_privacy_listener()
+    
     # Request ID and CSRF middleware
     @app.before_request
     def before_request():
@@ -174,6 +180,9 @@ def create_app():
         
         return response
     
+    # Compress JSON and text bodies for clients that accept it
+    app.after_request(compress_response)
+    
     # Register blueprints - all under versioned API prefix
     app.register_blueprint(health_bp)  # Health check available at / and API_PREFIX/health
     app.register_blueprint(interactions_bp, url_prefix=f"{API_PREFIX}/interactions")
@@ -0,0 +1,16 @@
+"""
+ASGI entry point for the Corgi Recommender Service.
+
+Serves the Mastodon proxy routes asynchronously (see routes/async_proxy.py)
+and every other route through the regular Flask app, so one process can hold
+thousands of concurrent slow upstream calls without a thread per request.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5002
+"""
+
+from app import create_app
+from routes.async_proxy import create_asgi_app
+
+flask_app = create_app()
+app = create_asgi_app(flask_app)
@@ -86,6 +86,54 @@ if not USER_HASH_SALT:
     else:
         print("WARNING: USER_HASH_SALT not set. Using an empty salt is not secure for production!")
 
+# Process-local privacy level cache, invalidated across workers with LISTEN/NOTIFY
+PRIVACY_CACHE_CONFIG = {
+    "ttl_seconds": int(os.getenv("PRIVACY_CACHE_TTL_SECONDS", "300")),
+    "max_entries": int(os.getenv("PRIVACY_CACHE_MAX_ENTRIES", "50000")),
+    "listen": os.getenv("PRIVACY_CACHE_LISTEN", "True").lower() == "true",
+    "reconnect_seconds": int(os.getenv("PRIVACY_CACHE_RECONNECT_SECONDS", "5")),
+    # How often the idle listener checks its connection is still alive
+    "ping_seconds": int(os.getenv("PRIVACY_CACHE_PING_SECONDS", "30")),
+}
+
+# Token -> identity cache shared across requests (see utils/identity.py)
+IDENTITY_CACHE_CONFIG = {
+    "ttl_seconds": int(os.getenv("IDENTITY_CACHE_TTL_SECONDS", "60")),
+    "max_entries": int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", "10000")),
+}
+
+# Helper function to parse "KEY=value,KEY=value" settings
+def parse_rates(rates_str):
+    """
+    Parse comma-separated KEY=fraction pairs.
+    
+    Args:
+        rates_str: String such as "REQ=0.1,RESP=0.1"
+        
+    Returns:
+        dict: Key -> float, skipping malformed pairs
+    """
+    rates = {}
+    for pair in rates_str.split(','):
+        key, _, value = pair.partition('=')
+        try:
+            rates[key.strip()] = float(value)
+        except ValueError:
+            if pair.strip():
+                print(f"WARNING: Invalid rate '{pair}'. Ignoring it.")
+    return rates
+
+# Proxy file logging: queued JSON lines with per-category sampling, see utils/log_pipeline.py
+LOG_PIPELINE_CONFIG = {
+    "async": os.getenv("LOG_ASYNC", "True").lower() == "true",
+    "queue_size": int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    "batch_size": int(os.getenv("LOG_BATCH_SIZE", "500")),
+    "max_bytes": int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+    "backup_count": int(os.getenv("LOG_BACKUP_COUNT", "5")),
+    "sample_threshold_per_second": int(os.getenv("LOG_SAMPLE_THRESHOLD_PER_SECOND", "50")),
+    "sample_rates": parse_rates(os.getenv("LOG_SAMPLE_RATES", "REQ=0.1,UP=0.1,PRIV=0.1,ENRICH=0.1,RESP=0.1")),
+}
+
 # Recommendation Algorithm Settings
 ALGORITHM_CONFIG = {
     "weights": {
@@ -99,6 +147,24 @@ ALGORITHM_CONFIG = {
     "include_synthetic": os.getenv("RANKING_INCLUDE_SYNTHETIC", "False").lower() == "true"
 }
 
+# Per-user Bloom filters of seen posts, see utils/seen_filter.py
+SEEN_FILTER_CONFIG = {
+    # Posts per generation and target false-positive rate; a generation that
+    # reaches capacity rotates early so the rate stays bounded
+    "capacity": int(os.getenv("SEEN_FILTER_CAPACITY", "2000")),
+    "fp_rate": float(os.getenv("SEEN_FILTER_FP_RATE", "0.01")),
+    # History window covered by the two generations (matches ranking's 30 days)
+    "window_days": int(os.getenv("SEEN_FILTER_WINDOW_DAYS", "30")),
+    "cache_size": int(os.getenv("SEEN_FILTER_CACHE_SIZE", "10000")),
+    "cache_ttl_seconds": int(os.getenv("SEEN_FILTER_CACHE_TTL_SECONDS", "60")),
+}
+
+# Interned author/tag/category ids, see utils/interning.py
+INTERNING_CONFIG = {
+    # Values per namespace; later values are used as plain strings
+    "max_values": int(os.getenv("INTERNING_MAX_VALUES", "100000")),
+}
+
 # Health Check Settings
 HEALTH_CHECK_TIMEOUT = int(os.getenv("HEALTH_CHECK_TIMEOUT", "5"))
 
@@ -106,10 +172,178 @@ HEALTH_CHECK_TIMEOUT = int(os.getenv("HEALTH_CHECK_TIMEOUT", "5"))
 DEFAULT_MASTODON_INSTANCE = os.getenv("DEFAULT_MASTODON_INSTANCE", "https://mastodon.social")
 RECOMMENDATION_BLEND_RATIO = float(os.getenv("RECOMMENDATION_BLEND_RATIO", "0.3"))
 PROXY_TIMEOUT = int(os.getenv("PROXY_TIMEOUT", "10"))
+PROXY_STREAMING_ENABLED = os.getenv("PROXY_STREAMING_ENABLED", "True").lower() == "true"
+PROXY_STREAM_CHUNK_SIZE = int(os.getenv("PROXY_STREAM_CHUNK_SIZE", "65536"))
+
+# Response compression for bodies the service builds or modifies, see utils/compression.py
+COMPRESSION_CONFIG = {
+    "enabled": os.getenv("COMPRESSION_ENABLED", "True").lower() == "true",
+    # Smaller bodies are sent uncompressed
+    "min_bytes": int(os.getenv("COMPRESSION_MIN_BYTES", "1024")),
+    "gzip_level": int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+    "brotli_quality": int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5")),
+    # Bodies at least this large are compressed at fast_level
+    "large_bytes": int(os.getenv("COMPRESSION_LARGE_BYTES", str(1024 * 1024))),
+    "fast_level": int(os.getenv("COMPRESSION_FAST_LEVEL", "1")),
+}
+
+# Precomputed anonymous home timelines, see utils/anonymous_timeline.py
+ANONYMOUS_TIMELINE_CONFIG = {
+    "enabled": os.getenv("ANONYMOUS_TIMELINE_ENABLED", "True").lower() == "true",
+    # Shuffles built per period; requests rotate through them
+    "variants": int(os.getenv("ANONYMOUS_TIMELINE_VARIANTS", "4")),
+    "rotate_seconds": int(os.getenv("ANONYMOUS_TIMELINE_ROTATE_SECONDS", "300")),
+}
+
+# Timeline steps run concurrently with the upstream fetch (privacy, recommendations)
+TIMELINE_FETCH_CONFIG = {
+    "max_workers": int(os.getenv("TIMELINE_FETCH_WORKERS", "16")),
+    "enrichment_timeout": float(os.getenv("TIMELINE_ENRICHMENT_TIMEOUT", "3")),
+}
+
+# Background prefetch of the next augmented timeline page, see utils/timeline_prefetch.py
+TIMELINE_PREFETCH_CONFIG = {
+    "enabled": os.getenv("TIMELINE_PREFETCH_ENABLED", "False").lower() == "true",
+    "page_ttl_seconds": float(os.getenv("TIMELINE_PREFETCH_PAGE_TTL_SECONDS", "30")),
+    "state_ttl_seconds": float(os.getenv("TIMELINE_PREFETCH_STATE_TTL_SECONDS", "900")),
+    "max_bytes": int(os.getenv("TIMELINE_PREFETCH_MAX_BYTES", str(32 * 1024 * 1024))),
+    "max_states": int(os.getenv("TIMELINE_PREFETCH_MAX_STATES", "20000")),
+    "max_in_flight": int(os.getenv("TIMELINE_PREFETCH_MAX_IN_FLIGHT", "32")),
+    "workers": int(os.getenv("TIMELINE_PREFETCH_WORKERS", "4")),
+    # Recommendation IDs remembered per scroll session so pages don't repeat them
+    "max_rec_ids": int(os.getenv("TIMELINE_PREFETCH_MAX_REC_IDS", "50")),
+}
+
+# Few-second cache of upstream home timelines and their enrichment while
+# clients poll, see utils/timeline_microcache.py
+TIMELINE_MICROCACHE_CONFIG = {
+    "enabled": os.getenv("TIMELINE_MICROCACHE_ENABLED", "True").lower() == "true",
+    "ttl_seconds": float(os.getenv("TIMELINE_MICROCACHE_TTL_SECONDS", "3")),
+    "max_bytes": int(os.getenv("TIMELINE_MICROCACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+    "max_enrichment_bytes": int(os.getenv("TIMELINE_MICROCACHE_MAX_ENRICHMENT_BYTES", str(4 * 1024 * 1024))),
+    # Longest a poll waits for a concurrent identical fetch before fetching itself
+    "coalesce_timeout_seconds": float(os.getenv("TIMELINE_MICROCACHE_COALESCE_TIMEOUT", "10")),
+}
+
+# Proxy latency sketches, see utils/latency.py
+LATENCY_CONFIG = {
+    "relative_accuracy": float(os.getenv("LATENCY_RELATIVE_ACCURACY", "0.01")),
+    "slot_seconds": int(os.getenv("LATENCY_SLOT_SECONDS", "10")),
+    "window_slots": int(os.getenv("LATENCY_WINDOW_SLOTS", "90")),
+    "max_series": int(os.getenv("LATENCY_MAX_SERIES", "2000")),
+    # Distinct route and instance labels; later ones are recorded as 'other'
+    "max_routes": int(os.getenv("LATENCY_MAX_ROUTES", "200")),
+    "max_instances": int(os.getenv("LATENCY_MAX_INSTANCES", "100")),
+    "summary_windows": [int(w) for w in os.getenv("LATENCY_SUMMARY_WINDOWS", "60,300,900").split(',')],
+}
+
+# Async (ASGI) proxy serving mode, see asgi.py
+ASYNC_PROXY_CONFIG = {
+    "max_connections": int(os.getenv("ASYNC_PROXY_MAX_CONNECTIONS", "1000")),
+    "max_keepalive_connections": int(os.getenv("ASYNC_PROXY_MAX_KEEPALIVE", "200")),
+    "keepalive_expiry": float(os.getenv("ASYNC_PROXY_KEEPALIVE_EXPIRY", "60")),
+    "worker_threads": int(os.getenv("ASYNC_PROXY_WORKER_THREADS", "40")),
+}
+
+# Streaming API relay on the async proxy, see utils/streaming.py
+STREAMING_CONFIG = {
+    # Events buffered per client connection before it is dropped as too slow
+    "queue_size": int(os.getenv("STREAMING_QUEUE_SIZE", "256")),
+    # Upstream connections stay open this long after their last client leaves
+    "linger_seconds": float(os.getenv("STREAMING_LINGER_SECONDS", "30")),
+    "max_streams_per_viewer": int(os.getenv("STREAMING_MAX_STREAMS_PER_VIEWER", "8")),
+    # Upstream streams opened for unauthenticated clients, all together
+    "max_anonymous_streams": int(os.getenv("STREAMING_MAX_ANONYMOUS_STREAMS", "64")),
+    # Mastodon sends a heartbeat every 15 seconds
+    "read_timeout": float(os.getenv("STREAMING_READ_TIMEOUT", "60")),
+    "heartbeat_seconds": float(os.getenv("STREAMING_HEARTBEAT_SECONDS", "15")),
+    "min_backoff_seconds": float(os.getenv("STREAMING_MIN_BACKOFF_SECONDS", "1")),
+    "max_backoff_seconds": float(os.getenv("STREAMING_MAX_BACKOFF_SECONDS", "30")),
+    # Recommendations interleaved into home streams
+    "inject_every_updates": int(os.getenv("STREAMING_INJECT_EVERY_UPDATES", "20")),
+    "inject_min_interval_seconds": float(os.getenv("STREAMING_INJECT_MIN_INTERVAL_SECONDS", "300")),
+}
+
+# Upstream connection pooling (one keep-alive session per Mastodon instance)
+UPSTREAM_POOL_CONFIG = {
+    "pool_maxsize": int(os.getenv("UPSTREAM_POOL_MAXSIZE", "20")),
+    # With pool_block, a request waits up to pool_timeout_seconds for a free connection;
+    # otherwise extra connections are opened and closed after use
+    "pool_block": os.getenv("UPSTREAM_POOL_BLOCK", "False").lower() == "true",
+    "pool_timeout_seconds": float(os.getenv("UPSTREAM_POOL_TIMEOUT_SECONDS", "5")),
+    "max_hosts": int(os.getenv("UPSTREAM_MAX_HOSTS", "64")),
+    "keepalive_idle_seconds": int(os.getenv("UPSTREAM_KEEPALIVE_IDLE_SECONDS", "60")),
+    "dns_ttl_seconds": int(os.getenv("UPSTREAM_DNS_TTL_SECONDS", "300")),
+}
+
+# Per-instance health: circuit breaker, adaptive timeouts and hedged GETs, see utils/instance_health.py
+INSTANCE_HEALTH_CONFIG = {
+    "enabled": os.getenv("INSTANCE_HEALTH_ENABLED", "True").lower() == "true",
+    "window_size": int(os.getenv("INSTANCE_HEALTH_WINDOW_SIZE", "200")),
+    "min_samples": int(os.getenv("INSTANCE_HEALTH_MIN_SAMPLES", "20")),
+    "error_rate_threshold": float(os.getenv("INSTANCE_HEALTH_ERROR_RATE_THRESHOLD", "0.5")),
+    "consecutive_failures": int(os.getenv("INSTANCE_HEALTH_CONSECUTIVE_FAILURES", "5")),
+    "open_seconds": float(os.getenv("INSTANCE_HEALTH_OPEN_SECONDS", "30")),
+    "timeout_multiplier": float(os.getenv("INSTANCE_HEALTH_TIMEOUT_MULTIPLIER", "3")),
+    "min_timeout_seconds": float(os.getenv("INSTANCE_HEALTH_MIN_TIMEOUT_SECONDS", "1")),
+    "max_hosts": int(os.getenv("INSTANCE_HEALTH_MAX_HOSTS", "1000")),
+    "max_stale_seconds": int(os.getenv("INSTANCE_HEALTH_MAX_STALE_SECONDS", "600")),
+    "hedge_enabled": os.getenv("UPSTREAM_HEDGE_ENABLED", "False").lower() == "true",
+    "hedge_workers": int(os.getenv("UPSTREAM_HEDGE_WORKERS", "32")),
+}
+
+# Cache for cacheable upstream GETs on the pass-through proxy
+UPSTREAM_CACHE_CONFIG = {
+    "enabled": os.getenv("UPSTREAM_CACHE_ENABLED", "True").lower() == "true",
+    "max_bytes": int(os.getenv("UPSTREAM_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    "max_entry_bytes": int(os.getenv("UPSTREAM_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024))),
+}
+
+# Write-behind queue for interactions logged by the proxy, see utils/interaction_writer.py
+INTERACTION_WRITER_CONFIG = {
+    "enabled": os.getenv("INTERACTION_WRITER_ENABLED", "True").lower() == "true",
+    "max_queue": int(os.getenv("INTERACTION_WRITER_MAX_QUEUE", "10000")),
+    "batch_size": int(os.getenv("INTERACTION_WRITER_BATCH_SIZE", "500")),
+    "flush_interval_seconds": float(os.getenv("INTERACTION_WRITER_FLUSH_INTERVAL_SECONDS", "0.5")),
+    "enqueue_timeout_seconds": float(os.getenv("INTERACTION_WRITER_ENQUEUE_TIMEOUT_SECONDS", "0.05")),
+    "shutdown_timeout_seconds": float(os.getenv("INTERACTION_WRITER_SHUTDOWN_TIMEOUT_SECONDS", "10")),
+}
+
+# Bulk post ingestion (tools/ingest_posts.py)
+POST_INGESTION_CONFIG = {
+    "batch_size": int(os.getenv("POST_INGESTION_BATCH_SIZE", "5000")),
+    "flush_interval_seconds": float(os.getenv("POST_INGESTION_FLUSH_INTERVAL_SECONDS", "2")),
+    "max_queue": int(os.getenv("POST_INGESTION_MAX_QUEUE", "20000")),
+    # Recently loaded posts remembered to drop re-reads and federated copies
+    "dedupe_window": int(os.getenv("POST_INGESTION_DEDUPE_WINDOW", "200000")),
+    "page_limit": int(os.getenv("POST_INGESTION_PAGE_LIMIT", "40")),
+    "poll_interval_seconds": float(os.getenv("POST_INGESTION_POLL_INTERVAL_SECONDS", "15")),
+    "request_timeout_seconds": float(os.getenv("POST_INGESTION_REQUEST_TIMEOUT_SECONDS", "10")),
+}
 
 # Cold Start Settings
 COLD_START_ENABLED = os.getenv("COLD_START_ENABLED", "True").lower() == "true"
 COLD_START_POSTS_PATH = os.getenv("COLD_START_POSTS_PATH", 
                                 os.path.join(os.path.dirname(__file__), 'data', 'cold_start_posts.json'))
 COLD_START_POST_LIMIT = int(os.getenv("COLD_START_POST_LIMIT", "30"))
-ALLOW_COLD_START_FOR_ANONYMOUS = os.getenv("ALLOW_COLD_START_FOR_ANONYMOUS", "True").lower() == "true"
\ No newline at end of file
+ALLOW_COLD_START_FOR_ANONYMOUS = os.getenv("ALLOW_COLD_START_FOR_ANONYMOUS", "True").lower() == "true"
+# How often cold start files are checked for changes, see utils/cold_start_store.py
+COLD_START_RELOAD_CHECK_SECONDS = float(os.getenv("COLD_START_RELOAD_CHECK_SECONDS", "2"))
+
+# Cached "does this user follow anyone" probe used for the cold start decision
+FOLLOW_STATUS_CONFIG = {
+    "positive_ttl_seconds": int(os.getenv("FOLLOW_STATUS_POSITIVE_TTL_SECONDS", "3600")),
+    "negative_ttl_seconds": int(os.getenv("FOLLOW_STATUS_NEGATIVE_TTL_SECONDS", "300")),
+    "miss_wait_seconds": float(os.getenv("FOLLOW_STATUS_MISS_WAIT_SECONDS", "1")),
+    "probe_workers": int(os.getenv("FOLLOW_STATUS_PROBE_WORKERS", "4")),
+    "max_entries": int(os.getenv("FOLLOW_STATUS_MAX_ENTRIES", "50000")),
+}
+
+# Fan-out-on-write Settings; seed affinities once with tools/rebuild_affinities.py
+FANOUT_ON_WRITE_ENABLED = os.getenv("FANOUT_ON_WRITE_ENABLED", "False").lower() == "true"
+FANOUT_CONFIG = {
+    "inbox_size": int(os.getenv("FANOUT_INBOX_SIZE", "200")),
+    "inbox_ttl_hours": int(os.getenv("FANOUT_INBOX_TTL_HOURS", "72")),
+    "min_affinity": float(os.getenv("FANOUT_MIN_AFFINITY", "3")),
+    "max_recipients": int(os.getenv("FANOUT_MAX_RECIPIENTS", "1000")),
+}
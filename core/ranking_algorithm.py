@@ -4,6 +4,9 @@ Ranking Algorithm Module for the Corgi Recommender Service.
 This module provides the core logic for ranking posts based on user preferences,
 engagement metrics, and recency.
 
+Classes:
+    - CandidatePost: Compact record for a candidate/ranked post
+
 Functions:
     - get_user_interactions: Retrieve a user's interactions from the database
     - get_candidate_posts: Retrieve candidate posts for ranking
@@ -20,10 +23,69 @@ from typing import Dict, List, Tuple, Any, Optional
 from config import ALGORITHM_CONFIG
 from db.connection import get_db_connection
 from utils.privacy import generate_user_alias
+from utils.interning import intern_id, lookup_id
+from utils.seen_filter import get_seen_filter
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Interaction types that count for or against an author
+POSITIVE_ACTIONS = ('favorite', 'bookmark', 'reblog', 'more_like_this')
+NEGATIVE_ACTIONS = ('less_like_this',)
+
+# Extra candidates fetched when seen posts are filtered in memory
+CANDIDATE_OVERFETCH = 2
+
+class CandidatePost:
+    """
+    Compact record for a candidate post moving through the ranking pipeline.
+
+    Uses __slots__ so a large candidate pool does not carry a per-post dict,
+    and is scored in place instead of being copied. Supports read-only
+    mapping access (post['post_id'], post.get('content')) so code written
+    against the old dict rows keeps working; convert with to_dict() only
+    when a plain dict is needed at the response edge.
+    """
+    __slots__ = (
+        'post_id', 'author_id', 'author_name', 'content', 'created_at',
+        'interaction_counts', 'ranking_score', 'recommendation_reason'
+    )
+
+    def __init__(self, post_id, author_id=None, author_name=None, content=None,
+                 created_at=None, interaction_counts=None):
+        self.post_id = post_id
+        self.author_id = author_id
+        self.author_name = author_name
+        self.content = content
+        self.created_at = created_at
+        self.interaction_counts = interaction_counts
+        self.ranking_score = None
+        self.recommendation_reason = None
+
+    @classmethod
+    def from_row(cls, row) -> 'CandidatePost':
+        """Build a record from a (post_id, author_id, author_name, content, created_at, interaction_counts) row."""
+        return cls(row[0], row[1], row[2], row[3], row[4], row[5])
+
+    def __getitem__(self, key):
+        if key not in self.__slots__ or getattr(self, key) is None:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def to_dict(self) -> Dict:
+        """Return the populated fields as a plain dictionary."""
+        return {key: getattr(self, key) for key in self.__slots__ if getattr(self, key) is not None}
+
+    def __repr__(self):
+        return f"CandidatePost(post_id={self.post_id!r}, ranking_score={self.ranking_score!r})"
+
 def get_user_interactions(conn, user_id: str, days_limit: int = 30) -> List[Dict]:
     """
     Retrieve a user's interactions from the database.
@@ -54,8 +116,9 @@ def get_candidate_posts(
     limit: int = 100, 
     days_limit: int = 7, 
     exclude_post_ids: List[str] = None,
-    include_synthetic: bool = False
-) -> List[Dict]:
+    include_synthetic: bool = False,
+    seen_filter=None
+) -> List[CandidatePost]:
     """
     Retrieve candidate posts for ranking.
     
@@ -67,9 +130,12 @@ def get_candidate_posts(
         include_synthetic: Whether to include synthetic posts (default: False)
                           If False, only returns posts with mastodon_post NOT NULL
                           If True, includes all posts
+        seen_filter: Optional SeenFilter; posts in it are dropped in memory
+                     instead of a NOT IN clause, fetching further pages
+                     until the limit is filled or candidates run out
         
     Returns:
-        List of post records with post_id, author_id, content, etc.
+        List of CandidatePost records with post_id, author_id, content, etc.
     """
     # First check how many real posts we have available in total (for diagnostics)
     with conn.cursor() as cur:
@@ -88,6 +154,9 @@ def get_candidate_posts(
     
     exclude_clause = ""
     mastodon_clause = "AND mastodon_post IS NOT NULL" if not include_synthetic else ""
+    requested_limit = limit
+    if seen_filter is not None:
+        limit = limit * CANDIDATE_OVERFETCH
     params = [days_limit, limit]
     
     if exclude_post_ids and len(exclude_post_ids) > 0:
@@ -104,7 +173,7 @@ def get_candidate_posts(
             WHERE created_at > NOW() - INTERVAL '%s days'
             {exclude_clause}
             {mastodon_clause}
-            ORDER BY created_at DESC
+            ORDER BY created_at DESC, post_id DESC
             LIMIT %s
         '''
         logger.debug(f"Executing query: {query}")
@@ -152,18 +221,39 @@ def get_candidate_posts(
                 FROM post_metadata
                 WHERE created_at > NOW() - INTERVAL '%s days'
                 {exclude_clause}
-                ORDER BY created_at DESC
+                ORDER BY created_at DESC, post_id DESC
                 LIMIT %s
             ''', params)
             
             results = cur.fetchall()
+            mastodon_clause = ""
             logger.info(f"After including synthetic posts, found {len(results)} candidates")
         
-        # Convert to list of dictionaries
-        columns = [desc[0] for desc in cur.description]
-        result_dicts = [dict(zip(columns, row)) for row in results]
+        # Convert to compact candidate records (columns match the SELECT order)
+        candidates = [CandidatePost.from_row(row) for row in results]
         
-        return result_dicts
+        if seen_filter is not None:
+            candidates = [post for post in candidates if post.post_id not in seen_filter]
+            page = results
+            # A short page means there are no older candidates left
+            while len(candidates) < requested_limit and len(page) == limit and page[-1][4] is not None:
+                last_post_id, last_created_at = page[-1][0], page[-1][4]
+                cur.execute(f'''
+                    SELECT post_id, author_id, author_name, content, created_at, interaction_counts
+                    FROM post_metadata
+                    WHERE created_at > NOW() - INTERVAL '%s days'
+                    {exclude_clause}
+                    {mastodon_clause}
+                    AND (created_at, post_id) < (%s, %s)
+                    ORDER BY created_at DESC, post_id DESC
+                    LIMIT %s
+                ''', params[:-1] + [last_created_at, last_post_id, limit])
+                page = cur.fetchall()
+                candidates.extend(post for post in map(CandidatePost.from_row, page)
+                                  if post.post_id not in seen_filter)
+            candidates = candidates[:requested_limit]
+        
+        return candidates
 
 def get_author_preference_score(user_interactions: List[Dict], author_id: str) -> float:
     """
@@ -179,17 +269,13 @@ def get_author_preference_score(user_interactions: List[Dict], author_id: str) -
     if not user_interactions or not author_id:
         return 0.1  # Return baseline if no interactions or no author
     
-    # Define positive and negative interaction types
-    positive_actions = ['favorite', 'bookmark', 'reblog', 'more_like_this']
-    negative_actions = ['less_like_this']
-    
     # Track the posts the user has interacted with to retrieve author data
     post_ids = [interaction['post_id'] for interaction in user_interactions]
     
     if not post_ids:
         return 0.1  # Return baseline if no post interactions
     
-    # Get a mapping of post_id -> author_id for all post IDs the user has interacted with
+    # Get a mapping of post_id -> interned author id for all post IDs the user has interacted with
     post_author_map = {}
     try:
         from db.connection import get_db_connection
@@ -209,7 +295,8 @@ def get_author_preference_score(user_interactions: List[Dict], author_id: str) -
             with conn.cursor() as cur:
                 cur.execute(query, params)
                 for post_id, post_author_id in cur.fetchall():
-                    post_author_map[post_id] = post_author_id
+                    if post_author_id is not None:
+                        post_author_map[post_id] = intern_id('author', post_author_id)
     except Exception as e:
         logger.error(f"Error getting post author mapping: {e}")
         return 0.1  # Return baseline on error
@@ -221,27 +308,46 @@ def get_author_preference_score(user_interactions: List[Dict], author_id: str) -
         'total': 0
     }
     
+    # Authors are compared by interned id; an author never interned has no interactions
+    target_author = lookup_id('author', author_id)
+    if target_author is None:
+        return author_score_from_counts(0, 0)
+    
     # Process all interactions for the target author
     for interaction in user_interactions:
         post_id = interaction['post_id']
-        if post_id in post_author_map and post_author_map[post_id] == author_id:
+        if post_author_map.get(post_id) == target_author:
             action_type = interaction['action_type']
             author_interactions['total'] += 1
             
-            if action_type in positive_actions:
+            if action_type in POSITIVE_ACTIONS:
                 author_interactions['positive'] += 1
-            elif action_type in negative_actions:
+            elif action_type in NEGATIVE_ACTIONS:
                 author_interactions['negative'] += 1
     
-    # Calculate preference score based on interaction data
-    if author_interactions['total'] == 0:
+    return author_score_from_counts(author_interactions['positive'], author_interactions['total'])
+
+def author_score_from_counts(positive: int, total: int) -> float:
+    """
+    Map a user's positive/total interaction counts for one author to a score.
+    
+    Shared by get_author_preference_score and the offline replay evaluator
+    so that both produce identical author preference values.
+    
+    Args:
+        positive: Number of positive interactions with the author's posts
+        total: Total number of interactions with the author's posts
+        
+    Returns:
+        A score between 0.1 and 1
+    """
+    if total == 0:
         return 0.1  # Baseline score for authors without interactions
     
     # Calculate positive ratio (with a small epsilon to avoid division by zero)
-    positive_ratio = author_interactions['positive'] / (author_interactions['total'] + 0.001)
+    positive_ratio = positive / (total + 0.001)
     
     # Apply a sigmoid function to map the ratio to a 0-1 range with a smooth curve
-    import math
     preference_score = 1 / (1 + math.exp(-5 * (positive_ratio - 0.5)))
     
     # Ensure minimum score is still the baseline
@@ -275,8 +381,18 @@ def get_content_engagement_score(post: Dict) -> float:
     replies = int(counts.get('replies', 0))
     
     # Simple engagement score - can be replaced with more sophisticated metrics
-    total = favorites + reblogs + replies
+    return engagement_score_from_total(favorites + reblogs + replies)
+
+def engagement_score_from_total(total: int) -> float:
+    """
+    Map a post's total engagement count to an engagement score.
     
+    Args:
+        total: Sum of favorites, reblogs and replies
+        
+    Returns:
+        A score of roughly 0-1
+    """
     # Logarithmic scaling to prevent very popular posts from completely dominating
     # Add 1 to avoid log(0)
     return math.log(total + 1) / 10.0  # Normalize to roughly 0-1 range
@@ -313,8 +429,21 @@ def get_recency_score(post: Dict) -> float:
     
     age_days = (now - created_at).total_seconds() / (24 * 3600)
     
+    return recency_score_from_age(age_days)
+
+def recency_score_from_age(age_days: float, decay_days: Optional[float] = None) -> float:
+    """
+    Map a post's age to a recency score with exponential decay.
+    
+    Args:
+        age_days: Age of the post in days
+        decay_days: Decay constant (defaults to ALGORITHM_CONFIG['time_decay_days'])
+        
+    Returns:
+        A score between 0.2 and 1
+    """
     # Exponential decay based on age
-    decay_factor = ALGORITHM_CONFIG['time_decay_days']
+    decay_factor = decay_days or ALGORITHM_CONFIG['time_decay_days']
     recency_score = math.exp(-age_days / decay_factor)
     
     # Ensure the score doesn't get too low, even for older posts
@@ -372,7 +501,7 @@ def generate_rankings_for_user(user_id: str) -> List[Dict]:
         user_id: User ID to generate rankings for
         
     Returns:
-        List of ranked posts with scores and reasons
+        List of ranked CandidatePost records with scores and reasons
     """
     try:
         # Get pseudonymized user ID for privacy
@@ -387,8 +516,16 @@ def generate_rankings_for_user(user_id: str) -> List[Dict]:
             )
             logger.info(f"Retrieved {len(user_interactions)} interactions for user {user_alias}")
             
-            # Extract post IDs the user has already interacted with
-            seen_post_ids = [interaction['post_id'] for interaction in user_interactions]
+            # Posts the user has already seen are excluded with their Bloom
+            # filter; fall back to an explicit id list if it is unavailable
+            seen_filter = None
+            seen_post_ids = None
+            try:
+                seen_filter = get_seen_filter(conn, user_alias)
+            except Exception as e:
+                logger.warning(f"Seen filter unavailable for {user_alias}, using NOT IN exclusion: {e}")
+                conn.rollback()
+                seen_post_ids = [interaction['post_id'] for interaction in user_interactions]
             
             # Step 2: Get candidate posts (excluding ones user has seen)
             candidate_posts = get_candidate_posts(
@@ -396,7 +533,8 @@ def generate_rankings_for_user(user_id: str) -> List[Dict]:
                 limit=ALGORITHM_CONFIG['max_candidates'],
                 days_limit=14,
                 exclude_post_ids=seen_post_ids,
-                include_synthetic=ALGORITHM_CONFIG['include_synthetic']
+                include_synthetic=ALGORITHM_CONFIG['include_synthetic'],
+                seen_filter=seen_filter
             )
             logger.debug(f"Found {len(candidate_posts)} candidate posts")
             
@@ -412,12 +550,12 @@ def generate_rankings_for_user(user_id: str) -> List[Dict]:
                 
                 # Include only posts with reasonable scores
                 if score > 0.1:
-                    post['ranking_score'] = score
-                    post['recommendation_reason'] = reason
+                    post.ranking_score = score
+                    post.recommendation_reason = reason
                     ranked_posts.append(post)
             
             # Sort by ranking score (descending)
-            ranked_posts.sort(key=lambda x: x['ranking_score'], reverse=True)
+            ranked_posts.sort(key=lambda x: x.ranking_score, reverse=True)
             logger.info(f"Generated {len(ranked_posts)} ranked posts")
             
             # Step 4: Store rankings in the database
@@ -435,12 +573,12 @@ def generate_rankings_for_user(user_id: str) -> List[Dict]:
                                 created_at = CURRENT_TIMESTAMP
                         ''', (
                             user_alias, 
-                            post['post_id'], 
-                            post['ranking_score'], 
-                            post['recommendation_reason']
+                            post.post_id, 
+                            post.ranking_score, 
+                            post.recommendation_reason
                         ))
                 except Exception as e:
-                    logger.error(f"Error storing ranking for post {post['post_id']}: {e}")
+                    logger.error(f"Error storing ranking for post {post.post_id}: {e}")
             
             conn.commit()
             
@@ -0,0 +1,510 @@
+"""
+Offline Replay Evaluation Module for the Corgi Recommender Service.
+
+This module replays the interactions table in time order and reconstructs the
+ranking each user would have received from core.ranking_algorithm at every
+evaluation point. Each reconstructed ranking is scored against the
+interactions that followed it (hit rate and NDCG at k), so quality changes to
+the ranking weights can be judged without any live services.
+
+Data can come from the local PostgreSQL database or from a JSON-lines snapshot
+file. Each snapshot line is one record:
+
+    {"kind": "post", "post_id": "...", "author_id": "...", "created_at": "..."}
+    {"kind": "interaction", "user_alias": "...", "post_id": "...",
+     "action_type": "favorite", "created_at": "..."}
+
+Functions:
+    - load_snapshot: Read posts and interactions from a snapshot file
+    - load_from_db: Stream posts and interactions from PostgreSQL
+    - export_snapshot: Dump the database to a snapshot file
+    - build_corpus: Index posts and group interactions per user
+    - weight_grid: Build a sweep of ranking weight configurations
+    - evaluate: Replay all users and compute metrics per weight configuration
+"""
+
+import bisect
+import heapq
+import json
+import logging
+import math
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import ALGORITHM_CONFIG
+from core.ranking_algorithm import (
+    POSITIVE_ACTIONS,
+    author_score_from_counts,
+    engagement_score_from_total,
+    recency_score_from_age,
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Windows used by generate_rankings_for_user
+HISTORY_DAYS = 30
+CANDIDATE_DAYS = 14
+# get_author_preference_score only maps authors for the 100 most recent posts
+AUTHOR_HISTORY_LIMIT = 100
+# Posts scoring at or below this are dropped from rankings
+MIN_RANKING_SCORE = 0.1
+# Interaction types that show up in a post's interaction_counts
+ENGAGEMENT_ACTIONS = ("favorite", "reblog")
+
+SECONDS_PER_DAY = 24 * 3600
+
+# Read-only replay state installed in each worker process
+_worker_state = {}
+
+
+def _to_epoch(value) -> float:
+    """Convert a datetime or ISO timestamp string to epoch seconds (naive = UTC)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def load_snapshot(path: str) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Read posts and interactions from a JSON-lines snapshot file.
+
+    Args:
+        path: Path to the snapshot file
+
+    Returns:
+        Tuple of (posts, interactions) as lists of records
+    """
+    posts = []
+    interactions = []
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Skipping invalid snapshot line {line_number}: {e}")
+                continue
+            kind = record.get("kind")
+            if kind == "post":
+                posts.append(record)
+            elif kind == "interaction":
+                interactions.append(record)
+
+    logger.info(f"Loaded snapshot with {len(posts)} posts and {len(interactions)} interactions")
+    return posts, interactions
+
+
+def _stream_query(conn, name: str, query: str, batch_size: int) -> Iterator[Dict]:
+    """Stream rows from a server-side cursor as dictionaries."""
+    with conn.cursor(name=name) as cur:
+        cur.itersize = batch_size
+        cur.execute(query)
+        columns = None
+        for row in cur:
+            if columns is None:
+                columns = [desc[0] for desc in cur.description]
+            yield dict(zip(columns, row))
+
+
+def load_from_db(conn, batch_size: int = 10000) -> Tuple[List[Dict], Iterator[Dict]]:
+    """
+    Load posts and stream interactions from PostgreSQL in time order.
+
+    Args:
+        conn: Database connection
+        batch_size: Rows fetched per round trip by the server-side cursors
+
+    Returns:
+        Tuple of (posts, interactions iterator)
+    """
+    posts = list(
+        _stream_query(
+            conn,
+            "replay_posts",
+            """
+        SELECT post_id, author_id, created_at
+        FROM post_metadata
+        WHERE created_at IS NOT NULL
+    """,
+            batch_size,
+        )
+    )
+
+    interactions = _stream_query(
+        conn,
+        "replay_interactions",
+        """
+        SELECT user_alias, post_id, action_type, created_at
+        FROM interactions
+        ORDER BY created_at, id
+    """,
+        batch_size,
+    )
+
+    return posts, interactions
+
+
+def export_snapshot(conn, path: str, batch_size: int = 10000) -> int:
+    """
+    Dump posts and interactions from PostgreSQL into a snapshot file.
+
+    Args:
+        conn: Database connection
+        path: Destination snapshot path
+        batch_size: Rows fetched per round trip by the server-side cursors
+
+    Returns:
+        Number of records written
+    """
+    posts, interactions = load_from_db(conn, batch_size)
+    written = 0
+    with open(path, "w") as f:
+        for kind, records in (("post", posts), ("interaction", interactions)):
+            for record in records:
+                record = dict(record, kind=kind)
+                record["created_at"] = datetime.fromtimestamp(
+                    _to_epoch(record["created_at"]), tz=timezone.utc
+                ).isoformat()
+                f.write(json.dumps(record) + "\n")
+                written += 1
+
+    logger.info(f"Exported {written} records to {path}")
+    return written
+
+
+def build_corpus(
+    posts: Iterable[Dict], interactions: Iterable[Dict]
+) -> Tuple[Dict, Dict[str, List]]:
+    """
+    Index posts by creation time and group interactions per user.
+
+    The corpus holds parallel columns sorted by post creation time so that the
+    candidate pool at any moment is a bisect plus a short backwards walk, and
+    per-post engagement timestamps so that engagement can be reconstructed as
+    of any moment.
+
+    Args:
+        posts: Post records with post_id, author_id and created_at
+        interactions: Interaction records with user_alias, post_id,
+                      action_type and created_at
+
+    Returns:
+        Tuple of (corpus, user_histories) where user_histories maps each user
+        alias to a time-ordered list of (timestamp, post_index, action_type)
+    """
+    rows = sorted(
+        (_to_epoch(p["created_at"]), str(p["post_id"]), str(p.get("author_id") or ""))
+        for p in posts
+        if p.get("created_at") and p.get("post_id")
+    )
+    corpus = {
+        "times": [row[0] for row in rows],
+        "post_ids": [row[1] for row in rows],
+        "authors": [row[2] for row in rows],
+    }
+    index = {post_id: i for i, post_id in enumerate(corpus["post_ids"])}
+    engagement = [[] for _ in rows]
+
+    user_histories = {}
+    for interaction in interactions:
+        timestamp = _to_epoch(interaction["created_at"])
+        post_index = index.get(str(interaction["post_id"]), -1)
+        action_type = interaction["action_type"]
+        user_histories.setdefault(interaction["user_alias"], []).append(
+            (timestamp, post_index, action_type)
+        )
+        if post_index >= 0 and action_type in ENGAGEMENT_ACTIONS:
+            engagement[post_index].append(timestamp)
+
+    for timestamps in engagement:
+        timestamps.sort()
+    for history in user_histories.values():
+        history.sort(key=lambda item: item[0])
+    corpus["engagement"] = engagement
+
+    logger.info(f"Built replay corpus with {len(rows)} posts and {len(user_histories)} users")
+    return corpus, user_histories
+
+
+def weight_grid(step: float = 0.1) -> List[Dict[str, float]]:
+    """
+    Build every weight configuration on a grid whose weights sum to 1.
+
+    Args:
+        step: Grid spacing for each weight
+
+    Returns:
+        List of weight dictionaries shaped like ALGORITHM_CONFIG['weights']
+    """
+    steps = int(round(1 / step))
+    grid = []
+    for a in range(steps + 1):
+        for e in range(steps + 1 - a):
+            grid.append(
+                {
+                    "author_preference": round(a * step, 6),
+                    "content_engagement": round(e * step, 6),
+                    "recency": round((steps - a - e) * step, 6),
+                }
+            )
+    return grid
+
+
+def _author_counts(
+    history: List[Tuple], start: int, end: int, authors: List[str]
+) -> Dict[str, List[int]]:
+    """Count positive/total interactions per author as get_author_preference_score does."""
+    # Production maps authors only for the most recent interactions' posts
+    mapped_posts = {
+        history[j][1]
+        for j in range(max(start, end - AUTHOR_HISTORY_LIMIT), end)
+        if history[j][1] >= 0
+    }
+    counts = {}
+    for j in range(start, end):
+        post_index = history[j][1]
+        if post_index in mapped_posts:
+            author_counts = counts.setdefault(authors[post_index], [0, 0])
+            author_counts[1] += 1
+            if history[j][2] in POSITIVE_ACTIONS:
+                author_counts[0] += 1
+    return counts
+
+
+def _candidate_features(
+    corpus: Dict, now: float, seen: set, author_counts: Dict, max_candidates: int, decay_days: float
+):
+    """Build the candidate pool at a moment and its per-post feature columns."""
+    times = corpus["times"]
+    authors = corpus["authors"]
+    engagement = corpus["engagement"]
+    oldest = now - CANDIDATE_DAYS * SECONDS_PER_DAY
+
+    candidates, author_col, engagement_col, recency_col = [], [], [], []
+    i = bisect.bisect_left(times, now) - 1
+    while i >= 0 and times[i] > oldest and len(candidates) < max_candidates:
+        if i not in seen:
+            positive, total = author_counts.get(authors[i], (0, 0))
+            candidates.append(i)
+            author_col.append(author_score_from_counts(positive, total))
+            engagement_col.append(
+                engagement_score_from_total(bisect.bisect_left(engagement[i], now))
+            )
+            recency_col.append(
+                recency_score_from_age((now - times[i]) / SECONDS_PER_DAY, decay_days)
+            )
+        i -= 1
+    return candidates, author_col, engagement_col, recency_col
+
+
+def replay_user(
+    history: List[Tuple],
+    corpus: Dict,
+    weight_configs: List[Dict[str, float]],
+    k: int = 10,
+    horizon_hours: float = 24,
+    min_history: int = 1,
+    max_candidates: Optional[int] = None,
+    decay_days: Optional[float] = None,
+) -> Dict:
+    """
+    Replay one user's history and score every reconstructed ranking.
+
+    An evaluation point is every positive interaction that has at least
+    `min_history` earlier interactions. The ranking is reconstructed just
+    before that moment and judged against the positive interactions that
+    occur within `horizon_hours` from it.
+
+    Args:
+        history: Time-ordered (timestamp, post_index, action_type) tuples
+        corpus: Corpus built by build_corpus
+        weight_configs: Weight configurations to score in the same pass
+        k: Ranking cutoff for hit rate and NDCG
+        horizon_hours: How far ahead interactions count as relevant
+        min_history: Minimum earlier interactions before evaluating
+        max_candidates: Candidate pool size (default: ALGORITHM_CONFIG)
+        decay_days: Recency decay constant (default: ALGORITHM_CONFIG)
+
+    Returns:
+        Accumulator dict with per-config hit/NDCG sums and evaluation counts
+    """
+    max_candidates = max_candidates or ALGORITHM_CONFIG["max_candidates"]
+    decay_days = decay_days or ALGORITHM_CONFIG["time_decay_days"]
+    horizon = horizon_hours * 3600
+    history_window = HISTORY_DAYS * SECONDS_PER_DAY
+    weights = [
+        (w["author_preference"], w["content_engagement"], w["recency"]) for w in weight_configs
+    ]
+    discounts = [1 / math.log2(rank + 2) for rank in range(k)]
+
+    result = _empty_result(len(weight_configs))
+    start = 0
+    for end, (now, target, action_type) in enumerate(history):
+        if action_type not in POSITIVE_ACTIONS or target < 0 or end < min_history:
+            continue
+
+        # Interactions visible to the ranker: the 30 days before this moment
+        while start < end and history[start][0] <= now - history_window:
+            start += 1
+        if end - start < min_history:
+            continue
+
+        relevant = set()
+        j = end
+        while j < len(history) and history[j][0] < now + horizon:
+            if history[j][2] in POSITIVE_ACTIONS and history[j][1] >= 0:
+                relevant.add(history[j][1])
+            j += 1
+
+        seen = {history[j][1] for j in range(start, end)}
+        author_counts = _author_counts(history, start, end, corpus["authors"])
+        candidates, author_col, engagement_col, recency_col = _candidate_features(
+            corpus, now, seen, author_counts, max_candidates, decay_days
+        )
+
+        result["eval_points"] += 1
+        if relevant & set(candidates):
+            result["covered"] += 1
+        ideal = sum(discounts[: min(k, len(relevant))])
+
+        # Features are computed once; every weight configuration reuses them
+        for c, (wa, we, wr) in enumerate(weights):
+            scores = [
+                wa * a + we * e + wr * r for a, e, r in zip(author_col, engagement_col, recency_col)
+            ]
+            ranked = heapq.nlargest(
+                k,
+                (i for i in range(len(candidates)) if scores[i] > MIN_RANKING_SCORE),
+                key=scores.__getitem__,
+            )
+            gains = [discounts[rank] for rank, i in enumerate(ranked) if candidates[i] in relevant]
+            if gains:
+                result["hits"][c] += 1
+                result["dcg"][c] += sum(gains) / ideal
+
+    return result
+
+
+def _empty_result(config_count: int) -> Dict:
+    return {
+        "eval_points": 0,
+        "covered": 0,
+        "hits": [0] * config_count,
+        "dcg": [0.0] * config_count,
+    }
+
+
+def _merge_results(total: Dict, part: Dict) -> Dict:
+    total["eval_points"] += part["eval_points"]
+    total["covered"] += part["covered"]
+    for c in range(len(total["hits"])):
+        total["hits"][c] += part["hits"][c]
+        total["dcg"][c] += part["dcg"][c]
+    return total
+
+
+def _init_worker(corpus: Dict, params: Dict) -> None:
+    """Install the read-only corpus and replay parameters in a worker process."""
+    _worker_state["corpus"] = corpus
+    _worker_state["params"] = params
+
+
+def _replay_shard(histories: List[List[Tuple]]) -> Dict:
+    """Replay a shard of users inside a worker process."""
+    corpus = _worker_state["corpus"]
+    params = _worker_state["params"]
+    total = _empty_result(len(params["weight_configs"]))
+    for history in histories:
+        _merge_results(total, replay_user(history, corpus, **params))
+    return total
+
+
+def _shard_users(user_histories: Dict[str, List], shard_count: int) -> List[List[List[Tuple]]]:
+    """Split users into shards by a stable hash of their alias."""
+    shards = [[] for _ in range(shard_count)]
+    for user_alias, history in user_histories.items():
+        shards[zlib.crc32(user_alias.encode()) % shard_count].append(history)
+    return [shard for shard in shards if shard]
+
+
+def evaluate(
+    corpus: Dict,
+    user_histories: Dict[str, List],
+    weight_configs: Optional[List[Dict[str, float]]] = None,
+    k: int = 10,
+    horizon_hours: float = 24,
+    min_history: int = 1,
+    max_candidates: Optional[int] = None,
+    decay_days: Optional[float] = None,
+    workers: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Replay every user and compute hit rate and NDCG for each weight configuration.
+
+    Users are sharded by alias and replayed in a process pool; the corpus is
+    shipped to each worker once through the pool initializer.
+
+    Args:
+        corpus: Corpus built by build_corpus
+        user_histories: Per-user histories built by build_corpus
+        weight_configs: Weight configurations to compare
+                        (default: the current ALGORITHM_CONFIG weights)
+        k: Ranking cutoff for hit rate and NDCG
+        horizon_hours: How far ahead interactions count as relevant
+        min_history: Minimum earlier interactions before evaluating
+        max_candidates: Candidate pool size (default: ALGORITHM_CONFIG)
+        decay_days: Recency decay constant (default: ALGORITHM_CONFIG)
+        workers: Process count; 0 or 1 replays in the current process
+
+    Returns:
+        One result dict per weight configuration, best NDCG first
+    """
+    weight_configs = weight_configs or [dict(ALGORITHM_CONFIG["weights"])]
+    params = {
+        "weight_configs": weight_configs,
+        "k": k,
+        "horizon_hours": horizon_hours,
+        "min_history": min_history,
+        "max_candidates": max_candidates,
+        "decay_days": decay_days,
+    }
+    workers = os.cpu_count() if workers is None else workers
+    total = _empty_result(len(weight_configs))
+
+    if workers <= 1 or len(user_histories) < 2:
+        _init_worker(corpus, params)
+        _merge_results(total, _replay_shard(list(user_histories.values())))
+    else:
+        shards = _shard_users(user_histories, workers * 4)
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(corpus, params)
+        ) as pool:
+            for part in pool.map(_replay_shard, shards):
+                _merge_results(total, part)
+
+    eval_points = total["eval_points"]
+    results = []
+    for c, weights in enumerate(weight_configs):
+        results.append(
+            {
+                "weights": weights,
+                "eval_points": eval_points,
+                f"hit_rate@{k}": total["hits"][c] / eval_points if eval_points else 0.0,
+                f"ndcg@{k}": total["dcg"][c] / eval_points if eval_points else 0.0,
+                "candidate_coverage": total["covered"] / eval_points if eval_points else 0.0,
+            }
+        )
+
+    results.sort(key=lambda r: r[f"ndcg@{k}"], reverse=True)
+    logger.info(f"Replayed {len(user_histories)} users over {eval_points} evaluation points")
+    return results
@@ -21,6 +21,9 @@ DROP TABLE IF EXISTS interactions;
 DROP TABLE IF EXISTS post_metadata;
 DROP TABLE IF EXISTS privacy_settings;
 DROP TABLE IF EXISTS user_identities;
+DROP TABLE IF EXISTS user_seen_filters;
+DROP TABLE IF EXISTS user_affinities;
+DROP TABLE IF EXISTS feed_inboxes;
 """
 
 # Create table definitions
@@ -89,6 +92,35 @@ CREATE TABLE IF NOT EXISTS user_identities (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+
+-- Table: user_seen_filters
+-- Stores each user's serialized Bloom filter of recently seen posts
+CREATE TABLE IF NOT EXISTS user_seen_filters (
+    user_alias TEXT PRIMARY KEY,
+    filter_data BYTEA NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Table: user_affinities
+-- Stores each user's net interaction count per author and tag for fan-out
+CREATE TABLE IF NOT EXISTS user_affinities (
+    kind TEXT CHECK (kind IN ('author', 'tag')) NOT NULL,
+    target TEXT NOT NULL,
+    user_alias TEXT NOT NULL,
+    affinity REAL NOT NULL,
+    PRIMARY KEY (kind, target, user_alias)
+);
+
+-- Table: feed_inboxes
+-- Stores fanned-out candidate posts per user and why each was delivered
+CREATE TABLE IF NOT EXISTS feed_inboxes (
+    user_alias TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    preference REAL NOT NULL,
+    reason TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_alias, post_id)
+);
 """
 
 # Create indexes for optimized queries
@@ -106,6 +138,8 @@ CREATE INDEX IF NOT EXISTS idx_post_created_at ON post_metadata(created_at);
 CREATE INDEX IF NOT EXISTS idx_post_language ON post_metadata(language);
 CREATE INDEX IF NOT EXISTS idx_post_tags ON post_metadata USING GIN (tags);
 CREATE INDEX IF NOT EXISTS idx_post_interaction_counts ON post_metadata USING GIN (interaction_counts);
+-- Lets bulk ingestion find copies of a post federated under another id
+CREATE INDEX IF NOT EXISTS idx_post_uri ON post_metadata ((mastodon_post->>'uri'));
 
 -- Indexes for post_rankings table
 CREATE INDEX IF NOT EXISTS idx_post_rankings_user_id ON post_rankings(user_id);
@@ -118,6 +152,23 @@ CREATE INDEX IF NOT EXISTS idx_user_identities_access_token ON user_identities(a
 CREATE INDEX IF NOT EXISTS idx_user_identities_mastodon_id ON user_identities(mastodon_id);
 """
 
+# Triggers
+CREATE_TRIGGERS_SQL = """
+-- Tell every worker when a user's privacy level changes, whoever changed it,
+-- so their privacy caches (utils/privacy.py) drop the entry on commit
+CREATE OR REPLACE FUNCTION notify_privacy_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('privacy_changed', COALESCE(NEW.user_id, OLD.user_id));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS privacy_settings_notify ON privacy_settings;
+CREATE TRIGGER privacy_settings_notify
+    AFTER INSERT OR UPDATE OR DELETE ON privacy_settings
+    FOR EACH ROW EXECUTE PROCEDURE notify_privacy_change();
+"""
+
 def create_tables(conn):
     """
     Create database tables if they don't exist.
@@ -134,6 +185,10 @@ def create_tables(conn):
         logger.info("Creating table indexes...")
         cur.execute(CREATE_INDEXES_SQL)
         
+        # Create triggers
+        logger.info("Creating table triggers...")
+        cur.execute(CREATE_TRIGGERS_SQL)
+        
         # Commit the transaction
         conn.commit()
         logger.info("Database schema created successfully")
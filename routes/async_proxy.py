@@ -0,0 +1,706 @@
+"""
+Async proxy routes for the Corgi Recommender Service.
+
+This module serves the proxy blueprint's upstream-bound routes
+(/timelines/home, /timelines/home/augmented and the catch-all) on ASGI, so a
+request waiting on a slow Mastodon instance does not hold a worker thread.
+
+The request handling itself is shared with routes/proxy.py: each view is split
+into a prepare and a finish phase around its upstream call. Those phases (user
+lookup, cold start, interaction logging, enrichment) run in a bounded thread
+pool under a Flask request context; only the upstream call is awaited, on a
+shared pooled httpx client. Upstream calls share the per-instance circuit
+breakers and adaptive timeouts of utils/instance_health.py with the Flask
+views. All other routes are served by the Flask app.
+
+The streaming API (/api/v1/streaming, SSE and WebSocket) is relayed through
+the shared upstream connections of utils/streaming.py, with recommendations
+occasionally interleaved into home streams.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urljoin
+
+import anyio
+import httpx
+from a2wsgi import WSGIMiddleware
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from flask import Response as FlaskResponse
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+from config import (
+    API_PREFIX,
+    ASYNC_PROXY_CONFIG,
+    PROXY_STREAM_CHUNK_SIZE,
+    PROXY_TIMEOUT,
+    STREAMING_CONFIG,
+    TIMELINE_FETCH_CONFIG,
+)
+from routes.proxy import (
+    UpstreamCall,
+    cached_proxy_response,
+    finish_augmented_timeline,
+    finish_home_timeline,
+    finish_proxy_request,
+    get_recommendation_slice,
+    invalidate_viewer_timelines,
+    lookup_proxy_cache,
+    parse_upstream_timeline,
+    prepare_augmented_timeline,
+    prepare_home_timeline,
+    prepare_proxy_request,
+    proxy_error_response,
+    proxy_logger,
+    record_follow_action,
+    record_request_metrics,
+    resolve_enrichment,
+    stale_proxy_response,
+    start_timeline_page,
+    store_proxy_response,
+    unavailable_instance_timeline,
+)
+from utils import instance_health, timeline_microcache, upstream_cache
+from utils.compression import compress_response
+from utils.instance_health import InstanceUnavailable
+from utils.log_pipeline import log_event
+from utils.streaming import (
+    STREAM_PATHS,
+    RecommendationInterleaver,
+    StreamingHub,
+    StreamLimitExceeded,
+    StreamRejected,
+    format_sse,
+    stream_request,
+)
+from utils.upstream import HOP_BY_HOP_HEADERS
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Flask endpoints served by the async app
+ASYNC_ENDPOINTS = frozenset(
+    [
+        "proxy.get_home_timeline",
+        "proxy.get_augmented_timeline",
+        "proxy.proxy_to_mastodon",
+    ]
+)
+
+
+def _forward_headers(headers):
+    return {key: value for key, value in headers.items() if key.lower() not in HOP_BY_HOP_HEADERS}
+
+
+def _to_asgi_response(flask_app, result):
+    """Convert a Flask view result into a Starlette response."""
+    flask_response = flask_app.make_response(result)
+    response = Response(flask_response.get_data(), status_code=flask_response.status_code)
+    response.raw_headers = [
+        (key.lower().encode("latin-1"), value.encode("latin-1"))
+        for key, value in flask_response.headers.items()
+    ]
+    return response
+
+
+async def _send_upstream(client, method, url, stream=False, **kwargs):
+    """Send an upstream request through the instance's circuit breaker."""
+    timeout = instance_health.acquire(url, method)
+    adaptive = instance_health.is_adaptive(method)
+    start = time.perf_counter()
+    try:
+        response = await client.send(
+            client.build_request(method, url, timeout=timeout, **kwargs), stream=stream
+        )
+    except httpx.TimeoutException:
+        # A slow non-GET may have gone through; it says little about the instance
+        if adaptive:
+            instance_health.record_failure(url, time.perf_counter() - start)
+        raise
+    except httpx.HTTPError:
+        instance_health.record_failure(url)
+        raise
+    instance_health.record_response(
+        url, response.status_code, time.perf_counter() - start if adaptive else None
+    )
+    return response
+
+
+async def _fetch_upstream_timeline(client, upstream_call):
+    """Fetch a timeline page through the micro-cache; concurrent polls share one request."""
+    return await timeline_microcache.afetch_timeline(
+        upstream_call.url,
+        upstream_call.params,
+        upstream_call.headers,
+        lambda: _send_upstream(
+            client,
+            upstream_call.method,
+            upstream_call.url,
+            headers=_forward_headers(upstream_call.headers),
+            params=upstream_call.params,
+        ),
+    )
+
+
+async def _wait_for_branch(task, deadline, default, request_id, label):
+    """Await a concurrent timeline step until its deadline."""
+    try:
+        return await asyncio.wait_for(task, timeout=max(0, deadline - time.time()))
+    except asyncio.TimeoutError:
+        proxy_logger.warning(f"TIMEOUT-{request_id} | {label} exceeded its time budget")
+    except Exception as e:
+        proxy_logger.error(f"ERROR-{request_id} | {label} failed: {e}")
+    return default
+
+
+class FlaskPhaseRunner:
+    """Runs proxy view phases in worker threads under a Flask request context."""
+
+    def __init__(self, flask_app, limiter, request: Request, body: bytes):
+        self.flask_app = flask_app
+        self.limiter = limiter
+        self.environ_args = {
+            "path": request.scope["path"],
+            # WebSocket scopes have no method
+            "method": request.scope.get("method", "GET"),
+            "query_string": request.url.query,
+            "headers": [
+                (key, value)
+                for key, value in request.headers.items()
+                if key.lower() != "content-length"
+            ],
+            "data": body,
+            "environ_base": {"REMOTE_ADDR": request.client.host if request.client else ""},
+        }
+
+    def _call(self, func, *args):
+        environ = EnvironBuilder(**self.environ_args).get_environ()
+        with self.flask_app.request_context(environ):
+            result = func(*args)
+            if isinstance(result, FlaskResponse) or (
+                isinstance(result, tuple) and result and isinstance(result[0], FlaskResponse)
+            ):
+                return _to_asgi_response(
+                    self.flask_app, compress_response(self.flask_app.make_response(result))
+                )
+            return result
+
+    async def run(self, func, *args):
+        return await anyio.to_thread.run_sync(
+            functools.partial(self._call, func, *args), limiter=self.limiter
+        )
+
+
+def create_async_proxy(flask_app, transport=None) -> FastAPI:
+    """
+    Create the FastAPI app serving the async proxy routes.
+
+    Args:
+        flask_app: The Flask app whose proxy logic and config are used
+        transport: Optional httpx transport (for tests)
+
+    Returns:
+        FastAPI app
+    """
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.limiter = anyio.CapacityLimiter(ASYNC_PROXY_CONFIG["worker_threads"])
+        app.state.client = httpx.AsyncClient(
+            transport=transport,
+            timeout=PROXY_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=ASYNC_PROXY_CONFIG["max_connections"],
+                max_keepalive_connections=ASYNC_PROXY_CONFIG["max_keepalive_connections"],
+                keepalive_expiry=ASYNC_PROXY_CONFIG["keepalive_expiry"],
+            ),
+        )
+        logger.info("Async proxy started")
+        try:
+            app.state.streaming = StreamingHub(app.state.client)
+            yield
+        finally:
+            await app.state.streaming.close()
+            await app.state.client.aclose()
+
+    app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+
+    async def phase_runner(request: Request) -> FlaskPhaseRunner:
+        body = await request.body()
+        return FlaskPhaseRunner(flask_app, request.app.state.limiter, request, body)
+
+    async def home_timeline(request: Request, runner: FlaskPhaseRunner):
+        request_id = hash(f"{time.time()}_{request.client}") % 10000000
+        prepared = await runner.run(prepare_home_timeline, request_id)
+        if not isinstance(prepared, UpstreamCall):
+            return prepared
+
+        try:
+            upstream_start_time = time.time()
+            upstream = await _fetch_upstream_timeline(request.app.state.client, prepared)
+            upstream_time = time.time() - upstream_start_time
+        except InstanceUnavailable as e:
+            return await runner.run(unavailable_instance_timeline, request_id, e)
+        except httpx.HTTPError as e:
+            proxy_logger.error(f"ERROR-{request_id} | Timeline proxy failed: {e}")
+            return JSONResponse({"timeline": []})
+
+        return await runner.run(finish_home_timeline, request_id, upstream, upstream_time)
+
+    @app.get(f"{API_PREFIX}/timelines/home")
+    async def get_home_timeline(request: Request):
+        return await home_timeline(request, await phase_runner(request))
+
+    @app.get(f"{API_PREFIX}/timelines/home/augmented")
+    async def get_augmented_timeline(request: Request):
+        runner = await phase_runner(request)
+        request_id = hash(f"{time.time()}_{request.client}") % 10000000
+        prepared = await runner.run(prepare_augmented_timeline, request_id)
+        if isinstance(prepared, Response):
+            return prepared
+
+        user_id, regular_timeline, upstream_call = prepared
+        recommendations = None
+        page = None
+        if upstream_call:
+            page, prefetched = start_timeline_page(user_id, upstream_call)
+            inject = request.query_params.get("inject_recommendations", "").lower() == "true"
+            if prefetched:
+                log_event(
+                    proxy_logger,
+                    "PREFETCH",
+                    "Serving prefetched timeline page",
+                    request_id=request_id,
+                )
+                regular_timeline = parse_upstream_timeline(request_id, prefetched)
+                page = page._replace(link=prefetched.link)
+                if inject:
+                    recommendations = prefetched.recommendations
+                return await runner.run(
+                    finish_augmented_timeline,
+                    request_id,
+                    user_id,
+                    regular_timeline,
+                    recommendations,
+                    page,
+                )
+
+            # Fetch recommendations while the upstream request is in flight
+            recs_task = None
+            if inject:
+                try:
+                    limit = int(request.query_params.get("limit", 20))
+                except ValueError:
+                    limit = 20
+                recs_deadline = time.time() + TIMELINE_FETCH_CONFIG["enrichment_timeout"]
+                recs_task = asyncio.ensure_future(
+                    runner.run(
+                        get_recommendation_slice, user_id, min(10, limit), page.injection.rec_ids
+                    )
+                )
+
+            try:
+                upstream = await _fetch_upstream_timeline(request.app.state.client, upstream_call)
+                regular_timeline = parse_upstream_timeline(request_id, upstream)
+                page = page._replace(link=upstream.headers.get("Link"))
+            except (httpx.HTTPError, InstanceUnavailable) as e:
+                proxy_logger.error(f"ERROR-{request_id} | Timeline retrieval failed: {e}")
+
+            if recs_task:
+                recommendations = await _wait_for_branch(
+                    recs_task, recs_deadline, [], request_id, "Recommendations"
+                )
+
+        return await runner.run(
+            finish_augmented_timeline, request_id, user_id, regular_timeline, recommendations, page
+        )
+
+    @app.get(f"{API_PREFIX}/streaming/{{stream:path}}")
+    async def streaming_events(request: Request, stream: str):
+        if stream not in STREAM_PATHS:
+            # Health checks and unknown streams are proxied as usual
+            return await proxy_to_mastodon(request, f"streaming/{stream}")
+
+        runner = _streaming_runner(flask_app, request)
+        request_id = hash(f"{time.time()}_{request.client}") % 10000000
+        proxy_req = await runner.run(prepare_proxy_request, f"streaming/{stream}", request_id)
+        params = {
+            name: value for name, value in request.query_params.items() if name != "access_token"
+        }
+        try:
+            subscription, interleaver = await _open_stream(
+                request.app.state.streaming, runner, proxy_req, stream, params
+            )
+        except StreamRejected as e:
+            return Response(e.body, status_code=e.status_code, media_type="application/json")
+        except StreamLimitExceeded:
+            return JSONResponse({"error": "Too many open streams"}, status_code=429)
+
+        log_event(
+            proxy_logger,
+            "STREAM",
+            "Streaming (SSE)",
+            request_id=request_id,
+            stream=stream,
+            user=proxy_req["user_id"] or "anonymous",
+        )
+        return StreamingResponse(
+            _relay_sse(subscription, interleaver),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.websocket(f"{API_PREFIX}/streaming")
+    async def streaming_socket(websocket: WebSocket):
+        # Clients may send their token as the subprotocol, which must be echoed
+        await websocket.accept(subprotocol=websocket.headers.get("sec-websocket-protocol"))
+        runner = _streaming_runner(flask_app, websocket)
+        request_id = hash(f"{time.time()}_{websocket.client}") % 10000000
+        proxy_req = await runner.run(prepare_proxy_request, "streaming", request_id)
+        log_event(
+            proxy_logger,
+            "STREAM",
+            "Streaming (WebSocket)",
+            request_id=request_id,
+            user=proxy_req["user_id"] or "anonymous",
+        )
+        await _relay_socket(websocket, runner, proxy_req)
+
+    @app.api_route(f"{API_PREFIX}/{{path:path}}", methods=["GET", "POST", "PUT", "DELETE"])
+    async def proxy_to_mastodon(request: Request, path: str):
+        runner = await phase_runner(request)
+        request_id = hash(f"{time.time()}_{request.client}") % 10000000
+        proxy_req = await runner.run(prepare_proxy_request, path, request_id)
+
+        # Same redirect as the Flask view
+        if path == "timelines/home" and proxy_req["method"] == "GET":
+            return await home_timeline(request, runner)
+
+        # Answer cacheable GETs from the upstream response cache when it is fresh
+        cached, upstream_headers = lookup_proxy_cache(proxy_req)
+        if cached and upstream_cache.is_fresh(cached):
+            return _to_asgi_response(flask_app, cached_proxy_response(proxy_req, cached))
+
+        try:
+            upstream_start_time = time.time()
+            upstream = await _send_upstream(
+                request.app.state.client,
+                proxy_req["method"],
+                proxy_req["target_url"],
+                stream=True,
+                headers=_forward_headers(upstream_headers),
+                params=proxy_req["params"],
+                content=proxy_req["data"],
+            )
+            upstream_time = time.time() - upstream_start_time
+            if proxy_req["follow_action"]:
+                await runner.run(record_follow_action, proxy_req, upstream.status_code)
+            invalidate_viewer_timelines(proxy_req, upstream.status_code)
+
+            if cached:
+                if upstream.status_code == 304:
+                    await upstream.aclose()
+                    cached = upstream_cache.revalidate(
+                        proxy_req["path"],
+                        proxy_req["target_url"],
+                        proxy_req["params"],
+                        proxy_req["headers"],
+                        cached,
+                        upstream.headers,
+                    )
+                    return _to_asgi_response(
+                        flask_app, cached_proxy_response(proxy_req, cached, revalidated=True)
+                    )
+                upstream_cache.record_miss()
+
+            if proxy_req["is_cacheable"] and upstream_cache.is_storable(
+                proxy_req["path"], proxy_req["headers"], upstream.status_code, upstream.headers
+            ):
+                body = b"".join([chunk async for chunk in upstream.aiter_raw()])
+                await upstream.aclose()
+                return _to_asgi_response(
+                    flask_app,
+                    store_proxy_response(proxy_req, upstream.status_code, upstream.headers, body),
+                )
+
+            if not proxy_req["is_passthrough"]:
+                await upstream.aread()
+        except (httpx.HTTPError, InstanceUnavailable) as e:
+            stale = stale_proxy_response(proxy_req, cached)
+            if stale:
+                return _to_asgi_response(flask_app, stale)
+            return await runner.run(proxy_error_response, proxy_req, e)
+
+        if proxy_req["is_passthrough"]:
+            return stream_upstream_response(proxy_req, upstream, upstream_time)
+
+        return await runner.run(finish_proxy_request, proxy_req, upstream, upstream_time)
+
+    return app
+
+
+def stream_upstream_response(proxy_req, upstream, upstream_time):
+    """
+    Stream a pass-through httpx response to the client as raw bytes.
+
+    Args:
+        proxy_req: Result of prepare_proxy_request
+        upstream: httpx response opened with stream=True
+        upstream_time: Seconds until upstream response headers arrived
+
+    Returns:
+        StreamingResponse relaying the upstream body
+    """
+    request_id = proxy_req["request_id"]
+    status_code = upstream.status_code
+    log_event(
+        proxy_logger,
+        "UP",
+        "Upstream response (streaming)",
+        request_id=request_id,
+        status=status_code,
+        time_to_headers=upstream_time,
+    )
+
+    async def body():
+        size = 0
+        try:
+            async for chunk in upstream.aiter_raw(PROXY_STREAM_CHUNK_SIZE):
+                size += len(chunk)
+                yield chunk
+        finally:
+            await upstream.aclose()
+            total_time = time.time() - proxy_req["request_start_time"]
+            log_event(
+                proxy_logger,
+                "RESP",
+                "Request completed",
+                request_id=request_id,
+                status=status_code,
+                total_time=total_time,
+                size=size,
+                enriched="not_applicable",
+            )
+            record_request_metrics(proxy_req, status_code, total_time, upstream_time)
+
+    response = StreamingResponse(body(), status_code=status_code)
+    response.raw_headers = [
+        (key.lower().encode("latin-1"), value.encode("latin-1"))
+        for key, value in upstream.headers.multi_items()
+        if key.lower() not in HOP_BY_HOP_HEADERS
+    ]
+    return response
+
+
+def _streaming_runner(flask_app, connection):
+    """
+    Get a FlaskPhaseRunner for a streaming connection.
+
+    Browsers can't set headers on EventSource or WebSocket connections, so
+    Mastodon also accepts the token as the access_token query parameter or
+    the WebSocket subprotocol; it is moved into the Authorization header the
+    proxy phases read.
+    """
+    runner = FlaskPhaseRunner(flask_app, connection.app.state.limiter, connection, b"")
+    token = connection.query_params.get("access_token") or connection.headers.get(
+        "sec-websocket-protocol"
+    )
+    if token and "authorization" not in connection.headers:
+        runner.environ_args["headers"].append(("Authorization", f"Bearer {token}"))
+    return runner
+
+
+async def _open_stream(hub, runner, proxy_req, path, params):
+    """
+    Subscribe a client connection to an upstream stream.
+
+    Args:
+        hub: The app's StreamingHub
+        runner: FlaskPhaseRunner of the client connection
+        proxy_req: Result of prepare_proxy_request for the connection
+        path: Upstream SSE path under /api/v1/streaming/
+        params: Query parameters selecting the stream
+
+    Returns:
+        tuple: (Subscription, RecommendationInterleaver or None)
+
+    Raises:
+        StreamRejected, StreamLimitExceeded: See StreamingHub.subscribe
+    """
+    headers = {"Accept": "text/event-stream"}
+    auth = proxy_req["headers"].get("Authorization")
+    if auth:
+        headers["Authorization"] = auth
+    url = urljoin(proxy_req["target_url"], f"/api/v1/streaming/{path}")
+    subscription = await hub.subscribe(url, params, headers)
+
+    user_id = proxy_req["user_id"]
+    if path != "user" or not user_id:
+        return subscription, None
+
+    async def recommendations():
+        # Same privacy check as enriched proxy responses: nothing unless personalization is allowed
+        _, recs = await runner.run(
+            resolve_enrichment, user_id, proxy_req["request_id"], proxy_req["privacy_level"]
+        )
+        return recs
+
+    return subscription, RecommendationInterleaver(subscription, recommendations)
+
+
+async def _relay_sse(subscription, interleaver):
+    """Relay a subscription's events to an SSE client."""
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.next(), STREAMING_CONFIG["heartbeat_seconds"]
+                )
+            except asyncio.TimeoutError:
+                # Keeps idle connections open through intermediaries
+                yield ":thump\n\n"
+                continue
+            if event is None:
+                return
+            if interleaver:
+                interleaver.observe(event)
+            yield format_sse(event)
+    finally:
+        if interleaver:
+            interleaver.close()
+        subscription.close()
+
+
+def _rejection_message(error):
+    try:
+        return json.loads(error.body)["error"]
+    except (ValueError, TypeError, KeyError):
+        return "Stream unavailable"
+
+
+async def _relay_socket(websocket, runner, proxy_req):
+    """
+    Serve a client WebSocket until it disconnects.
+
+    Handles Mastodon's subscribe and unsubscribe messages; each subscribed
+    stream is relayed by its own task as {"stream", "event", "payload"}
+    messages.
+    """
+    hub = websocket.app.state.streaming
+    send_lock = asyncio.Lock()
+    pumps = {}
+
+    async def send(message):
+        async with send_lock:
+            await websocket.send_text(json.dumps(message))
+
+    async def pump(labels, subscription, interleaver):
+        try:
+            while True:
+                event = await subscription.next()
+                if event is None:
+                    break
+                if interleaver:
+                    interleaver.observe(event)
+                await send({"stream": labels, "event": event.event, "payload": event.data})
+        finally:
+            if interleaver:
+                interleaver.close()
+            subscription.close()
+        if subscription.closed_reason == "overflow":
+            # Too far behind to catch up; the client reconnects and refetches
+            await websocket.close(code=1013)
+
+    async def subscribe(message):
+        requested = stream_request(message.get("stream"), message)
+        if requested is None:
+            await send({"error": "Unknown stream type", "status": 400})
+            return
+        path, params, labels = requested
+        key = tuple(labels)
+        if key in pumps and not pumps[key].done():
+            return
+        try:
+            subscription, interleaver = await _open_stream(hub, runner, proxy_req, path, params)
+        except StreamRejected as e:
+            await send({"error": _rejection_message(e), "status": e.status_code})
+            return
+        except StreamLimitExceeded:
+            await send({"error": "Too many open streams", "status": 429})
+            return
+        pumps[key] = asyncio.ensure_future(pump(labels, subscription, interleaver))
+
+    def unsubscribe(message):
+        requested = stream_request(message.get("stream"), message)
+        task = pumps.pop(tuple(requested[2]), None) if requested else None
+        if task:
+            task.cancel()
+
+    try:
+        if "stream" in websocket.query_params:
+            await subscribe(dict(websocket.query_params))
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+            if message.get("type") == "subscribe":
+                await subscribe(message)
+            elif message.get("type") == "unsubscribe":
+                unsubscribe(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in pumps.values():
+            task.cancel()
+        await asyncio.gather(*pumps.values(), return_exceptions=True)
+
+
+class AsyncProxyDispatcher:
+    """
+    ASGI app that routes requests between the async proxy and Flask.
+
+    A request goes to the async app when Flask would have dispatched it to one
+    of ASYNC_ENDPOINTS, so routing precedence is exactly Flask's.
+    """
+
+    def __init__(self, flask_app, async_app):
+        self.url_map = flask_app.url_map
+        self.async_app = async_app
+        self.wsgi_app = WSGIMiddleware(flask_app)
+
+    def is_async(self, scope) -> bool:
+        adapter = self.url_map.bind("localhost")
+        try:
+            endpoint, _ = adapter.match(scope["path"], method=scope["method"])
+        except HTTPException:
+            return False
+        return endpoint in ASYNC_ENDPOINTS
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not self.is_async(scope):
+            await self.wsgi_app(scope, receive, send)
+        else:
+            await self.async_app(scope, receive, send)
+
+
+def create_asgi_app(flask_app, transport=None):
+    """
+    Create the ASGI app serving the proxy asynchronously and the rest via Flask.
+
+    Args:
+        flask_app: The Flask app from app.create_app()
+        transport: Optional httpx transport (for tests)
+
+    Returns:
+        AsyncProxyDispatcher
+    """
+    return AsyncProxyDispatcher(flask_app, create_async_proxy(flask_app, transport))
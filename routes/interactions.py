@@ -13,6 +13,7 @@ from db.connection import get_db_connection, get_cursor, USE_IN_MEMORY_DB
 from utils.privacy import generate_user_alias, get_user_privacy_level
 from utils.logging_decorator import log_route
 from utils.metrics import track_recommendation_interaction
+from utils.seen_filter import mark_seen
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -263,6 +264,9 @@ def log_interaction():
                 
                 conn.commit()
                 
+                # Exclude the post from this user's future candidate pools
+                mark_seen(conn, user_alias, [post_id])
+                
                 # Track metrics for interactions with recommendations
                 is_injected = context.get('injected', False)
                 track_recommendation_interaction(action_type, is_injected)
@@ -12,6 +12,7 @@ import json
 import time
 from flask import Blueprint, request, redirect, url_for, jsonify, session, current_app
 from utils.logging_decorator import log_route
+from utils.identity import invalidate_identity
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -218,6 +219,9 @@ def revoke_token():
     if not token:
         return jsonify({"error": "Missing token parameter"}), 400
     
+    # Revoked tokens must stop resolving to a user right away
+    invalidate_identity(token=token)
+    
     # Try to remove the token - returns True if token existed and was removed
     if auth_tokens.remove_token(token):
         logger.info(f"Token successfully revoked")
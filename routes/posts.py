@@ -8,7 +8,9 @@ import logging
 import json
 from flask import Blueprint, request, jsonify
 
+from config import FANOUT_ON_WRITE_ENABLED
 from db.connection import get_db_connection, get_cursor, USE_IN_MEMORY_DB
+from utils.feed_inbox import fanout_post
 from utils.logging_decorator import log_route
 
 # Set up logging
@@ -75,6 +77,13 @@ def get_posts():
     
     return jsonify(formatted_posts)
 
+def _post_tags(mastodon_post):
+    """Extract tag names from an optional Mastodon API post object."""
+    if not isinstance(mastodon_post, dict):
+        return []
+    return [tag['name'] for tag in mastodon_post.get('tags', [])
+            if isinstance(tag, dict) and 'name' in tag]
+
 @posts_bp.route('', methods=['POST'])
 @log_route
 def create_post():
@@ -211,6 +220,9 @@ def create_post():
                 result = cur.fetchone()
                 conn.commit()
                 
+                if FANOUT_ON_WRITE_ENABLED and not is_update:
+                    fanout_post(conn, post_id, author_id, _post_tags(mastodon_post), created_at)
+                
                 return jsonify({
                     "message": "Post saved successfully",
                     "post_id": result[0]
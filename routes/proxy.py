@@ -6,22 +6,40 @@ while intercepting specific endpoints to inject personalized recommendations.
 """
 
 import logging
-import logging.handlers
 import requests
 import json
 import os
 import re
-from flask import Blueprint, request, Response, jsonify, g, current_app
+from flask import Blueprint, request, Response, jsonify, g, current_app, has_app_context
 from urllib.parse import urljoin, urlparse
 import time
 import datetime
 import os
 import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 from db.connection import get_db_connection
 from utils.logging_decorator import log_route
-from utils.privacy import get_user_privacy_level, generate_user_alias
+from utils.log_pipeline import configure_file_logger, log_event, get_log_pipeline_stats
+from utils.privacy import get_user_privacy_level, get_cached_privacy_level, get_privacy_cache_stats, generate_user_alias
 from config import COLD_START_ENABLED, COLD_START_POSTS_PATH, COLD_START_POST_LIMIT, ALLOW_COLD_START_FOR_ANONYMOUS
+from config import PROXY_STREAMING_ENABLED, PROXY_STREAM_CHUNK_SIZE
+from config import TIMELINE_FETCH_CONFIG, UPSTREAM_CACHE_CONFIG, INSTANCE_HEALTH_CONFIG
+from utils.identity import Identity, get_cached_identity, cache_identity, get_identity_cache_stats
+from utils.interaction_writer import InteractionEvent, enqueue_interaction, get_interaction_writer_stats
+from utils.timeline_splice import RawTimeline
+from utils.compression import get_compression_stats
+from utils.cold_start_store import get_cold_start_store, get_cold_start_store_stats
+from utils.anonymous_timeline import get_anonymous_timeline_stats
+from utils.streaming import get_streaming_stats
+from utils import timeline_prefetch, timeline_microcache
+from utils.timeline_prefetch import INITIAL_STATE, PrefetchedPage
+from utils.latency import LABELS as LATENCY_LABELS, route_label, instance_label, record_request
+from utils.latency import query_latency, get_latency_summary, reset_latency
+from utils.upstream import upstream_request, get_upstream_metrics, reset_upstream_metrics, HOP_BY_HOP_HEADERS
+from utils.instance_health import InstanceUnavailable, get_instance_health
+from utils import upstream_cache
 from utils.user_signals import (
     get_weighted_post_selection, update_user_signals, should_exit_cold_start,
     should_reenter_cold_start, import_user_signals_from_db, export_user_signals_to_db
@@ -30,101 +48,11 @@ from utils.user_signals import (
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Get the repo root directory
-repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-logs_dir = os.path.join(repo_root, 'logs')
-
-# Ensure logs directory exists
-os.makedirs(logs_dir, exist_ok=True)
-
-# Secure the logs directory - restrict to user only (0700)
-try:
-    import stat
-    os.chmod(logs_dir, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
-except Exception as e:
-    logger.warning(f"Could not set secure permissions on logs directory: {e}")
-
-# Set up proxy-specific file logger
-proxy_logger = logging.getLogger('proxy')
-proxy_logger.setLevel(logging.INFO)
-
-# Use a secure log file with permissions set correctly
-log_file_path = os.path.join(logs_dir, 'proxy.log')
-
-# Add rotating file handler
-file_handler = logging.handlers.RotatingFileHandler(
-    log_file_path,
-    maxBytes=10 * 1024 * 1024,  # 10 MB
-    backupCount=5
-)
-
-# Secure the log file - restrict to user only (0600)
-try:
-    if os.path.exists(log_file_path):
-        os.chmod(log_file_path, stat.S_IRUSR | stat.S_IWUSR)
-except Exception as e:
-    logger.warning(f"Could not set secure permissions on log file: {e}")
-file_formatter = logging.Formatter(
-    '%(asctime)s [%(levelname)s] %(message)s'
-)
-file_handler.setFormatter(file_formatter)
-proxy_logger.addHandler(file_handler)
-
-# Set up interaction-specific logger
-interaction_logger = logging.getLogger('proxy_interactions')
-interaction_logger.setLevel(logging.INFO)
-
-# Only add handler if it doesn't already exist
-if not interaction_logger.handlers:
-    # Create file handler for proxy_interactions.log
-    interaction_log_path = os.path.join(logs_dir, 'proxy_interactions.log')
-    interaction_handler = logging.handlers.RotatingFileHandler(
-        interaction_log_path,
-        maxBytes=10 * 1024 * 1024,  # 10 MB
-        backupCount=5
-    )
-    
-    # Secure the interaction log file - restrict to user only (0600)
-    try:
-        if os.path.exists(interaction_log_path):
-            os.chmod(interaction_log_path, stat.S_IRUSR | stat.S_IWUSR)
-    except Exception as e:
-        logger.warning(f"Could not set secure permissions on interaction log file: {e}")
-    
-    # Use a simple formatter for clean logs
-    interaction_formatter = logging.Formatter('%(asctime)s | %(message)s')
-    interaction_handler.setFormatter(interaction_formatter)
-    
-    # Add the handler to the logger
-    interaction_logger.addHandler(interaction_handler)
-
-# Set up cold start logger
-cold_start_logger = logging.getLogger('cold_start_interactions')
-cold_start_logger.setLevel(logging.INFO)
-
-# Only add handler if it doesn't already exist
-if not cold_start_logger.handlers:
-    # Create file handler for cold_start_interactions.log
-    cold_start_log_path = os.path.join(logs_dir, 'cold_start_interactions.log')
-    cold_start_handler = logging.handlers.RotatingFileHandler(
-        cold_start_log_path,
-        maxBytes=10 * 1024 * 1024,  # 10 MB
-        backupCount=5
-    )
-    
-    # Secure the cold start log file - restrict to user only (0600)
-    try:
-        if os.path.exists(cold_start_log_path):
-            os.chmod(cold_start_log_path, stat.S_IRUSR | stat.S_IWUSR)
-    except Exception as e:
-        logger.warning(f"Could not set secure permissions on cold start log file: {e}")
-    
-    # Use a simple formatter for clean logs
-    cold_start_formatter = logging.Formatter('%(asctime)s | %(message)s')
-    cold_start_handler.setFormatter(cold_start_formatter)
-    
-    # Add the handler to the logger
-    cold_start_logger.addHandler(cold_start_handler)
+# Proxy, interaction and cold start logs are written as JSON lines by a
+# background listener thread, see utils/log_pipeline.py
+proxy_logger = configure_file_logger('proxy', 'proxy.log')
+interaction_logger = configure_file_logger('proxy_interactions', 'proxy_interactions.log')
+cold_start_logger = configure_file_logger('cold_start_interactions', 'cold_start_interactions.log')
 
 # Add console handler in development mode
 if os.environ.get('FLASK_ENV') == 'development':
@@ -138,6 +66,16 @@ if os.environ.get('FLASK_ENV') == 'development':
 # Create blueprint
 proxy_bp = Blueprint('proxy', __name__)
 
+# An upstream request a view must make before it can respond; views are split
+# around it so the async proxy can await the call instead of blocking on it
+UpstreamCall = namedtuple('UpstreamCall', ['method', 'url', 'headers', 'params', 'data'])
+
+# Bounded pool for timeline steps that run alongside the upstream fetch
+_timeline_executor = ThreadPoolExecutor(
+    max_workers=TIMELINE_FETCH_CONFIG['max_workers'],
+    thread_name_prefix='timeline-fetch'
+)
+
 def sanitize_instance_url(url):
     """
     Validate and sanitize a Mastodon instance URL.
@@ -172,23 +110,6 @@ def sanitize_instance_url(url):
         # Remove any paths from the URL - keep just the domain with scheme
         url = f"{parsed.scheme}://{parsed.netloc}"
         
-        # Exclude localhost in production unless explicitly allowed
-        if parsed.netloc == 'localhost' or parsed.netloc.startswith('127.0.0.') or parsed.netloc.startswith('0.0.0.'):
-            if os.environ.get('FLASK_ENV') == 'production' and os.environ.get('ALLOW_LOCAL_TESTING') != 'true':
-                logger.warning(f"Blocked localhost URL in production: {url}")
-                return None
-            
-        return url
-    except Exception as e:
-        logger.error(f"Error parsing instance URL: {e}")
-        return None$'
-        if not re.match(domain_pattern, parsed.netloc):
-            logger.warning(f"Invalid domain in instance URL: {parsed.netloc}")
-            return None
-        
-        # Remove any paths from the URL - keep just the domain with scheme
-        url = f"{parsed.scheme}://{parsed.netloc}"
-        
         # Exclude localhost in production unless explicitly allowed
         if parsed.netloc == 'localhost' or parsed.netloc.startswith('127.0.0.') or parsed.netloc.startswith('0.0.0.'):
             if os.environ.get('FLASK_ENV') == 'production' and os.environ.get('ALLOW_LOCAL_TESTING') != 'true':
@@ -200,6 +121,16 @@ def sanitize_instance_url(url):
         logger.error(f"Error parsing instance URL: {e}")
         return None
 
+def mark_cold_start_post(post):
+    """Flag a post as cold start content."""
+    post['is_cold_start'] = True
+    post['is_real_mastodon_post'] = False
+    post['is_synthetic'] = True
+
+def cold_start_posts_store():
+    """Get the shared store of the posts in COLD_START_POSTS_PATH."""
+    return get_cold_start_store(COLD_START_POSTS_PATH, mark_cold_start_post)
+
 def load_cold_start_posts():
     """Load and prepare cold start posts from the configured JSON file.
     
@@ -207,9 +138,10 @@ def load_cold_start_posts():
     follow anyone yet (cold start scenario). It adds metadata flags to each post
     to identify it as cold start content in the system.
     
-    The posts are loaded from the path specified in COLD_START_POSTS_PATH config.
-    Each post is marked with `is_cold_start=True`, `is_real_mastodon_post=False`, 
-    and `is_synthetic=True` flags.
+    The posts are loaded from the path specified in COLD_START_POSTS_PATH config,
+    through the shared cold start store, which re-reads the file only when it
+    changes. Each post is marked with `is_cold_start=True`,
+    `is_real_mastodon_post=False`, and `is_synthetic=True` flags.
     
     Returns:
         list: A list of cold start posts in Mastodon-compatible format with added flags.
@@ -218,22 +150,7 @@ def load_cold_start_posts():
     Raises:
         No exceptions are raised; errors are logged and an empty list is returned.
     """
-    try:
-        with open(COLD_START_POSTS_PATH, 'r') as f:
-            posts = json.load(f)
-            
-        # Mark posts as cold start content
-        for post in posts:
-            post['is_cold_start'] = True
-            post['is_real_mastodon_post'] = False
-            post['is_synthetic'] = True
-            
-        proxy_logger.info(f"Loaded {len(posts)} cold start posts from {COLD_START_POSTS_PATH}")
-        return posts
-    except Exception as e:
-        proxy_logger.error(f"Error loading cold start posts: {e}")
-        # Return an empty list if we can't load the posts
-        return []
+    return cold_start_posts_store().posts()
 
 def get_user_instance(req):
     """
@@ -275,51 +192,105 @@ def get_user_instance(req):
             logger.warning(f"Invalid instance URL in query parameter, falling back to default")
     
     # Try to extract from authorization token
-    auth_header = req.headers.get('Authorization')
-    if auth_header and auth_header.startswith('Bearer '):
-        token = auth_header.split(' ')[1]
-        # Look up in database
-        user_info = get_user_by_token(token)
-        if user_info and 'instance_url' in user_info:
-            logger.debug(f"Using instance from token lookup: {user_info['instance_url']}")
-            return user_info['instance_url']
+    identity = get_identity(bearer_token(req))
+    if identity and identity.instance_url:
+        logger.debug(f"Using instance from token lookup: {identity.instance_url}")
+        return identity.instance_url
     
     # Default fallback instance
     default_instance = current_app.config.get('DEFAULT_MASTODON_INSTANCE', 'https://mastodon.social')
     logger.warning(f"No instance found in request, using default: {default_instance}")
     return default_instance
 
+def bearer_token(req):
+    """
+    Extract the OAuth bearer token from a request's Authorization header.
+    
+    Args:
+        req: The Flask request object
+        
+    Returns:
+        str: The token, or None if the request has no bearer token
+    """
+    auth_header = req.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header.split(' ')[1]
+    return None
+
 def get_user_by_token(token):
     """
     Look up user information based on an OAuth token.
     
+    Results are kept in the cross-request identity cache. The user's privacy
+    level comes from the privacy cache, or is read on the same connection.
+    
     Args:
         token: The OAuth token to look up
         
     Returns:
         dict: User information including instance_url and user_id
     """
+    user_info = get_cached_identity(token)
+    if user_info:
+        user_info['access_token'] = token
+        user_info['privacy_level'] = get_cached_privacy_level(user_info['user_id'])
+        return user_info
+    
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
-                    SELECT user_id, instance_url, access_token 
+                    SELECT user_id, instance_url, mastodon_id, token_scope 
                     FROM user_identities 
                     WHERE access_token = %s
                 """, (token,))
                 
                 result = cur.fetchone()
                 if result:
-                    return {
+                    user_info = {
                         'user_id': result[0],
                         'instance_url': result[1],
-                        'access_token': result[2]
+                        'mastodon_id': result[2],
+                        'token_scope': result[3]
                     }
+                    cache_identity(token, user_info)
+                    user_info['access_token'] = token
+                    user_info['privacy_level'] = get_user_privacy_level(conn, result[0])
+                    return user_info
     except Exception as e:
         logger.error(f"Database error looking up token: {e}")
     
     return None
 
+def get_identity(token):
+    """
+    Resolve the identity behind an OAuth token.
+    
+    The result is kept on flask.g, so every lookup of the same token within a
+    request (instance, user ID, alias, privacy level) shares one resolution.
+    
+    Args:
+        token: The OAuth token, or None
+        
+    Returns:
+        Identity: The resolved identity, or None for unknown or missing tokens
+    """
+    if not token:
+        return None
+    
+    identities = g.setdefault('identities', {}) if has_app_context() else {}
+    if token not in identities:
+        user_info = get_user_by_token(token)
+        identities[token] = Identity(
+            user_id=user_info['user_id'],
+            user_alias=generate_user_alias(user_info['user_id']),
+            instance_url=user_info.get('instance_url'),
+            mastodon_id=user_info.get('mastodon_id'),
+            token_scope=user_info.get('token_scope'),
+            privacy_level=user_info.get('privacy_level')
+        ) if user_info else None
+    return identities[token]
+
 def get_authenticated_user(req):
     """
     Resolve the internal user ID from the request.
@@ -331,13 +302,9 @@ def get_authenticated_user(req):
         str: Internal user ID for the authenticated user or None
     """
     # Try to get from the Authorization header
-    auth_header = req.headers.get('Authorization')
-    if auth_header and auth_header.startswith('Bearer '):
-        token = auth_header.split(' ')[1]
-        # Look up in database
-        user_info = get_user_by_token(token)
-        if user_info:
-            return user_info['user_id']
+    identity = get_identity(bearer_token(req))
+    if identity:
+        return identity.user_id
     
     # Check if development mode is explicitly enabled
     if os.environ.get('FLASK_ENV') == 'development' and os.environ.get('ALLOW_QUERY_USER_ID') == 'true':
@@ -350,6 +317,38 @@ def get_authenticated_user(req):
     # No user identified
     return None
 
+def get_request_identity(user_id):
+    """
+    Get the current request's identity if it belongs to user_id.
+    
+    Must run inside a Flask request context.
+    
+    Args:
+        user_id: The user ID the request is being handled for
+        
+    Returns:
+        Identity: The request's identity, or None if it is not user_id's
+    """
+    identity = get_identity(bearer_token(request))
+    if identity and identity.user_id == user_id:
+        return identity
+    return None
+
+def get_request_user_alias(user_id):
+    """
+    Get a user's alias, reusing the current request's identity when it is theirs.
+    
+    Must run inside a Flask request context.
+    
+    Args:
+        user_id: The user ID to pseudonymize
+        
+    Returns:
+        str: The user's alias
+    """
+    identity = get_request_identity(user_id)
+    return identity.user_alias if identity else generate_user_alias(user_id)
+
 def check_user_privacy(user_id):
     """
     Check if a user has opted out of personalization.
@@ -363,6 +362,10 @@ def check_user_privacy(user_id):
     if not user_id:
         return False
     
+    privacy_level = get_cached_privacy_level(user_id)
+    if privacy_level is not None:
+        return privacy_level == 'full'
+    
     try:
         with get_db_connection() as conn:
             privacy_level = get_user_privacy_level(conn, user_id)
@@ -420,32 +423,133 @@ def get_recommendations(user_id, limit=5):
         logger.error(f"Error getting recommendations: {e}")
         return []
 
-def blend_recommendations(original_posts, recommendations, blend_ratio=0.3):
+def get_recommendation_slice(user_id, limit, exclude_ids=()):
     """
-    Blend recommendations into the original timeline.
+    Get recommendations that earlier timeline pages didn't show.
     
     Args:
-        original_posts: List of posts from Mastodon
-        recommendations: List of personalized recommendations
+        user_id: The user ID to get recommendations for
+        limit: Maximum number of recommendations to return
+        exclude_ids: IDs of recommendations already shown
+        
+    Returns:
+        list: List of Mastodon-compatible post objects
+    """
+    def fetch():
+        if not exclude_ids:
+            return get_recommendations(user_id, limit)
+        exclude = set(exclude_ids)
+        recommendations = get_recommendations(user_id, limit + len(exclude))
+        return [rec for rec in recommendations if rec.get('id') not in exclude][:limit]
+    
+    # Polls within a few seconds of each other share one ranking
+    recommendations = timeline_microcache.enrichment.get_or_fetch(
+        ('recommendations', user_id, limit, tuple(exclude_ids)), fetch
+    )
+    # Timelines flag the posts they inject; keep the cached ones untouched
+    return [dict(rec) for rec in recommendations]
+
+def resolve_enrichment(user_id, request_id, privacy_level=None, timings=None):
+    """
+    Resolve a user's privacy level and, if personalization is allowed, their recommendations.
+    
+    Args:
+        user_id: The user ID to enrich a timeline for
+        request_id: Request ID used in proxy log lines
+        privacy_level: The user's privacy level if already known from their identity
+        timings: Optional dict; its 'recommendation' key is set to the
+            seconds this took
+        
+    Returns:
+        tuple: (privacy_level, recommendations)
+    """
+    start_time = time.time()
+    try:
+        return _resolve_enrichment(user_id, request_id, privacy_level)
+    finally:
+        if timings is not None:
+            timings['recommendation'] = time.time() - start_time
+
+def _resolve_enrichment(user_id, request_id, privacy_level):
+    if privacy_level is None:
+        privacy_level = get_cached_privacy_level(user_id)
+    if privacy_level is None:
+        try:
+            with get_db_connection() as conn:
+                privacy_level = get_user_privacy_level(conn, user_id)
+        except Exception as e:
+            proxy_logger.error(f"ERROR-{request_id} | Failed to check privacy: {e}")
+            return 'error', []
+    
+    # Only fetch recommendations once personalization is known to be allowed
+    if privacy_level != 'full':
+        return privacy_level, []
+    return privacy_level, get_recommendation_slice(user_id, 5)
+
+def submit_timeline_task(func, *args):
+    """
+    Run a timeline step in the bounded timeline executor.
+    
+    Args:
+        func: Function to run (with the current Flask app context)
+        *args: Arguments for func
+        
+    Returns:
+        concurrent.futures.Future for the result
+    """
+    app = current_app._get_current_object()
+    
+    def run():
+        with app.app_context():
+            return func(*args)
+    
+    return _timeline_executor.submit(run)
+
+def wait_for_branch(future, deadline, default, request_id, label):
+    """
+    Wait for a concurrent timeline step until its deadline.
+    
+    Args:
+        future: Future returned by submit_timeline_task
+        deadline: time.time() value after which the step is abandoned
+        default: Value to use if the step times out or fails
+        request_id: Request ID used in proxy log lines
+        label: Step name for log lines
+        
+    Returns:
+        The step's result, or default
+    """
+    try:
+        return future.result(timeout=max(0, deadline - time.time()))
+    except FutureTimeoutError:
+        future.cancel()
+        proxy_logger.warning(f"TIMEOUT-{request_id} | {label} exceeded its time budget")
+    except Exception as e:
+        proxy_logger.error(f"ERROR-{request_id} | {label} failed: {e}")
+    return default
+
+def blend_order(total_posts, total_recommendations, blend_ratio=0.3, position=0):
+    """
+    Plan where recommendations go in a blended timeline.
+    
+    Args:
+        total_posts: Number of posts in the original timeline
+        total_recommendations: Number of recommendations available
         blend_ratio: Approximate ratio of recommendations to include
+        position: Index of the first post in the whole scrolled timeline,
+            so consecutive pages share one injection grid
         
     Returns:
-        list: Combined and sorted list of posts
+        list: (is_recommendation, index) pairs in blended timeline order
     """
-    if not recommendations:
-        logger.debug("No recommendations to blend")
-        return original_posts
+    if not total_recommendations:
+        return [(False, i) for i in range(total_posts)]
     
-    if not original_posts:
-        logger.debug("No original posts, returning only recommendations")
-        return recommendations
+    if not total_posts:
+        return [(True, i) for i in range(total_recommendations)]
     
     # Compute how many recommendations to include
-    total_posts = len(original_posts)
-    rec_count = min(len(recommendations), max(1, int(total_posts * blend_ratio)))
-    
-    # Get the subset of recommendations to use
-    recs_to_use = recommendations[:rec_count]
+    rec_count = min(total_recommendations, max(1, int(total_posts * blend_ratio)))
     
     # Calculate spacing for injecting recommendations
     if total_posts <= rec_count:
@@ -456,28 +560,70 @@ def blend_recommendations(original_posts, recommendations, blend_ratio=0.3):
         spacing = max(1, total_posts // rec_count - 1)
     
     # Create the blended timeline
-    blended = []
+    order = []
     rec_index = 0
     
-    for i, post in enumerate(original_posts):
-        blended.append(post)
+    for i in range(total_posts):
+        order.append((False, i))
         
         # Insert a recommendation after every 'spacing' posts
-        if i % spacing == 0 and rec_index < len(recs_to_use):
-            blended.append(recs_to_use[rec_index])
+        if (position + i) % spacing == 0 and rec_index < rec_count:
+            order.append((True, rec_index))
             rec_index += 1
     
     # Add any remaining recommendations at the end
-    if rec_index < len(recs_to_use):
-        blended.extend(recs_to_use[rec_index:])
+    order.extend((True, i) for i in range(rec_index, rec_count))
     
     # Ensure we're not returning more than the original count (to avoid pagination issues)
     # Allow up to 3 extra posts for a smoother experience
-    max_allowed = total_posts + 3
-    if len(blended) > max_allowed:
-        blended = blended[:max_allowed]
+    return order[:total_posts + 3]
+
+def blend_recommendations(original_posts, recommendations, blend_ratio=0.3, position=0):
+    """
+    Blend recommendations into the original timeline.
+    
+    Args:
+        original_posts: List of posts from Mastodon
+        recommendations: List of personalized recommendations
+        blend_ratio: Approximate ratio of recommendations to include
+        position: Index of the first post in the whole scrolled timeline
+        
+    Returns:
+        list: Combined and sorted list of posts
+    """
+    if not recommendations:
+        logger.debug("No recommendations to blend")
+        return original_posts
+    
+    if not original_posts:
+        logger.debug("No original posts, returning only recommendations")
+        return recommendations
+    
+    return [recommendations[i] if is_rec else original_posts[i]
+            for is_rec, i in blend_order(len(original_posts), len(recommendations), blend_ratio, position)]
+
+def splice_recommendations(timeline, recommendations, blend_ratio=0.3, position=0):
+    """
+    Blend recommendations into an undecoded upstream timeline.
     
-    return blended
+    Produces the same order as blend_recommendations, but only the
+    recommendations that are used get serialized.
+    
+    Args:
+        timeline: RawTimeline from the upstream response
+        recommendations: List of personalized recommendations
+        blend_ratio: Approximate ratio of recommendations to include
+        position: Index of the first post in the whole scrolled timeline
+        
+    Returns:
+        tuple: (JSON array bytes, number of posts in the blended timeline)
+    """
+    order = blend_order(len(timeline), len(recommendations), blend_ratio, position)
+    inserts = {i: json.dumps(recommendations[i]).encode('utf-8') for is_rec, i in order if is_rec}
+    return timeline.to_json(order, inserts), len(order)
+
+# Flags added to every upstream post on the augmented timeline
+REAL_POST_FIELDS = b'"is_real_mastodon_post":true,"is_synthetic":false'
 
 # New endpoints for home timeline
 @proxy_bp.route('/timelines/home', methods=['GET'])
@@ -516,25 +662,73 @@ def get_home_timeline():
         COLD_START_POST_LIMIT: Maximum number of cold start posts to return
     """
     request_id = hash(f"{time.time()}_{request.remote_addr}") % 10000000
-    proxy_logger.info(
-        f"REQ-{request_id} | GET /timelines/home | "
-        f"User: {get_authenticated_user(request) or 'anonymous'} | "
-        f"Client: {request.remote_addr}"
-    )
+    prepared = prepare_home_timeline(request_id)
+    if not isinstance(prepared, UpstreamCall):
+        return prepared
+
+    try:
+        # Make the request to the Mastodon instance
+        upstream_start_time = time.time()
+        proxied_response = fetch_upstream_timeline(prepared)
+        upstream_time = time.time() - upstream_start_time
+        return finish_home_timeline(request_id, proxied_response, upstream_time)
+    except InstanceUnavailable as e:
+        return unavailable_instance_timeline(request_id, e)
+    except Exception as e:
+        proxy_logger.error(f"ERROR-{request_id} | Timeline proxy failed: {e}")
+        # Return empty array on error
+        return jsonify({"timeline": []})
+
+def fetch_upstream_timeline(upstream_call):
+    """
+    Fetch a timeline page from the user's instance through the micro-cache.
     
+    Clients poll the home timeline every few seconds, often from several
+    tabs; polls for the same page within the micro-cache TTL share one
+    upstream request.
+    
+    Args:
+        upstream_call: UpstreamCall that fetches the page
+        
+    Returns:
+        The upstream response, possibly shared with concurrent polls
+    """
+    return timeline_microcache.fetch_timeline(
+        upstream_call.url, upstream_call.params, upstream_call.headers,
+        lambda: upstream_request(
+            method=upstream_call.method,
+            url=upstream_call.url,
+            headers=upstream_call.headers,
+            params=upstream_call.params
+        )
+    )
+
+def prepare_home_timeline(request_id):
+    """
+    Handle the parts of the home timeline that don't need the upstream instance.
+
+    Must run inside a Flask request context.
+
+    Args:
+        request_id: Request ID used in proxy log lines
+
+    Returns:
+        Response for cold start and synthetic users, otherwise the
+        UpstreamCall that fetches the user's timeline
+    """
     # Get user ID either from query param or auth header
     user_id = get_authenticated_user(request)
     is_anonymous = not user_id
     
+    log_event(proxy_logger, 'REQ', 'GET /timelines/home', request_id=request_id,
+              user=user_id or 'anonymous', client=request.remote_addr)
+    
     # Get request parameters
     limit = request.args.get('limit', default=20, type=int)
     force_cold_start = request.args.get('cold_start', '').lower() == 'true'
     
     # Extract auth token from request
-    auth_header = request.headers.get('Authorization')
-    user_token = None
-    if auth_header and auth_header.startswith('Bearer '):
-        user_token = auth_header.split(' ')[1]
+    user_token = bearer_token(request)
     
     # Check if cold start mode is forced or should be triggered
     cold_start_mode = force_cold_start
@@ -588,19 +782,16 @@ def get_home_timeline():
             is_anonymous_session = user_id == "anonymous"
             
             # Log the cold start event
-            user_alias = "anonymous" if is_anonymous_session else generate_user_alias(user_id)
-            cold_start_logger.info(
-                f"{user_alias} | COLD_START_TRIGGERED | " +
-                f"forced={force_cold_start} | anonymous={is_anonymous_session} | request_id={request_id}"
-            )
+            user_alias = "anonymous" if is_anonymous_session else get_request_user_alias(user_id)
+            log_event(cold_start_logger, 'COLD_START_TRIGGERED', 'Cold start triggered', user_alias=user_alias,
+                      forced=force_cold_start, anonymous=is_anonymous_session, request_id=request_id)
             
-            # Load all cold start posts
-            all_posts = load_cold_start_posts()
+            store = cold_start_posts_store()
             
             # For anonymous users, always use random selection
-            if is_anonymous_session or force_cold_start or len(all_posts) == 0:
+            if is_anonymous_session or force_cold_start or len(store) == 0:
                 # For anonymous or forced cold start, use random selection
-                posts = all_posts[:min(COLD_START_POST_LIMIT, limit)]
+                posts = store.sample(min(COLD_START_POST_LIMIT, limit))
                 
                 proxy_logger.info(
                     f"[COLD_START] Injecting default content | " +
@@ -612,7 +803,7 @@ def get_home_timeline():
                 # For authenticated users with history, use weighted selection
                 posts = get_weighted_post_selection(
                     user_id=user_id,
-                    posts=all_posts,
+                    posts=store.posts(),
                     count=min(COLD_START_POST_LIMIT, limit)
                 )
                 
@@ -662,60 +853,71 @@ def get_home_timeline():
     
     # For real users, attempt to proxy to their instance
     instance_url = get_user_instance(request)
-    
-    try:
-        # Build the target URL
-        target_url = urljoin(instance_url, f"/api/v1/timelines/home")
-        
-        # Extract request components
-        headers = {key: value for key, value in request.headers.items()
-                   if key.lower() not in ['host', 'content-length']}
-        params = request.args.to_dict()
-        
-        # Make the request to the Mastodon instance
-        upstream_start_time = time.time()
-        proxied_response = requests.request(
-            method='GET',
-            url=target_url,
-            headers=headers,
-            params=params,
-            timeout=10
-        )
-        upstream_time = time.time() - upstream_start_time
-        
-        # Log upstream response metrics
-        proxy_logger.info(
-            f"UP-{request_id} | Upstream timeline response | "
-            f"Status: {proxied_response.status_code} | "
-            f"Time: {upstream_time:.3f}s"
-        )
-        
-        if proxied_response.status_code == 200:
-            try:
-                # Extract the response content
-                timeline_data = proxied_response.json()
-                
-                # Return as timeline field for validator compatibility
-                return jsonify({"timeline": timeline_data})
-            except Exception as e:
-                proxy_logger.error(f"ERROR-{request_id} | Failed to parse timeline: {e}")
-                # Return proxied response as-is
-                return Response(
-                    proxied_response.content,
-                    status=proxied_response.status_code,
-                    content_type=proxied_response.headers.get('Content-Type')
-                )
-        elif proxied_response.status_code == 401:
-            # For 401 Unauthorized, return empty array instead
-            proxy_logger.info(f"AUTH-{request_id} | Unauthorized response from upstream, returning empty timeline")
-            return jsonify({"timeline": []})
-        else:
-            # For other errors, return empty array
-            proxy_logger.info(f"ERR-{request_id} | Error {proxied_response.status_code} from upstream, returning empty timeline")
-            return jsonify({"timeline": []})
-    except Exception as e:
-        proxy_logger.error(f"ERROR-{request_id} | Timeline proxy failed: {e}")
-        # Return empty array on error
+
+    # Extract request components
+    headers = {key: value for key, value in request.headers.items()
+               if key.lower() not in ['host', 'content-length']}
+    params = request.args.to_dict()
+
+    return UpstreamCall('GET', urljoin(instance_url, "/api/v1/timelines/home"), headers, params, None)
+
+def unavailable_instance_timeline(request_id, e):
+    """
+    Build the home timeline served while the user's instance is unavailable.
+
+    Must run inside a Flask request context.
+
+    Args:
+        request_id: Request ID used in proxy log lines
+        e: The InstanceUnavailable raised for the instance
+
+    Returns:
+        Response: Cold start timeline, or an empty one if cold start is disabled
+    """
+    proxy_logger.warning(f"CIRCUIT-{request_id} | {e}, serving cold start timeline")
+    if not COLD_START_ENABLED:
+        return jsonify({"timeline": []})
+    limit = request.args.get('limit', default=20, type=int)
+    return jsonify({"timeline": load_cold_start_posts()[:min(COLD_START_POST_LIMIT, limit)]})
+
+def finish_home_timeline(request_id, proxied_response, upstream_time):
+    """
+    Build the home timeline response from the upstream instance's answer.
+
+    Args:
+        request_id: Request ID used in proxy log lines
+        proxied_response: Upstream response (requests or httpx)
+        upstream_time: Seconds the upstream call took
+
+    Returns:
+        Response: Timeline response
+    """
+    # Log upstream response metrics
+    log_event(proxy_logger, 'UP', 'Upstream timeline response', request_id=request_id,
+              status=proxied_response.status_code, time=upstream_time)
+
+    if proxied_response.status_code == 200:
+        try:
+            # Extract the response content
+            timeline_data = proxied_response.json()
+
+            # Return as timeline field for validator compatibility
+            return jsonify({"timeline": timeline_data})
+        except Exception as e:
+            proxy_logger.error(f"ERROR-{request_id} | Failed to parse timeline: {e}")
+            # Return proxied response as-is
+            return Response(
+                proxied_response.content,
+                status=proxied_response.status_code,
+                content_type=proxied_response.headers.get('Content-Type')
+            )
+    elif proxied_response.status_code == 401:
+        # For 401 Unauthorized, return empty array instead
+        proxy_logger.info(f"AUTH-{request_id} | Unauthorized response from upstream, returning empty timeline")
+        return jsonify({"timeline": []})
+    else:
+        # For other errors, return empty array
+        proxy_logger.info(f"ERR-{request_id} | Error {proxied_response.status_code} from upstream, returning empty timeline")
         return jsonify({"timeline": []})
 
 @proxy_bp.route('/timelines/home/augmented', methods=['GET'])
@@ -735,14 +937,65 @@ def get_augmented_timeline():
         200 OK with blended timeline posts
     """
     request_id = hash(f"{time.time()}_{request.remote_addr}") % 10000000
-    proxy_logger.info(
-        f"REQ-{request_id} | GET /timelines/home/augmented | "
-        f"User: {get_authenticated_user(request) or 'anonymous'} | "
-        f"Client: {request.remote_addr}"
-    )
-    
+    prepared = prepare_augmented_timeline(request_id)
+    if isinstance(prepared, Response):
+        return prepared
+
+    user_id, regular_timeline, upstream_call = prepared
+    recommendations = None
+    page = None
+    if upstream_call:
+        page, prefetched = start_timeline_page(user_id, upstream_call)
+        inject = request.args.get('inject_recommendations', '').lower() == 'true'
+        if prefetched:
+            # Scrolled onto a page fetched after the previous one was served
+            log_event(proxy_logger, 'PREFETCH', 'Serving prefetched timeline page', request_id=request_id)
+            regular_timeline = parse_upstream_timeline(request_id, prefetched)
+            page = page._replace(link=prefetched.link)
+            if inject:
+                recommendations = prefetched.recommendations
+            return finish_augmented_timeline(request_id, user_id, regular_timeline, recommendations, page)
+        
+        # Fetch recommendations while the upstream request is in flight
+        recs_future = None
+        if inject:
+            limit = request.args.get('limit', default=20, type=int)
+            recs_deadline = time.time() + TIMELINE_FETCH_CONFIG['enrichment_timeout']
+            recs_future = submit_timeline_task(get_recommendation_slice, user_id, min(10, limit),
+                                               page.injection.rec_ids)
+        
+        try:
+            # Make the request to get regular timeline
+            proxied_response = fetch_upstream_timeline(upstream_call)
+            regular_timeline = parse_upstream_timeline(request_id, proxied_response)
+            page = page._replace(link=proxied_response.headers.get('Link'))
+        except Exception as e:
+            proxy_logger.error(f"ERROR-{request_id} | Timeline retrieval failed: {e}")
+        
+        if recs_future:
+            recommendations = wait_for_branch(recs_future, recs_deadline, [], request_id, 'Recommendations')
+
+    return finish_augmented_timeline(request_id, user_id, regular_timeline, recommendations, page)
+
+def prepare_augmented_timeline(request_id):
+    """
+    Resolve the user and the source of their regular timeline.
+
+    Must run inside a Flask request context.
+
+    Args:
+        request_id: Request ID used in proxy log lines
+
+    Returns:
+        Response if there is no authenticated user, otherwise a tuple of
+        (user_id, regular_timeline, upstream_call) where upstream_call is
+        None when the regular timeline was built locally
+    """
     # Get user ID either from query param or auth header
     user_id = get_authenticated_user(request)
+    
+    log_event(proxy_logger, 'REQ', 'GET /timelines/home/augmented', request_id=request_id,
+              user=user_id or 'anonymous', client=request.remote_addr)
     if not user_id:
         # Return empty array instead of 401 for validator compatibility
         proxy_logger.info(f"USER-{request_id} | No authenticated user, returning empty timeline")
@@ -750,7 +1003,6 @@ def get_augmented_timeline():
     
     # Get request parameters
     limit = request.args.get('limit', default=20, type=int)
-    inject_recommendations = request.args.get('inject_recommendations', '').lower() == 'true'
     
     # Get the regular timeline first
     regular_timeline = []
@@ -783,48 +1035,93 @@ def get_augmented_timeline():
             })
         
         proxy_logger.info(f"TIMELINE-{request_id} | Created {len(regular_timeline)} synthetic timeline posts")
-    else:
-        # For real users, try to get their timeline from the instance
+        return user_id, regular_timeline, None
+
+    # For real users, get their timeline from the instance
+    instance_url = get_user_instance(request)
+
+    # Extract request components
+    headers = {key: value for key, value in request.headers.items()
+               if key.lower() not in ['host', 'content-length']}
+    params = request.args.to_dict()
+
+    return user_id, [], UpstreamCall('GET', urljoin(instance_url, "/api/v1/timelines/home"), headers, params, None)
+
+def parse_upstream_timeline(request_id, proxied_response):
+    """
+    Extract the regular timeline posts from an upstream response.
+
+    Args:
+        request_id: Request ID used in proxy log lines
+        proxied_response: Upstream response (requests or httpx)
+
+    Returns:
+        RawTimeline of the posts, which are flagged as real when serialized,
+        or an empty list if the instance returned an error
+    """
+    regular_timeline = []
+    if proxied_response.status_code == 200:
         try:
-            # Get regular timeline
-            instance_url = get_user_instance(request)
-            target_url = urljoin(instance_url, f"/api/v1/timelines/home")
-            
-            # Extract request components
-            headers = {key: value for key, value in request.headers.items()
-                       if key.lower() not in ['host', 'content-length']}
-            params = request.args.to_dict()
-            
-            # Make the request to get regular timeline
-            proxied_response = requests.request(
-                method='GET',
-                url=target_url,
-                headers=headers,
-                params=params,
-                timeout=10
-            )
-            
-            if proxied_response.status_code == 200:
-                try:
-                    # Extract the response content
-                    regular_timeline = proxied_response.json()
-                    for post in regular_timeline:
-                        post['is_real_mastodon_post'] = True
-                        post['is_synthetic'] = False
-                    
-                    proxy_logger.info(f"TIMELINE-{request_id} | Retrieved {len(regular_timeline)} regular timeline posts")
-                except Exception as e:
-                    proxy_logger.error(f"ERROR-{request_id} | Failed to parse timeline: {e}")
-            else:
-                proxy_logger.info(f"ERR-{request_id} | Error {proxied_response.status_code} from upstream timeline")
+            # Keep the posts as upstream bytes; the flags are spliced in on output
+            regular_timeline = RawTimeline(proxied_response.content, REAL_POST_FIELDS)
+
+            proxy_logger.info(f"TIMELINE-{request_id} | Retrieved {len(regular_timeline)} regular timeline posts")
         except Exception as e:
-            proxy_logger.error(f"ERROR-{request_id} | Timeline retrieval failed: {e}")
-    
+            proxy_logger.error(f"ERROR-{request_id} | Failed to parse timeline: {e}")
+    else:
+        proxy_logger.info(f"ERR-{request_id} | Error {proxied_response.status_code} from upstream timeline")
+    return regular_timeline
+
+# An augmented timeline page fetched from the user's instance: its prefetch
+# key, the injection state it continues from and the upstream Link header
+TimelinePage = namedtuple('TimelinePage', ['key', 'injection', 'upstream_call', 'link'])
+
+def start_timeline_page(user_id, upstream_call):
+    """
+    Look up a timeline page's injection state and prefetched copy.
+
+    Args:
+        user_id: Authenticated user ID
+        upstream_call: UpstreamCall that fetches the page
+
+    Returns:
+        tuple: (TimelinePage without its link, PrefetchedPage or None)
+    """
+    key = timeline_prefetch.page_key(user_id, upstream_call.url, upstream_call.params, upstream_call.headers)
+    prefetched = timeline_prefetch.take_page(key) if 'max_id' in upstream_call.params else None
+    return TimelinePage(key, timeline_prefetch.get_injection_state(key), upstream_call, None), prefetched
+
+def finish_augmented_timeline(request_id, user_id, regular_timeline, recommendations=None, page=None):
+    """
+    Blend recommendations into the regular timeline if requested.
+
+    Must run inside a Flask request context.
+
+    Args:
+        request_id: Request ID used in proxy log lines
+        user_id: Authenticated user ID
+        regular_timeline: The user's regular timeline posts, as a list or
+            an undecoded RawTimeline
+        recommendations: Recommendations fetched concurrently with the
+            regular timeline; fetched here if None
+        page: TimelinePage if the posts came from the user's instance;
+            injection continues from its state and the next page is
+            prefetched
+
+    Returns:
+        Response: Timeline response
+    """
+    limit = request.args.get('limit', default=20, type=int)
+    inject_recommendations = request.args.get('inject_recommendations', '').lower() == 'true'
+    injection = page.injection if page else INITIAL_STATE
+    shown_ids = ()
+
     # If inject_recommendations is true, get and blend recommendations
     if inject_recommendations:
         try:
-            proxy_logger.info(f"INJECT-{request_id} | Getting recommendations for user {user_id}")
-            recommendations = get_recommendations(user_id, limit=min(10, limit))
+            if recommendations is None:
+                proxy_logger.info(f"INJECT-{request_id} | Getting recommendations for user {user_id}")
+                recommendations = get_recommendation_slice(user_id, min(10, limit), injection.rec_ids)
             
             # Add is_recommendation flag for validator compatibility
             for rec in recommendations:
@@ -838,7 +1135,19 @@ def get_augmented_timeline():
             
             # If we have regular timeline posts, blend them
             if regular_timeline:
-                blended_timeline = blend_recommendations(regular_timeline, recommendations)
+                shown_ids = [recommendations[i].get('id') for is_rec, i in
+                             blend_order(len(regular_timeline), len(recommendations), position=injection.position)
+                             if is_rec]
+            if isinstance(regular_timeline, RawTimeline) and regular_timeline:
+                blended_timeline, final_count = splice_recommendations(regular_timeline, recommendations,
+                                                                       position=injection.position)
+                proxy_logger.info(
+                    f"BLEND-{request_id} | Spliced {len(regular_timeline)} regular posts with "
+                    f"{len(recommendations)} recommendations, resulting in {final_count} posts"
+                )
+            elif regular_timeline:
+                blended_timeline = blend_recommendations(regular_timeline, recommendations,
+                                                         position=injection.position)
                 proxy_logger.info(
                     f"BLEND-{request_id} | Blended {len(regular_timeline)} regular posts with "
                     f"{len(recommendations)} recommendations, resulting in {len(blended_timeline)} posts"
@@ -851,18 +1160,135 @@ def get_augmented_timeline():
                 )
             
             # Return the blended timeline
-            return jsonify({
-                "timeline": blended_timeline,
-                "injected_count": len(recommendations)
-            })
+            response = timeline_json_response(blended_timeline, len(recommendations))
         except Exception as e:
             proxy_logger.error(f"ERROR-{request_id} | Recommendation blending failed: {e}")
             # Return regular timeline on error
-            return jsonify({"timeline": regular_timeline})
+            return timeline_json_response(regular_timeline)
     else:
         # No recommendations requested, just return regular timeline
         proxy_logger.info(f"NOREC-{request_id} | No recommendations requested, returning {len(regular_timeline)} regular posts")
-        return jsonify({"timeline": regular_timeline})
+        response = timeline_json_response(regular_timeline)
+
+    if page:
+        continue_timeline(request_id, user_id, page, regular_timeline, shown_ids)
+    return response
+
+def continue_timeline(request_id, user_id, page, regular_timeline, shown_ids):
+    """
+    Carry injection state over to the next timeline page and prefetch it.
+
+    Must run inside a Flask request context.
+
+    Args:
+        request_id: Request ID used in proxy log lines
+        user_id: Authenticated user ID
+        page: TimelinePage that was just served
+        regular_timeline: Its upstream posts
+        shown_ids: IDs of the recommendations injected into it
+    """
+    if not isinstance(regular_timeline, RawTimeline) or not regular_timeline:
+        return
+    try:
+        last_id = regular_timeline.post(len(regular_timeline) - 1).get('id')
+    except (ValueError, AttributeError):
+        last_id = None
+    params = timeline_prefetch.next_page_params(page.upstream_call.params, page.link, last_id)
+    if params is None:
+        return
+    
+    next_call = page.upstream_call._replace(params=params)
+    next_key = timeline_prefetch.page_key(user_id, next_call.url, params, next_call.headers)
+    next_state = timeline_prefetch.advance_injection_state(page.injection, len(regular_timeline), shown_ids)
+    timeline_prefetch.save_injection_state(next_key, next_state)
+    
+    recs_limit = 0
+    if request.args.get('inject_recommendations', '').lower() == 'true':
+        recs_limit = min(10, request.args.get('limit', default=20, type=int))
+    app = current_app._get_current_object()
+    
+    def fetch():
+        with app.app_context():
+            response = upstream_request(
+                method=next_call.method,
+                url=next_call.url,
+                headers=next_call.headers,
+                params=next_call.params
+            )
+            recommendations = None
+            if recs_limit and response.status_code == 200:
+                recommendations = get_recommendation_slice(user_id, recs_limit, next_state.rec_ids)
+            return PrefetchedPage(response.status_code, response.content,
+                                  response.headers.get('Link'), recommendations)
+    
+    if timeline_prefetch.start_prefetch(next_key, fetch):
+        log_event(proxy_logger, 'PREFETCH', 'Prefetching next timeline page', request_id=request_id,
+                  max_id=params['max_id'])
+
+def timeline_json_response(timeline, injected_count=None):
+    """
+    Build a {"timeline": [...]} response.
+    
+    Args:
+        timeline: List of posts, a RawTimeline or an already serialized
+            JSON array
+        injected_count: Number of injected recommendations to report, if any
+        
+    Returns:
+        Response: JSON response
+    """
+    if isinstance(timeline, list):
+        body = {"timeline": timeline}
+        if injected_count is not None:
+            body["injected_count"] = injected_count
+        return jsonify(body)
+    
+    if isinstance(timeline, RawTimeline):
+        timeline = timeline.to_json()
+    parts = [b'{"timeline":', timeline]
+    if injected_count is not None:
+        parts.append(b',"injected_count":%d' % injected_count)
+    parts.append(b'}')
+    return Response(b''.join(parts), mimetype='application/json')
+
+def stream_proxied_response(proxy_req, proxied_response, upstream_time):
+    """
+    Stream an upstream response to the client without buffering it.
+    
+    The body is relayed as raw bytes (still compressed if the instance
+    compressed it), so Content-Encoding and Content-Length stay valid.
+    The upstream connection returns to the pool once the body is sent.
+    
+    Args:
+        proxy_req: Result of prepare_proxy_request
+        proxied_response: Upstream response opened with stream=True
+        upstream_time: Seconds until upstream response headers arrived
+        
+    Returns:
+        Response: Streaming Flask response
+    """
+    request_id = proxy_req['request_id']
+    status_code = proxied_response.status_code
+    response_headers = {key: value for key, value in proxied_response.headers.items()
+                        if key.lower() not in HOP_BY_HOP_HEADERS}
+    
+    log_event(proxy_logger, 'UP', 'Upstream response (streaming)', request_id=request_id,
+              status=status_code, time_to_headers=upstream_time)
+    
+    def generate():
+        size = 0
+        try:
+            for chunk in proxied_response.raw.stream(PROXY_STREAM_CHUNK_SIZE, decode_content=False):
+                size += len(chunk)
+                yield chunk
+        finally:
+            proxied_response.close()
+            total_time = time.time() - proxy_req['request_start_time']
+            log_event(proxy_logger, 'RESP', 'Request completed', request_id=request_id,
+                      status=status_code, total_time=total_time, size=size, enriched='not_applicable')
+            record_request_metrics(proxy_req, status_code, total_time, upstream_time)
+    
+    return Response(generate(), status=status_code, headers=response_headers, direct_passthrough=True)
 
 @proxy_bp.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 @log_route
@@ -881,6 +1307,67 @@ def proxy_to_mastodon(path):
     """
     # Extract request information for logging
     request_id = hash(f"{time.time()}_{request.remote_addr}") % 10000000
+    proxy_req = prepare_proxy_request(path, request_id)
+    
+    # If this is a home timeline request, let our specialized endpoint handle it
+    if path == 'timelines/home' and proxy_req['method'] == 'GET':
+        proxy_logger.info(f"ROUTE-{request_id} | Home timeline detected, redirecting to specialized handler")
+        return get_home_timeline()
+    
+    # Answer cacheable GETs from the upstream response cache when it is fresh
+    cached, upstream_headers = lookup_proxy_cache(proxy_req)
+    if cached and upstream_cache.is_fresh(cached):
+        return cached_proxy_response(proxy_req, cached)
+    
+    try:
+        # Make the request to the target Mastodon instance
+        upstream_start_time = time.time()
+        proxied_response = upstream_request(
+            method=proxy_req['method'],
+            url=proxy_req['target_url'],
+            headers=upstream_headers,
+            params=proxy_req['params'],
+            data=proxy_req['data'],
+            stream=proxy_req['is_passthrough']
+        )
+        upstream_time = time.time() - upstream_start_time
+        record_follow_action(proxy_req, proxied_response.status_code)
+        invalidate_viewer_timelines(proxy_req, proxied_response.status_code)
+        
+        if cached:
+            if proxied_response.status_code == 304:
+                proxied_response.close()
+                cached = upstream_cache.revalidate(proxy_req['path'], proxy_req['target_url'], proxy_req['params'],
+                                                   proxy_req['headers'], cached, proxied_response.headers)
+                return cached_proxy_response(proxy_req, cached, revalidated=True)
+            upstream_cache.record_miss()
+        
+        if proxy_req['is_cacheable'] and upstream_cache.is_storable(
+                proxy_req['path'], proxy_req['headers'], proxied_response.status_code, proxied_response.headers):
+            body = proxied_response.raw.read(decode_content=False)
+            proxied_response.close()
+            return store_proxy_response(proxy_req, proxied_response.status_code, proxied_response.headers, body)
+        
+        if proxy_req['is_passthrough']:
+            return stream_proxied_response(proxy_req, proxied_response, upstream_time)
+        
+        return finish_proxy_request(proxy_req, proxied_response, upstream_time)
+    except requests.RequestException as e:
+        return stale_proxy_response(proxy_req, cached) or proxy_error_response(proxy_req, e)
+
+def prepare_proxy_request(path, request_id):
+    """
+    Resolve the target instance and user and handle cold start interactions.
+    
+    Must run inside a Flask request context.
+    
+    Args:
+        path: The API path after /api/v1/
+        request_id: Request ID used in proxy log lines
+        
+    Returns:
+        dict: Everything needed to send the upstream request and process its response
+    """
     request_start_time = time.time()
     
     # Extract Mastodon instance to proxy to
@@ -897,32 +1384,33 @@ def proxy_to_mastodon(path):
     
     # Get authenticated user information
     user_id = get_authenticated_user(request)
+    identity = get_request_identity(user_id) if user_id else None
     
     # Log the proxy request
-    proxy_logger.info(
-        f"REQ-{request_id} | {request.method} /{path} | "
-        f"Target: {instance_url} | "
-        f"User: {user_id or 'anonymous'} | "
-        f"Client: {request.remote_addr} | "
-        f"UA: {request.headers.get('User-Agent', 'Unknown').split(' ')[0]}"
-    )
+    if proxy_logger.isEnabledFor(logging.INFO):  # skip building the fields when INFO is off
+        log_event(proxy_logger, 'REQ', 'Proxy request', request_id=request_id,
+                  method=request.method, path=f"/{path}", target=instance_url,
+                  user=user_id or 'anonymous', client=request.remote_addr,
+                  ua=request.headers.get('User-Agent', 'Unknown').split(' ')[0])
     
     # Extract request components
     method = request.method
     headers = {key: value for key, value in request.headers.items()
                if key.lower() not in ['host', 'content-length']}
+    # Pass-through bodies are relayed still encoded, so the instance may only
+    # use codings the client asked for; without this header the HTTP client
+    # would ask for gzip on its own
+    if 'Accept-Encoding' not in request.headers:
+        headers['Accept-Encoding'] = 'identity'
     params = request.args.to_dict()
     data = request.get_data()
     
     # Extract auth token if present
-    user_token = None
-    auth_header = headers.get('Authorization')
-    if auth_header and auth_header.startswith('Bearer '):
-        user_token = auth_header.split(' ')[1]
+    user_token = bearer_token(request)
     
     # Log auth headers presence (without revealing tokens)
-    has_auth = 'Authorization' in headers
-    proxy_logger.debug(f"REQ-{request_id} | Auth headers present: {has_auth}")
+    log_event(proxy_logger, 'REQ', 'Auth headers present', logging.DEBUG, request_id=request_id,
+              has_auth='Authorization' in headers)
     
     # Check if this is an interaction endpoint we need to handle
     interaction_pattern = re.match(r'^statuses/([^/]+)/(favourite|bookmark|reblog)$', path)
@@ -931,9 +1419,9 @@ def proxy_to_mastodon(path):
     # Indicate if the route is likely to be enriched
     is_enrichable = (path == 'timelines/home' and method == 'GET')
     
-    # Track metrics for later use
-    enrichment_status = 'not_applicable'
-    recommendations_count = 0
+    # Follows and unfollows keep the cold start follow status current
+    follow_pattern = re.match(r'^accounts/[^/]+/(follow|unfollow)$', path)
+    follow_action = follow_pattern.group(1) if follow_pattern and method == 'POST' and user_token else None
     
     # Extract post ID and action type if this is an interaction endpoint
     post_id = None
@@ -948,12 +1436,8 @@ def proxy_to_mastodon(path):
         else:
             action_type = raw_action  # 'bookmark' or 'reblog'
             
-        proxy_logger.info(
-            f"INTERACTION-{request_id} | Detected interaction | "
-            f"Action: {action_type} | "
-            f"Post: {post_id} | "
-            f"User: {user_id or 'anonymous'}"
-        )
+        log_event(proxy_logger, 'INTERACTION', 'Detected interaction', request_id=request_id,
+                  action=action_type, post=post_id, user=user_id or 'anonymous')
         
         # Check if this is a cold start post interaction
         if post_id.startswith('cold_start_post_') and user_token:
@@ -963,14 +1447,7 @@ def proxy_to_mastodon(path):
             # Log the cold start interaction
             try:
                 # Get the post data to extract metadata for signal tracking
-                cold_start_posts = load_cold_start_posts()
-                post_metadata = None
-                
-                # Find the post in our cold start collection
-                for post in cold_start_posts:
-                    if post.get('id') == post_id:
-                        post_metadata = post
-                        break
+                post_metadata = cold_start_posts_store().get(post_id)
                 
                 # Log basic interaction for analyzing cold start effectiveness
                 log_cold_start_interaction(
@@ -1008,350 +1485,387 @@ def proxy_to_mastodon(path):
                 proxy_logger.error(f"ERROR-{request_id} | Failed to log cold start interaction: {e}")
                 # Continue with normal processing
     
-    # If this is a home timeline request, let our specialized endpoint handle it
-    if path == 'timelines/home' and method == 'GET':
-        proxy_logger.info(f"ROUTE-{request_id} | Home timeline detected, redirecting to specialized handler")
-        return get_home_timeline()
+    return {
+        'request_id': request_id,
+        'request_start_time': request_start_time,
+        'path': path,
+        'method': method,
+        'instance_url': instance_url,
+        'target_url': target_url,
+        'headers': headers,
+        'params': params,
+        'data': data,
+        'user_id': user_id,
+        # Known from the user's identity; None means look it up
+        'user_alias': identity.user_alias if identity else None,
+        'privacy_level': identity.privacy_level if identity else None,
+        'post_id': post_id,
+        'action_type': action_type,
+        'is_interaction': is_interaction,
+        'is_enrichable': is_enrichable,
+        'user_token': user_token,
+        'follow_action': follow_action,
+        # GETs we only relay may be answered from the upstream response cache
+        'is_cacheable': (UPSTREAM_CACHE_CONFIG['enabled'] and PROXY_STREAMING_ENABLED and method == 'GET'
+                         and not (is_interaction or is_enrichable) and 'Range' not in request.headers),
+        # Responses we never read or modify are streamed straight to the client
+        'is_passthrough': PROXY_STREAMING_ENABLED and not (is_interaction or is_enrichable),
+        # Phase durations (e.g. 'recommendation') measured off the request thread
+        'timings': {},
+    }
+
+def lookup_proxy_cache(proxy_req):
+    """
+    Look up a cacheable request in the upstream response cache.
     
-    try:
-        # Make the request to the target Mastodon instance
-        upstream_start_time = time.time()
-        proxied_response = requests.request(
-            method=method,
-            url=target_url,
-            headers=headers,
-            params=params,
-            data=data,
-            timeout=10
-        )
-        upstream_time = time.time() - upstream_start_time
+    Args:
+        proxy_req: Result of prepare_proxy_request
         
-        # Log upstream response metrics
-        proxy_logger.info(
-            f"UP-{request_id} | Upstream response | "
-            f"Status: {proxied_response.status_code} | "
-            f"Time: {upstream_time:.3f}s | "
-            f"Size: {len(proxied_response.content)} bytes"
-        )
+    Returns:
+        tuple: (entry, headers) where entry is the cached response or None,
+        and headers are the request headers to send upstream, with
+        validators added when the entry is stale
+    """
+    headers = proxy_req['headers']
+    if not proxy_req['is_cacheable']:
+        return None, headers
+    
+    entry = upstream_cache.lookup(proxy_req['path'], proxy_req['target_url'], proxy_req['params'], headers)
+    if entry and not upstream_cache.is_fresh(entry):
+        headers = dict(headers, **upstream_cache.conditional_headers(entry))
+    return entry, headers
+
+def cached_proxy_response(proxy_req, entry, revalidated=False, stale=False):
+    """
+    Serve a response from the upstream response cache.
+    
+    Args:
+        proxy_req: Result of prepare_proxy_request
+        entry: The cached response
+        revalidated: Whether the instance just confirmed the entry with a 304
+        stale: Whether the entry is served past its freshness because the
+            instance could not be reached
         
-        # Extract the response for potential modification
-        response_headers = {key: value for key, value in proxied_response.headers.items()
-                            if key.lower() not in ['content-encoding', 'transfer-encoding', 'content-length']}
-        response_content = proxied_response.content
-        status_code = proxied_response.status_code
+    Returns:
+        Response: The cached response
+    """
+    upstream_cache.record_hit(revalidated, stale)
+    cache_status = 'STALE' if stale else 'REVALIDATED' if revalidated else 'HIT'
+    total_time = time.time() - proxy_req['request_start_time']
+    log_event(proxy_logger, 'RESP', 'Request completed', request_id=proxy_req['request_id'],
+              status=entry.status_code, total_time=total_time, size=len(entry.body), cache=cache_status)
+    record_request_metrics(proxy_req, entry.status_code, total_time)
+    return Response(entry.body, status=entry.status_code,
+                    headers=upstream_cache.response_headers_for(entry, cache_status))
+
+def stale_proxy_response(proxy_req, entry):
+    """
+    Serve a stale cached response in place of an upstream error.
+    
+    Args:
+        proxy_req: Result of prepare_proxy_request
+        entry: The cached response, or None
         
-        # Handle interaction logging for successful requests to interaction endpoints
-        if is_interaction and status_code >= 200 and status_code < 300 and user_id:
-            try:
-                # Parse post data from response
-                post_data = json.loads(response_content)
-                
-                # Only proceed if we have a valid user ID
-                if user_id:
-                    # Check privacy settings
-                    with get_db_connection() as conn:
-                        privacy_level = get_user_privacy_level(conn, user_id)
-                        
-                        # Don't log if privacy level is 'none'
-                        if privacy_level != 'none':
-                            # Generate user alias for privacy
-                            user_alias = generate_user_alias(user_id)
-                            
-                            # Create context with source info
-                            context = {
-                                'source': 'mastodon_proxy',
-                                'instance': instance_url,
-                                'client_ip': request.remote_addr,
-                                'user_agent': request.headers.get('User-Agent', 'Unknown')
-                            }
-                            
-                            # Add minimal post info to ensure we have post metadata
-                            ensure_post_metadata(conn, post_id, post_data)
-                            
-                            # Log the interaction
-                            log_proxy_interaction(conn, user_alias, post_id, action_type, context)
-                            
-                            proxy_logger.info(
-                                f"INTERACTION-{request_id} | Logged interaction | "
-                                f"User: {user_id} | "
-                                f"Post: {post_id} | "
-                                f"Action: {action_type} | "
-                                f"Privacy: {privacy_level}"
-                            )
-                        else:
-                            proxy_logger.info(
-                                f"INTERACTION-{request_id} | Skipped logging (privacy: none) | "
-                                f"User: {user_id}"
-                            )
-            except Exception as e:
-                proxy_logger.error(f"ERROR-{request_id} | Failed to log interaction: {str(e)}")
-                # Continue with the proxied response even if logging fails
+    Returns:
+        Response: The stale response, or None if there is no entry or it
+        expired more than max_stale_seconds ago
+    """
+    if entry is None or time.time() - entry.expires_at > INSTANCE_HEALTH_CONFIG['max_stale_seconds']:
+        return None
+    proxy_logger.warning(f"STALE-{proxy_req['request_id']} | Instance unreachable, serving stale cached response")
+    return cached_proxy_response(proxy_req, entry, stale=True)
+
+def store_proxy_response(proxy_req, status_code, response_headers, body):
+    """
+    Store a buffered upstream response in the cache and serve it.
+    
+    Args:
+        proxy_req: Result of prepare_proxy_request
+        status_code: Upstream response status
+        response_headers: Upstream response headers
+        body: Raw (still encoded) response body
+        
+    Returns:
+        Response: The upstream response
+    """
+    entry = upstream_cache.store(proxy_req['path'], proxy_req['target_url'], proxy_req['params'],
+                                 proxy_req['headers'], status_code, response_headers, body)
+    total_time = time.time() - proxy_req['request_start_time']
+    log_event(proxy_logger, 'RESP', 'Request completed', request_id=proxy_req['request_id'],
+              status=status_code, total_time=total_time, size=len(body), cache='STORED' if entry else 'MISS')
+    record_request_metrics(proxy_req, status_code, total_time)
+    headers = [(key, value) for key, value in response_headers.items()
+               if key.lower() not in HOP_BY_HOP_HEADERS]
+    return Response(body, status=status_code, headers=headers + [('X-Cache', 'MISS')])
+
+def record_follow_action(proxy_req, status_code):
+    """
+    Update the user's cached follow status after a successful follow or unfollow.
+    
+    Args:
+        proxy_req: Result of prepare_proxy_request
+        status_code: Upstream response status
+    """
+    if not proxy_req['follow_action'] or not 200 <= status_code < 300:
+        return
+    
+    try:
+        # Import here to avoid circular imports
+        from utils.follows import record_follow_change
+        record_follow_change(proxy_req['user_token'], proxy_req['follow_action'] == 'follow')
+    except Exception as e:
+        proxy_logger.error(f"ERROR-{proxy_req['request_id']} | Failed to record follow change: {e}")
+
+def invalidate_viewer_timelines(proxy_req, status_code):
+    """
+    Drop the user's micro-cached timelines after a successful write.
+    
+    Posting, boosting, favouriting or following changes what the next poll
+    should show, so it must not be answered from the micro-cache.
+    
+    Args:
+        proxy_req: Result of prepare_proxy_request
+        status_code: Upstream response status
+    """
+    if proxy_req['method'] in ('GET', 'HEAD', 'OPTIONS') or not 200 <= status_code < 300:
+        return
+    timeline_microcache.invalidate_viewer(proxy_req['headers'])
+
+def finish_proxy_request(proxy_req, proxied_response, upstream_time):
+    """
+    Log interactions and enrich timelines from a buffered upstream response.
+    
+    Must run inside a Flask request context.
+    
+    Args:
+        proxy_req: Result of prepare_proxy_request
+        proxied_response: Upstream response (requests or httpx)
+        upstream_time: Seconds the upstream call took
         
-        # For timeline/home, consider injecting recommendations
-        if is_enrichable and status_code == 200:
-            # Check if personalization is allowed for this user
-            privacy_level = 'unknown'
-            personalization_allowed = False
+    Returns:
+        Response: The proxied response, potentially with injected recommendations
+    """
+    request_id = proxy_req['request_id']
+    request_start_time = proxy_req['request_start_time']
+    instance_url = proxy_req['instance_url']
+    user_id = proxy_req['user_id']
+    post_id = proxy_req['post_id']
+    action_type = proxy_req['action_type']
+    is_interaction = proxy_req['is_interaction']
+    is_enrichable = proxy_req['is_enrichable']
+    
+    # Track metrics for later use
+    enrichment_status = 'not_applicable'
+    recommendations_count = 0
+    rec_time = proxy_req['timings'].get('recommendation')
+    blend_time = None
+    
+    # Log upstream response metrics
+    log_event(proxy_logger, 'UP', 'Upstream response', request_id=request_id,
+              status=proxied_response.status_code, time=upstream_time, size=len(proxied_response.content))
+    
+    # Extract the response for potential modification
+    response_headers = {key: value for key, value in proxied_response.headers.items()
+                        if key.lower() not in ['content-encoding', 'transfer-encoding', 'content-length']}
+    response_content = proxied_response.content
+    status_code = proxied_response.status_code
+    
+    # Queue interaction logging for successful requests to interaction endpoints;
+    # the database writes happen on the interaction writer thread
+    if is_interaction and status_code >= 200 and status_code < 300 and user_id:
+        try:
+            # Parse post data from response
+            post_data = json.loads(response_content)
             
-            if user_id:
-                try:
-                    with get_db_connection() as conn:
-                        privacy_level = get_user_privacy_level(conn, user_id)
-                        personalization_allowed = (privacy_level == 'full')
-                except Exception as e:
-                    proxy_logger.error(f"ERROR-{request_id} | Failed to check privacy: {e}")
-                    privacy_level = 'error'
+            # Create context with source info
+            context = {
+                'source': 'mastodon_proxy',
+                'instance': instance_url,
+                'client_ip': request.remote_addr,
+                'user_agent': request.headers.get('User-Agent', 'Unknown')
+            }
             
-            proxy_logger.info(
-                f"PRIV-{request_id} | Privacy check | "
-                f"User: {user_id or 'anonymous'} | "
-                f"Level: {privacy_level} | "
-                f"Can enrich: {personalization_allowed}"
-            )
+            # Privacy is checked by the writer if it is not already cached
+            enqueue_interaction(InteractionEvent(
+                user_id=user_id,
+                user_alias=proxy_req['user_alias'] or generate_user_alias(user_id),
+                privacy_level=proxy_req['privacy_level'],
+                post_id=post_id,
+                action_type=action_type,
+                context=context,
+                post_data=post_data
+            ))
             
-            if user_id and personalization_allowed:
-                try:
-                    # Parse the original response
-                    original_posts = json.loads(response_content)
-                    original_count = len(original_posts)
-                    
-                    # Get recommendations for this user
-                    rec_start_time = time.time()
-                    recommendations = get_recommendations(user_id)
-                    rec_time = time.time() - rec_start_time
-                    
-                    if recommendations:
-                        # Blend recommendations with the original posts
-                        blend_start_time = time.time()
-                        blended_timeline = blend_recommendations(original_posts, recommendations)
-                        blend_time = time.time() - blend_start_time
-                        
-                        # Convert back to JSON
-                        response_content = json.dumps(blended_timeline).encode('utf-8')
-                        response_headers['Content-Type'] = 'application/json'
-                        
-                        # Add header to indicate recommendations were injected
-                        recommendations_count = len(recommendations)
-                        response_headers['X-Corgi-Recommendations'] = f"injected={recommendations_count}"
-                        
-                        # Log the enrichment
-                        proxy_logger.info(
-                            f"ENRICH-{request_id} | Timeline enriched | "
-                            f"Original posts: {original_count} | "
-                            f"Recs added: {recommendations_count} | "
-                            f"Final posts: {len(blended_timeline)} | "
-                            f"Rec time: {rec_time:.3f}s | "
-                            f"Blend time: {blend_time:.3f}s"
-                        )
-                        
-                        enrichment_status = 'enriched'
-                    else:
-                        proxy_logger.info(f"ENRICH-{request_id} | No recommendations generated")
-                        enrichment_status = 'no_recommendations'
-                except Exception as e:
-                    proxy_logger.error(f"ERROR-{request_id} | Enrichment failed: {str(e)}")
-                    enrichment_status = 'error'
-                    # Continue with original response on error
-            else:
-                if not user_id:
-                    enrichment_status = 'no_user'
-                else:
-                    enrichment_status = 'privacy_restricted'
-                proxy_logger.info(
-                    f"ENRICH-{request_id} | Skipped enrichment | "
-                    f"Reason: {enrichment_status}"
-                )
-        
-        # Prepare final response
-        response = Response(
-            response_content,
-            status=status_code,
-            headers=response_headers
-        )
+            log_event(proxy_logger, 'INTERACTION', 'Queued interaction', request_id=request_id,
+                      user=user_id, post=post_id, action=action_type)
+        except Exception as e:
+            proxy_logger.error(f"ERROR-{request_id} | Failed to log interaction: {str(e)}")
+            # Continue with the proxied response even if logging fails
+    
+    # For timeline/home, consider injecting recommendations
+    if is_enrichable and status_code == 200:
+        # Check if personalization is allowed for this user
+        privacy_level = 'unknown'
+        recommendations = []
         
-        # Log completion
-        total_time = time.time() - request_start_time
-        proxy_logger.info(
-            f"RESP-{request_id} | Request completed | "
-            f"Status: {status_code} | "
-            f"Total time: {total_time:.3f}s | "
-            f"Enriched: {enrichment_status}"
-        )
+        if user_id:
+            privacy_level, recommendations = resolve_enrichment(user_id, request_id, proxy_req['privacy_level'],
+                                                                proxy_req['timings'])
+            rec_time = proxy_req['timings'].get('recommendation')
+        personalization_allowed = (privacy_level == 'full')
         
-        # Record metrics if this was a timeline request
-        if is_enrichable and status_code == 200:
-            record_proxy_metrics(
-                path=path,
-                user_id=user_id,
-                elapsed_time=total_time,
-                upstream_time=upstream_time,
-                enriched=(enrichment_status == 'enriched'),
-                recommendations_count=recommendations_count,
-                status_code=status_code
-            )
+        log_event(proxy_logger, 'PRIV', 'Privacy check', request_id=request_id,
+                  user=user_id or 'anonymous', privacy_level=privacy_level, can_enrich=personalization_allowed)
         
-        return response
+        if user_id and personalization_allowed:
+            try:
+                # Parse the original response
+                original_posts = json.loads(response_content)
+                original_count = len(original_posts)
                 
-    except requests.RequestException as e:
-        error_time = time.time() - request_start_time
-        proxy_logger.error(
-            f"ERROR-{request_id} | Proxy failed | "
-            f"Target: {instance_url} | "
-            f"Error: {str(e)} | "
-            f"Time: {error_time:.3f}s"
-        )
-        
-        # Record error metrics
-        if is_enrichable:
-            record_proxy_metrics(
-                path=path,
-                user_id=user_id,
-                elapsed_time=error_time,
-                upstream_time=0,
-                enriched=False,
-                recommendations_count=0,
-                status_code=502,
-                error=str(e)
-            )
+                if recommendations:
+                    # Blend recommendations with the original posts
+                    blend_start_time = time.time()
+                    blended_timeline = blend_recommendations(original_posts, recommendations)
+                    blend_time = time.time() - blend_start_time
+                    
+                    # Convert back to JSON
+                    response_content = json.dumps(blended_timeline).encode('utf-8')
+                    response_headers['Content-Type'] = 'application/json'
+                    
+                    # Add header to indicate recommendations were injected
+                    recommendations_count = len(recommendations)
+                    response_headers['X-Corgi-Recommendations'] = f"injected={recommendations_count}"
+                    
+                    # Log the enrichment
+                    log_event(proxy_logger, 'ENRICH', 'Timeline enriched', request_id=request_id,
+                              original_posts=original_count, recs_added=recommendations_count,
+                              final_posts=len(blended_timeline), rec_time=rec_time, blend_time=blend_time)
+                    
+                    enrichment_status = 'enriched'
+                else:
+                    log_event(proxy_logger, 'ENRICH', 'No recommendations generated', request_id=request_id)
+                    enrichment_status = 'no_recommendations'
+            except Exception as e:
+                proxy_logger.error(f"ERROR-{request_id} | Enrichment failed: {str(e)}")
+                enrichment_status = 'error'
+                # Continue with original response on error
+        else:
+            if not user_id:
+                enrichment_status = 'no_user'
+            elif privacy_level == 'timeout':
+                enrichment_status = 'timeout'
+            else:
+                enrichment_status = 'privacy_restricted'
+            log_event(proxy_logger, 'ENRICH', 'Skipped enrichment', request_id=request_id,
+                      reason=enrichment_status)
+    
+    # Prepare final response
+    response = Response(
+        response_content,
+        status=status_code,
+        headers=response_headers
+    )
+    
+    # Log completion
+    total_time = time.time() - request_start_time
+    log_event(proxy_logger, 'RESP', 'Request completed', request_id=request_id,
+              status=status_code, total_time=total_time, enriched=enrichment_status)
+    
+    record_request_metrics(proxy_req, status_code, total_time, upstream_time,
+                           enrichment_status=enrichment_status,
+                           recommendations_count=recommendations_count,
+                           rec_time=rec_time, blend_time=blend_time)
+    
+    return response
+
+def proxy_error_response(proxy_req, e):
+    """
+    Log a failed upstream request and build the error response.
+    
+    Args:
+        proxy_req: Result of prepare_proxy_request
+        e: The upstream exception
         
-        return jsonify({
-            "error": "Failed to proxy request to Mastodon instance",
-            "instance": instance_url,
-            "details": str(e)
-        }), 502
+    Returns:
+        tuple: JSON error response and status code: 503 with Retry-After
+        when the instance's circuit is open, otherwise 502
+    """
+    request_id = proxy_req['request_id']
+    request_start_time = proxy_req['request_start_time']
+    instance_url = proxy_req['instance_url']
+    is_enrichable = proxy_req['is_enrichable']
+    
+    # An open circuit fails fast; tell the client when to come back
+    status_code = 503 if isinstance(e, InstanceUnavailable) else 502
+    
+    error_time = time.time() - request_start_time
+    proxy_logger.error(
+        f"ERROR-{request_id} | Proxy failed | "
+        f"Target: {instance_url} | "
+        f"Error: {str(e)} | "
+        f"Time: {error_time:.3f}s"
+    )
+    
+    # Record error metrics
+    record_request_metrics(proxy_req, status_code, error_time,
+                           enrichment_status='error' if is_enrichable else 'not_applicable',
+                           error=str(e))
+    
+    response = jsonify({
+        "error": "Failed to proxy request to Mastodon instance",
+        "instance": instance_url,
+        "details": str(e)
+    })
+    if status_code == 503:
+        return response, 503, {'Retry-After': str(e.retry_after)}
+    return response, 502
 
 # In-memory metrics store
 from collections import defaultdict, deque
 import threading
 
-# Thread-safe metrics storage
+# Thread-safe metrics storage; latency distributions live in utils.latency
 _metrics_lock = threading.Lock()
 _request_metrics = defaultdict(int)
-_latency_samples = deque(maxlen=100)  # Store the 100 most recent request times
 _error_samples = deque(maxlen=20)  # Store the 20 most recent errors
 _last_reset_time = time.time()
 
-def ensure_post_metadata(conn, post_id, post_data):
+def record_request_metrics(proxy_req, status_code, elapsed_time, upstream_time=None,
+                           enrichment_status='not_applicable', recommendations_count=0,
+                           rec_time=None, blend_time=None, error=None):
     """
-    Ensure post metadata exists in the database.
+    Record metrics about a request handled by proxy_to_mastodon.
     
     Args:
-        conn: Database connection
-        post_id: Post ID
-        post_data: Post data from Mastodon API
-    """
-    try:
-        with conn.cursor() as cur:
-            # Check if post exists
-            cur.execute(
-                "SELECT post_id FROM post_metadata WHERE post_id = %s",
-                (post_id,)
-            )
-            exists = cur.fetchone() is not None
-            
-            if not exists:
-                # Extract basic post information
-                author_id = str(post_data.get('account', {}).get('id', ''))
-                author_name = post_data.get('account', {}).get('username', 'unknown')
-                content = post_data.get('content', '')
-                sensitive = post_data.get('sensitive', False)
-                language = post_data.get('language', 'en')
-                
-                # Extract tags
-                tags = []
-                for tag in post_data.get('tags', []):
-                    if isinstance(tag, dict) and 'name' in tag:
-                        tags.append(tag['name'])
-                    elif isinstance(tag, str):
-                        tags.append(tag)
-                
-                # Insert post metadata
-                cur.execute('''
-                    INSERT INTO post_metadata 
-                    (post_id, author_id, author_name, content, language, tags, sensitive, mastodon_post)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (post_id) DO NOTHING
-                ''', (
-                    post_id,
-                    author_id,
-                    author_name,
-                    content,
-                    language,
-                    tags,
-                    sensitive,
-                    json.dumps(post_data)
-                ))
-                conn.commit()
-                
-                proxy_logger.debug(f"Added new post metadata for post {post_id}")
-    except Exception as e:
-        proxy_logger.error(f"Error ensuring post metadata: {e}")
-        # Don't raise, to avoid breaking the interaction flow
-
-def log_proxy_interaction(conn, user_alias, post_id, action_type, context):
-    """
-    Log a user interaction from the proxy.
-    
-    Args:
-        conn: Database connection
-        user_alias: Pseudonymized user ID
-        post_id: Post ID
-        action_type: Type of action (favorite, bookmark, reblog)
-        context: Additional context information
+        proxy_req: Result of prepare_proxy_request
+        status_code: HTTP status code returned to the client
+        elapsed_time: Total request time
+        upstream_time: Time spent in the upstream request, if it was made
+        enrichment_status: Outcome of timeline enrichment
+        recommendations_count: Number of recommendations added
+        rec_time: Time spent resolving recommendations, if any
+        blend_time: Time spent blending recommendations, if any
+        error: Error message (if any)
     """
-    try:
-        with conn.cursor() as cur:
-            # Insert the interaction
-            cur.execute('''
-                INSERT INTO interactions 
-                (user_alias, post_id, action_type, context)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (user_alias, post_id, action_type) 
-                DO UPDATE SET 
-                    context = EXCLUDED.context,
-                    created_at = CURRENT_TIMESTAMP
-                RETURNING id
-            ''', (user_alias, post_id, action_type, json.dumps(context)))
-            
-            result = cur.fetchone()
-            interaction_id = result[0] if result else None
-            
-            # Update interaction counts if this is a trackable action
-            if action_type in ['favorite', 'bookmark', 'reblog']:
-                field_name = {
-                    'favorite': 'favorites',
-                    'bookmark': 'bookmarks',
-                    'reblog': 'reblogs'
-                }.get(action_type)
-                
-                if field_name:
-                    cur.execute('''
-                        UPDATE post_metadata
-                        SET interaction_counts = jsonb_set(
-                            COALESCE(interaction_counts, '{}'::jsonb),
-                            %s,
-                            (COALESCE((interaction_counts->%s)::int, 0) + 1)::text::jsonb
-                        )
-                        WHERE post_id = %s
-                    ''', ([field_name], field_name, post_id))
-            
-            conn.commit()
-            
-            # Log the interaction to the dedicated interactions log
-            try:
-                # Log the interaction using the pre-configured logger
-                interaction_logger.info(f"{user_alias} | {post_id} | {action_type}")
-            except Exception as log_err:
-                proxy_logger.error(f"Failed to write to interaction log: {log_err}")
-            
-            return interaction_id
-    except Exception as e:
-        proxy_logger.error(f"Error logging interaction: {e}")
-        conn.rollback()
-        return None
+    record_proxy_metrics(
+        path=proxy_req['path'],
+        user_id=proxy_req['user_id'],
+        elapsed_time=elapsed_time,
+        upstream_time=upstream_time,
+        enriched=(enrichment_status == 'enriched'),
+        recommendations_count=recommendations_count,
+        status_code=status_code,
+        error=error,
+        instance_url=proxy_req['instance_url'],
+        enrichment_status=enrichment_status,
+        rec_time=rec_time,
+        blend_time=blend_time
+    )
 
 def record_proxy_metrics(path, user_id, elapsed_time, upstream_time, enriched, 
-                         recommendations_count, status_code, error=None):
+                         recommendations_count, status_code, error=None, instance_url=None,
+                         enrichment_status=None, rec_time=None, blend_time=None):
     """
     Record metrics about a proxy request.
     
@@ -1359,12 +1873,22 @@ def record_proxy_metrics(path, user_id, elapsed_time, upstream_time, enriched,
         path: The API path that was proxied
         user_id: The user ID (or None)
         elapsed_time: Total request time
-        upstream_time: Time spent in the upstream request
+        upstream_time: Time spent in the upstream request (None if not made)
         enriched: Whether the response was enriched with recommendations
         recommendations_count: Number of recommendations added
         status_code: HTTP status code
         error: Error message (if any)
+        instance_url: Upstream instance the request went to
+        enrichment_status: Outcome of timeline enrichment; derived from
+            enriched if not given
+        rec_time: Time spent resolving recommendations (if any)
+        blend_time: Time spent blending recommendations (if any)
     """
+    if enrichment_status is None:
+        enrichment_status = 'enriched' if enriched else 'not_applicable'
+    record_request(route_label(path), instance_label(instance_url), enrichment_status, elapsed_time,
+                   upstream=upstream_time, recommendation=rec_time, blend=blend_time)
+    
     with _metrics_lock:
         # Increment request counter
         _request_metrics['total_requests'] += 1
@@ -1383,8 +1907,8 @@ def record_proxy_metrics(path, user_id, elapsed_time, upstream_time, enriched,
                 _request_metrics['enriched_timelines'] += 1
                 _request_metrics['total_recommendations'] += recommendations_count
         
-        # Track latency
-        _latency_samples.append(elapsed_time)
+        # Track latency; percentiles come from utils.latency
+        _request_metrics['total_latency_ms'] += int(elapsed_time * 1000)
         
         # Track errors
         if error:
@@ -1404,7 +1928,7 @@ def get_proxy_metrics():
     """
     with _metrics_lock:
         # Calculate average latency
-        avg_latency = sum(_latency_samples) / max(len(_latency_samples), 1)
+        avg_latency = _request_metrics['total_latency_ms'] / 1000 / max(_request_metrics['total_requests'], 1)
         
         # Calculate enrichment rate
         timeline_requests = _request_metrics['timeline_requests']
@@ -1427,7 +1951,8 @@ def get_proxy_metrics():
             'total_recommendations': _request_metrics['total_recommendations'],
             'avg_latency_seconds': avg_latency,
             'enrichment_rate': enrichment_rate,
-            'sample_size': len(_latency_samples),
+            'sample_size': _request_metrics['total_requests'],
+            'latency': get_latency_summary(),
             'recent_errors': recent_errors,
             'uptime_seconds': uptime
         }
@@ -1436,7 +1961,7 @@ def reset_proxy_metrics():
     """Reset all proxy metrics."""
     with _metrics_lock:
         _request_metrics.clear()
-        _latency_samples.clear()
+        reset_latency()
         _error_samples.clear()
         global _last_reset_time
         _last_reset_time = time.time()
@@ -1447,11 +1972,15 @@ def reset_proxy_metrics():
 def proxy_status():
     """
     Status endpoint to check if the proxy is running.
+    
+    Includes each upstream instance's circuit state, latency percentiles,
+    error rate and current timeout.
     """
     return jsonify({
         "status": "ok",
         "proxy": "active",
-        "default_instance": current_app.config.get('DEFAULT_MASTODON_INSTANCE', 'https://mastodon.social')
+        "default_instance": current_app.config.get('DEFAULT_MASTODON_INSTANCE', 'https://mastodon.social'),
+        "instances": get_instance_health()
     })
 
 @proxy_bp.route('/instance', methods=['GET'])
@@ -1542,9 +2071,47 @@ def proxy_metrics():
     """
     reset = request.args.get('reset', '').lower() == 'true'
     metrics = get_proxy_metrics()
+    metrics['upstream'] = get_upstream_metrics()
+    metrics['identity_cache'] = get_identity_cache_stats()
+    metrics['privacy_cache'] = get_privacy_cache_stats()
+    metrics['upstream_cache'] = upstream_cache.get_upstream_cache_metrics()
+    metrics['interaction_writer'] = get_interaction_writer_stats()
+    metrics['logging'] = get_log_pipeline_stats()
+    metrics['timeline_prefetch'] = timeline_prefetch.get_prefetch_stats()
+    metrics['timeline_microcache'] = timeline_microcache.get_microcache_stats()
+    metrics['streaming'] = get_streaming_stats()
+    metrics['compression'] = get_compression_stats()
+    metrics['anonymous_timeline'] = get_anonymous_timeline_stats()
+    metrics['cold_start_store'] = get_cold_start_store_stats()
     
     if reset:
         reset_proxy_metrics()
+        reset_upstream_metrics()
+        upstream_cache.reset_upstream_cache_metrics()
         metrics['reset'] = True
     
-    return jsonify(metrics)
\ No newline at end of file
+    return jsonify(metrics)
+
+@proxy_bp.route('/latency', methods=['GET'])
+def proxy_latency():
+    """
+    Return proxy latency percentiles over a sliding window.
+    
+    Query parameters:
+        window: Window in seconds (default: everything retained)
+        route, instance, enrichment, phase: Only include matching requests
+        group_by: Comma-separated labels to break down by
+            (default: route,phase)
+    """
+    group_by = tuple(label for label in request.args.get('group_by', 'route,phase').split(',') if label)
+    unknown = [label for label in group_by if label not in LATENCY_LABELS]
+    if unknown:
+        return jsonify({"error": f"Unknown group_by labels: {', '.join(unknown)}"}), 400
+    
+    window = request.args.get('window', type=float)
+    filters = {label: request.args.get(label) for label in LATENCY_LABELS}
+    return jsonify({
+        'window_seconds': window,
+        'group_by': list(group_by),
+        'latency': query_latency(window, group_by, **filters)
+    })
\ No newline at end of file
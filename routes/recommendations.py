@@ -10,8 +10,11 @@ import json
 from flask import Blueprint, request, jsonify
 from datetime import datetime
 
+from config import FANOUT_ON_WRITE_ENABLED
 from db.connection import get_db_connection, get_cursor, USE_IN_MEMORY_DB
 from core.ranking_algorithm import generate_rankings_for_user
+from utils.feed_inbox import get_inbox
+from utils.seen_filter import mark_seen
 from utils.privacy import generate_user_alias
 from utils.logging_decorator import log_route
 
@@ -21,6 +24,39 @@ logger = logging.getLogger(__name__)
 # Create blueprint
 recommendations_bp = Blueprint('recommendations', __name__)
 
+def merge_inbox_rows(cur, user_alias, ranking_data, limit):
+    """
+    Merge a user's fan-out inbox into their cached ranking rows.
+    
+    Args:
+        cur: Database cursor
+        user_alias: Pseudonymized user ID
+        ranking_data: Rows from post_rankings joined with post_metadata
+        limit: Maximum number of rows to return
+        
+    Returns:
+        Rows in the same shape as ranking_data, highest score first
+    """
+    ranked_ids = {row[0] for row in ranking_data}
+    inbox = [entry for entry in get_inbox(cur.connection, user_alias, limit)
+             if entry[0] not in ranked_ids]
+    if not inbox:
+        return ranking_data
+    
+    cur.execute('''
+        SELECT post_id, mastodon_post, author_id, author_name, content, created_at, interaction_counts
+        FROM post_metadata
+        WHERE post_id = ANY(%s)
+    ''', ([post_id for post_id, _, _ in inbox],))
+    metadata = {row[0]: row[1:] for row in cur.fetchall()}
+    
+    inbox_rows = [
+        (post_id, score, reason) + metadata[post_id]
+        for post_id, score, reason in inbox if post_id in metadata
+    ]
+    merged = sorted(ranking_data + inbox_rows, key=lambda row: row[1], reverse=True)
+    return merged[:limit]
+
 @recommendations_bp.route('/rankings/generate', methods=['POST'])
 @log_route
 def generate_rankings():
@@ -232,6 +268,10 @@ def get_recommended_timeline():
                 
                 ranking_data = cur.fetchall()
                 
+                # Fan-out-on-write: fresh posts from high-affinity authors/tags
+                if FANOUT_ON_WRITE_ENABLED:
+                    ranking_data = merge_inbox_rows(cur, user_alias, list(ranking_data), limit)
+                
                 if not ranking_data:
                     # Try to auto-generate rankings
                     try:
@@ -311,6 +351,9 @@ def get_recommended_timeline():
                         recommendations.append(post_data)
                     except Exception as e:
                         logger.error(f"Error processing post {post_id}: {e}")
+                
+                # Record impressions so served posts are not ranked again
+                mark_seen(conn, user_alias, [post["id"] for post in recommendations])
     
     return jsonify(recommendations)
 
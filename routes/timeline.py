@@ -13,9 +13,11 @@ import os
 from datetime import datetime
 from urllib.parse import urljoin
 from flask import Blueprint, request, jsonify, Response
-import requests
 
 from utils.logging_decorator import log_route
+from utils.upstream import upstream_request
+from utils import timeline_microcache
+from utils.anonymous_timeline import anonymous_timeline_response
 from utils.timeline_injector import inject_into_timeline
 from utils.recommendation_engine import get_ranked_recommendations, load_cold_start_posts, is_new_user
 from utils.metrics import (
@@ -26,13 +28,16 @@ from utils.metrics import (
     track_recommendation_generation,
     track_recommendation_processing_time
 )
+from config import ANONYMOUS_TIMELINE_CONFIG, TIMELINE_FETCH_CONFIG
 from routes.proxy import (
     get_authenticated_user, 
     get_user_instance, 
     ALLOW_COLD_START_FOR_ANONYMOUS,
     should_exit_cold_start,
     should_reenter_cold_start,
-    generate_user_alias
+    generate_user_alias,
+    submit_timeline_task,
+    wait_for_branch
 )
 
 # Setup logger
@@ -42,9 +47,8 @@ timeline_logger = logging.getLogger("timeline_injection")
 # Create Blueprint
 timeline_bp = Blueprint('timeline', __name__)
 
-# Path to cold start posts JSON file
-COLD_START_DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 
-                                    'data', 'cold_start_formatted.json')
+# Strategies get_injection_strategy() knows by name
+INJECTION_STRATEGIES = ('uniform', 'after_n', 'first_only', 'tag_match')
 
 def load_json_file(filepath):
     """
@@ -254,6 +258,184 @@ def get_injection_strategy(user_id, is_anonymous, strategy_name=None):
     }
 
 
+def load_injectable_posts(user_id):
+    """
+    Get the posts to inject for a user, shared between nearby requests.
+    
+    Args:
+        user_id: User identifier, "anonymous" for anonymous sessions
+        
+    Returns:
+        tuple: (posts, source_type) as returned by load_injected_posts_for_user
+    """
+    return timeline_microcache.enrichment.get_or_fetch(
+        ('injectable_posts', user_id), lambda: load_injected_posts_for_user(user_id)
+    )
+
+
+def build_injected_timeline(request_id, user_id, is_anonymous, strategy_name, real_posts, injectable=None):
+    """
+    Blend injectable posts into a user's timeline.
+    
+    Args:
+        request_id: Request ID used in log lines
+        user_id: User identifier, "anonymous" for anonymous sessions
+        is_anonymous: Whether the session is anonymous
+        strategy_name: Requested injection strategy, if any
+        real_posts: The user's real timeline posts
+        injectable: (posts, source_type) loaded while the timeline was
+            fetched; loaded here if None
+        
+    Returns:
+        list: The merged timeline, or None if there were no posts to inject
+    """
+    # Get posts to inject
+    injectable_posts, source_type = injectable or load_injectable_posts(user_id)
+        
+    if injectable_posts:
+        # Get appropriate injection strategy
+        strategy = get_injection_strategy(user_id, is_anonymous, strategy_name)
+            
+        # Log injection attempt
+        logger.info(
+            f"INJECT-{request_id} | Injecting posts | "
+            f"User: {user_id} | "
+            f"Strategy: {strategy['type']} | "
+            f"Source: {source_type} | "
+            f"Available posts: {len(injectable_posts)}"
+        )
+            
+        # Add debug logs before injection
+        logger.debug(f"[DEBUG] Before injection: real_posts={len(real_posts)}, injectable_posts={len(injectable_posts)}")
+        logger.debug(f"[DEBUG] Strategy: {strategy}")
+            
+        # If real_posts is empty, we can still inject posts (important for cold start)
+        if not real_posts and injectable_posts:
+            logger.debug("[DEBUG] No real posts but have injectable posts - will create standalone timeline")
+            # Create a stub real post just to trigger injection
+            # This post will be removed later if not needed
+            real_posts = [{
+                "id": "stub_post",
+                "content": "Stub post for injection",
+                "created_at": datetime.now().isoformat(),
+                "account": {
+                    "id": "stub_account",
+                    "username": "stub",
+                    "display_name": "Stub Account",
+                    "url": "https://example.com/@stub"
+                },
+                "stub_for_injection": True
+            }]
+            
+        # Inject posts using timeline injector
+        logger.debug(f"[DEBUG] Calling inject_into_timeline with {len(real_posts)} real posts, {len(injectable_posts)} injectable posts, and strategy type {strategy.get('type', 'unknown')}")
+            
+        try:
+            start_time = time.time()
+            logger.info(f"[INFO] Starting inject_into_timeline with {len(real_posts)} real posts and {len(injectable_posts)} injectable posts")
+            merged_timeline = inject_into_timeline(real_posts, injectable_posts, strategy)
+            inject_time = time.time() - start_time
+                
+            # Track injection processing time
+            track_injection_processing_time(strategy['type'], inject_time)
+                
+            logger.debug(f"[DEBUG] inject_into_timeline returned {len(merged_timeline)} total posts")
+        except Exception as e:
+            import traceback
+            error_trace = traceback.format_exc()
+            logger.error(f"[ERROR] Timeline injection failed: {e}")
+            logger.error(f"[ERROR] Traceback: {error_trace}")
+            # If injection fails, use a fallback approach
+            merged_timeline = []
+            inject_time = time.time() - start_time
+            track_fallback('injection_error')
+            
+        # Remove stub post if it was added
+        merged_timeline = [post for post in merged_timeline if not post.get("stub_for_injection", False)]
+            
+        # If merged_timeline is empty but we had injectable posts, something went wrong
+        # Let's manually create a timeline with a subset of injectable posts
+        if not merged_timeline and injectable_posts:
+            logger.warning(f"[DEBUG] Timeline injection produced empty result despite having {len(injectable_posts)} injectable posts. Falling back to direct inclusion.")
+            # Create a new list for the timeline
+            merged_timeline = []
+            # Directly add injectable posts (up to max_injections)
+            max_posts = min(strategy.get("max_injections", 5), len(injectable_posts))
+            for i in range(max_posts):
+                if i < len(injectable_posts):  # Make sure we don't go out of bounds
+                    from copy import deepcopy
+                    post = deepcopy(injectable_posts[i])
+                    post["injected"] = True
+                    merged_timeline.append(post)
+            logger.debug(f"[DEBUG] Manually added {len(merged_timeline)} posts to timeline as fallback")
+            
+        # Ensure merged_timeline is a list before continuing
+        if not isinstance(merged_timeline, list):
+            logger.error(f"Expected merged_timeline to be a list but got {type(merged_timeline)}. Creating empty list instead.")
+            merged_timeline = []
+            
+        # Count injected posts - notice we're checking for injected=True, not defaulting to True
+        try:
+            injected_count = sum(1 for post in merged_timeline if post.get("injected") is True)
+            real_count = len(merged_timeline) - injected_count
+                
+            # Debug the result
+            logger.debug(f"[DEBUG] After injection: merged_timeline={len(merged_timeline)}, injected_count={injected_count}")
+                
+            # Log injection results
+            timeline_logger.info(
+                f"INJECTION-{request_id} | "
+                f"User: {generate_user_alias(user_id)} | "
+                f"Strategy: {strategy['type']} | "
+                f"Injected: {injected_count}/{len(injectable_posts)} | "
+                f"Total posts: {len(merged_timeline)} | "
+                f"Processing time: {inject_time:.3f}s"
+            )
+                
+            # Track metrics - wrap each call in try/except to ensure one failure doesn't prevent others
+            try:
+                track_injection(strategy['type'], source_type, injected_count)
+            except Exception as e:
+                logger.error(f"Error tracking injection metrics: {e}")
+                
+            try:
+                track_timeline_post_counts(real_count, injected_count)
+            except Exception as e:
+                logger.error(f"Error tracking timeline post counts: {e}")
+                
+            # Add extra metrics tracking
+            # This extra explicit tracking ensures metrics are incremented regardless of any side effects
+            try:
+                from utils.metrics import (
+                    INJECTED_POSTS_TOTAL, 
+                    TIMELINE_POST_COUNT, 
+                    INJECTION_RATIO
+                )
+                    
+                # Explicitly increment the metrics
+                INJECTED_POSTS_TOTAL.labels(strategy=strategy['type'], source=source_type).inc(injected_count)
+                TIMELINE_POST_COUNT.labels(post_type='real').set(real_count)
+                TIMELINE_POST_COUNT.labels(post_type='injected').set(injected_count)
+                    
+                if real_count + injected_count > 0:
+                    ratio = injected_count / (real_count + injected_count)
+                    INJECTION_RATIO.observe(ratio)
+            except Exception as e:
+                logger.error(f"Error setting explicit metrics: {e}")
+        except Exception as e:
+            logger.error(f"Error processing timeline metrics: {e}")
+                
+        return merged_timeline
+    
+    # Log that we couldn't inject posts
+    logger.warning(
+        f"NOINJECT-{request_id} | No injectable posts available | "
+        f"User: {user_id} | "
+        f"Source type: {source_type}"
+    )
+    return None
+
+
 @timeline_bp.route('/api/v1/timelines/home', methods=['GET'])
 @log_route
 def get_timeline():
@@ -303,14 +485,30 @@ def get_timeline():
         
         # Use "anonymous" as user_id for tracking
         user_id = "anonymous"
+        
+        # Every anonymous visitor gets the same timeline; serve it precomputed
+        if inject_posts and ANONYMOUS_TIMELINE_CONFIG['enabled']:
+            key = strategy_name if strategy_name in INJECTION_STRATEGIES else None
+            response = anonymous_timeline_response(
+                key, lambda: build_injected_timeline('precomputed', "anonymous", True, key, [])
+            )
+            if response is not None:
+                return response
     
     # Get the real timeline posts
     real_posts = []
+    injectable = None
     
     # For real users, attempt to proxy to their instance
     if not is_anonymous and not user_id.startswith('corgi_validator_') and not user_id.startswith('test_'):
         instance_url = get_user_instance(request)
         
+        # Load the posts to inject while the upstream request is in flight
+        injectable_future = None
+        if inject_posts:
+            injectable_deadline = time.time() + TIMELINE_FETCH_CONFIG['enrichment_timeout']
+            injectable_future = submit_timeline_task(load_injectable_posts, user_id)
+        
         try:
             # Build the target URL for the Mastodon instance
             target_url = urljoin(instance_url, f"/api/v1/timelines/home")
@@ -326,14 +524,17 @@ def get_timeline():
             if 'inject' in params:
                 del params['inject']
             
-            # Make the request to the Mastodon instance
+            # Make the request to the Mastodon instance; polls within a few
+            # seconds of each other share one upstream request
             upstream_start_time = time.time()
-            proxied_response = requests.request(
-                method='GET',
-                url=target_url,
-                headers=headers,
-                params=params,
-                timeout=10
+            proxied_response = timeline_microcache.fetch_timeline(
+                target_url, params, headers,
+                lambda: upstream_request(
+                    method='GET',
+                    url=target_url,
+                    headers=headers,
+                    params=params
+                )
             )
             upstream_time = time.time() - upstream_start_time
             
@@ -356,6 +557,10 @@ def get_timeline():
                 )
         except Exception as e:
             logger.error(f"ERROR-{request_id} | Timeline proxy failed: {e}")
+        
+        if injectable_future:
+            injectable = wait_for_branch(injectable_future, injectable_deadline, ([], 'timeout'),
+                                         request_id, 'Injectable posts')
     
     # For synthetic/validator users, create dummy timeline
     elif user_id.startswith('corgi_validator_') or user_id.startswith('test_'):
@@ -387,152 +592,12 @@ def get_timeline():
     
     # If we should inject posts
     if inject_posts:
-        # Get posts to inject
-        injectable_posts, source_type = load_injected_posts_for_user(user_id)
-        
-        if injectable_posts:
-            # Get appropriate injection strategy
-            strategy = get_injection_strategy(user_id, is_anonymous, strategy_name)
-            
-            # Log injection attempt
-            logger.info(
-                f"INJECT-{request_id} | Injecting posts | "
-                f"User: {user_id} | "
-                f"Strategy: {strategy['type']} | "
-                f"Source: {source_type} | "
-                f"Available posts: {len(injectable_posts)}"
-            )
-            
-            # Add debug logs before injection
-            logger.debug(f"[DEBUG] Before injection: real_posts={len(real_posts)}, injectable_posts={len(injectable_posts)}")
-            logger.debug(f"[DEBUG] Strategy: {strategy}")
-            
-            # If real_posts is empty, we can still inject posts (important for cold start)
-            if not real_posts and injectable_posts:
-                logger.debug("[DEBUG] No real posts but have injectable posts - will create standalone timeline")
-                # Create a stub real post just to trigger injection
-                # This post will be removed later if not needed
-                real_posts = [{
-                    "id": "stub_post",
-                    "content": "Stub post for injection",
-                    "created_at": datetime.now().isoformat(),
-                    "account": {
-                        "id": "stub_account",
-                        "username": "stub",
-                        "display_name": "Stub Account",
-                        "url": "https://example.com/@stub"
-                    },
-                    "stub_for_injection": True
-                }]
-            
-            # Inject posts using timeline injector
-            logger.debug(f"[DEBUG] Calling inject_into_timeline with {len(real_posts)} real posts, {len(injectable_posts)} injectable posts, and strategy type {strategy.get('type', 'unknown')}")
-            
-            try:
-                start_time = time.time()
-                logger.info(f"[INFO] Starting inject_into_timeline with {len(real_posts)} real posts and {len(injectable_posts)} injectable posts")
-                merged_timeline = inject_into_timeline(real_posts, injectable_posts, strategy)
-                inject_time = time.time() - start_time
-                
-                # Track injection processing time
-                track_injection_processing_time(strategy['type'], inject_time)
-                
-                logger.debug(f"[DEBUG] inject_into_timeline returned {len(merged_timeline)} total posts")
-            except Exception as e:
-                import traceback
-                error_trace = traceback.format_exc()
-                logger.error(f"[ERROR] Timeline injection failed: {e}")
-                logger.error(f"[ERROR] Traceback: {error_trace}")
-                # If injection fails, use a fallback approach
-                merged_timeline = []
-                inject_time = time.time() - start_time
-                track_fallback('injection_error')
-            
-            # Remove stub post if it was added
-            merged_timeline = [post for post in merged_timeline if not post.get("stub_for_injection", False)]
-            
-            # If merged_timeline is empty but we had injectable posts, something went wrong
-            # Let's manually create a timeline with a subset of injectable posts
-            if not merged_timeline and injectable_posts:
-                logger.warning(f"[DEBUG] Timeline injection produced empty result despite having {len(injectable_posts)} injectable posts. Falling back to direct inclusion.")
-                # Create a new list for the timeline
-                merged_timeline = []
-                # Directly add injectable posts (up to max_injections)
-                max_posts = min(strategy.get("max_injections", 5), len(injectable_posts))
-                for i in range(max_posts):
-                    if i < len(injectable_posts):  # Make sure we don't go out of bounds
-                        from copy import deepcopy
-                        post = deepcopy(injectable_posts[i])
-                        post["injected"] = True
-                        merged_timeline.append(post)
-                logger.debug(f"[DEBUG] Manually added {len(merged_timeline)} posts to timeline as fallback")
-            
-            # Ensure merged_timeline is a list before continuing
-            if not isinstance(merged_timeline, list):
-                logger.error(f"Expected merged_timeline to be a list but got {type(merged_timeline)}. Creating empty list instead.")
-                merged_timeline = []
-            
-            # Count injected posts - notice we're checking for injected=True, not defaulting to True
-            try:
-                injected_count = sum(1 for post in merged_timeline if post.get("injected") is True)
-                real_count = len(merged_timeline) - injected_count
-                
-                # Debug the result
-                logger.debug(f"[DEBUG] After injection: merged_timeline={len(merged_timeline)}, injected_count={injected_count}")
-                
-                # Log injection results
-                timeline_logger.info(
-                    f"INJECTION-{request_id} | "
-                    f"User: {generate_user_alias(user_id)} | "
-                    f"Strategy: {strategy['type']} | "
-                    f"Injected: {injected_count}/{len(injectable_posts)} | "
-                    f"Total posts: {len(merged_timeline)} | "
-                    f"Processing time: {inject_time:.3f}s"
-                )
-                
-                # Track metrics - wrap each call in try/except to ensure one failure doesn't prevent others
-                try:
-                    track_injection(strategy['type'], source_type, injected_count)
-                except Exception as e:
-                    logger.error(f"Error tracking injection metrics: {e}")
-                
-                try:
-                    track_timeline_post_counts(real_count, injected_count)
-                except Exception as e:
-                    logger.error(f"Error tracking timeline post counts: {e}")
-                
-                # Add extra metrics tracking
-                # This extra explicit tracking ensures metrics are incremented regardless of any side effects
-                try:
-                    from utils.metrics import (
-                        INJECTED_POSTS_TOTAL, 
-                        TIMELINE_POST_COUNT, 
-                        INJECTION_RATIO
-                    )
-                    
-                    # Explicitly increment the metrics
-                    INJECTED_POSTS_TOTAL.labels(strategy=strategy['type'], source=source_type).inc(injected_count)
-                    TIMELINE_POST_COUNT.labels(post_type='real').set(real_count)
-                    TIMELINE_POST_COUNT.labels(post_type='injected').set(injected_count)
-                    
-                    if real_count + injected_count > 0:
-                        ratio = injected_count / (real_count + injected_count)
-                        INJECTION_RATIO.observe(ratio)
-                except Exception as e:
-                    logger.error(f"Error setting explicit metrics: {e}")
-            except Exception as e:
-                logger.error(f"Error processing timeline metrics: {e}")
-                
+        merged_timeline = build_injected_timeline(request_id, user_id, is_anonymous, strategy_name, real_posts,
+                                                  injectable)
+        if merged_timeline is not None:
             # Just return the merged timeline directly as an array
             # This matches the format expected by Elk and other Mastodon clients
             return jsonify(merged_timeline)
-        else:
-            # Log that we couldn't inject posts
-            logger.warning(
-                f"NOINJECT-{request_id} | No injectable posts available | "
-                f"User: {user_id} | "
-                f"Source type: {source_type}"
-            )
     
     # If we're here, we're not injecting or had no posts to inject
     # Just return the original timeline
@@ -0,0 +1,111 @@
+"""
+Tests for the async (ASGI) proxy serving mode.
+"""
+
+import json
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from routes.async_proxy import create_asgi_app
+from utils.timeline_microcache import clear_microcaches
+
+
+class _Body(httpx.AsyncByteStream):
+    """Unread upstream body, as a real network response would have."""
+
+    def __init__(self, data):
+        self.data = data
+
+    async def __aiter__(self):
+        yield self.data
+
+
+def _upstream(request):
+    """Stand-in Mastodon instance."""
+    if request.url.path == "/api/v1/statuses/fail":
+        raise httpx.ConnectError("Connection refused", request=request)
+    if request.url.path == "/api/v1/custom_emojis":
+        _upstream.emoji_calls += 1
+        return httpx.Response(
+            200,
+            headers={
+                "Content-Type": "application/json",
+                "Content-Length": "2",
+                "Cache-Control": "max-age=60",
+            },
+            stream=_Body(b"[]"),
+        )
+    return httpx.Response(
+        200,
+        headers={"Content-Type": "application/json", "Connection": "keep-alive"},
+        stream=_Body(
+            json.dumps(
+                {"path": request.url.path, "auth": request.headers.get("Authorization")}
+            ).encode()
+        ),
+    )
+
+
+_upstream.emoji_calls = 0
+
+
+@pytest.fixture
+def asgi_client(app):
+    """ASGI test client with upstream calls served by a mock transport."""
+    clear_microcaches()
+    with patch("routes.proxy.get_user_by_token", return_value=None):
+        with TestClient(create_asgi_app(app, transport=httpx.MockTransport(_upstream))) as client:
+            yield client
+
+
+def test_passthrough_is_proxied_asynchronously(asgi_client):
+    """Test that catch-all proxy routes are served by the async app."""
+    response = asgi_client.get(
+        "/api/v1/statuses/123/context",
+        headers={
+            "X-Mastodon-Instance": "https://mastodon.social",
+            "Authorization": "Bearer token123",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"path": "/api/v1/statuses/123/context", "auth": "Bearer token123"}
+    assert "connection" not in response.headers
+
+
+def test_upstream_failure_returns_502(asgi_client):
+    """Test that upstream connection errors become a 502 like the Flask proxy."""
+    response = asgi_client.get(
+        "/api/v1/statuses/fail", headers={"X-Mastodon-Instance": "https://mastodon.social"}
+    )
+
+    assert response.status_code == 502
+    assert "Connection refused" in response.json()["details"]
+
+
+def test_other_routes_are_served_by_flask(asgi_client):
+    """Test that non-proxy endpoints keep going to the Flask app."""
+    response = asgi_client.get("/api/v1/status")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+
+
+def test_cacheable_get_is_served_from_cache(asgi_client):
+    """Test that the async proxy shares the upstream response cache."""
+    from utils.upstream_cache import clear_upstream_cache
+
+    clear_upstream_cache()
+    _upstream.emoji_calls = 0
+    headers = {"X-Mastodon-Instance": "https://mastodon.social"}
+
+    assert asgi_client.get("/api/v1/custom_emojis", headers=headers).headers["x-cache"] == "MISS"
+    response = asgi_client.get("/api/v1/custom_emojis", headers=headers)
+
+    assert response.headers["x-cache"] == "HIT"
+    assert response.json() == []
+    assert _upstream.emoji_calls == 1
+    clear_upstream_cache()
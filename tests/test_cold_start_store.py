@@ -0,0 +1,72 @@
+"""
+Tests for the cold start content store.
+"""
+
+import json
+import os
+
+import pytest
+
+from utils import cold_start_store
+from utils.cold_start_store import clear_cold_start_stores, get_cold_start_store
+
+POSTS = [
+    {
+        "id": f"cold_{i}",
+        "content": f"Post {i}",
+        "category": "pets" if i % 2 else "tech",
+        "tags": ["Corgi"] if i < 2 else [{"name": "python"}],
+    }
+    for i in range(6)
+]
+
+
+@pytest.fixture
+def posts_file(tmp_path, monkeypatch):
+    """A cold start file checked for changes on every access."""
+    monkeypatch.setattr(cold_start_store, "COLD_START_RELOAD_CHECK_SECONDS", 0)
+    clear_cold_start_stores()
+    path = tmp_path / "cold_start.json"
+    path.write_text(json.dumps(POSTS + [{"content": "no id"}, POSTS[0]]))
+    yield path
+    clear_cold_start_stores()
+
+
+def test_indexes_and_sampling(posts_file):
+    """Test lookups by id, category and tag, and distinct samples."""
+    store = get_cold_start_store(str(posts_file))
+    assert get_cold_start_store(str(posts_file)) is store
+
+    # The post without an id and the duplicate are skipped
+    assert len(store) == 6
+    assert store.stats()["invalid_posts"] == 2
+    assert store.get("cold_3")["content"] == "Post 3"
+    assert store.get("missing") is None
+    assert [post["id"] for post in store.by_category("pets")] == ["cold_1", "cold_3", "cold_5"]
+    assert [post["id"] for post in store.by_tag("CORGI")] == ["cold_0", "cold_1"]
+    assert sorted(store.categories()) == ["pets", "tech"]
+
+    sample = store.sample(3, exclude_ids={"cold_0", "cold_1"})
+    assert len(sample) == 3 and len({post["id"] for post in sample}) == 3
+    assert not {"cold_0", "cold_1"} & {post["id"] for post in sample}
+    assert [post["id"] for post in store.sample(5, category="tech", tag="corgi")] == ["cold_0"]
+
+    # Callers get copies
+    store.get("cold_3")["content"] = "changed"
+    assert store.get("cold_3")["content"] == "Post 3"
+
+
+def test_reloads_changed_file_and_keeps_last_good_posts(posts_file):
+    """Test that a rewritten file is picked up and a broken one is ignored."""
+    store = get_cold_start_store(str(posts_file))
+    assert len(store) == 6
+
+    posts_file.write_text(json.dumps(POSTS[:2]))
+    assert [post["id"] for post in store.posts()] == ["cold_0", "cold_1"]
+
+    posts_file.write_text('{"not": "a list"')
+    stat = os.stat(posts_file)
+    os.utime(posts_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert len(store) == 2
+    assert store.last_error
+    assert store.stats()["loads"] == 2
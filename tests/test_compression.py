@@ -0,0 +1,81 @@
+"""
+Tests for adaptive response compression.
+"""
+
+import gzip
+import json
+from unittest.mock import patch
+
+import pytest
+from flask import Flask, Response, jsonify
+from werkzeug.datastructures import Accept
+
+from utils import compression
+from utils.compression import choose_encoding, compress_response
+
+LARGE = {"timeline": [{"id": str(i), "content": "<p>Hello fediverse</p>" * 5} for i in range(100)]}
+
+
+@pytest.fixture
+def compressing_client():
+    """A Flask app with the compression hook and a few routes."""
+    app = Flask(__name__)
+    app.after_request(compress_response)
+
+    @app.route("/large")
+    def large():
+        return jsonify(LARGE)
+
+    @app.route("/small")
+    def small():
+        return jsonify({"status": "ok"})
+
+    @app.route("/encoded")
+    def encoded():
+        return Response(
+            b"\x1f\x8b" + b"0" * 4096,
+            mimetype="application/json",
+            headers={"Content-Encoding": "gzip"},
+        )
+
+    @app.route("/streamed")
+    def streamed():
+        return Response((b"[]" for _ in range(1)), mimetype="application/json")
+
+    return app.test_client()
+
+
+def test_large_json_is_gzipped(compressing_client):
+    """Test that large JSON bodies are compressed for clients that accept gzip."""
+    response = compressing_client.get("/large", headers={"Accept-Encoding": "gzip, deflate"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert int(response.headers["Content-Length"]) == len(response.data)
+    assert json.loads(gzip.decompress(response.data)) == LARGE
+
+
+def test_skipped_responses(compressing_client):
+    """Test that small, already encoded, streamed and unaccepted responses are left alone."""
+    plain = compressing_client.get("/large")
+    assert "Content-Encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    small = compressing_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+
+    encoded = compressing_client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+    assert encoded.data == b"\x1f\x8b" + b"0" * 4096
+
+    streamed = compressing_client.get("/streamed", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in streamed.headers
+
+
+def test_choose_encoding_prefers_available_brotli():
+    """Test that brotli is only chosen when it is installed and accepted."""
+    accepts = Accept([("br", 1), ("gzip", 0.5)])
+    with patch.object(compression, "BROTLI_AVAILABLE", False):
+        assert choose_encoding(accepts) == "gzip"
+    with patch.object(compression, "BROTLI_AVAILABLE", True):
+        assert choose_encoding(accepts) == "br"
+    assert choose_encoding(Accept([("identity", 1)])) is None
@@ -0,0 +1,134 @@
+"""
+Tests for the fan-out-on-write feed inbox.
+"""
+
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from utils.feed_inbox import (
+    AUTHOR_REASON,
+    fanout_post,
+    get_fanout_stats,
+    get_inbox,
+    rebuild_affinity_index,
+    record_affinities,
+)
+
+
+@pytest.fixture(autouse=True)
+def fanout_config():
+    with patch.dict(
+        "utils.feed_inbox.FANOUT_CONFIG",
+        {"inbox_size": 2, "inbox_ttl_hours": 24, "min_affinity": 2, "max_recipients": 10},
+    ):
+        yield
+
+
+@pytest.fixture
+def mock_db_conn():
+    """Create a mock database connection."""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.__enter__.return_value = mock_conn
+    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.__enter__.return_value = mock_cursor
+    return mock_conn, mock_cursor
+
+
+@patch("utils.feed_inbox.execute_values")
+def test_record_affinities_sums_and_drops_exhausted(mock_execute_values, mock_db_conn):
+    """Test that deltas are summed per key and rows at zero are deleted."""
+    mock_conn, _ = mock_db_conn
+    mock_execute_values.return_value = [
+        ("author", "author1", "fan", 0.0),
+        ("tag", "python", "fan", 1.0),
+    ]
+
+    assert (
+        record_affinities(
+            mock_conn,
+            [
+                ("fan", "author1", ["Python", "python"], "favorite"),
+                ("fan", "author1", [], "favorite"),
+                ("fan", "author1", [], "less_like_this"),
+                ("fan", "author1", [], "view"),
+            ],
+        )
+        is True
+    )
+
+    upsert, delete = mock_execute_values.call_args_list
+    assert upsert.args[2] == [("author", "author1", "fan", 0.0), ("tag", "python", "fan", 1.0)]
+    assert delete.args[2] == [("author", "author1", "fan")]
+    mock_conn.commit.assert_called_once()
+
+
+@patch("utils.feed_inbox.execute_values")
+def test_rebuild_locks_before_reading(mock_execute_values, mock_db_conn):
+    """Test that the table is locked before interactions are read, so no update lands in between."""
+    mock_conn, mock_cursor = mock_db_conn
+    mock_cursor.fetchall.return_value = [("fan", "author1", ["python"], "favorite")]
+    mock_execute_values.return_value = []
+
+    assert rebuild_affinity_index(mock_conn) == 1
+
+    statements = [call.args[0].strip() for call in mock_cursor.execute.call_args_list]
+    assert statements[0] == "LOCK TABLE user_affinities IN EXCLUSIVE MODE"
+    assert statements[1].startswith("SELECT") and statements[2] == "DELETE FROM user_affinities"
+    mock_conn.commit.assert_called_once()
+
+
+@patch("utils.feed_inbox.execute_values")
+def test_fanout_reaches_high_affinity_users_with_their_reason(mock_execute_values, mock_db_conn):
+    """Test that only users over the threshold receive the post, each with the affinity that caused it."""
+    mock_conn, mock_cursor = mock_db_conn
+    mock_cursor.fetchall.side_effect = [
+        [
+            ("fan", "author", "author1", 3.0),
+            ("tag_fan", "tag", "python", 4.0),
+            ("tag_fan", "author", "author1", 1.0),
+            ("casual", "author", "author1", 1.0),
+        ],
+        [("post1",)],  # evicted from one inbox that was already full of stronger posts
+    ]
+    mock_execute_values.return_value = [("fan",), ("tag_fan",)]
+
+    assert fanout_post(mock_conn, "post1", "author1", ["Python"]) == 1
+
+    delivered = {row[0]: row[3] for row in mock_execute_values.call_args.args[2]}
+    assert delivered == {"fan": AUTHOR_REASON, "tag_fan": "Because you engage with #python"}
+    assert mock_cursor.execute.call_args_list[0].args[1] == ("author1", ["python"])
+    mock_conn.commit.assert_called_once()
+
+
+def test_fanout_failure_is_rolled_back(mock_db_conn):
+    """Test that a database error delivers nothing and leaves no open transaction."""
+    mock_conn, mock_cursor = mock_db_conn
+    mock_cursor.execute.side_effect = Exception("relation does not exist")
+
+    assert fanout_post(mock_conn, "post1", "author1") == 0
+    mock_conn.rollback.assert_called_once()
+
+
+def test_get_inbox_scores_by_preference_and_recency(mock_db_conn):
+    """Test that inbox entries are ordered by score and keep their reasons."""
+    mock_conn, mock_cursor = mock_db_conn
+    now = time.time()
+    mock_cursor.fetchall.return_value = [
+        ("weak", 0.2, now, AUTHOR_REASON),
+        ("strong", 0.9, now - 3600, "Because you engage with #python"),
+    ]
+
+    inbox = get_inbox(mock_conn, "fan")
+
+    assert [(post_id, reason) for post_id, _, reason in inbox] == [
+        ("strong", "Because you engage with #python"),
+        ("weak", AUTHOR_REASON),
+    ]
+    assert get_inbox(mock_conn, "fan", limit=1)[0][0] == "strong"
+
+    mock_cursor.fetchone.return_value = (1, 2)
+    stats = get_fanout_stats(mock_conn)
+    assert stats["inboxes"] == 1 and stats["inbox_entries"] == 2
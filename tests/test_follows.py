@@ -0,0 +1,94 @@
+"""
+Tests for the cached follow status used by the cold start decision.
+"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from utils.follows import (
+    _follow_status,
+    clear_follow_status,
+    record_follow_change,
+    user_follows_anyone,
+)
+from utils.identity import Identity
+
+IDENTITY = Identity("user123", "alias123", "https://example.org", "42", "read", "full")
+
+
+def _following_response(accounts):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = accounts
+    return response
+
+
+@pytest.fixture
+def follows():
+    """Empty follow status cache with a known identity for 'token123'."""
+    clear_follow_status()
+    with patch("utils.follows.get_identity", return_value=IDENTITY):
+        with patch("utils.follows.upstream_request") as mock_request:
+            yield mock_request
+    clear_follow_status()
+
+
+def test_follow_status_is_cached(follows):
+    """Test that only the first check probes the user's instance."""
+    follows.return_value = _following_response([{"id": "1"}])
+
+    assert user_follows_anyone("token123") is True
+    assert user_follows_anyone("token123") is True
+
+    follows.assert_called_once()
+    assert "accounts/42/following?limit=1" in follows.call_args[0][1]
+
+
+def test_expired_status_is_served_while_refreshing(follows):
+    """Test that an expired answer is returned and refreshed in the background."""
+    follows.return_value = _following_response([])
+    assert user_follows_anyone("token123") is False
+
+    # Expire the entry; the refresh finds a follow
+    _follow_status["user123"] = (0, False)
+    follows.return_value = _following_response([{"id": "1"}])
+
+    with patch("utils.follows._probe_executor") as mock_executor:
+        assert user_follows_anyone("token123") is False
+        mock_executor.submit.assert_called_once()
+
+
+def test_failed_probe_is_not_cached(follows):
+    """Test that instance errors default to True without caching the guess."""
+    follows.return_value = MagicMock(status_code=503)
+
+    assert user_follows_anyone("token123") is True
+    assert "user123" not in _follow_status
+
+
+def test_follow_and_unfollow_update_the_cache(follows):
+    """Test that follows mark the user and unfollows re-probe."""
+    record_follow_change("token123", True)
+    assert user_follows_anyone("token123") is True
+    follows.assert_not_called()
+
+    follows.return_value = _following_response([])
+    with patch("utils.follows._probe_executor") as mock_executor:
+        record_follow_change("token123", False)
+        mock_executor.submit.assert_called_once()
+    assert "user123" not in _follow_status
+
+
+@patch("routes.proxy.upstream_request")
+def test_proxied_follow_updates_the_cache(mock_request, client):
+    """Test that a follow passing through the proxy is recorded."""
+    clear_follow_status()
+    mock_request.return_value = MagicMock(status_code=200)
+
+    with patch("utils.follows.get_identity", return_value=IDENTITY):
+        with patch("routes.proxy.get_user_by_token", return_value=None):
+            client.post("/api/v1/accounts/99/follow", headers={"Authorization": "Bearer token123"})
+
+    assert _follow_status["user123"][1] is True
+    clear_follow_status()
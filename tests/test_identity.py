@@ -0,0 +1,101 @@
+"""
+Tests for the identity cache and request-scoped identity resolution.
+"""
+
+import time
+from unittest.mock import patch
+
+import pytest
+
+from routes.proxy import get_authenticated_user, get_user_by_token, get_user_instance
+from utils.identity import (
+    cache_identity,
+    clear_identity_cache,
+    get_cached_identity,
+    get_identity_cache_stats,
+    invalidate_identity,
+)
+
+USER_INFO = {
+    "user_id": "user123",
+    "instance_url": "https://example.org",
+    "mastodon_id": "42",
+    "token_scope": "read write",
+    "privacy_level": "full",
+}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """Start and end each test with an empty identity cache."""
+    clear_identity_cache()
+    yield
+    clear_identity_cache()
+
+
+def test_entries_expire():
+    """Test that cached identities are dropped after their TTL."""
+    with patch.dict("utils.identity.IDENTITY_CACHE_CONFIG", {"ttl_seconds": 60}):
+        cache_identity("token_a", USER_INFO)
+    assert get_cached_identity("token_a") == USER_INFO
+
+    with patch("utils.identity.time") as mock_time:
+        mock_time.time.return_value = time.time() + 61
+        assert get_cached_identity("token_a") is None
+
+    stats = get_identity_cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    """Test that the cache stays within max_entries."""
+    with patch.dict("utils.identity.IDENTITY_CACHE_CONFIG", {"max_entries": 2}):
+        cache_identity("token_a", USER_INFO)
+        cache_identity("token_b", USER_INFO)
+        get_cached_identity("token_a")
+        cache_identity("token_c", USER_INFO)
+
+    assert get_cached_identity("token_a") is not None
+    assert get_cached_identity("token_b") is None
+    assert get_cached_identity("token_c") is not None
+
+
+def test_invalidate_by_token_and_user():
+    """Test dropping one token's entry and every entry of a user."""
+    cache_identity("token_a", USER_INFO)
+    cache_identity("token_b", USER_INFO)
+    cache_identity("token_c", dict(USER_INFO, user_id="other"))
+
+    assert invalidate_identity(token="token_a") == 1
+    assert invalidate_identity(user_id="user123") == 1
+    assert get_cached_identity("token_b") is None
+    assert get_cached_identity("token_c") is not None
+
+
+def test_cached_token_skips_the_database():
+    """Test that a cached token resolves without a database lookup."""
+    cache_identity("token_a", USER_INFO)
+
+    with patch("routes.proxy.get_db_connection") as mock_conn:
+        user_info = get_user_by_token("token_a")
+
+    mock_conn.assert_not_called()
+    assert user_info["user_id"] == "user123"
+    assert user_info["access_token"] == "token_a"
+
+
+@patch("routes.proxy.get_user_by_token")
+def test_identity_is_resolved_once_per_request(mock_get_user, app):
+    """Test that instance and user lookups share one token resolution."""
+    mock_get_user.return_value = dict(USER_INFO)
+
+    with app.test_request_context(headers={"Authorization": "Bearer test_token"}):
+        from flask import request
+
+        assert get_authenticated_user(request) == "user123"
+        assert get_user_instance(request) == "https://example.org"
+        assert get_authenticated_user(request) == "user123"
+
+    mock_get_user.assert_called_once_with("test_token")
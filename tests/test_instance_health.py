@@ -0,0 +1,143 @@
+"""
+Tests for per-instance health tracking, the circuit breaker and hedged GETs.
+"""
+
+import json
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from config import PROXY_TIMEOUT
+from utils import instance_health
+from utils.instance_health import InstanceUnavailable
+from utils.upstream import upstream_request
+
+URL = "https://slow.example/api/v1/timelines/public"
+
+
+@pytest.fixture(autouse=True)
+def healthy():
+    """Start and end each test with every circuit closed."""
+    instance_health.reset_instance_health()
+    yield
+    instance_health.reset_instance_health()
+
+
+def _trip():
+    for _ in range(instance_health.INSTANCE_HEALTH_CONFIG["consecutive_failures"]):
+        instance_health.record_failure(URL)
+
+
+def test_circuit_opens_and_recovers():
+    """Test that repeated failures open the circuit and a successful probe closes it."""
+    _trip()
+    with pytest.raises(InstanceUnavailable) as raised:
+        instance_health.acquire(URL)
+    assert raised.value.retry_after <= instance_health.INSTANCE_HEALTH_CONFIG["open_seconds"]
+    assert instance_health.get_instance_health()["slow.example"]["state"] == "open"
+
+    # After open_seconds one probe is let through with the full timeout
+    later = time.time() + instance_health.INSTANCE_HEALTH_CONFIG["open_seconds"] + 1
+    with patch("utils.instance_health.time.time", return_value=later):
+        assert instance_health.acquire(URL) == PROXY_TIMEOUT
+        with pytest.raises(InstanceUnavailable):
+            instance_health.acquire(URL)
+        instance_health.record_response(URL, 200, 0.1)
+
+    assert instance_health.get_instance_health()["slow.example"]["state"] == "closed"
+    instance_health.acquire(URL)
+
+
+def test_timeout_adapts_to_p99():
+    """Test that the timeout follows observed latency within its bounds."""
+    assert instance_health.acquire(URL) == PROXY_TIMEOUT
+
+    for _ in range(50):
+        instance_health.record_response(URL, 200, 0.2)
+    with patch.dict("utils.instance_health.INSTANCE_HEALTH_CONFIG", {"min_timeout_seconds": 0.1}):
+        assert instance_health.acquire(URL) == pytest.approx(0.6)
+    assert (
+        instance_health.acquire(URL)
+        == instance_health.INSTANCE_HEALTH_CONFIG["min_timeout_seconds"]
+    )
+
+    health = instance_health.get_instance_health()["slow.example"]
+    assert health["p99_ms"] == pytest.approx(200)
+    assert health["error_rate"] == 0.0
+
+
+@patch("utils.upstream.get_session")
+def test_open_circuit_fails_fast(mock_session):
+    """Test that requests to an open instance are not sent."""
+    _trip()
+    with pytest.raises(InstanceUnavailable):
+        upstream_request("GET", URL)
+    mock_session.assert_not_called()
+    assert instance_health.get_instance_health()["slow.example"]["rejected"] == 1
+
+
+@patch("utils.upstream.get_session")
+def test_hedged_get_returns_first_response(mock_session):
+    """Test that a slow GET is hedged and the faster copy wins."""
+    for _ in range(20):
+        instance_health.record_response(URL, 200, 0.01)
+
+    slow = MagicMock(status_code=200)
+    fast = MagicMock(status_code=200)
+    calls = []
+    released = threading.Event()
+
+    def request(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            released.wait(2)
+            return slow
+        return fast
+
+    mock_session.return_value.request.side_effect = request
+    with patch.dict("utils.upstream.INSTANCE_HEALTH_CONFIG", {"hedge_enabled": True}):
+        assert upstream_request("GET", URL) is fast
+    released.set()
+
+    assert len(calls) == 2
+    assert instance_health.get_instance_health()["slow.example"]["hedge_wins"] == 1
+    for _ in range(50):
+        if slow.close.called:
+            break
+        time.sleep(0.01)
+    slow.close.assert_called_once()
+
+
+@patch("utils.upstream.get_session")
+def test_writes_keep_the_full_timeout(mock_session):
+    """Test that non-GETs get PROXY_TIMEOUT and their timeouts do not count as failures."""
+    for _ in range(50):
+        instance_health.record_response(URL, 200, 0.2)
+    mock_session.return_value.request.side_effect = requests.ReadTimeout()
+
+    for _ in range(instance_health.INSTANCE_HEALTH_CONFIG["consecutive_failures"]):
+        with pytest.raises(requests.ReadTimeout):
+            upstream_request("POST", URL, data=b"media")
+    assert mock_session.return_value.request.call_args.kwargs["timeout"] == PROXY_TIMEOUT
+
+    health = instance_health.get_instance_health()["slow.example"]
+    assert health["state"] == "closed"
+    assert health["error_rate"] == 0.0
+    assert instance_health.acquire(URL) < PROXY_TIMEOUT
+
+
+@patch("routes.proxy.upstream_request", side_effect=InstanceUnavailable("mastodon.social", 12))
+def test_proxy_fails_fast_and_reports_status(mock_request, client):
+    """Test that an open circuit answers 503 with Retry-After and shows on the status endpoint."""
+    response = client.get(
+        "/api/v1/statuses/1/context", headers={"X-Mastodon-Instance": "https://mastodon.social"}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "12"
+
+    _trip()
+    status = json.loads(client.get("/api/v1/status").data)
+    assert status["instances"]["slow.example"]["state"] == "open"
@@ -0,0 +1,127 @@
+"""
+Tests for the write-behind interaction queue.
+"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from utils import interaction_writer
+from utils.interaction_writer import (
+    InteractionEvent,
+    enqueue_interaction,
+    flush_interactions,
+    get_interaction_writer_stats,
+    stop_interaction_writer,
+    write_interactions,
+)
+
+
+def _event(post_id="post1", action_type="favorite", user="user1", privacy_level="full"):
+    return InteractionEvent(
+        user_id=user,
+        user_alias=f"alias_{user}",
+        privacy_level=privacy_level,
+        post_id=post_id,
+        action_type=action_type,
+        context={"source": "mastodon_proxy"},
+        post_data={
+            "id": post_id,
+            "account": {"id": "author1", "username": "author"},
+            "tags": [{"name": "corgi"}],
+        },
+    )
+
+
+@pytest.fixture
+def mock_db():
+    """Patch the database connection and batch statements."""
+    mock_conn = MagicMock()
+    mock_conn.__enter__.return_value = mock_conn
+    with patch("utils.interaction_writer.get_db_connection", return_value=mock_conn), patch(
+        "utils.interaction_writer.execute_values", return_value=[("post1",)]
+    ) as mock_values, patch("utils.interaction_writer.mark_seen") as mock_seen:
+        yield mock_conn, mock_values, mock_seen
+
+
+@pytest.fixture(autouse=True)
+def stopped_writer():
+    """Leave no writer thread or queued events behind."""
+    yield
+    stop_interaction_writer()
+
+
+def test_batch_is_written_in_one_transaction(mock_db):
+    """Test that a batch becomes one commit of multi-row statements."""
+    mock_conn, mock_values, mock_seen = mock_db
+    events = [
+        _event("post1"),
+        _event("post1"),
+        _event("post2", "bookmark"),
+        _event("post1", user="user2"),
+    ]
+
+    assert write_interactions(events) == 4
+    mock_conn.commit.assert_called_once()
+
+    metadata, interactions, favorites, bookmarks = mock_values.call_args_list
+    assert [row[0] for row in metadata[0][2]] == ["post1", "post2"]
+    # The repeated interaction is upserted once
+    assert len(interactions[0][2]) == 3
+    assert favorites[0][2] == [("post1", "favorites", 3)]
+    assert bookmarks[0][2] == [("post2", "bookmarks", 1)]
+    mock_seen.assert_any_call(mock_conn, "alias_user1", ["post1", "post1", "post2"])
+
+
+def test_privacy_none_is_skipped(mock_db):
+    """Test that users who opted out are not logged and unknown privacy is looked up."""
+    mock_conn, mock_values, _ = mock_db
+    with patch(
+        "utils.interaction_writer.get_user_privacy_level", return_value="none"
+    ) as mock_privacy:
+        assert write_interactions([_event(privacy_level=None)]) == 0
+
+    mock_privacy.assert_called_once_with(mock_conn, "user1")
+    mock_values.assert_not_called()
+    assert get_interaction_writer_stats()["skipped_privacy"] >= 1
+
+
+def test_failed_batch_is_retried_singly(mock_db):
+    """Test that one bad event does not lose the rest of its batch."""
+    mock_conn, _, _ = mock_db
+    written = []
+
+    def write_batch(conn, events):
+        if len(events) > 1 or events[0].post_id == "bad":
+            raise ValueError("bad row")
+        written.append(events[0].post_id)
+        return set()
+
+    with patch("utils.interaction_writer._write_batch", side_effect=write_batch):
+        assert write_interactions([_event("post1"), _event("bad"), _event("post2")]) == 2
+
+    assert written == ["post1", "post2"]
+    assert mock_conn.rollback.call_count == 2
+
+
+def test_queue_drains_in_background_and_overflows_inline(mock_db):
+    """Test that queued events are flushed and a full queue writes synchronously."""
+    mock_conn, _, _ = mock_db
+    assert enqueue_interaction(_event("post1")) is True
+    assert flush_interactions(timeout=5) is True
+    assert mock_conn.commit.called
+
+    stop_interaction_writer()
+    overflows = get_interaction_writer_stats()["overflows"]
+    # No writer thread may start on the stand-in queue: it would drain it
+    # and call task_done() on the real one afterwards
+    with patch.object(
+        interaction_writer,
+        "_queue",
+        MagicMock(put=MagicMock(side_effect=interaction_writer.queue.Full)),
+    ), patch("utils.interaction_writer.start_interaction_writer"), patch(
+        "utils.interaction_writer.write_interactions"
+    ) as mock_write:
+        assert enqueue_interaction(_event("post2")) is False
+    mock_write.assert_called_once()
+    assert get_interaction_writer_stats()["overflows"] == overflows + 1
@@ -0,0 +1,47 @@
+"""
+Tests for the interning registry.
+"""
+
+import pytest
+
+import utils.interning as interning
+from utils.interning import intern_id, intern_ids, lookup_id, resolve_id
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    """Give each test an empty registry and restore the shared one afterwards."""
+    saved = (interning._ids, interning._values)
+    interning._ids = {namespace: {} for namespace in interning.NAMESPACES}
+    interning._values = {namespace: [] for namespace in interning.NAMESPACES}
+    yield
+    interning._ids, interning._values = saved
+
+
+def test_intern_assigns_dense_ids_per_namespace():
+    """Test that ids are dense, stable and independent per namespace."""
+    assert intern_id("tag", "python") == 0
+    assert intern_id("tag", "rust") == 1
+    assert intern_id("tag", "python") == 0
+    assert intern_id("category", "python") == 0
+
+    assert intern_ids("tag", ["rust", "go"]) == [1, 2]
+    assert resolve_id("tag", 2) == "go"
+
+
+def test_lookup_does_not_assign():
+    """Test that lookups of unknown values leave the registry unchanged."""
+    assert lookup_id("author", "unknown") is None
+    assert interning._values["author"] == []
+
+
+def test_full_namespace_returns_strings(monkeypatch):
+    """Test that a full namespace stops growing and still compares correctly."""
+    monkeypatch.setitem(interning.INTERNING_CONFIG, "max_values", 2)
+    assert intern_ids("author", ["a", "b", "c"]) == [0, 1, "c"]
+    assert interning._values["author"] == ["a", "b"]
+
+    assert lookup_id("author", "b") == 1
+    assert lookup_id("author", "c") == intern_id("author", "c") == "c"
+    assert resolve_id("author", "c") == "c"
+    assert lookup_id("tag", "c") is None
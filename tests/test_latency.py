@@ -0,0 +1,113 @@
+"""
+Tests for the per-route, per-instance latency sketches.
+"""
+
+import json
+import random
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from utils import latency
+from utils.latency import (
+    LatencySketch,
+    query_latency,
+    record_request,
+    reset_latency,
+    route_label,
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_latency():
+    reset_latency()
+    yield
+    reset_latency()
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    """Test that quantiles match exact percentiles within 1% and sketches merge."""
+    rng = random.Random(7)
+    values = [rng.lognormvariate(-3, 1) for _ in range(20000)]
+    first, second = LatencySketch(), LatencySketch()
+    for i, value in enumerate(values):
+        (first if i % 2 else second).add(value)
+    first.merge(second)
+
+    ordered = sorted(values)
+    assert first.count == len(values)
+    for q in (0.5, 0.95, 0.99):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert abs(first.quantile(q) - exact) <= 0.01 * exact
+    assert LatencySketch().quantile(0.5) is None
+
+
+def test_route_label_collapses_ids():
+    """Test that IDs in paths don't create one series per post."""
+    assert route_label("statuses/109876543/favourite") == "statuses/:id/favourite"
+    assert route_label("accounts/42/statuses") == "accounts/:id/statuses"
+    assert route_label("timelines/home") == "timelines/home"
+    assert route_label("timelines/tag/corgi") == "timelines/tag/:tag"
+    assert route_label("no/such/endpoint") == "other"
+
+
+def test_labels_are_bounded(monkeypatch):
+    """Test that new routes and instances past the caps share 'other' in both stores."""
+    monkeypatch.setitem(latency.LATENCY_CONFIG, "max_routes", 1)
+    monkeypatch.setitem(latency.LATENCY_CONFIG, "max_instances", 1)
+    with patch("utils.latency.track_proxy_latency") as mock_track:
+        record_request("timelines/home", "mastodon.social", "enriched", 0.1)
+        record_request("timelines/public", "evil.example", "enriched", 0.1)
+
+    assert [call.args[:4] for call in mock_track.call_args_list] == [
+        ("timelines/home", "mastodon.social", "enriched", "total"),
+        ("other", "other", "enriched", "total"),
+    ]
+    assert set(query_latency()) == {"timelines/home", "other"}
+
+
+def test_sliding_window_and_phases():
+    """Test that queries only merge slots inside the window and keep phases apart."""
+    with patch("utils.latency.time.time", return_value=1000.0):
+        record_request(
+            "timelines/home", "mastodon.social", "enriched", 0.5, upstream=0.3, recommendation=0.1
+        )
+    with patch("utils.latency.time.time", return_value=1200.0):
+        record_request(
+            "timelines/home", "mastodon.social", "enriched", 0.2, upstream=0.1, blend=0.01
+        )
+        recent = query_latency(60)
+        everything = query_latency()
+        by_instance = query_latency(group_by=("instance",), phase="total")
+        overall = query_latency(group_by=(), phase="total")
+
+    assert recent["timelines/home"]["total"]["count"] == 1
+    assert recent["timelines/home"]["total"]["p50_ms"] == pytest.approx(200, rel=0.01)
+    assert "recommendation" not in recent["timelines/home"]
+    assert everything["timelines/home"]["total"]["count"] == 2
+    assert everything["timelines/home"]["upstream"]["max_ms"] == pytest.approx(300)
+    assert by_instance == {"mastodon.social": overall}
+    assert overall["count"] == 2
+
+
+@patch("routes.proxy.upstream_request")
+def test_proxy_records_route_and_instance(mock_request, client):
+    """Test that proxied requests are recorded and queryable through /latency."""
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.content = b'{"id": "1"}'
+    mock_response.headers = {"Content-Type": "application/json"}
+    mock_response.raw.stream.return_value = [b'{"id": "1"}']
+    mock_request.return_value = mock_response
+
+    client.get("/api/v1/statuses/123/context")
+    client.get("/api/v1/statuses/456/context")
+
+    response = client.get("/api/v1/latency?group_by=route,instance,phase")
+    assert response.status_code == 200
+    data = json.loads(response.data)["latency"]
+    phases = data["statuses/:id/context"]["mastodon.social"]
+    assert phases["total"]["count"] == 2
+    assert phases["upstream"]["count"] == 2
+
+    assert client.get("/api/v1/latency?group_by=user").status_code == 400
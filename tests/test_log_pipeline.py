@@ -0,0 +1,95 @@
+"""
+Tests for the queued, structured and sampled log pipeline.
+"""
+
+import json
+import logging
+from unittest.mock import patch
+
+import pytest
+
+from utils import log_pipeline
+from utils.log_pipeline import (
+    SamplingFilter,
+    configure_file_logger,
+    flush_log_pipeline,
+    log_event,
+)
+
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch, request):
+    """Configure a pipeline logger writing to a temporary directory."""
+    monkeypatch.setattr(log_pipeline, "LOGS_DIR", str(tmp_path))
+    name = f"test_pipeline_{request.node.name}"
+    target = configure_file_logger(name, "test.log")
+    target.propagate = False
+    yield target, tmp_path / "test.log"
+    target.handlers.clear()
+    log_pipeline._file_handlers.pop(name).close()
+
+
+def _lines(path):
+    assert flush_log_pipeline() is True
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_events_and_legacy_lines_are_json(log_file):
+    """Test that structured events and prefixed strings become the same JSON fields."""
+    target, path = log_file
+    log_event(target, "RESP", "Request completed", request_id=42, status=200, total_time=0.25)
+    target.info("UP-42 | Upstream response | Status: 200")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        target.exception("ERROR-42 | Failed")
+
+    event, legacy, error = _lines(path)
+    assert event["category"] == "RESP"
+    assert event["msg"] == "Request completed"
+    assert (event["request_id"], event["status"], event["total_time"]) == (42, 200, 0.25)
+    assert (legacy["category"], legacy["request_id"], legacy["msg"]) == (
+        "UP",
+        "42",
+        "Upstream response | Status: 200",
+    )
+    assert error["level"] == "ERROR"
+    assert "ValueError: boom" in error["exc"]
+
+
+def test_disabled_level_builds_no_record(log_file):
+    """Test that events below the logger's level are not built."""
+    target, _ = log_file
+    with patch.object(target, "log") as mock_log:
+        log_event(target, "REQ", "Auth headers present", logging.DEBUG, request_id=1)
+    mock_log.assert_not_called()
+
+
+def test_sampling_keeps_whole_requests():
+    """Test that busy categories are sampled per request and warnings always pass."""
+    sampler = SamplingFilter({"REQ": 0.5, "RESP": 0.5}, threshold_per_second=10)
+
+    def record(category, request_id, level=logging.INFO):
+        rec = logging.LogRecord("proxy", level, __file__, 0, "msg", None, None)
+        rec.created = 1000.0
+        rec.category = category
+        rec.fields = {"request_id": request_id}
+        return rec
+
+    assert all(sampler.filter(record("REQ", i)) for i in range(10))
+    kept_req = {i for i in range(10, 1010) if sampler.filter(record("REQ", i))}
+    kept_resp = {i for i in range(10, 1010) if sampler.filter(record("RESP", i))}
+    assert 350 < len(kept_req) < 650
+    # RESP passes its first 10 records; after that the same requests survive
+    assert {i for i in kept_req if i >= 20} == {i for i in kept_resp if i >= 20}
+    assert sampler.filter(record("REQ", "dropped", logging.WARNING))
+    assert sampler.filter(record("OTHER", 1))
+
+
+def test_full_queue_drops_and_counts(log_file):
+    """Test that a full queue drops records instead of blocking."""
+    target, _ = log_file
+    dropped = log_pipeline.get_log_pipeline_stats()["dropped"].get(target.name, 0)
+    with patch.object(log_pipeline._queue, "put_nowait", side_effect=log_pipeline.queue.Full):
+        log_event(target, "REQ", "Proxy request", request_id=1)
+    assert log_pipeline.get_log_pipeline_stats()["dropped"][target.name] == dropped + 1
@@ -0,0 +1,148 @@
+"""
+Tests for bulk post ingestion.
+"""
+
+import csv
+import json
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from utils.post_ingestion import (
+    STAGING_COLUMNS,
+    PostIngester,
+    copy_payload,
+    iter_instance_posts,
+    normalize_post,
+)
+
+
+def _status(status_id, uri=None, content="Hello", **fields):
+    return dict(
+        {
+            "id": status_id,
+            "uri": uri or f"https://example.social/statuses/{status_id}",
+            "account": {"id": "acct1", "acct": "corgi@example.social"},
+            "content": content,
+            "created_at": "2025-04-19T08:30:00.000Z",
+            "tags": [{"name": "corgi"}],
+            "favourites_count": 2,
+        },
+        **fields,
+    )
+
+
+@pytest.fixture
+def database():
+    """A connection factory whose merge reports one insert per row."""
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    batches = []
+
+    def copy_expert(sql, payload):
+        batches.append(list(csv.reader(payload)))
+        cursor.fetchall.return_value = [(True,)] * len(batches[-1])
+
+    cursor.copy_expert.side_effect = copy_expert
+
+    @contextmanager
+    def connection_factory():
+        yield conn
+
+    return connection_factory, conn, batches
+
+
+def test_normalize_post_and_copy_payload():
+    """Test that boosts are unwrapped and rows survive CSV encoding."""
+    boost = {
+        "id": "900",
+        "account": {"id": "booster"},
+        "reblog": _status("101", content='Say "hi"\x00\nthere', tags=['a"b', {"name": "c\\d"}]),
+    }
+    row = normalize_post(boost)
+
+    assert row[0] == "101" and row[3] == "corgi@example.social"
+    assert row[4] == 'Say "hi"\nthere'
+    assert json.loads(row[8])["content"] == 'Say "hi"\nthere'
+    assert json.loads(row[9]) == {"favorites": 2, "reblogs": 0, "replies": 0}
+    assert row[10] == "2025-04-19T08:30:00+00:00"
+    assert normalize_post({"id": "1", "content": "no author"}) is None
+
+    text = copy_payload([row, row[:1] + (None,) + row[2:4] + ("",) + row[5:]]).getvalue()
+    fields = list(csv.reader(text.splitlines(keepends=True)))
+    assert len(fields) == 2 and len(fields[0]) == len(STAGING_COLUMNS)
+    assert fields[0][4] == 'Say "hi"\nthere'
+    assert fields[0][6] == '{"a\\"b","c\\\\d"}'
+    assert fields[0][7] == "f"
+    # NULL is an unquoted empty field, an empty string a quoted one
+    assert ",," in text.splitlines()[-1] and ',"",' in text.splitlines()[-1]
+
+
+def test_ingest_dedupes_and_resumes_from_checkpoint(tmp_path, database):
+    """Test dedupe by id and URI, one COPY per batch, and resuming after the checkpoint."""
+    connection_factory, conn, batches = database
+    source = tmp_path / "posts.jsonl"
+    federated_copy = _status("555", uri="https://example.social/statuses/1")
+    source.write_text(
+        "\n".join(
+            [
+                json.dumps([_status("1"), _status("2")]),
+                "not json",
+                json.dumps(_status("1")),
+                json.dumps(federated_copy),
+                json.dumps(_status("3", content="edited")),
+            ]
+        )
+        + "\n"
+    )
+    checkpoint = tmp_path / "checkpoint.json"
+
+    stats = PostIngester(str(checkpoint), connection_factory=connection_factory).ingest(
+        [str(source)]
+    )
+
+    assert [row[0] for row in batches[0]] == ["1", "2", "3"]
+    assert stats["read"] == 6
+    assert stats["invalid"] == 1
+    assert stats["duplicates"] == 2
+    assert stats["inserted"] == 3 and stats["batches"] == 1
+    assert json.loads(checkpoint.read_text()) == {str(source): source.stat().st_size}
+    conn.commit.assert_called_once()
+
+    with source.open("a") as f:
+        f.write(json.dumps(_status("4")) + "\n")
+    stats = PostIngester(str(checkpoint), connection_factory=connection_factory).ingest(
+        [str(source)]
+    )
+    assert stats["read"] == 1
+    assert [row[0] for row in batches[1]] == ["4"]
+
+
+def test_instance_source_pages_forward_with_min_id():
+    """Test that an instance timeline is read oldest first and caught up page by page."""
+    pages = [
+        [_status("12"), _status("11")],
+        [_status("13")],
+    ]
+    responses = []
+    for page in pages:
+        response = MagicMock()
+        response.json.return_value = page
+        responses.append(response)
+
+    with patch(
+        "utils.post_ingestion.upstream_request", side_effect=responses
+    ) as mock_request, patch.dict("utils.post_ingestion.POST_INGESTION_CONFIG", {"page_limit": 2}):
+        statuses = list(iter_instance_posts("http://localhost:5002/", start="10"))
+
+    assert [(status["id"], position) for status, position in statuses] == [
+        ("11", "11"),
+        ("12", "12"),
+        ("13", "13"),
+    ]
+    assert mock_request.call_args_list[0].args == (
+        "GET",
+        "http://localhost:5002/api/v1/timelines/public",
+    )
+    assert [call.kwargs["params"]["min_id"] for call in mock_request.call_args_list] == ["10", "12"]
@@ -5,7 +5,13 @@ Tests for the privacy utilities.
 import pytest
 from unittest.mock import patch, MagicMock
 
-from utils.privacy import generate_user_alias, get_user_privacy_level, update_user_privacy_level
+from utils.privacy import (
+    generate_user_alias,
+    get_user_privacy_level,
+    update_user_privacy_level,
+    get_cached_privacy_level,
+    invalidate_privacy_level
+)
 
 
 def test_generate_user_alias():
@@ -122,4 +128,89 @@ def test_update_user_privacy_level_db_error(mock_db_conn):
     assert result is False
     
     # Verify rollback was called
-    mock_conn.rollback.assert_called_once()
\ No newline at end of file
+    mock_conn.rollback.assert_called_once()
+
+
+@pytest.fixture
+def privacy_cache():
+    """Empty privacy cache, trusted as if the change listener were connected."""
+    invalidate_privacy_level()
+    with patch('utils.privacy._listener_connected', True):
+        yield
+    invalidate_privacy_level()
+
+
+def test_privacy_level_is_cached(privacy_cache, mock_db_conn):
+    """Test that repeated lookups are served from the cache."""
+    mock_conn, mock_cursor = mock_db_conn
+    mock_cursor.fetchone.return_value = ("limited",)
+    
+    assert get_user_privacy_level(mock_conn, "test_user_123") == "limited"
+    assert get_user_privacy_level(mock_conn, "test_user_123") == "limited"
+    
+    assert mock_cursor.execute.call_count == 1
+    assert get_cached_privacy_level("test_user_123") == "limited"
+
+
+def test_update_writes_through_cache(privacy_cache, mock_db_conn):
+    """Test that an opt-out is served from the cache right after the update."""
+    mock_conn, mock_cursor = mock_db_conn
+    mock_cursor.fetchone.return_value = ("full",)
+    get_user_privacy_level(mock_conn, "test_user_123")
+    
+    assert update_user_privacy_level(mock_conn, "test_user_123", "none") is True
+    assert get_cached_privacy_level("test_user_123") == "none"
+
+
+def test_cache_is_bypassed_without_listener(mock_db_conn):
+    """Test that nothing is served from the cache while changes could be missed."""
+    mock_conn, mock_cursor = mock_db_conn
+    mock_cursor.fetchone.return_value = ("full",)
+    
+    with patch('utils.privacy._listener_connected', False):
+        get_user_privacy_level(mock_conn, "test_user_123")
+        get_user_privacy_level(mock_conn, "test_user_123")
+        assert get_cached_privacy_level("test_user_123") is None
+    
+    assert mock_cursor.execute.call_count == 2
+
+
+def test_invalidation_during_read_is_not_cached(privacy_cache, mock_db_conn):
+    """Test that a level read before a concurrent change is not cached."""
+    mock_conn, mock_cursor = mock_db_conn
+    
+    def stale_read():
+        # Another worker's change is notified while this read is in flight
+        invalidate_privacy_level("test_user_123")
+        return ("full",)
+    mock_cursor.fetchone.side_effect = stale_read
+    
+    assert get_user_privacy_level(mock_conn, "test_user_123") == "full"
+    assert get_cached_privacy_level("test_user_123") is None
+
+
+
+@patch('utils.privacy.select.select', return_value=([], [], []))
+@patch('utils.privacy.psycopg2.connect')
+def test_idle_listener_pings_and_reconnects(mock_connect, mock_select, mock_db_conn):
+    """Test that a dead listener connection is noticed while idle instead of serving stale levels."""
+    from utils import privacy
+    mock_conn, mock_cursor = mock_db_conn
+    mock_connect.return_value = mock_conn
+
+    def execute(sql, *args):
+        if sql == "SELECT 1":
+            # Stop after this attempt rather than reconnecting
+            privacy._listener_stop.set()
+            raise Exception("server closed the connection unexpectedly")
+    mock_cursor.execute.side_effect = execute
+
+    with patch.dict('utils.privacy.PRIVACY_CACHE_CONFIG', {'ping_seconds': 0}):
+        privacy._listener_stop.clear()
+        privacy._listen_for_privacy_changes()
+    privacy._listener_stop.clear()
+
+    assert mock_connect.call_args.kwargs['keepalives'] == 1
+    assert mock_cursor.execute.call_args.args[0] == "SELECT 1"
+    assert privacy._listener_connected is False
+    mock_conn.close.assert_called_once()
@@ -17,6 +17,7 @@ from routes.proxy import (
     get_proxy_metrics,
     reset_proxy_metrics
 )
+from utils.timeline_microcache import clear_microcaches
 
 @pytest.fixture
 def app():
@@ -38,6 +39,13 @@ def reset_metrics():
     yield
     reset_proxy_metrics()
 
+@pytest.fixture(autouse=True)
+def clear_timeline_caches():
+    """Keep cached timelines and recommendations from leaking between tests."""
+    clear_microcaches()
+    yield
+    clear_microcaches()
+
 class TestProxyHelpers:
     """Test helper functions for the proxy middleware."""
     
@@ -101,7 +109,7 @@ class TestProxyHelpers:
     ('timelines/home', 'https://mastodon.social', 'https://mastodon.social/api/v1/timelines/home'),
     ('statuses/123', 'https://fosstodon.org', 'https://fosstodon.org/api/v1/statuses/123'),
 ])
-@patch('routes.proxy.requests.request')
+@patch('routes.proxy.upstream_request')
 def test_proxy_forwarding(mock_request, client, path, instance, expected_url):
     """Test that requests are properly forwarded to the Mastodon instance."""
     # Mock the response from the proxied request
@@ -124,7 +132,7 @@ def test_proxy_forwarding(mock_request, client, path, instance, expected_url):
     assert response.status_code == 200
     assert 'Content-Type' in response.headers
 
-@patch('routes.proxy.requests.request')
+@patch('routes.proxy.upstream_request')
 @patch('routes.proxy.get_recommendations')
 @patch('routes.proxy.get_authenticated_user')
 @patch('routes.proxy.check_user_privacy')
@@ -173,7 +181,7 @@ def test_timeline_recommendation_injection(
     assert metrics['enriched_timelines'] == 1
     assert metrics['total_recommendations'] == 1
     
-@patch('routes.proxy.requests.request')
+@patch('routes.proxy.upstream_request')
 @patch('routes.proxy.get_authenticated_user')
 @patch('routes.proxy.check_user_privacy')
 def test_standard_get_passthrough(
@@ -214,7 +222,7 @@ def test_standard_get_passthrough(
     assert metrics['successful_requests'] == 1
     assert metrics['timeline_requests'] == 0  # Not a timeline request
 
-@patch('routes.proxy.requests.request')
+@patch('routes.proxy.upstream_request')
 @patch('routes.proxy.get_authenticated_user')
 @patch('routes.proxy.get_user_privacy_level')
 def test_timeline_with_privacy_none(
@@ -257,7 +265,7 @@ def test_timeline_with_privacy_none(
     assert metrics['timeline_requests'] == 1
     assert metrics['enriched_timelines'] == 0  # No enrichment occurred
 
-@patch('routes.proxy.requests.request')
+@patch('routes.proxy.upstream_request')
 def test_proxy_error_when_target_instance_fails(mock_request, client):
     """Test that errors are handled gracefully when the target instance fails."""
     # Mock request to raise an exception
@@ -279,7 +287,7 @@ def test_proxy_error_when_target_instance_fails(mock_request, client):
     assert len(metrics['recent_errors']) == 1
     assert 'Connection refused' in metrics['recent_errors'][0]['error']
 
-@patch('routes.proxy.requests.request')
+@patch('routes.proxy.upstream_request')
 def test_auth_header_passthrough(mock_request, client):
     """Test that authentication headers are properly passed through."""
     # Mock successful response
@@ -303,7 +311,7 @@ def test_auth_header_passthrough(mock_request, client):
     assert 'Authorization' in kwargs['headers']
     assert kwargs['headers']['Authorization'] == f'Bearer {auth_token}'
 
-@patch('routes.proxy.requests.request')
+@patch('routes.proxy.upstream_request')
 def test_proxy_metrics_endpoint(mock_request, client):
     """Test the proxy metrics endpoint."""
     # Generate some proxy activity first
@@ -338,4 +346,90 @@ def test_proxy_metrics_endpoint(mock_request, client):
     # Metrics should now be reset
     response = client.get('/api/v1/proxy/metrics')
     metrics = json.loads(response.data)
-    assert metrics['total_requests'] == 0
\ No newline at end of file
+    assert metrics['total_requests'] == 0
+
+
+@patch('routes.proxy.upstream_request')
+def test_passthrough_response_is_streamed(mock_request, client):
+    """Test that pass-through routes stream the raw upstream body."""
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.headers = {
+        'Content-Type': 'application/json',
+        'Content-Encoding': 'gzip',
+        'Transfer-Encoding': 'chunked',
+        'Connection': 'keep-alive'
+    }
+    mock_response.raw.stream.return_value = iter([b'chunk1', b'chunk2'])
+    mock_request.return_value = mock_response
+    
+    response = client.get('/api/v1/statuses/123/context',
+                          headers={'X-Mastodon-Instance': 'https://mastodon.social',
+                                   'Accept-Encoding': 'gzip'})
+    
+    assert response.status_code == 200
+    assert response.data == b'chunk1chunk2'
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Connection' not in response.headers
+    
+    args, kwargs = mock_request.call_args
+    assert kwargs['stream'] is True
+    # The instance only sees the client's own Accept-Encoding
+    assert kwargs['headers']['Accept-Encoding'] == 'gzip'
+    mock_response.raw.stream.assert_called_once_with(ANY, decode_content=False)
+    mock_response.close.assert_called_once()
+
+
+@patch('routes.proxy.get_recommendations')
+@patch('routes.proxy.upstream_request')
+@patch('routes.proxy.get_user_instance')
+@patch('routes.proxy.get_authenticated_user')
+def test_augmented_timeline_fetches_recommendations_concurrently(
+    mock_get_user, mock_instance, mock_request, mock_get_recs, client
+):
+    """Test that recommendations are fetched while the upstream timeline is in flight."""
+    mock_get_user.return_value = 'user123'
+    mock_instance.return_value = 'https://mastodon.social'
+    
+    calls = {}
+    
+    def record_call(name, result):
+        # Keep each call busy long enough for an overlap to be unambiguous
+        start = time.monotonic()
+        time.sleep(0.2)
+        calls[name] = (start, time.monotonic())
+        return result
+    
+    def slow_upstream(**kwargs):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = json.dumps([{'id': 'post1'}, {'id': 'post2'}]).encode('utf-8')
+        return record_call('upstream', mock_response)
+    
+    def slow_recommendations(user_id, limit):
+        return record_call('recommendations', [{'id': 'rec1'}])
+    
+    mock_request.side_effect = slow_upstream
+    mock_get_recs.side_effect = slow_recommendations
+    
+    response = client.get('/api/v1/timelines/home/augmented?inject_recommendations=true')
+    
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['injected_count'] == 1
+    assert [post['id'] for post in data['timeline']] == ['post1', 'rec1', 'post2']
+    # Each call started before the other one finished
+    upstream_start, upstream_end = calls['upstream']
+    recs_start, recs_end = calls['recommendations']
+    assert upstream_start < recs_end and recs_start < upstream_end
+
+
+def test_wait_for_branch_times_out(app):
+    """Test that a slow concurrent step falls back to its default."""
+    from routes.proxy import submit_timeline_task, wait_for_branch
+    
+    with app.app_context():
+        future = submit_timeline_task(time.sleep, 0.5)
+        result = wait_for_branch(future, time.time() + 0.05, 'fallback', 1, 'Slow step')
+    
+    assert result == 'fallback'
@@ -13,6 +13,7 @@ from core.ranking_algorithm import (
     get_content_engagement_score,
     get_recency_score,
     calculate_ranking_score,
+    CandidatePost,
     generate_rankings_for_user
 )
 from utils.privacy import generate_user_alias
@@ -296,4 +297,30 @@ def test_generate_rankings_for_user(mock_generate_alias, mock_get_conn, mock_db_
                 mock_cursor.execute.assert_any_call(
                     "INSERT INTO post_rankings (user_id, post_id, ranking_score, recommendation_reason) VALUES (%s, %s, %s, %s) ON CONFLICT (user_id, post_id) DO UPDATE SET ranking_score = EXCLUDED.ranking_score, recommendation_reason = EXCLUDED.recommendation_reason, created_at = CURRENT_TIMESTAMP",
                     (user_alias, result[0]['post_id'], result[0]['ranking_score'], result[0]['recommendation_reason'])
-                )
\ No newline at end of file
+                )
+
+
+def test_candidate_post_record():
+    """Test that candidate records support the dict-style reads callers use."""
+    post = CandidatePost.from_row(('post123', 'author1', 'Author One', 'Content 1', None, '{"favorites":5}'))
+
+    assert post['post_id'] == 'post123'
+    assert post.get('author_name') == 'Author One'
+    assert post.get('created_at', 'missing') == 'missing'
+    assert 'ranking_score' not in post
+    assert not hasattr(post, '__dict__')
+
+    post.ranking_score = 0.8
+    post.recommendation_reason = 'Recently posted'
+    assert post['ranking_score'] == 0.8
+    assert post.to_dict() == {
+        'post_id': 'post123',
+        'author_id': 'author1',
+        'author_name': 'Author One',
+        'content': 'Content 1',
+        'interaction_counts': '{"favorites":5}',
+        'ranking_score': 0.8,
+        'recommendation_reason': 'Recently posted'
+    }
+    with pytest.raises(KeyError):
+        post['unknown_field']
@@ -79,19 +79,16 @@ def mock_cold_start_data():
     ]
 
 # Test loading cold start posts
-@patch('utils.recommendation_engine.open')
-def test_load_cold_start_posts(mock_open, mock_cold_start_data):
+def test_load_cold_start_posts(tmp_path, mock_cold_start_data):
     """Test loading cold start posts from JSON file."""
-    # Configure the mock to return appropriate data
-    mock_file = MagicMock()
-    mock_file.__enter__.return_value.read.return_value = json.dumps(mock_cold_start_data)
-    mock_open.return_value = mock_file
+    data_file = tmp_path / 'cold_start.json'
+    data_file.write_text(json.dumps(mock_cold_start_data))
     
     # Call the function
-    posts = load_cold_start_posts()
+    with patch('utils.recommendation_engine.COLD_START_DATA_PATH', str(data_file)):
+        posts = load_cold_start_posts()
     
     # Assertions
-    assert mock_open.called
     assert len(posts) == 2
     assert posts[0]['id'] == 'cold1'
     assert posts[1]['id'] == 'cold2'
@@ -0,0 +1,129 @@
+"""
+Tests for the offline replay evaluation engine.
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.replay_evaluation import (
+    build_corpus,
+    evaluate,
+    load_snapshot,
+    replay_user,
+    weight_grid,
+)
+
+BASE_TIME = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def _post(post_id, author_id, hours):
+    return {
+        "kind": "post",
+        "post_id": post_id,
+        "author_id": author_id,
+        "created_at": (BASE_TIME + timedelta(hours=hours)).isoformat(),
+    }
+
+
+def _interaction(user_alias, post_id, action_type, hours):
+    return {
+        "kind": "interaction",
+        "user_alias": user_alias,
+        "post_id": post_id,
+        "action_type": action_type,
+        "created_at": (BASE_TIME + timedelta(hours=hours)).isoformat(),
+    }
+
+
+@pytest.fixture
+def replay_data():
+    """Two authors; the user only ever likes posts by author_a."""
+    posts = [
+        _post("a1", "author_a", 0),
+        _post("b1", "author_b", 1),
+        _post("a2", "author_a", 2),
+        _post("b2", "author_b", 3),
+        _post("b3", "author_b", 4),
+    ]
+    interactions = [
+        _interaction("user_1", "a1", "favorite", 1),
+        _interaction("user_1", "b1", "less_like_this", 2),
+        _interaction("user_1", "a2", "favorite", 5),
+    ]
+    return posts, interactions
+
+
+def test_build_corpus_orders_posts_and_histories(replay_data):
+    """Test that posts are time ordered and interactions grouped per user."""
+    posts, interactions = replay_data
+    corpus, histories = build_corpus(reversed(posts), reversed(interactions))
+
+    assert corpus["post_ids"] == ["a1", "b1", "a2", "b2", "b3"]
+    assert corpus["times"] == sorted(corpus["times"])
+    assert [corpus["post_ids"][h[1]] for h in histories["user_1"]] == ["a1", "b1", "a2"]
+    # Only favorites/reblogs count as engagement
+    assert len(corpus["engagement"][0]) == 1
+    assert corpus["engagement"][1] == []
+
+
+def test_replay_user_does_not_leak_future(replay_data):
+    """Test that candidates are limited to posts that existed at each point."""
+    posts, interactions = replay_data
+    corpus, histories = build_corpus(posts, interactions)
+
+    result = replay_user(
+        histories["user_1"],
+        corpus,
+        [{"author_preference": 1.0, "content_engagement": 0.0, "recency": 0.0}],
+        k=1,
+        horizon_hours=1,
+    )
+
+    # The first favorite has no prior history; the a2 favorite is evaluated
+    assert result["eval_points"] == 1
+    # Author preference puts a2 ahead of the unseen author_b posts
+    assert result["hits"] == [1]
+    assert result["dcg"][0] == pytest.approx(1.0)
+
+
+def test_weight_sweep_separates_configs(replay_data):
+    """Test that a sweep scores configurations from the same replay pass."""
+    posts, interactions = replay_data
+    corpus, histories = build_corpus(posts, interactions)
+    configs = [
+        {"author_preference": 0.0, "content_engagement": 0.0, "recency": 1.0},
+        {"author_preference": 1.0, "content_engagement": 0.0, "recency": 0.0},
+    ]
+
+    results = evaluate(corpus, histories, configs, k=1, horizon_hours=1, workers=1)
+
+    assert len(results) == 2
+    # Pure recency ranks the newer b3 first and misses; author preference hits
+    assert results[0]["weights"] == configs[1]
+    assert results[0]["hit_rate@1"] == 1.0
+    assert results[1]["hit_rate@1"] == 0.0
+    assert results[0]["candidate_coverage"] == 1.0
+
+
+def test_weight_grid_sums_to_one():
+    """Test that every generated weight configuration is normalized."""
+    grid = weight_grid(0.5)
+
+    assert len(grid) == 6
+    for weights in grid:
+        assert sum(weights.values()) == pytest.approx(1.0)
+
+
+def test_load_snapshot_skips_bad_lines(tmp_path, replay_data):
+    """Test reading a JSON-lines snapshot."""
+    posts, interactions = replay_data
+    path = tmp_path / "snapshot.jsonl"
+    lines = [json.dumps(record) for record in posts + interactions]
+    path.write_text("\n".join(lines[:2] + ["not json"] + lines[2:]) + "\n")
+
+    loaded_posts, loaded_interactions = load_snapshot(str(path))
+
+    assert len(loaded_posts) == 5
+    assert len(loaded_interactions) == 3
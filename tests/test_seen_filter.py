@@ -0,0 +1,172 @@
+"""
+Tests for the per-user seen-post Bloom filters.
+"""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.ranking_algorithm import get_candidate_posts
+from utils.seen_filter import (
+    SEEN_FILTER_CONFIG,
+    BloomFilter,
+    SeenFilter,
+    clear_seen_filters,
+    get_seen_filter,
+    mark_seen,
+)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """Start every test without cached filters."""
+    clear_seen_filters()
+    yield
+    clear_seen_filters()
+
+
+@pytest.fixture
+def mock_db_conn():
+    """Create a mock database connection."""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.__enter__.return_value = mock_conn
+    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.__enter__.return_value = mock_cursor
+    return mock_conn, mock_cursor
+
+
+def test_bloom_filter_false_positive_rate():
+    """Test membership and that false positives stay near the target rate."""
+    bloom = BloomFilter.for_capacity(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f"seen_{i}")
+
+    assert all(f"seen_{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other_{i}" in bloom for i in range(10000))
+    assert false_positives < 300  # 1% target, generous margin
+
+
+def test_seen_filter_roundtrip_and_rotation():
+    """Test serialization and that one rotation keeps the previous generation."""
+    seen = SeenFilter()
+    seen.add("post1")
+
+    restored = SeenFilter.from_bytes(seen.to_bytes())
+    assert "post1" in restored
+    assert "post2" not in restored
+
+    later = restored.rotated_at + SEEN_FILTER_CONFIG["window_days"] * 86400 / 2 + 1
+    assert restored.rotate_if_due(later) is True
+    restored.add("post2")
+    assert "post1" in restored and "post2" in restored
+
+    # A second rotation ages out the oldest generation
+    restored.rotate_if_due(later + SEEN_FILTER_CONFIG["window_days"] * 86400)
+    assert "post1" not in restored
+    assert "post2" in restored
+
+
+def test_full_generation_rotates_to_bound_false_positives(monkeypatch):
+    """Test that a heavy user's filter rotates on capacity, not only on age."""
+    monkeypatch.setitem(SEEN_FILTER_CONFIG, "capacity", 500)
+    seen = SeenFilter()
+    for i in range(5000):
+        seen.add(f"seen_{i}")
+
+    assert seen.count <= 500
+    assert "seen_4999" in seen
+    false_positives = sum(f"other_{i}" in seen for i in range(10000))
+    assert false_positives < 500  # two generations at 1% each, generous margin
+    assert SeenFilter.from_bytes(seen.to_bytes()).count == seen.count
+
+
+def test_get_seen_filter_backfills_from_interactions(mock_db_conn):
+    """Test that a user without a stored filter is seeded from interactions."""
+    mock_conn, mock_cursor = mock_db_conn
+    mock_cursor.fetchone.return_value = None
+    mock_cursor.fetchall.return_value = [("post1",), ("post2",)]
+
+    seen = get_seen_filter(mock_conn, "user_alias")
+
+    assert "post1" in seen and "post2" in seen
+    assert any(
+        "INSERT INTO user_seen_filters" in call[0][0] for call in mock_cursor.execute.call_args_list
+    )
+
+    # Cached afterwards: no further queries
+    mock_cursor.execute.reset_mock()
+    assert get_seen_filter(mock_conn, "user_alias") is seen
+    mock_cursor.execute.assert_not_called()
+
+
+def test_mark_seen_updates_and_persists(mock_db_conn):
+    """Test that marked posts are excluded and the filter is written back."""
+    mock_conn, mock_cursor = mock_db_conn
+    stored = SeenFilter()
+    mock_cursor.fetchone.return_value = (stored.to_bytes(),)
+
+    assert mark_seen(mock_conn, "user_alias", ["post9"]) is True
+    assert "post9" in get_seen_filter(mock_conn, "user_alias")
+
+    persisted = mock_cursor.execute.call_args_list[-1][0][1][1]
+    assert "post9" in SeenFilter.from_bytes(persisted)
+
+
+def test_get_candidate_posts_filters_seen_in_memory(mock_db_conn):
+    """Test that candidates are over-fetched and seen posts dropped without NOT IN."""
+    mock_conn, mock_cursor = mock_db_conn
+    mock_cursor.fetchone.return_value = (5,)
+    mock_cursor.fetchall.return_value = [
+        ("post1", "author1", "Author One", "Content 1", None, None),
+        ("post2", "author2", "Author Two", "Content 2", None, None),
+        ("post3", "author3", "Author Three", "Content 3", None, None),
+    ]
+    seen = SeenFilter()
+    seen.add("post2")
+
+    result = get_candidate_posts(mock_conn, limit=2, days_limit=7, seen_filter=seen)
+
+    assert [post.post_id for post in result] == ["post1", "post3"]
+    query, params = mock_cursor.execute.call_args_list[2][0]
+    assert "NOT IN" not in query
+    assert params == [7, 4]
+
+
+def test_mark_seen_merges_into_the_stored_filter(mock_db_conn):
+    """Test that marks stored by another worker survive, and a corrupt filter is rebuilt."""
+    mock_conn, mock_cursor = mock_db_conn
+    other_worker = SeenFilter()
+    other_worker.add("post1")
+    mock_cursor.fetchone.return_value = (other_worker.to_bytes(),)
+    # This process cached the filter before the other worker's mark
+    get_seen_filter(mock_conn, "user_alias")
+
+    assert mark_seen(mock_conn, "user_alias", ["post2"]) is True
+    assert "FOR UPDATE" in mock_cursor.execute.call_args_list[-2][0][0]
+    persisted = SeenFilter.from_bytes(mock_cursor.execute.call_args_list[-1][0][1][1])
+    assert "post1" in persisted and "post2" in persisted
+
+    mock_cursor.fetchone.return_value = (b"\x00" * 8,)
+    mock_cursor.fetchall.return_value = [("post3",)]
+    assert mark_seen(mock_conn, "user_alias", ["post4"]) is True
+    rebuilt = SeenFilter.from_bytes(mock_cursor.execute.call_args_list[-1][0][1][1])
+    assert "post3" in rebuilt and "post4" in rebuilt
+
+
+def test_get_candidate_posts_pages_past_seen_posts(mock_db_conn):
+    """Test that a page of mostly seen posts is followed by older pages until the limit is filled."""
+    mock_conn, mock_cursor = mock_db_conn
+    mock_cursor.fetchone.return_value = (10,)
+    rows = [(f"post{i}", "author1", "Author One", "Content", 100 - i, None) for i in range(6)]
+    mock_cursor.fetchall.side_effect = [rows[:4], rows[4:]]
+    seen = SeenFilter()
+    for post_id in ("post0", "post1", "post2"):
+        seen.add(post_id)
+
+    result = get_candidate_posts(mock_conn, limit=2, days_limit=7, seen_filter=seen)
+
+    assert [post.post_id for post in result] == ["post3", "post4"]
+    query, params = mock_cursor.execute.call_args_list[-1][0]
+    assert "(created_at, post_id) < (%s, %s)" in query
+    assert params == [7, 97, "post3", 4]
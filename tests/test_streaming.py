@@ -0,0 +1,182 @@
+"""
+Tests for the streaming API relay.
+"""
+
+import asyncio
+import json
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from routes.async_proxy import create_asgi_app
+from utils import streaming
+from utils.streaming import StreamEvent, parse_sse, stream_request
+
+INSTANCE = {"X-Mastodon-Instance": "https://mastodon.social"}
+
+EVENTS = (
+    b":thump\n\n"
+    b'event: update\ndata: {"id": "101", "content": "first"}\n\n'
+    b'event: update\ndata: {"id": "102", "content": "second"}\n\n'
+    b"event: delete\ndata: 99\n\n"
+)
+
+
+class _StreamBody(httpx.AsyncByteStream):
+    """Upstream event stream; a held stream stays open like a live one."""
+
+    def __init__(self, data, hold):
+        self.data = data
+        self.hold = hold
+
+    async def __aiter__(self):
+        yield self.data
+        if self.hold:
+            await asyncio.Event().wait()
+
+
+class StreamingStandIn:
+    """Stand-in for a Mastodon streaming server."""
+
+    def __init__(self, hold=True):
+        self.hold = hold
+        self.connections = []
+
+    def __call__(self, request):
+        self.connections.append(request.url.path)
+        if request.headers.get("Authorization") != "Bearer good-token":
+            return httpx.Response(401, json={"error": "Invalid access token"})
+        if not self.hold and self.connections.count(request.url.path) > 1:
+            # Token revoked while the client was connected
+            return httpx.Response(401, json={"error": "Invalid access token"})
+        return httpx.Response(
+            200,
+            headers={"Content-Type": "text/event-stream"},
+            stream=_StreamBody(EVENTS, self.hold),
+        )
+
+
+@pytest.fixture
+def streaming_config(monkeypatch):
+    """Reconnect immediately and inject after every second update."""
+    monkeypatch.setitem(streaming.STREAMING_CONFIG, "min_backoff_seconds", 0)
+    monkeypatch.setitem(streaming.STREAMING_CONFIG, "inject_every_updates", 2)
+    monkeypatch.setitem(streaming.STREAMING_CONFIG, "inject_min_interval_seconds", 0)
+
+
+def test_parse_sse_and_stream_names():
+    """Test SSE parsing and mapping WebSocket stream names to SSE requests."""
+
+    async def collect():
+        async def lines():
+            for line in EVENTS.decode().split("\n"):
+                yield line
+
+        return [event async for event in parse_sse(lines())]
+
+    events = asyncio.run(collect())
+    assert events == [
+        StreamEvent("update", '{"id": "101", "content": "first"}'),
+        StreamEvent("update", '{"id": "102", "content": "second"}'),
+        StreamEvent("delete", "99"),
+    ]
+    assert stream_request("public:local:media", {}) == (
+        "public/local",
+        {"only_media": "true"},
+        ["public:local:media"],
+    )
+    assert stream_request("hashtag", {"tag": "corgi"}) == (
+        "hashtag",
+        {"tag": "corgi"},
+        ["hashtag", "corgi"],
+    )
+    assert stream_request("hashtag", {}) is None
+    assert stream_request("admin", {}) is None
+
+
+@patch("routes.async_proxy.resolve_enrichment")
+@patch("routes.proxy.get_authenticated_user", return_value="user123")
+@patch("routes.proxy.get_user_by_token", return_value=None)
+def test_websocket_relays_shared_stream_with_recommendations(
+    mock_token, mock_user, mock_enrichment, app, streaming_config
+):
+    """Test that a viewer's sockets share one upstream stream and get a recommendation."""
+    mock_enrichment.return_value = ("full", [{"id": "rec1", "is_recommendation": True}])
+    stand_in = StreamingStandIn()
+
+    with TestClient(create_asgi_app(app, transport=httpx.MockTransport(stand_in))) as client:
+        url = "/api/v1/streaming?stream=user&access_token=good-token"
+        with client.websocket_connect(url, headers=INSTANCE) as first:
+            messages = [first.receive_json() for _ in range(4)]
+            with client.websocket_connect(url, headers=INSTANCE) as second:
+                # Replies in order, so the initial subscription is in place
+                second.send_json({"type": "subscribe", "stream": "hashtag"})
+                assert second.receive_json() == {"error": "Unknown stream type", "status": 400}
+                assert stand_in.connections == ["/api/v1/streaming/user"]
+
+    assert all(message["stream"] == ["user"] for message in messages)
+    payloads = [(message["event"], message["payload"]) for message in messages]
+    assert payloads[:2] == [
+        ("update", '{"id": "101", "content": "first"}'),
+        ("update", '{"id": "102", "content": "second"}'),
+    ]
+    assert ("delete", "99") in payloads
+    assert (
+        json.loads(next(payload for event, payload in payloads[2:] if event == "update"))["id"]
+        == "rec1"
+    )
+    mock_enrichment.assert_called_once()
+
+
+@patch("routes.proxy.get_user_by_token", return_value=None)
+def test_sse_relay_and_rejection(mock_token, app, streaming_config):
+    """Test SSE relaying until the instance closes the stream for good, and refused tokens."""
+    stand_in = StreamingStandIn(hold=False)
+
+    with TestClient(create_asgi_app(app, transport=httpx.MockTransport(stand_in))) as client:
+        response = client.get(
+            "/api/v1/streaming/public/local?access_token=good-token", headers=INSTANCE
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert 'event: update\ndata: {"id": "102", "content": "second"}\n\n' in response.text
+        assert "event: delete\ndata: 99\n\n" in response.text
+        # Reconnected once after the instance closed the stream, then refused
+        assert stand_in.connections == ["/api/v1/streaming/public/local"] * 2
+
+        refused = client.get(
+            "/api/v1/streaming/user", headers=dict(INSTANCE, Authorization="Bearer bad")
+        )
+        assert refused.status_code == 401
+        assert refused.json() == {"error": "Invalid access token"}
+
+
+def test_anonymous_streams_have_their_own_cap(monkeypatch):
+    """Test that unauthenticated clients are not limited as one viewer, but still capped."""
+    monkeypatch.setitem(streaming.STREAMING_CONFIG, "max_streams_per_viewer", 1)
+    monkeypatch.setitem(streaming.STREAMING_CONFIG, "max_anonymous_streams", 3)
+    url = "https://mastodon.social/api/v1/streaming/hashtag"
+
+    def instance(request):
+        return httpx.Response(
+            200, headers={"Content-Type": "text/event-stream"}, stream=_StreamBody(b"", True)
+        )
+
+    async def subscribe_all():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(instance)) as client:
+            hub = streaming.StreamingHub(client)
+            try:
+                for tag in ("a", "b", "c"):
+                    await hub.subscribe(url, {"tag": tag}, {})
+                with pytest.raises(streaming.StreamLimitExceeded):
+                    await hub.subscribe(url, {"tag": "d"}, {})
+                # Viewers with credentials keep their own limit
+                await hub.subscribe(url, {"tag": "a"}, {"Authorization": "Bearer good-token"})
+                with pytest.raises(streaming.StreamLimitExceeded):
+                    await hub.subscribe(url, {"tag": "b"}, {"Authorization": "Bearer good-token"})
+            finally:
+                await hub.close()
+
+    asyncio.run(subscribe_all())
@@ -4,9 +4,12 @@ Tests for the timeline routes with injection capabilities.
 
 import os
 import json
+import threading
 import pytest
 from unittest.mock import patch, MagicMock
 from app import create_app
+from utils.anonymous_timeline import clear_anonymous_timelines
+from utils.timeline_microcache import clear_microcaches
 
 # Mock response for requests to upstream Mastodon server
 def mock_requests_get(*args, **kwargs):
@@ -78,13 +81,17 @@ MOCK_COLD_START_POSTS = [
 def test_client():
     """Create a test client using the Flask application."""
     app = create_app()
+    clear_microcaches()
+    clear_anonymous_timelines()
     with app.test_client() as client:
         yield client
+    clear_microcaches()
+    clear_anonymous_timelines()
 
 
 @patch('routes.timeline.load_json_file')
 @patch('routes.proxy.get_authenticated_user')
-@patch('routes.timeline.requests.request', side_effect=mock_requests_get)
+@patch('routes.timeline.upstream_request', side_effect=mock_requests_get)
 def test_timeline_with_injection(mock_request, mock_auth_user, mock_load_json, test_client):
     """Test the /api/v1/timelines/home endpoint with injection."""
     # Setup mocks
@@ -120,7 +127,7 @@ def test_timeline_with_injection(mock_request, mock_auth_user, mock_load_json, t
 
 @patch('routes.timeline.load_json_file')
 @patch('routes.proxy.get_authenticated_user')
-@patch('routes.timeline.requests.request', side_effect=mock_requests_get)
+@patch('routes.timeline.upstream_request', side_effect=mock_requests_get)
 def test_timeline_without_injection(mock_request, mock_auth_user, mock_load_json, test_client):
     """Test the /api/v1/timelines/home endpoint with injection disabled."""
     # Setup mocks
@@ -153,7 +160,7 @@ def test_timeline_without_injection(mock_request, mock_auth_user, mock_load_json
 
 @patch('routes.timeline.load_json_file')
 @patch('routes.proxy.get_authenticated_user')
-@patch('routes.timeline.requests.request', side_effect=mock_requests_get)
+@patch('routes.timeline.upstream_request', side_effect=mock_requests_get)
 def test_different_injection_strategies(mock_request, mock_auth_user, mock_load_json, test_client):
     """Test different injection strategies."""
     # Setup mocks
@@ -176,7 +183,7 @@ def test_different_injection_strategies(mock_request, mock_auth_user, mock_load_
 
 @patch('routes.timeline.load_json_file', side_effect=FileNotFoundError)
 @patch('routes.proxy.get_authenticated_user')
-@patch('routes.timeline.requests.request', side_effect=mock_requests_get)
+@patch('routes.timeline.upstream_request', side_effect=mock_requests_get)
 def test_timeline_with_missing_injectable_posts(mock_request, mock_auth_user, mock_load_json, test_client):
     """Test behavior when injectable posts cannot be loaded."""
     # Setup mocks
@@ -222,4 +229,34 @@ def test_timeline_with_anonymous_user(mock_auth_user, mock_load_json, test_clien
         
         # Check all posts are marked as injected (since anonymous users only get injected posts)
         injected_posts = [post for post in data['timeline'] if post.get('injected', False)]
-        assert len(injected_posts) > 0
\ No newline at end of file
+        assert len(injected_posts) > 0
+
+@patch('routes.timeline.load_injected_posts_for_user')
+@patch('routes.timeline.get_user_instance', return_value='https://mastodon.example')
+@patch('routes.timeline.get_authenticated_user', return_value='real_user_123')
+@patch('routes.timeline.upstream_request')
+def test_timeline_loads_injectable_posts_during_upstream_fetch(mock_request, mock_auth_user, mock_instance,
+                                                               mock_load_posts, test_client):
+    """Test that injectable posts load while the upstream timeline is being fetched."""
+    # Each side only returns once the other has started, so a sequential
+    # implementation breaks the barrier instead of passing
+    both_started = threading.Barrier(2, timeout=5)
+
+    def fetch_upstream(*args, **kwargs):
+        both_started.wait()
+        return mock_requests_get()
+
+    def load_posts(user_id):
+        both_started.wait()
+        return MOCK_COLD_START_POSTS, "cold_start"
+
+    mock_request.side_effect = fetch_upstream
+    mock_load_posts.side_effect = load_posts
+
+    response = test_client.get('/api/v1/timelines/home?strategy=uniform')
+
+    assert response.status_code == 200
+    timeline = json.loads(response.data)
+    assert 'real_post_1' in [post['id'] for post in timeline]
+    assert any(post.get('injected') for post in timeline)
+    assert not both_started.broken
@@ -0,0 +1,115 @@
+"""
+Tests for the home timeline micro-cache.
+"""
+
+import json
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from utils import timeline_microcache
+from utils.timeline_microcache import MicroCache, invalidate_viewer, timeline_key
+
+AUTH = {"Authorization": "Bearer token-a"}
+
+
+@pytest.fixture
+def microcache_enabled(monkeypatch):
+    """Enable the micro-cache with empty caches."""
+    monkeypatch.setitem(timeline_microcache.TIMELINE_MICROCACHE_CONFIG, "enabled", True)
+    timeline_microcache.clear_microcaches()
+    yield
+    timeline_microcache.clear_microcaches()
+
+
+def test_concurrent_fetches_are_coalesced(microcache_enabled):
+    """Test that polls arriving during a fetch wait for it instead of fetching again."""
+    cache = MicroCache("test", 1024, len)
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return "page"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_fetch("key", fetch)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    while cache.stats()["coalesced"] < 4:
+        time.sleep(0.005)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ["page"] * 5
+    # Later polls within the TTL are hits
+    assert cache.get_or_fetch("key", fetch) == "page"
+    assert cache.stats()["hits"] == 1
+
+
+def test_ttl_size_bound_and_invalidation(microcache_enabled, monkeypatch):
+    """Test expiry, eviction by size and per-viewer invalidation."""
+    cache = MicroCache("test", 10, len)
+    cache.get_or_fetch("a", lambda: "aaaa")
+    cache.get_or_fetch("b", lambda: "bbbb")
+    cache.get_or_fetch("c", lambda: "cccc")
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] == 8 and stats["evictions"] == 1
+    # Values over the bound are returned but never stored
+    assert cache.get_or_fetch("big", lambda: "x" * 11) == "x" * 11
+    assert cache.stats()["entries"] == 2
+
+    monkeypatch.setitem(timeline_microcache.TIMELINE_MICROCACHE_CONFIG, "ttl_seconds", 0)
+    cache.get_or_fetch("d", lambda: "dd")
+    assert cache.get_or_fetch("d", lambda: "fresh") == "fresh"
+
+    # Proxy-only parameters don't split the key; credentials do
+    url = "https://mastodon.social/api/v1/timelines/home"
+    key = timeline_key(url, {"limit": "20", "inject": "true"}, AUTH)
+    assert key == timeline_key(url, {"limit": "20"}, {"authorization": "Bearer token-a"})
+    assert key != timeline_key(url, {"limit": "20"}, {"Authorization": "Bearer token-b"})
+    timeline_microcache.fetch_timeline(
+        url, {"limit": "20"}, AUTH, lambda: MagicMock(status_code=200, content=b"[]")
+    )
+    timeline_microcache.fetch_timeline(
+        url,
+        {"limit": "20"},
+        {"Authorization": "Bearer token-b"},
+        lambda: MagicMock(status_code=200, content=b"[]"),
+    )
+    assert invalidate_viewer(AUTH) == 1
+
+
+@patch("routes.timeline.load_json_file")
+@patch("routes.timeline.get_user_instance")
+@patch("routes.timeline.get_authenticated_user")
+@patch("routes.timeline.upstream_request")
+def test_polls_share_upstream_timeline(
+    mock_request, mock_get_user, mock_instance, mock_load_json, client, microcache_enabled
+):
+    """Test that repeated polls of the same page reach the instance once."""
+    mock_get_user.return_value = "user123"
+    mock_instance.return_value = "https://mastodon.social"
+    mock_load_json.return_value = []
+    posts = [{"id": "2", "content": "newer"}, {"id": "1", "content": "older"}]
+    response = MagicMock(status_code=200, content=json.dumps(posts).encode("utf-8"))
+    response.json.return_value = posts
+    mock_request.return_value = response
+
+    first = client.get("/api/v1/timelines/home?limit=20&inject=false", headers=AUTH)
+    second = client.get("/api/v1/timelines/home?limit=20&inject=false", headers=AUTH)
+    assert json.loads(first.data) == json.loads(second.data) == posts
+    assert mock_request.call_count == 1
+
+    # A new cursor is a different page
+    client.get("/api/v1/timelines/home?limit=20&since_id=2&inject=false", headers=AUTH)
+    assert mock_request.call_count == 2
+    assert timeline_microcache.get_microcache_stats()["upstream_timelines"]["hits"] == 1
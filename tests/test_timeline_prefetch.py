@@ -0,0 +1,84 @@
+"""
+Tests for prefetching the next augmented timeline page.
+"""
+
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from routes.proxy import blend_order
+from utils import timeline_prefetch
+from utils.timeline_prefetch import next_page_params
+
+
+@pytest.fixture
+def prefetch_enabled(monkeypatch):
+    """Enable prefetching with empty caches."""
+    monkeypatch.setitem(timeline_prefetch.TIMELINE_PREFETCH_CONFIG, "enabled", True)
+    timeline_prefetch.clear_prefetch_cache()
+    yield
+    timeline_prefetch.flush_prefetch()
+    timeline_prefetch.clear_prefetch_cache()
+
+
+def test_next_page_params():
+    """Test that the next cursor comes from the Link header, else the last post."""
+    link = (
+        '<https://mastodon.social/api/v1/timelines/home?max_id=105>; rel="next", '
+        '<https://mastodon.social/api/v1/timelines/home?min_id=110>; rel="prev"'
+    )
+    assert next_page_params({"limit": "5"}, link, "106") == {"limit": "5", "max_id": "105"}
+    assert next_page_params({"limit": "5", "max_id": "111"}, None, "106") == {
+        "limit": "5",
+        "max_id": "106",
+    }
+    assert next_page_params({"min_id": "100"}, link, "106") is None
+    assert next_page_params({}, None, None) is None
+
+
+def test_blend_order_continues_across_pages():
+    """Test that a page starting mid-timeline keeps the injection grid."""
+    first = blend_order(5, 1)
+    second = blend_order(5, 1, position=5)
+    assert first.index((True, 0)) == 1
+    # Spacing is 4: the grid lands on post 8 of the timeline, index 3 of the page
+    assert second.index((True, 0)) == 4
+
+
+@patch("routes.proxy.get_recommendations")
+@patch("routes.proxy.upstream_request")
+@patch("routes.proxy.get_user_instance")
+@patch("routes.proxy.get_authenticated_user")
+def test_next_page_served_from_prefetch(
+    mock_get_user, mock_instance, mock_request, mock_get_recs, client, prefetch_enabled
+):
+    """Test that scrolling down is served from memory with fresh recommendations."""
+    mock_get_user.return_value = "user123"
+    mock_instance.return_value = "https://mastodon.social"
+
+    def upstream(**kwargs):
+        top = int(kwargs["params"].get("max_id", 111)) - 1
+        response = MagicMock()
+        response.status_code = 200
+        response.content = json.dumps([{"id": str(top - i)} for i in range(5)]).encode("utf-8")
+        response.headers = {
+            "Link": f'<https://mastodon.social/api/v1/timelines/home?max_id={top - 4}>; rel="next"'
+        }
+        return response
+
+    mock_request.side_effect = upstream
+    mock_get_recs.side_effect = lambda user_id, limit: [{"id": f"rec{i}"} for i in range(limit)]
+
+    url = "/api/v1/timelines/home/augmented?inject_recommendations=true&limit=5"
+    first = json.loads(client.get(url).data)["timeline"]
+    assert [post["id"] for post in first] == ["110", "rec0", "109", "108", "107", "106"]
+    assert timeline_prefetch.flush_prefetch()
+    assert mock_request.call_count == 2
+
+    second = json.loads(client.get(url + "&max_id=106").data)["timeline"]
+    assert timeline_prefetch.flush_prefetch()
+    # Only the page after this one was fetched
+    assert mock_request.call_count == 3
+    assert [post["id"] for post in second] == ["105", "104", "103", "102", "rec1", "101"]
+    assert timeline_prefetch.get_prefetch_stats()["hits"] == 1
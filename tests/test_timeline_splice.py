@@ -0,0 +1,60 @@
+"""
+Tests for splicing recommendations into undecoded upstream timelines.
+"""
+
+import json
+
+import pytest
+
+from routes.proxy import blend_recommendations, splice_recommendations
+from utils.timeline_splice import RawTimeline, find_elements
+
+
+def test_find_elements_skips_strings():
+    """Test that brackets and quotes inside strings do not end an element."""
+    data = b' [ {"content": "<p>a ] } [ \\" {</p>", "tags": [{"name": "x"}]} ,\n{"id": "2"} ] '
+    spans = find_elements(data)
+
+    assert [json.loads(data[start:end]) for start, end in spans] == json.loads(data)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b'{"error": "not found"}',
+        b"[1, 2]",
+        b'[[{"id": "1"}]]',
+        b'[{"id": "1"}',
+        b'[{"id": "1}]',
+        b'[{"id": "1"}] trailing',
+    ],
+)
+def test_find_elements_rejects_other_json(data):
+    """Test that anything but a complete array of objects is rejected."""
+    with pytest.raises(ValueError):
+        find_elements(data)
+
+
+@pytest.mark.parametrize("post_count,rec_count", [(0, 2), (1, 3), (10, 3), (40, 10), (5, 0)])
+def test_splice_matches_blend(post_count, rec_count):
+    """Test that splicing yields the same timeline as decoding and blending."""
+    posts = [{"id": str(i), "content": "ü [x]"} for i in range(post_count)]
+    recommendations = [{"id": f"rec{i}", "is_recommendation": True} for i in range(rec_count)]
+
+    spliced, final_count = splice_recommendations(
+        RawTimeline(json.dumps(posts).encode()), recommendations
+    )
+
+    expected = blend_recommendations(posts, recommendations)
+    assert json.loads(spliced) == expected
+    assert final_count == len(expected)
+
+
+def test_post_fields_are_added_to_every_post():
+    """Test that per-post flags are spliced into each original post, including empty ones."""
+    timeline = RawTimeline(b'[{"id": "1"}, { }]', b'"is_real_mastodon_post":true')
+
+    assert json.loads(timeline.to_json()) == [
+        {"is_real_mastodon_post": True, "id": "1"},
+        {"is_real_mastodon_post": True},
+    ]
@@ -0,0 +1,92 @@
+"""
+Tests for the pooled upstream client.
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from config import UPSTREAM_POOL_CONFIG
+from utils.upstream import (
+    close_sessions,
+    get_session,
+    get_upstream_metrics,
+    reset_upstream_metrics,
+    upstream_request,
+)
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"[]"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "session=abc")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def instance_url():
+    """Run a local keep-alive HTTP server standing in for a Mastodon instance."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    close_sessions()
+    reset_upstream_metrics()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    close_sessions()
+    reset_upstream_metrics()
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused(instance_url):
+    """Test that repeated requests to one instance share a connection."""
+    for _ in range(5):
+        response = upstream_request(
+            "GET",
+            f"{instance_url}/api/v1/timelines/home",
+            headers={"Connection": "close"},
+            timeout=5,
+        )
+        assert response.status_code == 200
+
+    metrics = get_upstream_metrics()
+    assert metrics["requests"] == 5
+    assert metrics["new_connections"] == 1
+    assert metrics["reuse_rate"] == pytest.approx(0.8)
+    assert metrics["hosts"]["127.0.0.1"]["avg_connect_ms"] >= 0
+
+
+def test_sessions_are_per_host_and_cookie_free(instance_url):
+    """Test that each host gets one session and cookies are not retained."""
+    session = get_session(f"{instance_url}/api/v1/accounts")
+    assert get_session(f"{instance_url}/api/v1/statuses") is session
+    assert get_session("https://other.example/api/v1") is not session
+
+    upstream_request("GET", f"{instance_url}/api/v1/accounts", timeout=5)
+    assert len(session.cookies) == 0
+
+
+def test_saturated_blocking_pool_fails_fast(instance_url, monkeypatch):
+    """Test that a request waiting for a connection from a full pool gives up."""
+    monkeypatch.setitem(UPSTREAM_POOL_CONFIG, "pool_maxsize", 1)
+    monkeypatch.setitem(UPSTREAM_POOL_CONFIG, "pool_block", True)
+    monkeypatch.setitem(UPSTREAM_POOL_CONFIG, "pool_timeout_seconds", 0.2)
+
+    held = upstream_request("GET", f"{instance_url}/api/v1/timelines/home", stream=True, timeout=5)
+    start = time.monotonic()
+    with pytest.raises(requests.ConnectionError):
+        upstream_request("GET", f"{instance_url}/api/v1/timelines/public", timeout=5)
+    assert time.monotonic() - start < 2
+    held.close()
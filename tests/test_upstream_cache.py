@@ -0,0 +1,200 @@
+"""
+Tests for the upstream response cache.
+"""
+
+import gzip
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from utils import upstream_cache
+
+URL = "https://mastodon.social/api/v1/"
+ALICE = {"Authorization": "Bearer alice", "Accept-Encoding": "gzip"}
+BOB = {"Authorization": "Bearer bob", "Accept-Encoding": "gzip"}
+
+
+def _headers(**extra):
+    headers = {"Content-Type": "application/json", "Content-Length": "2"}
+    headers.update({key.replace("_", "-"): value for key, value in extra.items()})
+    return headers
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """Start and end each test with an empty cache."""
+    upstream_cache.clear_upstream_cache()
+    yield
+    upstream_cache.clear_upstream_cache()
+
+
+def test_authenticated_bodies_are_not_shared():
+    """Test that a viewer-specific route is cached per token."""
+    path = "statuses/1/context"
+    upstream_cache.store(
+        path, URL + path, {}, ALICE, 200, _headers(Cache_Control="max-age=60"), b"{}"
+    )
+
+    assert upstream_cache.lookup(path, URL + path, {}, ALICE) is not None
+    assert upstream_cache.lookup(path, URL + path, {}, BOB) is None
+    assert upstream_cache.lookup(path, URL + path, {}, {"Accept-Encoding": "gzip"}) is None
+
+
+def test_public_routes_are_shared():
+    """Test that public routes are shared unless marked private."""
+    upstream_cache.store(
+        "custom_emojis",
+        URL + "custom_emojis",
+        {},
+        ALICE,
+        200,
+        _headers(Cache_Control="max-age=60"),
+        b"[]",
+    )
+    assert upstream_cache.lookup("custom_emojis", URL + "custom_emojis", {}, BOB) is not None
+
+    upstream_cache.store(
+        "accounts/1",
+        URL + "accounts/1",
+        {},
+        ALICE,
+        200,
+        _headers(Cache_Control="private, max-age=60"),
+        b"{}",
+    )
+    assert upstream_cache.lookup("accounts/1", URL + "accounts/1", {}, BOB) is None
+    assert upstream_cache.lookup("accounts/1", URL + "accounts/1", {}, ALICE) is not None
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        _headers(Cache_Control="no-store"),
+        _headers(Cache_Control="max-age=60", Set_Cookie="session=1"),
+        _headers(Cache_Control="max-age=60", Vary="*"),
+        _headers(),
+        {"Cache-Control": "max-age=60"},
+    ],
+)
+def test_uncacheable_responses(headers):
+    """Test that no-store, cookies, Vary: *, no freshness or unknown length are not stored."""
+    assert not upstream_cache.is_storable("custom_emojis", {}, 200, headers)
+
+
+def test_stale_entries_revalidate():
+    """Test conditional headers for stale entries and refresh on 304."""
+    entry = upstream_cache.store(
+        "custom_emojis",
+        URL + "custom_emojis",
+        {},
+        {},
+        200,
+        _headers(ETag='"v1"', Cache_Control="no-cache"),
+        b"[]",
+    )
+    assert not upstream_cache.is_fresh(entry)
+    assert upstream_cache.conditional_headers(entry) == {"If-None-Match": '"v1"'}
+
+    refreshed = upstream_cache.revalidate(
+        "custom_emojis",
+        URL + "custom_emojis",
+        {},
+        {},
+        entry,
+        {"Cache-Control": "max-age=60", "ETag": '"v1"'},
+    )
+    assert upstream_cache.is_fresh(refreshed)
+    assert refreshed.body == b"[]"
+
+
+def test_cache_is_bounded_by_bytes():
+    """Test that least recently used entries are evicted past max_bytes."""
+    with patch.dict("utils.upstream_cache.UPSTREAM_CACHE_CONFIG", {"max_bytes": 10}):
+        for name in ("a", "b", "c"):
+            upstream_cache.store(
+                "custom_emojis",
+                URL + name,
+                {},
+                {},
+                200,
+                _headers(Cache_Control="max-age=60"),
+                b"12345",
+            )
+
+    metrics = upstream_cache.get_upstream_cache_metrics()
+    assert metrics["entries"] == 2
+    assert metrics["bytes"] == 10
+    assert metrics["evictions"] == 1
+    assert upstream_cache.lookup("custom_emojis", URL + "a", {}, {}) is None
+
+
+@patch("routes.proxy.upstream_request")
+def test_proxy_serves_and_revalidates_from_cache(mock_request, client):
+    """Test that the proxy answers repeat GETs from the cache and revalidates stale ones."""
+    response = MagicMock()
+    response.status_code = 200
+    response.headers = _headers(Cache_Control="max-age=60", ETag='"v1"')
+    response.raw.read.return_value = b"[]"
+    mock_request.return_value = response
+    headers = {"X-Mastodon-Instance": "https://mastodon.social"}
+
+    assert client.get("/api/v1/custom_emojis", headers=headers).headers["X-Cache"] == "MISS"
+    hit = client.get("/api/v1/custom_emojis", headers=headers)
+    assert hit.headers["X-Cache"] == "HIT"
+    assert hit.data == b"[]"
+    assert mock_request.call_count == 1
+
+    # Expire the entry; the instance confirms it is unchanged
+    with patch("utils.upstream_cache.time.time", return_value=10**10):
+        mock_request.return_value = MagicMock(
+            status_code=304, headers={"Cache-Control": "max-age=60"}
+        )
+        revalidated = client.get("/api/v1/custom_emojis", headers=headers)
+    assert revalidated.headers["X-Cache"] == "REVALIDATED"
+    assert revalidated.data == b"[]"
+    assert mock_request.call_args.kwargs["headers"]["If-None-Match"] == '"v1"'
+
+    metrics = json.loads(client.get("/api/v1/metrics").data)["upstream_cache"]
+    assert metrics["hits"] == 1
+    assert metrics["revalidated"] == 1
+    assert metrics["hit_rate"] == pytest.approx(2 / 3)
+
+
+@patch("routes.proxy.upstream_request")
+def test_encoded_bodies_only_reach_clients_that_accept_them(mock_request, client):
+    """Test that a client sending no Accept-Encoding never gets an upstream gzip body."""
+    encoded = gzip.compress(b"[]")
+
+    def instance(method, url, headers=None, **kwargs):
+        response = MagicMock()
+        response.status_code = 200
+        if "gzip" in headers["Accept-Encoding"]:
+            response.headers = _headers(
+                Cache_Control="max-age=60",
+                Content_Encoding="gzip",
+                Content_Length=str(len(encoded)),
+            )
+            response.raw.read.return_value = encoded
+        else:
+            response.headers = _headers(Cache_Control="max-age=60")
+            response.raw.read.return_value = b"[]"
+        return response
+
+    mock_request.side_effect = instance
+    instance_header = {"X-Mastodon-Instance": "https://mastodon.social"}
+
+    compressed = client.get(
+        "/api/v1/custom_emojis", headers=dict(instance_header, **{"Accept-Encoding": "gzip"})
+    )
+    assert compressed.headers["Content-Encoding"] == "gzip"
+
+    plain = client.get("/api/v1/custom_emojis", headers=instance_header)
+    assert plain.headers["X-Cache"] == "MISS"
+    assert "Content-Encoding" not in plain.headers
+    assert plain.data == b"[]"
+    assert mock_request.call_args.kwargs["headers"]["Accept-Encoding"] == "identity"
+
+    # Each client is then served its own stored copy
+    assert client.get("/api/v1/custom_emojis", headers=instance_header).data == b"[]"
+    assert mock_request.call_count == 2
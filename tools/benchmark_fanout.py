@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Fan-out Benchmark Tool
+
+Compares the fan-out-on-read model (rank a candidate pool on every read) with
+the fan-out-on-write model (push new posts into per-user inboxes at ingest and
+merge the inbox with cached rankings on read).
+
+Inboxes and affinities are stored in the database, so fan-out-on-write
+timings include their round trips while the fan-out-on-read model is scored
+in memory. Run it against a scratch database: the inbox and affinity tables
+are cleared first.
+
+Example:
+    python tools/benchmark_fanout.py --users 5000 --authors 500 --posts 2000
+"""
+
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ALGORITHM_CONFIG, FANOUT_CONFIG
+from core.ranking_algorithm import (
+    author_score_from_counts,
+    engagement_score_from_total,
+    recency_score_from_age,
+)
+from db.connection import get_db_connection
+from utils import feed_inbox
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Corgi Fan-out Benchmark Tool")
+
+    parser.add_argument(
+        "--users", type=int, default=2000, help="Number of simulated users (default: 2000)"
+    )
+    parser.add_argument(
+        "--authors", type=int, default=300, help="Number of simulated authors (default: 300)"
+    )
+    parser.add_argument(
+        "--posts", type=int, default=2000, help="Number of posts ingested (default: 2000)"
+    )
+    parser.add_argument(
+        "--interactions-per-user",
+        type=int,
+        default=30,
+        help="Historical interactions per user (default: 30)",
+    )
+    parser.add_argument(
+        "--reads",
+        type=int,
+        default=2000,
+        help="Number of timed recommendation reads (default: 2000)",
+    )
+    parser.add_argument(
+        "--limit", type=int, default=20, help="Recommendations returned per read (default: 20)"
+    )
+    parser.add_argument(
+        "--candidate-pool",
+        type=int,
+        default=ALGORITHM_CONFIG["max_candidates"],
+        help="Candidates ranked per read in the fan-out-on-read model",
+    )
+    parser.add_argument(
+        "--inbox-size",
+        type=int,
+        default=FANOUT_CONFIG["inbox_size"],
+        help="Per-user inbox capacity",
+    )
+    parser.add_argument(
+        "--min-affinity",
+        type=float,
+        default=FANOUT_CONFIG["min_affinity"],
+        help="Affinity needed to receive a post",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument(
+        "--output", choices=["text", "json"], default="text", help="Output format (default: text)"
+    )
+
+    return parser.parse_args()
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(samples):
+    """Summarize latency samples in milliseconds."""
+    return {
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "mean_ms": sum(samples) / len(samples) * 1000,
+    }
+
+
+def build_history(conn, args, rng):
+    """Simulate user interaction history with Zipf-like author popularity."""
+    author_weights = [1 / (rank + 1) for rank in range(args.authors)]
+    authors = [f"author_{i}" for i in range(args.authors)]
+    tags = [f"tag{i}" for i in range(50)]
+
+    author_counts = {}
+    interactions = []
+    for u in range(args.users):
+        user_alias = f"user_{u}"
+        counts = defaultdict(lambda: [0, 0])
+        # Each user concentrates on a handful of favourite authors
+        favourites = rng.choices(authors, weights=author_weights, k=5)
+        for _ in range(args.interactions_per_user):
+            author = rng.choice(favourites) if rng.random() < 0.8 else rng.choice(authors)
+            positive = rng.random() < 0.9
+            action = "favorite" if positive else "less_like_this"
+            counts[author][1] += 1
+            counts[author][0] += int(positive)
+            interactions.append((user_alias, author, rng.sample(tags, 2), action))
+        author_counts[user_alias] = dict(counts)
+
+    feed_inbox.record_affinities(conn, interactions)
+
+    return authors, author_weights, tags, author_counts
+
+
+def main():
+    """Main entry point for the fan-out benchmark."""
+    args = parse_args()
+    rng = random.Random(args.seed)
+    FANOUT_CONFIG["inbox_size"] = args.inbox_size
+    FANOUT_CONFIG["min_affinity"] = args.min_affinity
+    weights = ALGORITHM_CONFIG["weights"]
+
+    with get_db_connection() as conn:
+        return run(conn, args, rng, weights)
+
+
+def run(conn, args, rng, weights):
+    """Run both models against the given connection and print the results."""
+    feed_inbox.reset_inboxes(conn)
+    authors, author_weights, tags, author_counts = build_history(conn, args, rng)
+
+    # Ingest posts: fan-out-on-write pays here, fan-out-on-read only stores them
+    now = time.time()
+    posts = []
+    write_samples = []
+    for p in range(args.posts):
+        post = {
+            "post_id": f"post_{p}",
+            "author_id": rng.choices(authors, weights=author_weights)[0],
+            "tags": rng.sample(tags, 2),
+            "created_at": now - (args.posts - p) * 60,
+            "engagement": rng.randint(0, 50),
+        }
+        posts.append(post)
+        start = time.perf_counter()
+        feed_inbox.fanout_post(
+            conn,
+            post["post_id"],
+            post["author_id"],
+            post["tags"],
+            time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(post["created_at"])),
+        )
+        write_samples.append(time.perf_counter() - start)
+
+    readers = [f"user_{rng.randrange(args.users)}" for _ in range(args.reads)]
+    pool = posts[-args.candidate_pool :]
+
+    # Fan-out-on-read: score the whole candidate pool for every read
+    read_samples = []
+    cached_rankings = {}
+    for user_alias in readers:
+        start = time.perf_counter()
+        counts = author_counts[user_alias]
+        scored = []
+        for post in pool:
+            positive, total = counts.get(post["author_id"], (0, 0))
+            score = (
+                weights["author_preference"] * author_score_from_counts(positive, total)
+                + weights["content_engagement"] * engagement_score_from_total(post["engagement"])
+                + weights["recency"] * recency_score_from_age((now - post["created_at"]) / 86400)
+            )
+            scored.append((score, post["post_id"]))
+        top = heapq.nlargest(args.limit, scored)
+        read_samples.append(time.perf_counter() - start)
+        cached_rankings[user_alias] = [(post_id, score) for score, post_id in top]
+
+    # Fan-out-on-write: merge the inbox with the cached rankings
+    merge_samples = []
+    for user_alias in readers:
+        start = time.perf_counter()
+        cached = cached_rankings[user_alias]
+        seen = {post_id for post_id, _ in cached}
+        inbox = [
+            entry[:2]
+            for entry in feed_inbox.get_inbox(conn, user_alias, args.limit)
+            if entry[0] not in seen
+        ]
+        merged = heapq.nlargest(args.limit, cached + inbox, key=lambda entry: entry[1])
+        merge_samples.append(time.perf_counter() - start)
+
+    stats = feed_inbox.get_fanout_stats(conn)
+    result = {
+        "config": vars(args),
+        "write_amplification": stats["write_amplification"],
+        "inbox_entries": stats["inbox_entries"],
+        "inboxes": stats["inboxes"],
+        "fanout_on_write": {
+            "write": summarize(write_samples),
+            "read": summarize(merge_samples),
+        },
+        "fanout_on_read": {
+            "read": summarize(read_samples),
+        },
+    }
+
+    if args.output == "json":
+        print(json.dumps(result, indent=2))
+        return 0
+
+    print(f"\nFan-out benchmark ({args.users} users, {args.authors} authors, {args.posts} posts)")
+    print("=" * 70)
+    print(f"Write amplification:      {result['write_amplification']:.1f} inbox writes per post")
+    print(f"Inboxes / entries:        {stats['inboxes']} / {stats['inbox_entries']}")
+    print("-" * 70)
+    print(f"{'':<26}{'p50 (ms)':>12}{'p95 (ms)':>12}{'mean (ms)':>12}")
+    for label, summary in (
+        ("fan-out-on-write: write", result["fanout_on_write"]["write"]),
+        ("fan-out-on-write: read", result["fanout_on_write"]["read"]),
+        ("fan-out-on-read:  read", result["fanout_on_read"]["read"]),
+    ):
+        print(
+            f"{label:<26}{summary['p50_ms']:>12.3f}{summary['p95_ms']:>12.3f}{summary['mean_ms']:>12.3f}"
+        )
+    print("=" * 70)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Logging Benchmark Tool
+
+Measures the logging cost a proxied timeline request pays on its own
+thread. Each simulated request logs the five proxy lines (REQ, UP, PRIV,
+ENRICH, RESP) and one interaction line:
+
+- before: f-string messages written synchronously to RotatingFileHandlers,
+  as the proxy used to log
+- after: log_event() through the queued JSON-lines pipeline in
+  utils/log_pipeline.py, with and without sampling
+
+Log files are written to a temporary directory. The time the listener
+thread needs to drain the queue afterwards is reported separately.
+
+Example:
+    python tools/benchmark_logging.py --requests 20000 --threads 8
+"""
+
+import argparse
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import LOG_PIPELINE_CONFIG
+from utils import log_pipeline
+from utils.log_pipeline import log_event
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Corgi Logging Benchmark Tool")
+
+    parser.add_argument(
+        "--requests", type=int, default=10000, help="Simulated requests per mode (default: 10000)"
+    )
+    parser.add_argument(
+        "--threads", type=int, default=4, help="Concurrent request threads (default: 4)"
+    )
+    parser.add_argument(
+        "--interval-ms",
+        type=float,
+        default=1.0,
+        help="Untimed pause between requests per thread, standing in for "
+        "upstream I/O (default: 1.0)",
+    )
+    parser.add_argument(
+        "--sample-rate",
+        type=float,
+        default=0.1,
+        help="Sample rate for the sampled mode (default: 0.1)",
+    )
+    parser.add_argument(
+        "--output", choices=["text", "json"], default="text", help="Output format (default: text)"
+    )
+
+    return parser.parse_args()
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(samples):
+    """Summarize per-request overhead in microseconds."""
+    return {
+        "p50_us": percentile(samples, 50) * 1e6,
+        "p99_us": percentile(samples, 99) * 1e6,
+        "mean_us": sum(samples) / len(samples) * 1e6,
+    }
+
+
+def sync_loggers(logs_dir):
+    """Build the previous synchronous file loggers."""
+    loggers = []
+    for name, filename, fmt in (
+        ("bench_sync_proxy", "sync_proxy.log", "%(asctime)s [%(levelname)s] %(message)s"),
+        ("bench_sync_interactions", "sync_interactions.log", "%(asctime)s | %(message)s"),
+    ):
+        target = logging.getLogger(name)
+        target.setLevel(logging.INFO)
+        target.propagate = False
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(logs_dir, filename), maxBytes=10 * 1024 * 1024, backupCount=5
+        )
+        handler.setFormatter(logging.Formatter(fmt))
+        target.addHandler(handler)
+        loggers.append(target)
+    return loggers
+
+
+def pipeline_loggers(prefix):
+    """Build loggers on the queued JSON-lines pipeline."""
+    loggers = []
+    for suffix in ("proxy", "interactions"):
+        target = log_pipeline.configure_file_logger(f"{prefix}_{suffix}", f"{prefix}_{suffix}.log")
+        target.propagate = False
+        loggers.append(target)
+    return loggers
+
+
+def request_before(proxy_logger, interaction_logger, request_id):
+    """Log one request the way the proxy used to."""
+    proxy_logger.info(
+        f"REQ-{request_id} | GET /timelines/home | "
+        f"Target: https://mastodon.social | "
+        f"User: user_{request_id % 500} | "
+        f"Client: 127.0.0.1 | "
+        f"UA: Mozilla/5.0"
+    )
+    proxy_logger.info(
+        f"UP-{request_id} | Upstream response | "
+        f"Status: 200 | "
+        f"Time: {0.123:.3f}s | "
+        f"Size: {48213} bytes"
+    )
+    proxy_logger.info(
+        f"PRIV-{request_id} | Privacy check | "
+        f"User: user_{request_id % 500} | "
+        f"Level: full | "
+        f"Can enrich: True"
+    )
+    proxy_logger.info(
+        f"ENRICH-{request_id} | Timeline enriched | "
+        f"Original posts: 20 | "
+        f"Recs added: 6 | "
+        f"Final posts: 26 | "
+        f"Rec time: {0.012:.3f}s | "
+        f"Blend time: {0.001:.3f}s"
+    )
+    proxy_logger.info(
+        f"RESP-{request_id} | Request completed | "
+        f"Status: 200 | "
+        f"Total time: {0.141:.3f}s | "
+        f"Enriched: enriched"
+    )
+    interaction_logger.info(f"alias_{request_id % 500} | post_{request_id} | favorite")
+
+
+def request_after(proxy_logger, interaction_logger, request_id):
+    """Log one request through the pipeline."""
+    log_event(
+        proxy_logger,
+        "REQ",
+        "GET /timelines/home",
+        request_id=request_id,
+        target="https://mastodon.social",
+        user=f"user_{request_id % 500}",
+        client="127.0.0.1",
+        ua="Mozilla/5.0",
+    )
+    log_event(
+        proxy_logger,
+        "UP",
+        "Upstream response",
+        request_id=request_id,
+        status=200,
+        time=0.123,
+        size=48213,
+    )
+    log_event(
+        proxy_logger,
+        "PRIV",
+        "Privacy check",
+        request_id=request_id,
+        user=f"user_{request_id % 500}",
+        privacy_level="full",
+        can_enrich=True,
+    )
+    log_event(
+        proxy_logger,
+        "ENRICH",
+        "Timeline enriched",
+        request_id=request_id,
+        original_posts=20,
+        recs_added=6,
+        final_posts=26,
+        rec_time=0.012,
+        blend_time=0.001,
+    )
+    log_event(
+        proxy_logger,
+        "RESP",
+        "Request completed",
+        request_id=request_id,
+        status=200,
+        total_time=0.141,
+        enriched="enriched",
+    )
+    log_event(
+        interaction_logger,
+        "INTERACTION",
+        "Interaction logged",
+        user_alias=f"alias_{request_id % 500}",
+        post_id=f"post_{request_id}",
+        action_type="favorite",
+    )
+
+
+def run(log_request, loggers, args):
+    """Log args.requests requests from args.threads threads, timing each one."""
+    samples = []
+    lock = threading.Lock()
+    per_thread = args.requests // args.threads
+
+    def worker(offset):
+        local = []
+        for request_id in range(offset, offset + per_thread):
+            start = time.perf_counter()
+            log_request(*loggers, request_id)
+            local.append(time.perf_counter() - start)
+            time.sleep(args.interval_ms / 1000)
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    drain_start = time.perf_counter()
+    log_pipeline.flush_log_pipeline(timeout=60)
+    drain = time.perf_counter() - drain_start
+    stats = log_pipeline.get_log_pipeline_stats()
+    return dict(
+        summarize(samples),
+        wall_s=elapsed,
+        drain_s=drain,
+        dropped=sum(stats["dropped"].get(target.name, 0) for target in loggers),
+        sampled_out=sum(stats["sampled_out"].values()),
+    )
+
+
+def main():
+    """Main entry point for the logging benchmark."""
+    args = parse_args()
+    logs_dir = tempfile.mkdtemp(prefix="corgi-logbench-")
+    log_pipeline.LOGS_DIR = logs_dir
+
+    results = {"before": run(request_before, sync_loggers(logs_dir), args)}
+
+    LOG_PIPELINE_CONFIG["sample_rates"] = {}
+    results["after"] = run(request_after, pipeline_loggers("unsampled"), args)
+
+    LOG_PIPELINE_CONFIG["sample_rates"] = {
+        category: args.sample_rate for category in ("REQ", "UP", "PRIV", "ENRICH", "RESP")
+    }
+    results["after_sampled"] = run(request_after, pipeline_loggers("sampled"), args)
+    log_pipeline.stop_log_pipeline()
+
+    result = {"config": vars(args), "logs_dir": logs_dir, "results": results}
+    if args.output == "json":
+        print(json.dumps(result, indent=2))
+        return 0
+
+    print(
+        f"\nLogging benchmark ({args.requests} requests, {args.threads} threads, 6 lines per request)"
+    )
+    print("=" * 78)
+    print(
+        f"{'':<28}{'p50 (us)':>10}{'p99 (us)':>10}{'mean (us)':>11}{'drain (s)':>10}{'dropped':>9}"
+    )
+    for label, key in (
+        ("before: sync f-strings", "before"),
+        ("after: queued JSON", "after"),
+        (f"after: sampled at {args.sample_rate:g}", "after_sampled"),
+    ):
+        r = results[key]
+        print(
+            f"{label:<28}{r['p50_us']:>10.1f}{r['p99_us']:>10.1f}{r['mean_us']:>11.1f}"
+            f"{r['drain_s']:>10.2f}{r['dropped']:>9}"
+        )
+    print("-" * 78)
+    print(f"Sampled out:      {results['after_sampled']['sampled_out']}")
+    print(f"Log files:        {logs_dir}")
+    print("=" * 78)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Bulk Post Ingestion Tool
+
+Loads fediverse posts into post_metadata from JSON-lines files, Mastodon API
+page dumps and instance public timelines, and reports the load rate.
+
+Examples:
+    python tools/ingest_posts.py posts.jsonl --checkpoint ingest.json
+    python tools/ingest_posts.py https://mastodon.social https://fosstodon.org \\
+        --checkpoint ingest.json --follow
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.post_ingestion import PostIngester
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger("ingest_posts")
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Corgi Bulk Post Ingestion Tool")
+
+    parser.add_argument(
+        "sources",
+        nargs="+",
+        help="JSON-lines or JSON files, or instance URLs (http:// or https://)",
+    )
+    parser.add_argument(
+        "--checkpoint", help="File recording progress per source; rerunning resumes from it"
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Keep polling instance timelines for new posts until interrupted",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, help="Posts per COPY and merge (default: POST_INGESTION_CONFIG)"
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point for the ingestion tool."""
+    args = parse_args()
+    ingester = PostIngester(checkpoint_path=args.checkpoint, batch_size=args.batch_size)
+
+    try:
+        stats = ingester.ingest(args.sources, follow=args.follow)
+    except KeyboardInterrupt:
+        logger.info("Interrupted; rerun with the same checkpoint to resume")
+        stats = ingester.stats
+    except Exception as e:
+        logger.error(f"Ingestion failed: {e}")
+        return 1
+
+    print(
+        f"\nIngested {stats['loaded']} posts in {stats['elapsed_seconds']}s "
+        f"({stats['rows_per_sec']} rows/s)"
+    )
+    print("=" * 60)
+    for name in ("read", "invalid", "duplicates", "inserted", "updated", "batches"):
+        print(f"{name:<12} {stats[name]}")
+    print("=" * 60)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Fan-out Affinity Rebuild Tool
+
+Recomputes the user_affinities table used by fan-out-on-write from recent
+interactions. Affinities are updated live as interactions are written, so
+this is only needed when fan-out is first enabled, or to let old
+interactions age out. Run it once per deployment, not per worker.
+
+Example:
+    python tools/rebuild_affinities.py --days 30
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connection import get_db_connection
+from utils.feed_inbox import rebuild_affinity_index
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger("rebuild_affinities")
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Corgi Fan-out Affinity Rebuild Tool")
+
+    parser.add_argument(
+        "--days", type=int, default=30, help="How far back to read interactions (default: 30)"
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point for the rebuild tool."""
+    args = parse_args()
+
+    try:
+        with get_db_connection() as conn:
+            processed = rebuild_affinity_index(conn, days_limit=args.days)
+    except Exception as e:
+        logger.error(f"Rebuild failed: {e}")
+        return 1
+
+    print(f"Rebuilt fan-out affinities from {processed} interactions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
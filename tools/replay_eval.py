@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Offline Replay Evaluation Tool
+
+Replays historical interactions through the ranking algorithm and reports
+hit rate and NDCG for one or more ranking weight configurations.
+
+Examples:
+    python tools/replay_eval.py --db --export-snapshot snapshot.jsonl
+    python tools/replay_eval.py --snapshot snapshot.jsonl --sweep 0.1 --workers 8
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.replay_evaluation import (
+    build_corpus,
+    evaluate,
+    export_snapshot,
+    load_from_db,
+    load_snapshot,
+    weight_grid,
+)
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger("replay_eval")
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Corgi Offline Replay Evaluation Tool")
+
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--snapshot", help="JSON-lines snapshot file to replay")
+    source.add_argument(
+        "--db", action="store_true", help="Replay directly from the configured database"
+    )
+
+    parser.add_argument("--export-snapshot", help="With --db, write a snapshot file and exit")
+    parser.add_argument(
+        "--k", type=int, default=10, help="Ranking cutoff for hit rate and NDCG (default: 10)"
+    )
+    parser.add_argument(
+        "--horizon-hours",
+        type=float,
+        default=24,
+        help="Window after each evaluation point that counts as relevant (default: 24)",
+    )
+    parser.add_argument(
+        "--min-history",
+        type=int,
+        default=1,
+        help="Earlier interactions required before evaluating a user (default: 1)",
+    )
+    parser.add_argument(
+        "--max-candidates", type=int, help="Candidate pool size (default: ALGORITHM_CONFIG)"
+    )
+    parser.add_argument(
+        "--decay-days",
+        type=float,
+        help="Recency decay constant in days (default: ALGORITHM_CONFIG)",
+    )
+    parser.add_argument(
+        "--sweep",
+        type=float,
+        metavar="STEP",
+        help="Evaluate every weight combination on a grid with this step",
+    )
+    parser.add_argument(
+        "--weights",
+        type=json.loads,
+        action="append",
+        help="Weight configuration as JSON (repeatable)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Worker processes (default: CPU count, 1 disables multiprocessing)",
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="Number of configurations to print (default: 10)"
+    )
+    parser.add_argument("--output", help="Write all results as JSON to this file")
+
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point for the replay evaluation tool."""
+    args = parse_args()
+    start_time = time.time()
+
+    if args.db:
+        from db.connection import get_db_connection
+
+        with get_db_connection() as conn:
+            if args.export_snapshot:
+                export_snapshot(conn, args.export_snapshot)
+                return 0
+            posts, interactions = load_from_db(conn)
+            corpus, user_histories = build_corpus(posts, interactions)
+    else:
+        posts, interactions = load_snapshot(args.snapshot)
+        corpus, user_histories = build_corpus(posts, interactions)
+
+    weight_configs = args.weights or []
+    if args.sweep:
+        weight_configs.extend(weight_grid(args.sweep))
+
+    results = evaluate(
+        corpus,
+        user_histories,
+        weight_configs=weight_configs or None,
+        k=args.k,
+        horizon_hours=args.horizon_hours,
+        min_history=args.min_history,
+        max_candidates=args.max_candidates,
+        decay_days=args.decay_days,
+        workers=args.workers,
+    )
+
+    elapsed = time.time() - start_time
+    hit_key, ndcg_key = f"hit_rate@{args.k}", f"ndcg@{args.k}"
+
+    print(f"\nReplay evaluation ({results[0]['eval_points']} evaluation points, {elapsed:.1f}s)")
+    print("=" * 80)
+    print(f"{'author':<8} {'engage':<8} {'recency':<8} {hit_key:<14} {ndcg_key:<12} {'coverage'}")
+    print("-" * 80)
+    for result in results[: args.top]:
+        w = result["weights"]
+        print(
+            f"{w['author_preference']:<8.2f} {w['content_engagement']:<8.2f} {w['recency']:<8.2f} "
+            f"{result[hit_key]:<14.4f} {result[ndcg_key]:<12.4f} {result['candidate_coverage']:.4f}"
+        )
+    print("=" * 80)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Wrote {len(results)} results to {args.output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
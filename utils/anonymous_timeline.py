@@ -0,0 +1,194 @@
+"""
+Anonymous timeline module for the Corgi Recommender Service.
+
+Every anonymous visitor gets effectively the same home timeline: cold start
+posts injected with the anonymous strategy, differing only in the shuffle.
+Rather than loading, copying and serializing those posts per request, a few
+variants are built per rotation period and kept as ready-to-send bodies,
+one per content coding, each with a strong ETag:
+
+- Requests are answered straight from those bytes, with public Cache-Control
+  headers lasting until the end of the period, so a front proxy can cache
+  them as well. Conditional requests for any current variant get a 304.
+- When a period ends, the next request rebuilds the variants in the
+  background while the previous ones keep being served.
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Response, request
+
+from config import ANONYMOUS_TIMELINE_CONFIG, COMPRESSION_CONFIG
+from utils import compression
+
+logger = logging.getLogger(__name__)
+
+# One precomputed timeline: encoding -> ETag and encoding -> body
+AnonymousVariant = namedtuple("AnonymousVariant", ["etags", "bodies"])
+
+# generation: rotation period the variants were built for
+VariantSet = namedtuple("VariantSet", ["generation", "expires_at", "variants"])
+
+_lock = threading.Lock()
+# key (requested strategy) -> VariantSet
+_variant_sets = {}
+_building = set()
+_counter = itertools.count()
+_stats = {"served": 0, "not_modified": 0, "builds": 0, "build_errors": 0}
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="anonymous-timeline")
+
+
+def encode_variant(timeline: list) -> AnonymousVariant:
+    """
+    Serialize and compress a timeline once for every client.
+
+    Args:
+        timeline: Posts to serve
+
+    Returns:
+        AnonymousVariant: Bodies for identity, gzip and (if installed) brotli
+    """
+    body = json.dumps(timeline, separators=(",", ":"), default=str).encode("utf-8")
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    bodies = {"identity": body, "gzip": compression.compress_body(body, "gzip")}
+    if compression.BROTLI_AVAILABLE:
+        bodies["br"] = compression.compress_body(body, "br")
+    etags = {
+        encoding: digest if encoding == "identity" else f"{digest}-{encoding}"
+        for encoding in bodies
+    }
+    return AnonymousVariant(etags, bodies)
+
+
+def _build(key, build, generation):
+    rotate_seconds = ANONYMOUS_TIMELINE_CONFIG["rotate_seconds"]
+    variants = {}
+    try:
+        for _ in range(ANONYMOUS_TIMELINE_CONFIG["variants"]):
+            timeline = build()
+            if timeline is None:
+                break
+            variant = encode_variant(timeline)
+            # Shuffles can repeat with few posts; keep each body once
+            variants.setdefault(variant.etags["identity"], variant)
+    except Exception as e:
+        logger.error(f"Building anonymous timeline variants failed: {e}")
+        with _lock:
+            _building.discard(key)
+            _stats["build_errors"] += 1
+        return _variant_sets.get(key)
+
+    variant_set = VariantSet(generation, (generation + 1) * rotate_seconds, list(variants.values()))
+    with _lock:
+        _variant_sets[key] = variant_set
+        _building.discard(key)
+        _stats["builds"] += 1
+    return variant_set
+
+
+def get_variants(key, build) -> VariantSet:
+    """
+    Get the current variants, rebuilding them once their period is over.
+
+    Args:
+        key: Hashable identifier of the timeline (e.g. the requested strategy)
+        build: Callable returning a freshly built timeline, or None if there
+            is nothing to serve; called once per variant
+
+    Returns:
+        VariantSet: Possibly from the previous period while a rebuild runs,
+        or None if building failed
+    """
+    generation = int(time.time() // ANONYMOUS_TIMELINE_CONFIG["rotate_seconds"])
+    with _lock:
+        current = _variant_sets.get(key)
+        if current and current.generation == generation:
+            return current
+        start = key not in _building
+        if start:
+            _building.add(key)
+
+    if current is None:
+        # Nothing to serve yet; build in this request
+        return _build(key, build, generation)
+    if start:
+        _executor.submit(_build, key, build, generation)
+    return current
+
+
+def anonymous_timeline_response(key, build):
+    """
+    Answer an anonymous timeline request from precomputed bytes.
+
+    Must run inside a Flask request context.
+
+    Args:
+        key: Hashable identifier of the timeline, see get_variants()
+        build: Callable building one variant, see get_variants()
+
+    Returns:
+        Response, or None if no variants could be built (the caller builds
+        the timeline itself)
+    """
+    variant_set = get_variants(key, build)
+    if not variant_set or not variant_set.variants:
+        return None
+
+    max_age = max(0, int(variant_set.expires_at - time.time()))
+    headers = {
+        "Cache-Control": f"public, max-age={max_age}",
+        # Never serve this to a signed-in user from a shared cache
+        "Vary": "Accept-Encoding, Authorization",
+    }
+    for variant in variant_set.variants:
+        for etag in variant.etags.values():
+            if request.if_none_match.contains(etag):
+                with _lock:
+                    _stats["not_modified"] += 1
+                return Response(status=304, headers=dict(headers, ETag=f'"{etag}"'))
+
+    variant = variant_set.variants[next(_counter) % len(variant_set.variants)]
+    encoding = (
+        compression.choose_encoding(request.accept_encodings)
+        if COMPRESSION_CONFIG["enabled"]
+        else None
+    )
+    if encoding not in variant.bodies:
+        encoding = "identity"
+    response = Response(
+        variant.bodies[encoding],
+        mimetype="application/json",
+        headers=dict(headers, ETag=f'"{variant.etags[encoding]}"'),
+    )
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    with _lock:
+        _stats["served"] += 1
+    return response
+
+
+def get_anonymous_timeline_stats() -> dict:
+    """Get serving and build counters."""
+    with _lock:
+        return dict(
+            _stats,
+            enabled=ANONYMOUS_TIMELINE_CONFIG["enabled"],
+            variant_sets=len(_variant_sets),
+            building=len(_building),
+        )
+
+
+def clear_anonymous_timelines() -> None:
+    """Forget precomputed variants and counters."""
+    with _lock:
+        _variant_sets.clear()
+        for name in _stats:
+            _stats[name] = 0
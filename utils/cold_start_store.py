@@ -0,0 +1,207 @@
+"""
+Cold start store module for the Corgi Recommender Service.
+
+Cold start posts are served by the proxy (COLD_START_POSTS_PATH), the
+recommendation engine and the timeline route (data/cold_start_formatted.json).
+A ColdStartStore holds one such file in memory:
+
+- The file is parsed and validated once, and read again only when its
+  modification time or size changes (checked at most every
+  COLD_START_RELOAD_CHECK_SECONDS). A file that fails to load leaves the
+  last good posts in place.
+- Posts are indexed by id, category and tag, so lookups and samples cost
+  O(1) and O(k) instead of a scan over the whole file.
+- Callers get shallow copies and may set top-level fields freely.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+from config import COLD_START_RELOAD_CHECK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_stores_lock = threading.Lock()
+_stores = {}
+
+
+def _tag_names(post):
+    names = []
+    for tag in post.get("tags") or ():
+        name = tag.get("name") if isinstance(tag, dict) else tag
+        if isinstance(name, str) and name:
+            names.append(name.lower())
+    return names
+
+
+class ColdStartStore:
+    """
+    In-memory, indexed copy of a cold start posts file.
+
+    Args:
+        path: Path of the JSON file (a list of Mastodon-compatible posts)
+        prepare: Optional callable applied to each post once per load
+    """
+
+    def __init__(self, path, prepare=None):
+        self.path = path
+        self.prepare = prepare
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0
+        self._posts = []
+        self._by_id = {}
+        self._by_category = {}
+        self._by_tag = {}
+        self._stats = {"loads": 0, "errors": 0, "invalid_posts": 0}
+
+    def _load(self, signature):
+        # Caller holds the lock
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if not isinstance(data, list):
+                raise ValueError(f"expected a list of posts, got {type(data).__name__}")
+        except Exception as e:
+            self.last_error = str(e)
+            self._stats["errors"] += 1
+            logger.error(f"Error loading cold start posts from {self.path}: {e}")
+            return
+
+        posts, by_id = [], {}
+        by_category, by_tag = defaultdict(list), defaultdict(list)
+        for post in data:
+            if (
+                not isinstance(post, dict)
+                or post.get("id") is None
+                or post.get("id") in by_id
+                or "content" not in post
+            ):
+                self._stats["invalid_posts"] += 1
+                continue
+            if self.prepare:
+                self.prepare(post)
+            posts.append(post)
+            by_id[post["id"]] = post
+            if post.get("category"):
+                by_category[post["category"]].append(post)
+            for name in _tag_names(post):
+                by_tag[name].append(post)
+
+        self._posts, self._by_id = posts, by_id
+        self._by_category, self._by_tag = dict(by_category), dict(by_tag)
+        self._signature = signature
+        self.last_error = None
+        self._stats["loads"] += 1
+        logger.info(f"Loaded {len(posts)} cold start posts from {self.path}")
+
+    def _current(self):
+        now = time.time()
+        with self._lock:
+            if self._signature is None or now - self._checked_at >= COLD_START_RELOAD_CHECK_SECONDS:
+                self._checked_at = now
+                try:
+                    stat = os.stat(self.path)
+                    signature = (stat.st_mtime_ns, stat.st_size)
+                except OSError as e:
+                    signature = None
+                    if not self.last_error:
+                        self.last_error = str(e)
+                        self._stats["errors"] += 1
+                        logger.error(f"Error loading cold start posts from {self.path}: {e}")
+                if signature is not None and signature != self._signature:
+                    self._load(signature)
+            return self._posts, self._by_id, self._by_category, self._by_tag
+
+    def __len__(self):
+        return len(self._current()[0])
+
+    def posts(self) -> list:
+        """Get all posts, in file order."""
+        return [dict(post) for post in self._current()[0]]
+
+    def get(self, post_id):
+        """Get a post by id, or None."""
+        post = self._current()[1].get(post_id)
+        return dict(post) if post is not None else None
+
+    def by_category(self, category: str) -> list:
+        """Get the posts of a category."""
+        return [dict(post) for post in self._current()[2].get(category, ())]
+
+    def by_tag(self, tag: str) -> list:
+        """Get the posts carrying a tag (case-insensitive)."""
+        return [dict(post) for post in self._current()[3].get(tag.lower(), ())]
+
+    def categories(self) -> list:
+        """Get the categories present in the file."""
+        return list(self._current()[2])
+
+    def sample(self, k: int, category: str = None, tag: str = None, exclude_ids=()) -> list:
+        """
+        Pick up to k distinct random posts.
+
+        Args:
+            k: Number of posts wanted
+            category: Only sample this category
+            tag: Only sample posts with this tag
+            exclude_ids: IDs of posts not to return (e.g. already shown)
+
+        Returns:
+            list: Up to k posts in random order
+        """
+        posts, _, by_category, by_tag = self._current()
+        if category is not None:
+            posts = by_category.get(category, [])
+        if tag is not None:
+            posts = by_tag.get(tag.lower(), [])
+            if category is not None:
+                posts = [post for post in posts if post.get("category") == category]
+        exclude = set(exclude_ids)
+        # Draw enough to make up for excluded posts, without scanning the rest
+        picked = random.sample(posts, min(len(posts), k + len(exclude)))
+        return [dict(post) for post in picked if post["id"] not in exclude][:k]
+
+    def stats(self) -> dict:
+        posts = self._current()[0]
+        with self._lock:
+            return dict(self._stats, path=self.path, posts=len(posts), last_error=self.last_error)
+
+
+def get_cold_start_store(path: str, prepare=None) -> ColdStartStore:
+    """
+    Get the shared store of a cold start posts file.
+
+    Args:
+        path: Path of the JSON file
+        prepare: Callable applied to each post on load; only used by the
+            call that creates the store
+
+    Returns:
+        ColdStartStore
+    """
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ColdStartStore(path, prepare)
+        return store
+
+
+def get_cold_start_store_stats() -> list:
+    """Get load counters of every store."""
+    with _stores_lock:
+        stores = list(_stores.values())
+    return [store.stats() for store in stores]
+
+
+def clear_cold_start_stores() -> None:
+    """Forget every store; the next access reloads its file."""
+    with _stores_lock:
+        _stores.clear()
@@ -0,0 +1,150 @@
+"""
+Compression module for the Corgi Recommender Service.
+
+This module compresses responses the service builds or modifies itself
+(timelines, posts, analytics, enriched proxy responses) according to the
+client's Accept-Encoding:
+
+- Brotli is preferred when the client accepts it and the brotli package is
+  installed, otherwise gzip.
+- Bodies under min_bytes are sent as they are; the framing costs more than
+  it saves. Bodies over large_bytes are compressed at fast_level so large
+  payloads don't cost more CPU time than the transfer they save.
+- Responses that already carry a Content-Encoding (upstream bodies passed
+  through untouched) and streamed responses are never touched.
+"""
+
+import gzip
+import threading
+
+from flask import request
+
+from config import COMPRESSION_CONFIG
+
+try:
+    import brotli
+
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+COMPRESSIBLE_MIMETYPES = frozenset(
+    [
+        "application/json",
+        "application/activity+json",
+        "application/javascript",
+        "application/xml",
+        "image/svg+xml",
+    ]
+)
+
+# Statuses whose bodies are empty or must not change
+_UNCOMPRESSED_STATUSES = frozenset([204, 206, 304])
+
+_stats_lock = threading.Lock()
+_stats = {"compressed": 0, "skipped": 0, "bytes_in": 0, "bytes_out": 0}
+
+
+def choose_encoding(accept_encodings) -> str:
+    """
+    Pick the content coding to use for a client.
+
+    Args:
+        accept_encodings: The request's parsed Accept-Encoding
+            (request.accept_encodings)
+
+    Returns:
+        str: 'br', 'gzip' or None if the client accepts neither
+    """
+    if BROTLI_AVAILABLE and accept_encodings.quality("br") > 0:
+        return "br"
+    if accept_encodings.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    """
+    Compress a body at the level its size calls for.
+
+    Args:
+        body: Uncompressed body
+        encoding: 'br' or 'gzip'
+
+    Returns:
+        bytes: Compressed body
+    """
+    large = len(body) >= COMPRESSION_CONFIG["large_bytes"]
+    if encoding == "br":
+        quality = (
+            COMPRESSION_CONFIG["fast_level"] if large else COMPRESSION_CONFIG["brotli_quality"]
+        )
+        return brotli.compress(body, quality=quality, mode=brotli.MODE_TEXT)
+    level = COMPRESSION_CONFIG["fast_level"] if large else COMPRESSION_CONFIG["gzip_level"]
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def _compressible(response):
+    if response.direct_passthrough or response.is_streamed:
+        return False
+    if response.status_code < 200 or response.status_code in _UNCOMPRESSED_STATUSES:
+        return False
+    if "Content-Encoding" in response.headers or "no-transform" in response.headers.get(
+        "Cache-Control", ""
+    ):
+        return False
+    mimetype = response.mimetype or ""
+    return mimetype.startswith("text/") or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def compress_response(response):
+    """
+    Compress a Flask response for the current request if worthwhile.
+
+    Registered as an after_request hook, and applied by the async proxy to
+    the Flask responses it relays. Must run inside a Flask request context.
+
+    Args:
+        response: Flask response
+
+    Returns:
+        The same response, compressed in place if it qualified
+    """
+    if not COMPRESSION_CONFIG["enabled"] or not _compressible(response):
+        return response
+
+    # Clients that can't decode still need to know the body may vary
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESSION_CONFIG["min_bytes"]:
+        with _stats_lock:
+            _stats["skipped"] += 1
+        return response
+
+    compressed = compress_body(body, encoding)
+    if len(compressed) >= len(body):
+        with _stats_lock:
+            _stats["skipped"] += 1
+        return response
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    # The compressed body is a different representation of the same resource
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    with _stats_lock:
+        _stats["compressed"] += 1
+        _stats["bytes_in"] += len(body)
+        _stats["bytes_out"] += len(compressed)
+    return response
+
+
+def get_compression_stats() -> dict:
+    """Get counts of compressed and skipped responses and bytes saved."""
+    with _stats_lock:
+        return dict(_stats, brotli=BROTLI_AVAILABLE)
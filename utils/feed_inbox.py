@@ -0,0 +1,371 @@
+"""
+Feed inbox module for the Corgi Recommender Service.
+
+This module provides an optional fan-out-on-write path for recommendations.
+When a post is ingested it is pushed into a bounded candidate inbox for each
+user with a high affinity for the post's author or tags, so reading
+recommendations for those users becomes a merge of a small inbox with their
+cached rankings instead of a full ranking pass.
+
+Affinity is a net interaction count per (user, author) and (user, tag). Both
+affinities and inboxes live in PostgreSQL (user_affinities and feed_inboxes)
+so every worker delivers to and reads from the same inboxes. Affinities are
+updated as interactions are written, and can be rebuilt from the
+interactions table with tools/rebuild_affinities.py.
+"""
+
+import heapq
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from config import ALGORITHM_CONFIG, FANOUT_CONFIG
+from core.ranking_algorithm import (
+    NEGATIVE_ACTIONS,
+    POSITIVE_ACTIONS,
+    recency_score_from_age,
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Tags are a weaker signal than authors when picking recipients
+TAG_AFFINITY_WEIGHT = 0.5
+# A negative interaction outweighs a single positive one
+AFFINITY_DELTAS = {action: 1.0 for action in POSITIVE_ACTIONS}
+AFFINITY_DELTAS.update({action: -2.0 for action in NEGATIVE_ACTIONS})
+
+AUTHOR_REASON = "From an author you engage with"
+TAG_REASON = "Because you engage with #{tag}"
+
+# Per-process counters; inbox sizes are read from the database
+_stats_lock = threading.Lock()
+_fanout_stats = defaultdict(int)
+
+
+def _parse_timestamp(created_at) -> float:
+    """Convert a post's created_at value to epoch seconds (now if missing)."""
+    if isinstance(created_at, datetime):
+        return created_at.timestamp()
+    if isinstance(created_at, str):
+        try:
+            return datetime.fromisoformat(created_at.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+def _preference(affinity: float) -> float:
+    """Map a net affinity count to a 0-1 preference score."""
+    return 1 - math.exp(-max(affinity, 0.0) / FANOUT_CONFIG["min_affinity"])
+
+
+def _add_affinities(cur, interactions: Iterable[Tuple]) -> None:
+    """Apply interactions to user_affinities and drop rows that reach zero."""
+    deltas = defaultdict(float)
+    for user_alias, author_id, tags, action_type in interactions:
+        delta = AFFINITY_DELTAS.get(action_type)
+        if not delta:
+            continue
+        if author_id:
+            deltas[("author", str(author_id), user_alias)] += delta
+        for tag in set(tag.lower() for tag in tags or []):
+            deltas[("tag", tag, user_alias)] += delta
+    if not deltas:
+        return
+
+    # Sorted so concurrent writers lock rows in the same order
+    updated = execute_values(
+        cur,
+        """
+        INSERT INTO user_affinities (kind, target, user_alias, affinity)
+        VALUES %s
+        ON CONFLICT (kind, target, user_alias)
+        DO UPDATE SET affinity = user_affinities.affinity + EXCLUDED.affinity
+        RETURNING kind, target, user_alias, affinity
+    """,
+        [key + (delta,) for key, delta in sorted(deltas.items())],
+        fetch=True,
+    )
+
+    exhausted = [tuple(row[:3]) for row in updated if row[3] <= 0]
+    if exhausted:
+        execute_values(
+            cur,
+            """
+            DELETE FROM user_affinities
+            WHERE (kind, target, user_alias) IN (VALUES %s)
+        """,
+            exhausted,
+        )
+
+
+def record_affinities(conn, interactions: Iterable[Tuple]) -> bool:
+    """
+    Update users' affinities for posts' authors and tags after interactions.
+
+    Args:
+        conn: Database connection
+        interactions: (user_alias, author_id, tags, action_type) tuples
+
+    Returns:
+        bool: True if successful, False on error
+    """
+    try:
+        with conn.cursor() as cur:
+            _add_affinities(cur, interactions)
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error recording fan-out affinities: {e}")
+        conn.rollback()
+        return False
+
+
+def rebuild_affinity_index(conn, days_limit: int = 30) -> int:
+    """
+    Rebuild the affinity index from recent interactions.
+
+    Args:
+        conn: Database connection
+        days_limit: How far back to read interactions
+
+    Returns:
+        Number of interactions processed
+    """
+    with conn.cursor() as cur:
+        # Locked before reading, so concurrent rebuilds run in turn on fresh
+        # snapshots and live updates wait instead of being overwritten
+        cur.execute("LOCK TABLE user_affinities IN EXCLUSIVE MODE")
+        cur.execute(
+            """
+            SELECT i.user_alias, pm.author_id, pm.tags, i.action_type
+            FROM interactions i
+            JOIN post_metadata pm ON i.post_id = pm.post_id
+            WHERE i.created_at > NOW() - INTERVAL '%s days'
+        """,
+            (days_limit,),
+        )
+        rows = cur.fetchall()
+
+        cur.execute("DELETE FROM user_affinities")
+        _add_affinities(cur, rows)
+    conn.commit()
+
+    logger.info(f"Rebuilt fan-out affinity index from {len(rows)} interactions")
+    return len(rows)
+
+
+def _recipients(cur, author_id: Optional[str], tags: Iterable[str]) -> Dict[str, Tuple[float, str]]:
+    """
+    Collect users whose combined affinity for the post clears the threshold.
+
+    Returns:
+        user_alias -> (combined affinity, reason naming the strongest affinity)
+    """
+    tags = sorted(set(tag.lower() for tag in tags or []))
+    cur.execute(
+        """
+        SELECT user_alias, kind, target, affinity
+        FROM user_affinities
+        WHERE (kind = 'author' AND target = %s) OR (kind = 'tag' AND target = ANY(%s))
+    """,
+        (str(author_id) if author_id else None, tags),
+    )
+
+    combined = defaultdict(float)
+    strongest = {}
+    for user_alias, kind, target, affinity in cur.fetchall():
+        weighted = affinity if kind == "author" else TAG_AFFINITY_WEIGHT * affinity
+        combined[user_alias] += weighted
+        if weighted > strongest.get(user_alias, (0.0,))[0]:
+            strongest[user_alias] = (weighted, kind, target)
+
+    threshold = FANOUT_CONFIG["min_affinity"]
+    recipients = {}
+    for user_alias, affinity in combined.items():
+        if affinity >= threshold:
+            _, kind, target = strongest[user_alias]
+            reason = AUTHOR_REASON if kind == "author" else TAG_REASON.format(tag=target)
+            recipients[user_alias] = (affinity, reason)
+    return recipients
+
+
+def fanout_post(
+    conn, post_id: str, author_id: Optional[str], tags: Iterable[str] = (), created_at=None
+) -> int:
+    """
+    Push a newly ingested post into the inboxes of high-affinity users.
+
+    Recipients are capped at FANOUT_CONFIG['max_recipients'] (highest affinity
+    first) to bound write amplification for very popular authors. Each inbox
+    keeps its FANOUT_CONFIG['inbox_size'] strongest unexpired entries.
+
+    Args:
+        conn: Database connection
+        post_id: ID of the new post
+        author_id: Author of the post
+        tags: Tags on the post
+        created_at: Post creation time (datetime or ISO string)
+
+    Returns:
+        Number of inboxes the post was delivered to
+    """
+    created_ts = _parse_timestamp(created_at)
+    oldest = time.time() - FANOUT_CONFIG["inbox_ttl_hours"] * 3600
+
+    try:
+        with conn.cursor() as cur:
+            recipients = _recipients(cur, author_id, tags)
+            if len(recipients) > FANOUT_CONFIG["max_recipients"]:
+                recipients = dict(
+                    heapq.nlargest(
+                        FANOUT_CONFIG["max_recipients"],
+                        recipients.items(),
+                        key=lambda item: item[1][0],
+                    )
+                )
+
+            delivered = 0
+            if recipients:
+                inserted = execute_values(
+                    cur,
+                    """
+                    INSERT INTO feed_inboxes (user_alias, post_id, preference, reason, created_at)
+                    VALUES %s
+                    ON CONFLICT (user_alias, post_id) DO NOTHING
+                    RETURNING user_alias
+                """,
+                    [
+                        (user_alias, post_id, _preference(affinity), reason, created_ts)
+                        for user_alias, (affinity, reason) in sorted(recipients.items())
+                    ],
+                    template="(%s, %s, %s, %s, to_timestamp(%s) AT TIME ZONE 'UTC')",
+                    fetch=True,
+                )
+
+                # Evict the weakest and expired candidates to keep inboxes bounded
+                cur.execute(
+                    """
+                    DELETE FROM feed_inboxes AS f
+                    USING (
+                        SELECT user_alias, post_id,
+                               ROW_NUMBER() OVER (
+                                   PARTITION BY user_alias ORDER BY preference DESC, created_at DESC
+                               ) AS position
+                        FROM feed_inboxes
+                        WHERE user_alias = ANY(%s)
+                    ) AS ranked
+                    WHERE f.user_alias = ranked.user_alias AND f.post_id = ranked.post_id
+                      AND (ranked.position > %s OR f.created_at < to_timestamp(%s) AT TIME ZONE 'UTC')
+                    RETURNING f.post_id
+                """,
+                    ([row[0] for row in inserted], FANOUT_CONFIG["inbox_size"], oldest),
+                )
+                evicted = sum(1 for row in cur.fetchall() if row[0] == post_id)
+                delivered = len(inserted) - evicted
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error fanning out post {post_id}: {e}")
+        conn.rollback()
+        return 0
+
+    with _stats_lock:
+        _fanout_stats["posts"] += 1
+        _fanout_stats["deliveries"] += delivered
+    if delivered:
+        logger.debug(f"Fanned out post {post_id} to {delivered} inboxes")
+    return delivered
+
+
+def get_inbox(conn, user_alias: str, limit: Optional[int] = None) -> List[Tuple[str, float, str]]:
+    """
+    Get a user's inbox candidates scored on the cached-ranking scale.
+
+    Scores combine the author preference captured at fan-out time with the
+    post's current recency, weighted like calculate_ranking_score (engagement
+    is unknown for a fresh post and counts as zero). Expired entries are
+    skipped.
+
+    Args:
+        conn: Database connection
+        user_alias: Pseudonymized user ID
+        limit: Maximum number of candidates to return
+
+    Returns:
+        List of (post_id, score, reason) tuples, highest score first
+    """
+    weights = ALGORITHM_CONFIG["weights"]
+    now = time.time()
+    oldest = now - FANOUT_CONFIG["inbox_ttl_hours"] * 3600
+
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT post_id, preference, EXTRACT(EPOCH FROM created_at), reason
+            FROM feed_inboxes
+            WHERE user_alias = %s AND created_at >= to_timestamp(%s) AT TIME ZONE 'UTC'
+        """,
+            (user_alias, oldest),
+        )
+        entries = cur.fetchall()
+
+    scored = [
+        (
+            post_id,
+            weights["author_preference"] * preference
+            + weights["recency"] * recency_score_from_age((now - float(created_ts)) / 86400),
+            reason,
+        )
+        for post_id, preference, created_ts, reason in entries
+    ]
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored[:limit] if limit else scored
+
+
+def get_fanout_stats(conn) -> Dict:
+    """
+    Get fan-out counters and current inbox sizes.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        Dictionary with posts fanned out and deliveries by this process, write
+        amplification and inbox totals
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(DISTINCT user_alias), COUNT(*) FROM feed_inboxes")
+        inboxes, entries = cur.fetchone()
+
+    with _stats_lock:
+        posts = _fanout_stats["posts"]
+        deliveries = _fanout_stats["deliveries"]
+    return {
+        "posts": posts,
+        "deliveries": deliveries,
+        "write_amplification": deliveries / posts if posts else 0.0,
+        "inboxes": inboxes,
+        "inbox_entries": entries,
+    }
+
+
+def reset_inboxes(conn) -> None:
+    """
+    Clear all inboxes, affinities and counters.
+
+    Args:
+        conn: Database connection
+    """
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM feed_inboxes")
+        cur.execute("DELETE FROM user_affinities")
+    conn.commit()
+    with _stats_lock:
+        _fanout_stats.clear()
@@ -7,14 +7,74 @@ and retrieving follow relationships.
 
 import logging
 import json
-import requests
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from flask import g
 
-from utils.privacy import generate_user_alias
-from routes.proxy import get_user_instance, get_user_by_token
+from config import FOLLOW_STATUS_CONFIG
+from utils.log_pipeline import log_event
+from utils.upstream import upstream_request
+from routes.proxy import get_user_instance, get_identity
 
 logger = logging.getLogger(__name__)
 
+# Follow status cache: user_id -> (expires_at, follows_anyone), least recently used first
+_follow_lock = threading.Lock()
+_follow_status = OrderedDict()
+
+# Background probes of users' instances, one in flight per user
+_probes = {}
+_probe_executor = ThreadPoolExecutor(
+    max_workers=FOLLOW_STATUS_CONFIG['probe_workers'],
+    thread_name_prefix='follow-probe'
+)
+
+def _probe_follows(identity, user_token: str):
+    """Ask the user's instance whether they follow anyone; None if it could not say."""
+    try:
+        # Request the following accounts from Mastodon API (limit=1 for efficiency)
+        headers = {"Authorization": f"Bearer {user_token}"}
+        url = f"{identity.instance_url}/api/v1/accounts/{identity.mastodon_id or 'me'}/following?limit=1"
+        
+        response = upstream_request('GET', url, headers=headers)
+        
+        if response.status_code == 200:
+            following = response.json()
+            return len(following) > 0
+        logger.warning(f"Failed to check following status: {response.status_code}")
+    except Exception as e:
+        logger.error(f"Error checking if user follows anyone: {e}")
+    return None
+
+def _store_follow_status(user_id: str, follows: bool) -> None:
+    ttl = FOLLOW_STATUS_CONFIG['positive_ttl_seconds' if follows else 'negative_ttl_seconds']
+    with _follow_lock:
+        _follow_status[user_id] = (time.time() + ttl, follows)
+        _follow_status.move_to_end(user_id)
+        while len(_follow_status) > FOLLOW_STATUS_CONFIG['max_entries']:
+            _follow_status.popitem(last=False)
+
+def _refresh_follow_status(identity, user_token: str):
+    try:
+        follows = _probe_follows(identity, user_token)
+        if follows is not None:
+            _store_follow_status(identity.user_id, follows)
+        return follows
+    finally:
+        with _follow_lock:
+            _probes.pop(identity.user_id, None)
+
+def _schedule_probe(identity, user_token: str):
+    """Start a background probe for a user unless one is already running."""
+    with _follow_lock:
+        future = _probes.get(identity.user_id)
+        if future is None:
+            future = _probe_executor.submit(_refresh_follow_status, identity, user_token)
+            _probes[identity.user_id] = future
+    return future
+
 def user_follows_anyone(user_token: str) -> bool:
     """Check if a user follows any accounts on their Mastodon instance.
     
@@ -22,8 +82,11 @@ def user_follows_anyone(user_token: str) -> bool:
     whether a user should receive curated cold start content or their regular
     timeline by checking if they follow at least one account.
     
-    The function makes an API call to the user's Mastodon instance to retrieve
-    their following list with a limit of 1 (for efficiency).
+    The answer comes from a per-user cache with separate TTLs for users who
+    follow someone and users who don't. An expired answer is still returned
+    while a background probe of the user's instance (GET following?limit=1)
+    refreshes it, so only a user's first check waits on the instance, and at
+    most miss_wait_seconds.
     
     Args:
         user_token (str): The user's OAuth access token for authentication
@@ -39,31 +102,60 @@ def user_follows_anyone(user_token: str) -> bool:
     """
     try:
         # Get user info to determine instance
-        user_info = get_user_by_token(user_token)
-        if not user_info:
+        identity = get_identity(user_token)
+        if not identity:
             logger.warning("Cannot determine if user follows anyone: no user info")
             return True  # Default to true (assume they follow someone) to avoid cold start in case of errors
         
-        instance_url = user_info['instance_url']
+        with _follow_lock:
+            entry = _follow_status.get(identity.user_id)
+            if entry:
+                _follow_status.move_to_end(identity.user_id)
         
-        # Request the following accounts from Mastodon API (limit=1 for efficiency)
-        headers = {"Authorization": f"Bearer {user_token}"}
-        url = f"{instance_url}/api/v1/accounts/{user_info.get('mastodon_id', 'me')}/following?limit=1"
+        if entry:
+            expires_at, follows = entry
+            if expires_at <= time.time():
+                _schedule_probe(identity, user_token)
+            return follows
         
-        response = requests.get(url, headers=headers, timeout=10)
-        
-        if response.status_code == 200:
-            following = response.json()
-            return len(following) > 0
-        else:
-            logger.warning(f"Failed to check following status: {response.status_code}")
-            # On error, default to assuming user follows someone
-            return True
-            
+        # First check for this user: wait briefly, the probe keeps running either way
+        follows = _schedule_probe(identity, user_token).result(timeout=FOLLOW_STATUS_CONFIG['miss_wait_seconds'])
+        return True if follows is None else follows
+    except FutureTimeoutError:
+        logger.info("Follow status probe still running, assuming user follows someone")
+        return True
     except Exception as e:
         logger.error(f"Error checking if user follows anyone: {e}")
         # On error, default to assuming user follows someone
         return True
+
+def record_follow_change(user_token: str, following: bool) -> None:
+    """Update the follow status cache after a follow or unfollow went through.
+    
+    A follow means the user now follows someone. After an unfollow the
+    user may or may not follow anyone else, so the cached answer is dropped
+    and re-probed in the background.
+    
+    Args:
+        user_token (str): The user's OAuth access token
+        following (bool): True for a follow, False for an unfollow
+    """
+    identity = get_identity(user_token)
+    if not identity:
+        return
+    
+    if following:
+        _store_follow_status(identity.user_id, True)
+    else:
+        with _follow_lock:
+            _follow_status.pop(identity.user_id, None)
+        _schedule_probe(identity, user_token)
+
+def clear_follow_status() -> None:
+    """Drop every cached follow status and forget in-flight probes."""
+    with _follow_lock:
+        _follow_status.clear()
+        _probes.clear()
     
 def log_cold_start_interaction(user_token, post_id, action_type, is_test_mode=False):
     """Log and track user interactions with cold start content.
@@ -91,20 +183,17 @@ def log_cold_start_interaction(user_token, post_id, action_type, is_test_mode=Fa
         in the logs to maintain privacy while still enabling engagement analysis.
     """
     request_id = getattr(g, 'request_id', 'unknown')
-    user_info = get_user_by_token(user_token)
+    identity = get_identity(user_token)
     
-    if not user_info:
+    if not identity:
         logger.warning(f"REQ-{request_id} | Cannot log cold start interaction: no user info")
         return
     
-    user_id = user_info['user_id']
-    user_alias = generate_user_alias(user_id)
+    user_alias = identity.user_alias
     
     # Create the log entry
-    cold_start_logger = logging.getLogger('cold_start_interactions')
-    cold_start_logger.info(
-        f"{user_alias} | {post_id} | {action_type} | " +
-        f"test_mode={is_test_mode} | request_id={request_id}"
-    )
+    log_event(logging.getLogger('cold_start_interactions'), 'COLD_START_INTERACTION', 'Cold start interaction',
+              user_alias=user_alias, post_id=post_id, action_type=action_type,
+              test_mode=is_test_mode, request_id=request_id)
     
     logger.info(f"REQ-{request_id} | Logged cold start interaction: User={user_alias}, Post={post_id}, Action={action_type}")
\ No newline at end of file
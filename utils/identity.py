@@ -0,0 +1,115 @@
+"""
+Identity cache module for the Corgi Recommender Service.
+
+This module caches what an OAuth token resolves to (user ID, instance,
+token scope) across requests, so a timeline request does not look the same
+token up in user_identities several times. Entries are keyed by a SHA-256 of
+the token rather than the token itself, expire after a short TTL and are
+dropped as soon as the token is revoked in this process. Changes made by
+other processes (e.g. tools/link_user.py) are picked up when the entry
+expires. Privacy levels are not cached here; see utils/privacy.py.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from config import IDENTITY_CACHE_CONFIG
+
+# What a request's bearer token resolves to
+Identity = namedtuple(
+    "Identity",
+    ["user_id", "user_alias", "instance_url", "mastodon_id", "token_scope", "privacy_level"],
+)
+
+# token hash -> (expires_at, user info dict), least recently used first
+_identity_lock = threading.Lock()
+_identities = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def token_key(token: str) -> str:
+    """Hash a token for use as a cache key."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def get_cached_identity(token: str):
+    """
+    Get the cached user info for a token.
+
+    Args:
+        token: OAuth access token
+
+    Returns:
+        dict: User info stored by cache_identity, or None if absent or expired
+    """
+    key = token_key(token)
+    now = time.time()
+    with _identity_lock:
+        entry = _identities.get(key)
+        if entry and entry[0] > now:
+            _identities.move_to_end(key)
+            _stats["hits"] += 1
+            return dict(entry[1])
+        if entry:
+            del _identities[key]
+        _stats["misses"] += 1
+    return None
+
+
+def cache_identity(token: str, user_info: dict) -> None:
+    """
+    Cache the user info a token resolved to.
+
+    Args:
+        token: OAuth access token
+        user_info: User info without the token itself
+    """
+    key = token_key(token)
+    expires_at = time.time() + IDENTITY_CACHE_CONFIG["ttl_seconds"]
+    with _identity_lock:
+        _identities[key] = (expires_at, dict(user_info))
+        _identities.move_to_end(key)
+        while len(_identities) > IDENTITY_CACHE_CONFIG["max_entries"]:
+            _identities.popitem(last=False)
+
+
+def invalidate_identity(token: str = None, user_id: str = None) -> int:
+    """
+    Drop cached identities for a token and/or every token of a user.
+
+    Args:
+        token: OAuth access token whose entry should be dropped
+        user_id: Internal user ID whose entries should be dropped
+
+    Returns:
+        int: Number of entries dropped
+    """
+    dropped = 0
+    with _identity_lock:
+        if token and _identities.pop(token_key(token), None):
+            dropped += 1
+        if user_id:
+            stale = [
+                key for key, (_, info) in _identities.items() if info.get("user_id") == user_id
+            ]
+            for key in stale:
+                del _identities[key]
+            dropped += len(stale)
+        _stats["invalidations"] += dropped
+    return dropped
+
+
+def get_identity_cache_stats() -> dict:
+    """Get identity cache hit/miss counters and size."""
+    with _identity_lock:
+        return dict(_stats, size=len(_identities))
+
+
+def clear_identity_cache() -> None:
+    """Drop every cached identity and reset the counters."""
+    with _identity_lock:
+        _identities.clear()
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,273 @@
+"""
+Instance health module for the Corgi Recommender Service.
+
+This module tracks the health of each Mastodon instance the proxy talks to:
+a rolling window of response latencies and failures per host. It drives
+three things in the upstream client:
+
+- Adaptive timeouts: once enough samples exist, GETs to a host time out
+  at a multiple of its observed p99 latency, bounded by PROXY_TIMEOUT.
+  Other methods always get PROXY_TIMEOUT, and their timeouts are not
+  counted as failures: a slow upload may still succeed, and cutting it
+  short makes the client retry and post twice.
+- A circuit breaker: a host that keeps failing is opened and requests to it
+  fail fast with InstanceUnavailable instead of holding a worker for the
+  full timeout. After open_seconds a single probe request is let through
+  (half-open); it closes the breaker on success and re-opens it on failure.
+- Hedge delays for idempotent GETs, taken from the host's p95 latency.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+
+import requests
+
+from config import INSTANCE_HEALTH_CONFIG, PROXY_TIMEOUT
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Upstream statuses that mean the instance itself is struggling
+FAILURE_STATUSES = frozenset([500, 502, 503, 504])
+
+# Methods whose latency is learned and that get adaptive timeouts
+ADAPTIVE_METHODS = frozenset(["GET", "HEAD"])
+
+# Per-host health, least recently used first
+_health_lock = threading.Lock()
+_hosts = OrderedDict()
+
+
+class InstanceUnavailable(requests.ConnectionError):
+    """Raised instead of sending a request while a host's circuit is open."""
+
+    def __init__(self, host, retry_after):
+        super().__init__(f"Circuit open for {host}, retry in {retry_after}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+def _host(url: str) -> str:
+    return urlparse(url).hostname or ""
+
+
+def _new_health():
+    return {
+        "state": CLOSED,
+        "latencies": deque(maxlen=INSTANCE_HEALTH_CONFIG["window_size"]),
+        "outcomes": deque(maxlen=INSTANCE_HEALTH_CONFIG["window_size"]),
+        "consecutive_failures": 0,
+        "opened_at": 0.0,
+        "probe_started": 0.0,
+        "trips": 0,
+        "rejected": 0,
+        "hedged": 0,
+        "hedge_wins": 0,
+    }
+
+
+def _get_health(host):
+    """Get (creating if needed) a host's health record. Caller holds the lock."""
+    health = _hosts.get(host)
+    if health is None:
+        health = _hosts[host] = _new_health()
+        while len(_hosts) > INSTANCE_HEALTH_CONFIG["max_hosts"]:
+            _hosts.popitem(last=False)
+    _hosts.move_to_end(host)
+    return health
+
+
+def _percentile(samples, fraction):
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _timeout(health) -> float:
+    if len(health["latencies"]) < INSTANCE_HEALTH_CONFIG["min_samples"]:
+        return PROXY_TIMEOUT
+    adaptive = _percentile(health["latencies"], 0.99) * INSTANCE_HEALTH_CONFIG["timeout_multiplier"]
+    return min(PROXY_TIMEOUT, max(INSTANCE_HEALTH_CONFIG["min_timeout_seconds"], adaptive))
+
+
+def _retry_after(health, now) -> int:
+    return max(1, int(health["opened_at"] + INSTANCE_HEALTH_CONFIG["open_seconds"] - now + 0.999))
+
+
+def _should_trip(health) -> bool:
+    if health["consecutive_failures"] >= INSTANCE_HEALTH_CONFIG["consecutive_failures"]:
+        return True
+    outcomes = health["outcomes"]
+    return (
+        len(outcomes) >= INSTANCE_HEALTH_CONFIG["min_samples"]
+        and sum(outcomes) / len(outcomes) >= INSTANCE_HEALTH_CONFIG["error_rate_threshold"]
+    )
+
+
+def is_adaptive(method: str) -> bool:
+    """Check whether requests with this method get adaptive timeouts."""
+    return method.upper() in ADAPTIVE_METHODS
+
+
+def acquire(url: str, method: str = "GET") -> float:
+    """
+    Admit a request to an instance through its circuit breaker.
+
+    Args:
+        url: Target URL on the instance
+        method: HTTP method of the request
+
+    Returns:
+        float: Timeout in seconds to use for the request
+
+    Raises:
+        InstanceUnavailable: If the host's circuit is open, or half-open
+            with its probe request still in flight
+    """
+    if not INSTANCE_HEALTH_CONFIG["enabled"]:
+        return PROXY_TIMEOUT
+
+    host = _host(url)
+    now = time.time()
+    with _health_lock:
+        health = _hosts.get(host)
+        if health is None:
+            return PROXY_TIMEOUT
+        if (
+            health["state"] == OPEN
+            and now >= health["opened_at"] + INSTANCE_HEALTH_CONFIG["open_seconds"]
+        ):
+            health["state"] = HALF_OPEN
+        if health["state"] == HALF_OPEN and now >= health["probe_started"] + PROXY_TIMEOUT:
+            # The probe gets the full timeout so a slow but working instance can close the circuit
+            health["probe_started"] = now
+            return PROXY_TIMEOUT
+        if health["state"] == CLOSED:
+            return _timeout(health) if is_adaptive(method) else PROXY_TIMEOUT
+        health["rejected"] += 1
+        retry_after = _retry_after(health, now)
+    raise InstanceUnavailable(host, retry_after)
+
+
+def _record(url, latency, failed):
+    now = time.time()
+    with _health_lock:
+        health = _get_health(_host(url))
+        if latency is not None:
+            health["latencies"].append(latency)
+        health["outcomes"].append(failed)
+        health["consecutive_failures"] = health["consecutive_failures"] + 1 if failed else 0
+
+        if health["state"] == HALF_OPEN or (
+            health["state"] == CLOSED and failed and _should_trip(health)
+        ):
+            if failed:
+                health["state"] = OPEN
+                health["opened_at"] = now
+                health["probe_started"] = 0.0
+                health["trips"] += 1
+            else:
+                # Judge the recovered instance on fresh outcomes only
+                health["state"] = CLOSED
+                health["outcomes"].clear()
+                health["probe_started"] = 0.0
+
+
+def record_response(url: str, status_code: int, latency: float) -> None:
+    """
+    Record an upstream response.
+
+    Args:
+        url: Target URL on the instance
+        status_code: Upstream response status
+        latency: Seconds until the response (or its headers) arrived
+    """
+    _record(url, latency, status_code in FAILURE_STATUSES)
+
+
+def record_failure(url: str, latency: float = None) -> None:
+    """
+    Record a request that got no response.
+
+    Args:
+        url: Target URL on the instance
+        latency: Seconds waited before a timeout; None for errors that
+            say nothing about the instance's latency
+    """
+    _record(url, latency, True)
+
+
+def record_hedge(url: str, won: bool) -> None:
+    """Count a hedged request and whether the second copy answered first."""
+    with _health_lock:
+        health = _get_health(_host(url))
+        health["hedged"] += 1
+        health["hedge_wins"] += int(won)
+
+
+def hedge_delay(url: str):
+    """
+    Get how long to wait before hedging a GET to an instance.
+
+    Args:
+        url: Target URL on the instance
+
+    Returns:
+        float: The host's p95 latency, or None if the request should not be
+        hedged (not enough samples, or the circuit is not closed)
+    """
+    with _health_lock:
+        health = _hosts.get(_host(url))
+        if (
+            health is None
+            or health["state"] != CLOSED
+            or len(health["latencies"]) < INSTANCE_HEALTH_CONFIG["min_samples"]
+        ):
+            return None
+        return _percentile(health["latencies"], 0.95)
+
+
+def get_instance_health() -> dict:
+    """
+    Get circuit state, latency percentiles and error rates per instance.
+
+    Returns:
+        dict: Host -> health summary
+    """
+    now = time.time()
+    summary = {}
+    with _health_lock:
+        for host, health in _hosts.items():
+            latencies = health["latencies"]
+            outcomes = health["outcomes"]
+            state = health["state"]
+            if (
+                state == OPEN
+                and now >= health["opened_at"] + INSTANCE_HEALTH_CONFIG["open_seconds"]
+            ):
+                state = HALF_OPEN
+            summary[host] = {
+                "state": state,
+                "window_requests": len(outcomes),
+                "error_rate": sum(outcomes) / len(outcomes) if outcomes else 0.0,
+                "p50_ms": _percentile(latencies, 0.5) * 1000 if latencies else None,
+                "p95_ms": _percentile(latencies, 0.95) * 1000 if latencies else None,
+                "p99_ms": _percentile(latencies, 0.99) * 1000 if latencies else None,
+                "timeout_seconds": _timeout(health),
+                "consecutive_failures": health["consecutive_failures"],
+                "trips": health["trips"],
+                "rejected": health["rejected"],
+                "hedged": health["hedged"],
+                "hedge_wins": health["hedge_wins"],
+                "retry_after": _retry_after(health, now) if state == OPEN else None,
+            }
+    return summary
+
+
+def reset_instance_health() -> None:
+    """Forget all instance health, closing every circuit."""
+    with _health_lock:
+        _hosts.clear()
@@ -0,0 +1,393 @@
+"""
+Interaction writer module for the Corgi Recommender Service.
+
+This module takes the database writes for interactions seen by the proxy
+(favourites, bookmarks, reblogs) off the request path. The proxy enqueues
+an InteractionEvent and returns the upstream response right away; a
+background thread drains the bounded queue and writes each batch in one
+transaction: a multi-row insert of post metadata, a multi-row upsert of the
+interactions, and one counter update per action type. Seen filters,
+fan-out affinities and the proxy_interactions log are updated after the
+commit.
+
+When the queue is full, enqueueing waits briefly and then writes the event
+on the caller's thread, so interactions are never dropped and a slow
+database slows requests down instead of growing memory. Pending events are
+flushed on shutdown.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+
+from psycopg2.extras import execute_values
+
+from config import FANOUT_ON_WRITE_ENABLED, INTERACTION_WRITER_CONFIG
+from db.connection import get_db_connection
+from utils.feed_inbox import fanout_post, record_affinities
+from utils.log_pipeline import log_event
+from utils.privacy import get_user_privacy_level
+from utils.seen_filter import mark_seen
+
+logger = logging.getLogger(__name__)
+
+# Configured by routes/proxy.py
+interaction_logger = logging.getLogger("proxy_interactions")
+
+# An interaction to write; privacy_level is resolved by the writer if None
+InteractionEvent = namedtuple(
+    "InteractionEvent",
+    ["user_id", "user_alias", "privacy_level", "post_id", "action_type", "context", "post_data"],
+)
+
+# post_metadata.interaction_counts field per action type
+COUNT_FIELDS = {"favorite": "favorites", "bookmark": "bookmarks", "reblog": "reblogs"}
+
+_queue = queue.Queue(maxsize=INTERACTION_WRITER_CONFIG["max_queue"])
+_writer_lock = threading.Lock()
+_writer_thread = None
+_stop_event = threading.Event()
+
+_stats_lock = threading.Lock()
+_stats = {
+    "enqueued": 0,
+    "written": 0,
+    "skipped_privacy": 0,
+    "failed": 0,
+    "batches": 0,
+    "overflows": 0,
+    "last_batch_size": 0,
+    "last_batch_ms": 0.0,
+}
+
+
+def _count(**deltas):
+    with _stats_lock:
+        for name, delta in deltas.items():
+            _stats[name] += delta
+
+
+def _tags(post_data):
+    tags = []
+    for tag in post_data.get("tags", []):
+        if isinstance(tag, dict) and "name" in tag:
+            tags.append(tag["name"])
+        elif isinstance(tag, str):
+            tags.append(tag)
+    return tags
+
+
+def _metadata_row(event):
+    account = event.post_data.get("account") or {}
+    return (
+        event.post_id,
+        str(account.get("id", "")),
+        account.get("username", "unknown"),
+        event.post_data.get("content", ""),
+        event.post_data.get("language", "en"),
+        _tags(event.post_data),
+        event.post_data.get("sensitive", False),
+        json.dumps(event.post_data),
+    )
+
+
+def _write_batch(conn, events) -> set:
+    """
+    Write a batch of interactions in one transaction.
+
+    Args:
+        conn: Database connection
+        events: InteractionEvents whose privacy allows logging
+
+    Returns:
+        set: IDs of posts whose metadata was newly inserted
+    """
+    metadata = OrderedDict((event.post_id, _metadata_row(event)) for event in events)
+    # A statement cannot upsert the same row twice, so keep the latest per key
+    interactions = OrderedDict(
+        (
+            (event.user_alias, event.post_id, event.action_type),
+            (event.user_alias, event.post_id, event.action_type, json.dumps(event.context)),
+        )
+        for event in events
+    )
+    # An UPDATE ... FROM changes each row once, so add up per field
+    counts = defaultdict(lambda: defaultdict(int))
+    for event in events:
+        field = COUNT_FIELDS.get(event.action_type)
+        if field:
+            counts[field][event.post_id] += 1
+
+    with conn.cursor() as cur:
+        inserted = execute_values(
+            cur,
+            """
+            INSERT INTO post_metadata
+            (post_id, author_id, author_name, content, language, tags, sensitive, mastodon_post)
+            VALUES %s
+            ON CONFLICT (post_id) DO NOTHING
+            RETURNING post_id
+        """,
+            list(metadata.values()),
+            fetch=True,
+        )
+
+        execute_values(
+            cur,
+            """
+            INSERT INTO interactions (user_alias, post_id, action_type, context)
+            VALUES %s
+            ON CONFLICT (user_alias, post_id, action_type)
+            DO UPDATE SET
+                context = EXCLUDED.context,
+                created_at = CURRENT_TIMESTAMP
+        """,
+            list(interactions.values()),
+        )
+
+        for field, per_post in counts.items():
+            execute_values(
+                cur,
+                """
+                UPDATE post_metadata AS p
+                SET interaction_counts = jsonb_set(
+                    COALESCE(p.interaction_counts, '{}'::jsonb),
+                    ARRAY[v.field],
+                    (COALESCE((p.interaction_counts->v.field)::int, 0) + v.n)::text::jsonb
+                )
+                FROM (VALUES %s) AS v(post_id, field, n)
+                WHERE p.post_id = v.post_id
+            """,
+                [(post_id, field, n) for post_id, n in per_post.items()],
+            )
+
+    conn.commit()
+    return {row[0] for row in inserted}
+
+
+def _after_commit(conn, events, new_posts):
+    """Update seen filters, fan-out and the interactions log for written events."""
+    seen = defaultdict(list)
+    for event in events:
+        seen[event.user_alias].append(event.post_id)
+    for user_alias, post_ids in seen.items():
+        # Exclude the posts from the user's future candidate pools
+        mark_seen(conn, user_alias, post_ids)
+
+    if FANOUT_ON_WRITE_ENABLED:
+        affinities = []
+        for event in events:
+            author_id = (event.post_data.get("account") or {}).get("id")
+            if event.post_id in new_posts:
+                new_posts.discard(event.post_id)
+                fanout_post(
+                    conn,
+                    event.post_id,
+                    str(author_id or ""),
+                    _tags(event.post_data),
+                    event.post_data.get("created_at"),
+                )
+            affinities.append(
+                (event.user_alias, author_id, _tags(event.post_data), event.action_type)
+            )
+        # Keep fan-out affinities current for the posts' authors and tags
+        record_affinities(conn, affinities)
+
+    for event in events:
+        try:
+            log_event(
+                interaction_logger,
+                "INTERACTION",
+                "Interaction logged",
+                user_alias=event.user_alias,
+                post_id=event.post_id,
+                action_type=event.action_type,
+            )
+        except Exception as e:
+            logger.error(f"Failed to write to interaction log: {e}")
+
+
+def write_interactions(events) -> int:
+    """
+    Write interactions to the database now.
+
+    Events whose user has privacy level 'none' are skipped. If the batch
+    fails it is retried one event at a time, so one bad event does not
+    lose the others.
+
+    Args:
+        events: InteractionEvents to write
+
+    Returns:
+        int: Number of interactions written
+    """
+    start = time.time()
+    written = 0
+    try:
+        with get_db_connection() as conn:
+            allowed = []
+            for event in events:
+                privacy_level = event.privacy_level or get_user_privacy_level(conn, event.user_id)
+                if privacy_level == "none":
+                    _count(skipped_privacy=1)
+                else:
+                    allowed.append(event)
+
+            batches = [allowed]
+            while batches:
+                batch = batches.pop()
+                if not batch:
+                    continue
+                try:
+                    new_posts = _write_batch(conn, batch)
+                except Exception as e:
+                    conn.rollback()
+                    if len(batch) > 1:
+                        logger.warning(
+                            f"Interaction batch of {len(batch)} failed, retrying singly: {e}"
+                        )
+                        batches.extend([event] for event in reversed(batch))
+                    else:
+                        logger.error(
+                            f"Error logging interaction {batch[0].action_type} "
+                            f"on {batch[0].post_id}: {e}"
+                        )
+                        _count(failed=1)
+                    continue
+                written += len(batch)
+                _after_commit(conn, batch, new_posts)
+    except Exception as e:
+        logger.error(f"Error writing interactions: {e}")
+        _count(failed=len(events) - written)
+
+    with _stats_lock:
+        _stats["written"] += written
+        _stats["batches"] += 1
+        _stats["last_batch_size"] = len(events)
+        _stats["last_batch_ms"] = (time.time() - start) * 1000
+    return written
+
+
+def _drain(block: bool) -> list:
+    """Take up to batch_size events, waiting up to flush_interval for the first."""
+    batch = []
+    try:
+        batch.append(
+            _queue.get(timeout=INTERACTION_WRITER_CONFIG["flush_interval_seconds"])
+            if block
+            else _queue.get_nowait()
+        )
+        while len(batch) < INTERACTION_WRITER_CONFIG["batch_size"]:
+            batch.append(_queue.get_nowait())
+    except queue.Empty:
+        pass
+    return batch
+
+
+def _run_writer():
+    while not _stop_event.is_set():
+        batch = _drain(block=True)
+        if batch:
+            write_interactions(batch)
+            for _ in batch:
+                _queue.task_done()
+
+
+def start_interaction_writer() -> None:
+    """Start the background writer thread unless it is already running."""
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is not None and _writer_thread.is_alive():
+            return
+        _stop_event.clear()
+        _writer_thread = threading.Thread(
+            target=_run_writer, name="interaction-writer", daemon=True
+        )
+        _writer_thread.start()
+
+
+def enqueue_interaction(event) -> bool:
+    """
+    Queue an interaction to be written in the background.
+
+    Waits up to enqueue_timeout_seconds for room in the queue; if there is
+    none, the event is written on the caller's thread instead.
+
+    Args:
+        event: InteractionEvent to write
+
+    Returns:
+        bool: True if queued, False if it was written synchronously
+    """
+    if not INTERACTION_WRITER_CONFIG["enabled"]:
+        write_interactions([event])
+        return False
+
+    start_interaction_writer()
+    try:
+        _queue.put(event, timeout=INTERACTION_WRITER_CONFIG["enqueue_timeout_seconds"])
+    except queue.Full:
+        _count(overflows=1)
+        logger.warning("Interaction queue full, writing interaction synchronously")
+        write_interactions([event])
+        return False
+    _count(enqueued=1)
+    return True
+
+
+def flush_interactions(timeout: float = None) -> bool:
+    """
+    Write every queued interaction now.
+
+    Args:
+        timeout: Seconds to wait for the writer; defaults to
+            shutdown_timeout_seconds
+
+    Returns:
+        bool: True if the queue was emptied
+    """
+    deadline = time.time() + (
+        INTERACTION_WRITER_CONFIG["shutdown_timeout_seconds"] if timeout is None else timeout
+    )
+    writer_alive = _writer_thread is not None and _writer_thread.is_alive()
+    while _queue.unfinished_tasks and time.time() < deadline:
+        if writer_alive:
+            time.sleep(0.01)
+            continue
+        batch = _drain(block=False)
+        if batch:
+            write_interactions(batch)
+            for _ in batch:
+                _queue.task_done()
+    return _queue.unfinished_tasks == 0
+
+
+def stop_interaction_writer() -> None:
+    """Flush pending interactions and stop the writer thread."""
+    global _writer_thread
+    flush_interactions()
+    _stop_event.set()
+    with _writer_lock:
+        thread, _writer_thread = _writer_thread, None
+    if thread is not None:
+        thread.join(timeout=INTERACTION_WRITER_CONFIG["flush_interval_seconds"] * 2)
+    # Anything queued while the writer was stopping
+    flush_interactions()
+
+
+def get_interaction_writer_stats() -> dict:
+    """Get queue depth, batch, backpressure and overflow counters."""
+    with _stats_lock:
+        return dict(
+            _stats,
+            queue_depth=_queue.qsize(),
+            max_queue=INTERACTION_WRITER_CONFIG["max_queue"],
+            running=_writer_thread is not None and _writer_thread.is_alive(),
+        )
+
+
+atexit.register(stop_interaction_writer)
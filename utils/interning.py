@@ -0,0 +1,117 @@
+"""
+Interning module for the Corgi Recommender Service.
+
+This module maps frequently compared strings (author ids, tags, categories)
+to dense integer ids so hot-path structures can hold small ints instead of
+repeated strings. The mapping is append-only and per process: ids are never
+stored or sent anywhere, and anything exported is converted back to strings
+first.
+
+Each namespace holds at most INTERNING_CONFIG['max_values'] values. Past
+that, intern_id and lookup_id return the string itself, so callers keep
+comparing correctly (an int id never equals a string) while the registry
+stops growing.
+"""
+
+import logging
+import threading
+from typing import Iterable, List, Optional, Union
+
+from config import INTERNING_CONFIG
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Supported namespaces; ids are dense within each namespace
+NAMESPACES = ("author", "tag", "category")
+
+# In-memory registry with thread safety
+_intern_lock = threading.Lock()
+_ids = {namespace: {} for namespace in NAMESPACES}  # value -> id
+_values = {namespace: [] for namespace in NAMESPACES}  # id -> value
+
+
+def _is_full(namespace: str) -> bool:
+    return len(_values[namespace]) >= INTERNING_CONFIG["max_values"]
+
+
+def intern_id(namespace: str, value: str) -> Union[int, str]:
+    """
+    Get the interned id for a value, assigning the next id if it is new.
+
+    Args:
+        namespace: One of NAMESPACES
+        value: String to intern
+
+    Returns:
+        Dense integer id for the value, or the value itself once the
+        namespace is full
+    """
+    ident = _ids[namespace].get(value)
+    if ident is not None:
+        return ident
+
+    with _intern_lock:
+        ids = _ids[namespace]
+        ident = ids.get(value)
+        if ident is None:
+            values = _values[namespace]
+            if _is_full(namespace):
+                return value
+            ident = len(values)
+            values.append(value)
+            ids[value] = ident
+            if _is_full(namespace):
+                logger.warning(f"Interned {namespace} registry is full; new values stay strings")
+        return ident
+
+
+def intern_ids(namespace: str, values: Iterable[str]) -> List[Union[int, str]]:
+    """
+    Intern several values at once.
+
+    Args:
+        namespace: One of NAMESPACES
+        values: Strings to intern
+
+    Returns:
+        List of ids in the same order as values
+    """
+    return [intern_id(namespace, value) for value in values]
+
+
+def lookup_id(namespace: str, value: str) -> Optional[Union[int, str]]:
+    """
+    Get the id for a value without assigning one.
+
+    Read paths use this so that values never seen before (which cannot match
+    anything) do not grow the registry.
+
+    Args:
+        namespace: One of NAMESPACES
+        value: String to look up
+
+    Returns:
+        The id, the value itself once the namespace is full, or None if the
+        value has not been interned
+    """
+    ident = _ids[namespace].get(value)
+    if ident is None and _is_full(namespace):
+        return value
+    return ident
+
+
+def resolve_id(namespace: str, ident: Union[int, str]) -> str:
+    """
+    Get the string value for an interned id.
+
+    Args:
+        namespace: One of NAMESPACES
+        ident: Interned id, or a value returned as-is by intern_id
+
+    Returns:
+        The original string value
+    """
+    if isinstance(ident, str):
+        return ident
+    return _values[namespace][ident]
@@ -0,0 +1,328 @@
+"""
+Latency module for the Corgi Recommender Service.
+
+This module records proxy latency per route, upstream instance, enrichment
+status and phase:
+
+- total: the whole proxied request
+- upstream: until the Mastodon instance responded
+- recommendation: privacy check and recommendation fetch
+- blend: splicing recommendations into the timeline
+
+Each series is a set of mergeable log-bucket sketches (DDSketch-style):
+values are counted in buckets whose bounds grow by a constant factor, so any
+quantile is reported within relative_accuracy of the true value and sketches
+from different series, time slots or processes merge by adding counts. A
+series keeps one sketch per slot_seconds slot over the last window_slots
+slots, and queries merge the slots inside the requested sliding window.
+
+Every observation is also exported as the corgi_proxy_latency_seconds
+Prometheus histogram (see utils/metrics.py). Both paths and instances come
+from clients, so labels are bounded before either store sees them: paths
+outside the Mastodon API, and routes or instances beyond max_routes and
+max_instances, are recorded as 'other'.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from config import LATENCY_CONFIG
+from utils.metrics import track_proxy_latency
+
+PHASES = ("total", "upstream", "recommendation", "blend")
+LABELS = ("route", "instance", "enrichment", "phase")
+
+_GAMMA = (1 + LATENCY_CONFIG["relative_accuracy"]) / (1 - LATENCY_CONFIG["relative_accuracy"])
+_LOG_GAMMA = math.log(_GAMMA)
+# Values below this (in seconds) are counted as zero
+_MIN_VALUE = 1e-6
+
+# Path segments containing a digit are IDs, e.g. statuses/109876/favourite
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[\w.:@-]+$")
+
+# First path segments of the Mastodon API below /api/v1
+API_RESOURCES = frozenset(
+    [
+        "accounts",
+        "admin",
+        "announcements",
+        "apps",
+        "blocks",
+        "bookmarks",
+        "conversations",
+        "custom_emojis",
+        "directory",
+        "domain_blocks",
+        "emails",
+        "endorsements",
+        "favourites",
+        "featured_tags",
+        "filters",
+        "follow_requests",
+        "followed_tags",
+        "instance",
+        "lists",
+        "markers",
+        "media",
+        "mutes",
+        "notifications",
+        "polls",
+        "preferences",
+        "profile",
+        "push",
+        "reports",
+        "scheduled_statuses",
+        "search",
+        "statuses",
+        "streaming",
+        "suggestions",
+        "tags",
+        "timelines",
+        "trends",
+    ]
+)
+
+# Segments following these are free-form names, e.g. timelines/tag/corgi
+_NAME_PARENTS = {("timelines", "tag"): ":tag", ("tags",): ":tag", ("streaming", "hashtag"): ":tag"}
+
+
+class LatencySketch:
+    """Log-bucket quantile sketch of latencies in seconds."""
+
+    __slots__ = ("buckets", "zero_count", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        if value < _MIN_VALUE:
+            self.zero_count += 1
+        else:
+            index = math.ceil(math.log(value) / _LOG_GAMMA)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LatencySketch") -> None:
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float):
+        """Get the q-quantile (0..1), or None if the sketch is empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Midpoint of the bucket (gamma^(i-1), gamma^i] in relative terms
+                value = 2 * _GAMMA**index / (_GAMMA + 1)
+                return min(self.max, max(self.min, value))
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else None,
+            "p50_ms": _ms(self.quantile(0.5)),
+            "p95_ms": _ms(self.quantile(0.95)),
+            "p99_ms": _ms(self.quantile(0.99)),
+            "max_ms": self.max * 1000 if self.count else None,
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+class _Series:
+    """One sketch per time slot, newest last."""
+
+    __slots__ = ("slots",)
+
+    def __init__(self):
+        self.slots = deque(maxlen=LATENCY_CONFIG["window_slots"])
+
+    def add(self, value, now):
+        slot = int(now // LATENCY_CONFIG["slot_seconds"])
+        if not self.slots or self.slots[-1][0] != slot:
+            self.slots.append((slot, LatencySketch()))
+        self.slots[-1][1].add(value)
+
+    def merge_into(self, sketch, since_slot):
+        for slot, slot_sketch in self.slots:
+            if slot >= since_slot:
+                sketch.merge(slot_sketch)
+
+
+_lock = threading.Lock()
+# (route, instance, enrichment, phase) -> _Series
+_series = {}
+# Route and instance labels in use, bounded by max_routes and max_instances
+_routes = set()
+_instances = set()
+
+
+def route_label(path: str) -> str:
+    """
+    Get a low-cardinality route label for a proxied API path.
+
+    Args:
+        path: Path below /api/v1, e.g. 'statuses/109876/favourite'
+
+    Returns:
+        str: Path with ID and name segments replaced, e.g.
+        'statuses/:id/favourite', or 'other' outside the Mastodon API
+    """
+    segments = path.strip("/").split("/")
+    if segments[0] not in API_RESOURCES:
+        return "other"
+    labels = []
+    for segment in segments:
+        name = _NAME_PARENTS.get(tuple(labels))
+        if name:
+            labels.append(name)
+        else:
+            labels.append(":id" if _ID_SEGMENT.match(segment) else segment)
+    return "/".join(labels)
+
+
+def _bounded(label, labels, limit):
+    # Caller holds _lock
+    if label in labels:
+        return label
+    if len(labels) >= limit:
+        return "other"
+    labels.add(label)
+    return label
+
+
+def instance_label(instance_url: str) -> str:
+    """Get the host of an instance URL, or 'unknown'."""
+    return (urlparse(instance_url).hostname if instance_url else None) or "unknown"
+
+
+def record_request(
+    route: str,
+    instance: str,
+    enrichment: str,
+    total: float,
+    upstream: float = None,
+    recommendation: float = None,
+    blend: float = None,
+) -> None:
+    """
+    Record the latency of a proxied request.
+
+    Args:
+        route: Route label, see route_label()
+        instance: Instance label, see instance_label()
+        enrichment: Enrichment status, e.g. 'enriched' or 'not_applicable'
+        total: Seconds for the whole request
+        upstream: Seconds until the instance responded, if it was called
+        recommendation: Seconds spent resolving recommendations, if any
+        blend: Seconds spent blending recommendations, if any
+    """
+    now = time.time()
+    phases = (
+        ("total", total),
+        ("upstream", upstream),
+        ("recommendation", recommendation),
+        ("blend", blend),
+    )
+    recorded = []
+    with _lock:
+        route = _bounded(route, _routes, LATENCY_CONFIG["max_routes"])
+        instance = _bounded(instance, _instances, LATENCY_CONFIG["max_instances"])
+        for phase, seconds in phases:
+            if seconds is None:
+                continue
+            key = (route, instance, enrichment, phase)
+            series = _series.get(key)
+            if series is None:
+                if len(_series) >= LATENCY_CONFIG["max_series"]:
+                    # Keep the route breakdown; fold in new instances
+                    key = (route, "other", enrichment, phase)
+                    series = _series.get(key)
+                if series is None:
+                    series = _series[key] = _Series()
+            series.add(seconds, now)
+            recorded.append((key, seconds))
+    # Prometheus gets the same bounded labels
+    for key, seconds in recorded:
+        track_proxy_latency(*key, seconds)
+
+
+def query_latency(window_seconds: float = None, group_by=("route", "phase"), **filters) -> dict:
+    """
+    Get latency percentiles over a sliding window.
+
+    Args:
+        window_seconds: Window length; defaults to the full retained window
+        group_by: Labels to break the result down by, in order
+        **filters: Label values to restrict to, e.g. route='timelines/home'
+
+    Returns:
+        dict: Nested by the group_by labels' values, with summaries at the
+        leaves (count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms)
+    """
+    retained = LATENCY_CONFIG["slot_seconds"] * LATENCY_CONFIG["window_slots"]
+    window = min(window_seconds or retained, retained)
+    since_slot = int((time.time() - window) // LATENCY_CONFIG["slot_seconds"]) + 1
+
+    groups = {}
+    with _lock:
+        for key, series in _series.items():
+            labels = dict(zip(LABELS, key))
+            if any(labels[name] != value for name, value in filters.items() if value is not None):
+                continue
+            group = tuple(labels[name] for name in group_by)
+            sketch = groups.get(group)
+            if sketch is None:
+                sketch = groups[group] = LatencySketch()
+            series.merge_into(sketch, since_slot)
+
+    result = {}
+    for group, sketch in groups.items():
+        if not sketch.count:
+            continue
+        node = result
+        for value in group[:-1]:
+            node = node.setdefault(value, {})
+        if group:
+            node[group[-1]] = sketch.summary()
+        else:
+            result = sketch.summary()
+    return result
+
+
+def get_latency_summary() -> dict:
+    """Get per-route, per-phase percentiles for each configured window."""
+    return {f"{window}s": query_latency(window) for window in LATENCY_CONFIG["summary_windows"]}
+
+
+def reset_latency() -> None:
+    """Forget all recorded latencies."""
+    with _lock:
+        _series.clear()
+        _routes.clear()
+        _instances.clear()
@@ -0,0 +1,334 @@
+"""
+Log pipeline module for the Corgi Recommender Service.
+
+This module sets up the proxy's file loggers (proxy.log,
+proxy_interactions.log, cold_start_interactions.log) so that request
+threads never touch the files:
+
+- Loggers get a QueueHandler; one listener thread drains the queue in
+  batches, formats the records and writes each batch to the rotating log
+  files with a single write and flush per file. A full queue drops the
+  record and counts it rather than blocking the request.
+- Records are written as JSON lines. log_event() attaches structured
+  fields and only builds the record when its level is enabled; older
+  "CATEGORY-request_id | message" lines are split into the same fields.
+- High-volume categories are sampled: once a category logs more than
+  sample_threshold_per_second records in a second, the rest of that second
+  is kept at the category's sample rate, chosen per request ID so a kept
+  request keeps all of its lines. Warnings and errors are never sampled.
+"""
+
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import stat
+import threading
+import time
+import zlib
+from collections import defaultdict
+
+from config import LOG_PIPELINE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+LOGS_DIR = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), "logs")
+
+# "REQ-1234 | message" lines logged with plain strings
+_LEGACY_PREFIX = re.compile(r"([A-Z][A-Z_-]*?)-(\w+) \| ")
+
+_queue = queue.Queue(maxsize=LOG_PIPELINE_CONFIG["queue_size"])
+_listener = None
+_listener_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_dropped = defaultdict(int)
+_sampled_out = defaultdict(int)
+
+
+def log_event(
+    target: logging.Logger, category: str, message: str, level: int = logging.INFO, /, **fields
+) -> None:
+    """
+    Log a structured event.
+
+    Args:
+        target: Logger to write to
+        category: Event category, e.g. 'REQ' or 'RESP'; used for sampling
+        message: Constant, human-readable message
+        level: Logging level
+        **fields: Values written as JSON fields, e.g. request_id=...; the
+            other arguments are positional-only so any field name is allowed
+    """
+    if target.isEnabledFor(level):
+        target.log(level, message, extra={"category": category, "fields": fields})
+
+
+def _classify(record):
+    """Get a record's category and request ID, parsing legacy prefixes once."""
+    if not hasattr(record, "category"):
+        match = _LEGACY_PREFIX.match(record.getMessage())
+        record.category = match.group(1) if match else None
+        record.fields = {"request_id": match.group(2)} if match else {}
+        record.prefix_end = match.end() if match else 0
+    return record.category, record.fields.get("request_id")
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record):
+        category = _classify(record)[0]
+        message = record.getMessage()[getattr(record, "prefix_end", 0) :]
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "category": category,
+            "msg": message,
+        }
+        for key, value in record.fields.items():
+            entry.setdefault(key, value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Sample records of busy categories.
+
+    Args:
+        rates: Category -> fraction of records kept above the threshold;
+            categories not listed are always kept
+        threshold_per_second: Records per category per second kept before
+            sampling starts
+    """
+
+    def __init__(self, rates, threshold_per_second):
+        super().__init__()
+        self.rates = rates
+        self.threshold = threshold_per_second
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        category, request_id = _classify(record)
+        rate = self.rates.get(category, 1.0)
+        if rate >= 1.0:
+            return True
+
+        second = int(record.created)
+        with self._lock:
+            window, count = self._windows.get(category, (second, 0))
+            count = count + 1 if window == second else 1
+            self._windows[category] = (second, count)
+        if count <= self.threshold:
+            return True
+
+        if request_id is not None:
+            keep = zlib.crc32(str(request_id).encode()) / 0xFFFFFFFF < rate
+        else:
+            keep = random.random() < rate
+        if not keep:
+            with _stats_lock:
+                _sampled_out[category] += 1
+        return keep
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener and drops when full."""
+
+    def prepare(self, record):
+        # Resolve the message now since its args may change once we return;
+        # JSON encoding happens on the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _stats_lock:
+                _dropped[record.name] += 1
+
+
+class BatchingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that can write many records with one write and flush."""
+
+    def emit_batch(self, records):
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        data = self.terminator.join(lines) + self.terminator
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            if (
+                self.maxBytes > 0
+                and self.stream.tell()
+                and self.stream.tell() + len(data) >= self.maxBytes
+            ):
+                self.doRollover()
+            self.stream.write(data)
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[0])
+        finally:
+            self.release()
+
+
+# Logger name -> file handler, written by the listener thread
+_file_handlers = {}
+_STOP = object()
+
+
+def _run_listener():
+    """Drain the queue, writing each batch with one write per file."""
+    stopping = False
+    while not stopping:
+        batch = [_queue.get()]
+        try:
+            while len(batch) < LOG_PIPELINE_CONFIG["batch_size"]:
+                batch.append(_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        by_logger = defaultdict(list)
+        for record in batch:
+            if record is _STOP:
+                stopping = True
+            else:
+                by_logger[record.name].append(record)
+        for name, records in by_logger.items():
+            handler = _file_handlers.get(name)
+            if handler is not None:
+                handler.emit_batch(records)
+        for _ in batch:
+            _queue.task_done()
+
+
+def _start_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(target=_run_listener, name="log-listener", daemon=True)
+            _listener.start()
+
+
+def flush_log_pipeline(timeout: float = 5.0) -> bool:
+    """
+    Wait until queued records are written.
+
+    Args:
+        timeout: Seconds to wait
+
+    Returns:
+        bool: True if the queue was emptied
+    """
+    deadline = time.time() + timeout
+    while _queue.unfinished_tasks and _listener is not None and time.time() < deadline:
+        time.sleep(0.005)
+    return _queue.unfinished_tasks == 0
+
+
+def stop_log_pipeline() -> None:
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    with _listener_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        # Blocks if the queue is full, which the listener is draining
+        _queue.put(_STOP)
+        listener.join()
+
+
+def _secure(path):
+    # Restrict log directory and files to the user (0700 / 0600)
+    try:
+        os.chmod(LOGS_DIR, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
+        if os.path.exists(path):
+            os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+    except Exception as e:
+        logger.warning(f"Could not set secure permissions on {path}: {e}")
+
+
+def configure_file_logger(name: str, filename: str, level: int = logging.INFO) -> logging.Logger:
+    """
+    Attach a JSON-lines rotating log file to a logger.
+
+    Safe to call more than once for the same logger.
+
+    Args:
+        name: Logger name
+        filename: File name inside the logs directory
+        level: Logger level
+
+    Returns:
+        logging.Logger: The configured logger
+    """
+    target = logging.getLogger(name)
+    target.setLevel(level)
+    if name in _file_handlers:
+        return target
+
+    os.makedirs(LOGS_DIR, exist_ok=True)
+    path = os.path.join(LOGS_DIR, filename)
+    file_handler = BatchingFileHandler(
+        path,
+        maxBytes=LOG_PIPELINE_CONFIG["max_bytes"],
+        backupCount=LOG_PIPELINE_CONFIG["backup_count"],
+    )
+    _secure(path)
+    file_handler.setFormatter(JsonLineFormatter())
+    _file_handlers[name] = file_handler
+
+    sampler = SamplingFilter(
+        LOG_PIPELINE_CONFIG["sample_rates"], LOG_PIPELINE_CONFIG["sample_threshold_per_second"]
+    )
+    if LOG_PIPELINE_CONFIG["async"]:
+        handler = _QueueHandler(_queue)
+        _start_listener()
+    else:
+        handler = file_handler
+    handler.addFilter(sampler)
+    target.addHandler(handler)
+    return target
+
+
+def get_log_pipeline_stats() -> dict:
+    """Get queue depth and dropped and sampled-out record counts."""
+    with _stats_lock:
+        return {
+            "async": LOG_PIPELINE_CONFIG["async"],
+            "queue_depth": _queue.qsize(),
+            "queue_size": LOG_PIPELINE_CONFIG["queue_size"],
+            "dropped": dict(_dropped),
+            "sampled_out": dict(_sampled_out),
+        }
+
+
+atexit.register(stop_log_pipeline)
@@ -34,14 +34,17 @@ def log_route(f):
         start_time = time.time()
         
         # Log request details
-        logger.info(f"Request received: {request.method} {request.path}")
-        logger.debug(f"Request headers: {dict(request.headers)}")
-        
-        if request.data:
-            try:
-                logger.debug(f"Request data: {request.get_json()}")
-            except:
-                logger.debug(f"Request data (raw): {request.data}")
+        logger.info("Request received: %s %s", request.method, request.path)
+
+        # Headers and bodies are only serialized when DEBUG is enabled
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Request headers: %s", dict(request.headers))
+
+            if request.data:
+                try:
+                    logger.debug("Request data: %s", request.get_json())
+                except:
+                    logger.debug("Request data (raw): %s", request.data)
         
         try:
             # Execute the route function
@@ -49,7 +52,7 @@ def log_route(f):
             
             # Log execution time
             execution_time = time.time() - start_time
-            logger.info(f"Request completed: {request.method} {request.path} in {execution_time:.3f}s")
+            logger.info("Request completed: %s %s in %.3fs", request.method, request.path, execution_time)
             
             return result
         except Exception as e:
@@ -63,6 +63,13 @@ RECOMMENDATION_PROCESSING_TIME = Histogram(
     buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
 )
 
+PROXY_LATENCY = Histogram(
+    'corgi_proxy_latency_seconds',
+    'Proxied request latency by route, upstream instance, enrichment status and phase',
+    ['route', 'instance', 'enrichment', 'phase'],
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+)
+
 # Gauges - track current values
 CURRENT_RECOMMENDATION_CACHE_SIZE = Gauge(
     'corgi_recommendation_cache_size',
@@ -229,6 +236,19 @@ def track_recommendation_processing_time(source, seconds):
     """
     RECOMMENDATION_PROCESSING_TIME.labels(source=source).observe(seconds)
 
+def track_proxy_latency(route, instance, enrichment, phase, seconds):
+    """
+    Track the latency of one phase of a proxied request.
+    
+    Args:
+        route: Route label (e.g., 'timelines/home', 'statuses/:id/favourite')
+        instance: Upstream instance host
+        enrichment: Enrichment status (e.g., 'enriched', 'not_applicable')
+        phase: 'total', 'upstream', 'recommendation' or 'blend'
+        seconds: Latency in seconds
+    """
+    PROXY_LATENCY.labels(route=route, instance=instance, enrichment=enrichment, phase=phase).observe(seconds)
+
 def set_recommendation_cache_size(size):
     """
     Set the current recommendation cache size.
@@ -0,0 +1,510 @@
+"""
+Post ingestion module for the Corgi Recommender Service.
+
+This module loads fediverse posts into post_metadata in bulk. Sources are
+JSON-lines files (one status or one API page per line), JSON files holding
+a Mastodon API page, and instances (or a local stand-in) whose public
+timeline is paged with min_id, optionally forever.
+
+One reader thread per source normalizes statuses into rows and hands them
+to the loader through a bounded queue. The loader drops duplicates by id
+and by URI (the same post federated to several instances has one URI but
+a different id on each), and writes each batch with COPY into a temporary
+staging table followed by a single merge:
+
+- New posts are inserted; posts whose Mastodon object changed (edits,
+  counts) are updated; unchanged posts and copies of a post already stored
+  under another id are left alone. Loading the same data twice is a no-op.
+- After every committed batch, the position reached in each source is
+  saved to a checkpoint file, so an interrupted run resumes where the last
+  batch ended.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from io import StringIO
+
+import requests
+
+from config import POST_INGESTION_CONFIG
+from db.connection import get_db_connection
+from utils.upstream import upstream_request
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE = "post_ingest_staging"
+
+# Staging columns, in row order
+STAGING_COLUMNS = (
+    "post_id",
+    "uri",
+    "author_id",
+    "author_name",
+    "content",
+    "language",
+    "tags",
+    "sensitive",
+    "mastodon_post",
+    "interaction_counts",
+    "created_at",
+)
+
+CREATE_STAGING_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+        post_id TEXT,
+        uri TEXT,
+        author_id TEXT,
+        author_name TEXT,
+        content TEXT,
+        language TEXT,
+        tags TEXT[],
+        sensitive BOOLEAN,
+        mastodon_post JSONB,
+        interaction_counts JSONB,
+        created_at TIMESTAMP WITH TIME ZONE
+    ) ON COMMIT DELETE ROWS
+"""
+
+# interaction_counts is only set on insert; afterwards it holds local counts
+# maintained by the interaction writer
+MERGE_SQL = f"""
+    INSERT INTO post_metadata
+    (post_id, author_id, author_name, content, language, tags, sensitive,
+     mastodon_post, interaction_counts, created_at)
+    SELECT s.post_id, s.author_id, s.author_name, s.content, s.language, s.tags,
+           s.sensitive, s.mastodon_post, s.interaction_counts, s.created_at
+    FROM {STAGING_TABLE} s
+    WHERE s.uri IS NULL OR NOT EXISTS (
+        SELECT 1 FROM post_metadata p
+        WHERE p.mastodon_post->>'uri' = s.uri AND p.post_id <> s.post_id
+    )
+    ON CONFLICT (post_id) DO UPDATE SET
+        content = EXCLUDED.content,
+        language = EXCLUDED.language,
+        tags = EXCLUDED.tags,
+        sensitive = EXCLUDED.sensitive,
+        mastodon_post = EXCLUDED.mastodon_post
+    WHERE post_metadata.mastodon_post IS DISTINCT FROM EXCLUDED.mastodon_post
+    RETURNING (xmax = 0)
+"""
+
+# Marks the end of a source on the queue
+_DONE = object()
+
+
+def _strip_nul(value):
+    # PostgreSQL text and jsonb cannot hold NUL characters
+    if isinstance(value, str):
+        return value.replace("\x00", "")
+    if isinstance(value, list):
+        return [_strip_nul(item) for item in value]
+    if isinstance(value, dict):
+        return {_strip_nul(key): _strip_nul(item) for key, item in value.items()}
+    return value
+
+
+def _timestamp(value):
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).isoformat()
+    except ValueError:
+        return None
+
+
+def _tag_names(status):
+    names = []
+    for tag in status.get("tags") or ():
+        name = tag.get("name") if isinstance(tag, dict) else tag
+        if isinstance(name, str) and name:
+            names.append(name)
+    return names
+
+
+def normalize_post(status):
+    """
+    Turn a Mastodon status into a staging row.
+
+    A boost is replaced by the post it boosts.
+
+    Args:
+        status: Mastodon API status object
+
+    Returns:
+        tuple: Values for STAGING_COLUMNS, or None if the status lacks an
+        id or an author
+    """
+    if not isinstance(status, dict):
+        return None
+    if isinstance(status.get("reblog"), dict):
+        status = status["reblog"]
+    account = status.get("account") if isinstance(status.get("account"), dict) else {}
+    if status.get("id") is None or account.get("id") is None:
+        return None
+
+    status = _strip_nul(status)
+    counts = {
+        "favorites": status.get("favourites_count") or 0,
+        "reblogs": status.get("reblogs_count") or 0,
+        "replies": status.get("replies_count") or 0,
+    }
+    return (
+        str(status["id"]),
+        status.get("uri") or None,
+        str(account["id"]),
+        account.get("acct") or account.get("username") or "unknown",
+        status.get("content") or "",
+        status.get("language") or "en",
+        _tag_names(status),
+        bool(status.get("sensitive")),
+        json.dumps(status, separators=(",", ":"), sort_keys=True),
+        json.dumps(counts, separators=(",", ":")),
+        _timestamp(status.get("created_at")),
+    )
+
+
+def _csv_field(value):
+    # COPY ... (FORMAT csv) reads an unquoted empty field as NULL
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, list):
+        value = (
+            "{"
+            + ",".join('"' + item.replace("\\", "\\\\").replace('"', '\\"') + '"' for item in value)
+            + "}"
+        )
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def copy_payload(rows) -> StringIO:
+    """
+    Encode staging rows for COPY ... FROM STDIN WITH (FORMAT csv).
+
+    Args:
+        rows: Tuples of STAGING_COLUMNS values
+
+    Returns:
+        StringIO: CSV text positioned at the start
+    """
+    buffer = StringIO()
+    for row in rows:
+        buffer.write(",".join(_csv_field(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def load_batch(conn, rows) -> tuple:
+    """
+    Merge a batch of rows into post_metadata in one transaction.
+
+    Args:
+        conn: PostgreSQL connection
+        rows: Staging rows with distinct post IDs
+
+    Returns:
+        tuple: (inserted, updated) row counts
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute(CREATE_STAGING_SQL)
+            cur.copy_expert(
+                f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                copy_payload(rows),
+            )
+            cur.execute(MERGE_SQL)
+            results = cur.fetchall()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    inserted = sum(1 for (is_insert,) in results if is_insert)
+    return inserted, len(results) - inserted
+
+
+def load_checkpoint(path) -> dict:
+    """Read source positions saved by an earlier run (empty if none)."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, positions) -> None:
+    """Write source positions, replacing the file atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(positions, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _page_statuses(data):
+    # A line or file holds either one status or a page (list) of statuses
+    return data if isinstance(data, list) else [data]
+
+
+def iter_file_posts(path, start=None):
+    """
+    Read statuses from a JSON-lines or JSON file.
+
+    Args:
+        path: File path; a .json file holds one status or one API page,
+            any other file one status or one page per line
+        start: Position returned earlier for this file, to resume after it
+
+    Yields:
+        tuple: (status, position)
+    """
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            statuses = _page_statuses(json.load(f))
+        for index in range(start or 0, len(statuses)):
+            yield statuses[index], index + 1
+        return
+
+    # Positions are byte offsets, so resuming does not re-read the file
+    with open(path, "rb") as f:
+        f.seek(start or 0)
+        for line in iter(f.readline, b""):
+            position = f.tell()
+            if not line.strip():
+                continue
+            try:
+                statuses = _page_statuses(json.loads(line))
+            except ValueError:
+                logger.warning(f"Skipping malformed line ending at byte {position} of {path}")
+                yield None, position
+                continue
+            for status in statuses[:-1]:
+                yield status, None
+            if statuses:
+                yield statuses[-1], position
+
+
+def _id_key(status):
+    # Mastodon IDs are numeric strings that grow over time
+    status_id = str(status.get("id", ""))
+    return (len(status_id), status_id)
+
+
+def iter_instance_posts(instance_url, start=None, follow=False, stop_event=None):
+    """
+    Page through an instance's public timeline, oldest new post first.
+
+    Args:
+        instance_url: Base URL of the instance or a local stand-in
+        start: Newest status ID loaded by an earlier run
+        follow: Keep polling for new posts until stop_event is set
+        stop_event: threading.Event ending a followed source
+
+    Yields:
+        tuple: (status, position)
+    """
+    stop_event = stop_event or threading.Event()
+    url = f"{instance_url.rstrip('/')}/api/v1/timelines/public"
+    page_limit = POST_INGESTION_CONFIG["page_limit"]
+    min_id = start
+
+    while not stop_event.is_set():
+        params = {"limit": page_limit}
+        if min_id:
+            params["min_id"] = min_id
+        try:
+            response = upstream_request(
+                "GET", url, params=params, timeout=POST_INGESTION_CONFIG["request_timeout_seconds"]
+            )
+            response.raise_for_status()
+            page = [status for status in response.json() if isinstance(status, dict)]
+        except (requests.RequestException, ValueError) as e:
+            if not follow:
+                raise
+            logger.warning(f"Fetching {url} failed, retrying: {e}")
+            page = []
+
+        if page:
+            page.sort(key=_id_key)
+            for status in page:
+                yield status, str(status["id"])
+            min_id = str(page[-1]["id"])
+            if len(page) >= page_limit:
+                # More posts are waiting
+                continue
+        if not follow:
+            return
+        stop_event.wait(POST_INGESTION_CONFIG["poll_interval_seconds"])
+
+
+def iter_source(source, start=None, follow=False, stop_event=None):
+    """Read statuses from a file path or an http(s) instance URL."""
+    if source.startswith(("http://", "https://")):
+        return iter_instance_posts(source, start, follow, stop_event)
+    return iter_file_posts(source, start)
+
+
+class PostIngester:
+    """
+    Streams statuses from several sources into post_metadata.
+
+    Args:
+        checkpoint_path: File keeping the position reached in each source
+        batch_size: Rows per COPY and merge (default: POST_INGESTION_CONFIG)
+        connection_factory: Context manager yielding a PostgreSQL connection
+    """
+
+    def __init__(self, checkpoint_path=None, batch_size=None, connection_factory=get_db_connection):
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size or POST_INGESTION_CONFIG["batch_size"]
+        self.connection_factory = connection_factory
+        self.positions = load_checkpoint(checkpoint_path)
+        self.stats = {
+            "read": 0,
+            "invalid": 0,
+            "duplicates": 0,
+            "loaded": 0,
+            "inserted": 0,
+            "updated": 0,
+            "batches": 0,
+            "elapsed_seconds": 0.0,
+            "rows_per_sec": 0.0,
+        }
+        # URI (or ID) -> (post_id, hash of mastodon_post) of recently loaded posts
+        self._recent = OrderedDict()
+        self._batch = OrderedDict()
+        self._batch_positions = {}
+
+    def _read(self, source, stop_event, items):
+        try:
+            for status, position in iter_source(
+                source, self.positions.get(source), self._follow, stop_event
+            ):
+                item = (source, normalize_post(status), position)
+                while not stop_event.is_set():
+                    try:
+                        items.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop_event.is_set():
+                    break
+            items.put((source, _DONE, None))
+        except Exception as e:
+            logger.error(f"Reading {source} failed: {e}")
+            items.put((source, _DONE, e))
+
+    def _add(self, source, row, position):
+        self.stats["read"] += 1
+        if position is not None:
+            self._batch_positions[source] = position
+        if row is None:
+            self.stats["invalid"] += 1
+            return
+        post_id, uri, digest = row[0], row[1], hash(row[8])
+        key = uri or post_id
+        seen = self._recent.get(key)
+        if seen and (seen[0] != post_id or seen[1] == digest):
+            # A federated copy, or a post re-read without changes
+            self.stats["duplicates"] += 1
+            return
+        self._recent[key] = (post_id, digest)
+        self._recent.move_to_end(key)
+        while len(self._recent) > POST_INGESTION_CONFIG["dedupe_window"]:
+            self._recent.popitem(last=False)
+        if post_id in self._batch:
+            self.stats["duplicates"] += 1
+        self._batch[post_id] = row
+        self._batch.move_to_end(post_id)
+
+    def flush(self) -> int:
+        """
+        Load the pending batch and save the source positions it covers.
+
+        Returns:
+            int: Number of rows loaded
+        """
+        rows = list(self._batch.values())
+        if rows:
+            with self.connection_factory() as conn:
+                inserted, updated = load_batch(conn, rows)
+            self.stats["loaded"] += len(rows)
+            self.stats["inserted"] += inserted
+            self.stats["updated"] += updated
+            self.stats["batches"] += 1
+            self._batch.clear()
+
+        if self._batch_positions:
+            self.positions.update(self._batch_positions)
+            self._batch_positions.clear()
+            if self.checkpoint_path:
+                save_checkpoint(self.checkpoint_path, self.positions)
+
+        elapsed = time.time() - self._started
+        self.stats["elapsed_seconds"] = round(elapsed, 2)
+        self.stats["rows_per_sec"] = (
+            round(self.stats["loaded"] / elapsed, 1) if elapsed > 0 else 0.0
+        )
+        return len(rows)
+
+    def ingest(self, sources, follow=False, stop_event=None) -> dict:
+        """
+        Load every source, returning once all are exhausted or stopped.
+
+        Args:
+            sources: File paths and instance URLs
+            follow: Keep polling instance sources for new posts
+            stop_event: threading.Event ending followed sources
+
+        Returns:
+            dict: Ingestion counters, including rows_per_sec
+
+        Raises:
+            Exception: The first error reading a source or loading a batch;
+                positions of committed batches are already saved
+        """
+        self._follow = follow
+        self._started = time.time()
+        stop_event = stop_event or threading.Event()
+        items = queue.Queue(maxsize=POST_INGESTION_CONFIG["max_queue"])
+        for source in sources:
+            threading.Thread(
+                target=self._read,
+                args=(source, stop_event, items),
+                name=f"ingest-{source}",
+                daemon=True,
+            ).start()
+
+        active = len(sources)
+        flush_interval = POST_INGESTION_CONFIG["flush_interval_seconds"]
+        deadline = time.time() + flush_interval
+        try:
+            while active:
+                try:
+                    source, row, position = items.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    pass
+                else:
+                    if row is _DONE:
+                        active -= 1
+                        if position is not None:
+                            raise position
+                    else:
+                        self._add(source, row, position)
+
+                if len(self._batch) >= self.batch_size or time.time() >= deadline:
+                    deadline = time.time() + flush_interval
+                    if self.flush():
+                        logger.info(
+                            f"Loaded {self.stats['loaded']} posts ({self.stats['inserted']} new, "
+                            f"{self.stats['updated']} updated), {self.stats['rows_per_sec']} rows/s"
+                        )
+            self.flush()
+        finally:
+            stop_event.set()
+        return dict(self.stats)
@@ -4,16 +4,48 @@ Privacy utilities module for the Corgi Recommender Service.
 This module provides functions for handling user privacy, including:
 - User pseudonymization via hashing
 - Privacy settings management
+- A process-local privacy level cache
+
+Privacy levels are read on every enrichable timeline and every logged
+interaction, so they are cached per process. Updates write through the cache,
+and a trigger on privacy_settings (db/schema.py) publishes every change on
+the privacy_changed channel; every worker LISTENs on it and drops its
+entry. The cache is only trusted while that listener is connected, so a
+worker never serves an opt-out it may have missed.
 """
 
 import hashlib
 import logging
 import os
-from config import USER_HASH_SALT
-from db.connection import USE_IN_MEMORY_DB, get_cursor
+import select
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from config import USER_HASH_SALT, DB_CONFIG, PRIVACY_CACHE_CONFIG
+from db.connection import USE_IN_MEMORY_DB, get_cursor, get_db_connection
 
 logger = logging.getLogger(__name__)
 
+# Channel used to tell other workers a privacy level changed
+PRIVACY_CHANNEL = 'privacy_changed'
+
+# Privacy level cache: user_id -> (expires_at, tracking_level), least recently used first
+_privacy_lock = threading.Lock()
+_privacy_cache = OrderedDict()
+_privacy_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+# Bumped on every invalidation, so a read that raced an update is not cached
+_privacy_generation = 0
+
+# Cross-worker invalidation listener
+_listener_thread = None
+_listener_stop = threading.Event()
+_listener_connected = False
+
 def generate_user_alias(user_id):
     """
     Hash a user ID for pseudonymization to protect user privacy.
@@ -48,10 +80,88 @@ def generate_user_alias(user_id):
         digestmod=hashlib.sha256
     ).hexdigest()
 
+def _cache_trusted():
+    """Whether cached levels can be served (single process, or listening for changes)."""
+    return USE_IN_MEMORY_DB or not PRIVACY_CACHE_CONFIG['listen'] or _listener_connected
+
+def get_cached_privacy_level(user_id):
+    """
+    Get a user's privacy level from the cache.
+    
+    Args:
+        user_id (str): The user ID to get privacy settings for
+        
+    Returns:
+        str: Cached privacy level, or None if it has to be read from the database
+    """
+    if not _cache_trusted():
+        return None
+    
+    now = time.time()
+    with _privacy_lock:
+        entry = _privacy_cache.get(user_id)
+        if entry and entry[0] > now:
+            _privacy_cache.move_to_end(user_id)
+            _privacy_stats['hits'] += 1
+            return entry[1]
+        if entry:
+            del _privacy_cache[user_id]
+        _privacy_stats['misses'] += 1
+    return None
+
+def _cache_privacy_level(user_id, tracking_level, generation):
+    with _privacy_lock:
+        # Skip if the level was invalidated while it was being read
+        if generation != _privacy_generation or not _cache_trusted():
+            return
+        _privacy_cache[user_id] = (time.time() + PRIVACY_CACHE_CONFIG['ttl_seconds'], tracking_level)
+        _privacy_cache.move_to_end(user_id)
+        while len(_privacy_cache) > PRIVACY_CACHE_CONFIG['max_entries']:
+            _privacy_cache.popitem(last=False)
+
+def invalidate_privacy_level(user_id=None):
+    """
+    Drop a user's cached privacy level, or every cached level.
+    
+    Args:
+        user_id (str): The user ID to drop, or None to clear the cache
+    """
+    global _privacy_generation
+    with _privacy_lock:
+        _privacy_generation += 1
+        if user_id is None:
+            _privacy_cache.clear()
+        else:
+            _privacy_cache.pop(user_id, None)
+        _privacy_stats['invalidations'] += 1
+
+def get_privacy_cache_stats():
+    """Get privacy cache hit/miss counters, size and listener state."""
+    with _privacy_lock:
+        return dict(_privacy_stats, size=len(_privacy_cache), trusted=_cache_trusted())
+
+def lookup_privacy_level(user_id):
+    """
+    Get a user's privacy level, only opening a connection on a cache miss.
+    
+    Args:
+        user_id (str): The user ID to get privacy settings for
+        
+    Returns:
+        str: Privacy level ('full', 'limited', or 'none')
+    """
+    privacy_level = get_cached_privacy_level(user_id)
+    if privacy_level is None:
+        with get_db_connection() as conn:
+            privacy_level = get_user_privacy_level(conn, user_id)
+    return privacy_level
+
 def get_user_privacy_level(conn, user_id):
     """
     Get the privacy tracking level for a user.
     
+    Served from the privacy cache when possible.
+    
     Args:
         conn: Database connection
         user_id (str): The user ID to get privacy settings for
@@ -59,6 +169,16 @@ def get_user_privacy_level(conn, user_id):
     Returns:
         str: Privacy level ('full', 'limited', or 'none')
     """
+    privacy_level = get_cached_privacy_level(user_id)
+    if privacy_level is not None:
+        return privacy_level
+    
+    generation = _privacy_generation
+    privacy_level = _read_privacy_level(conn, user_id)
+    _cache_privacy_level(user_id, privacy_level, generation)
+    return privacy_level
+
+def _read_privacy_level(conn, user_id):
     with get_cursor(conn) as cur:
         # Use the appropriate placeholder style
         placeholder = "?" if USE_IN_MEMORY_DB else "%s"
@@ -117,9 +237,87 @@ def update_user_privacy_level(conn, user_id, tracking_level):
                     ON CONFLICT (user_id) 
                     DO UPDATE SET tracking_level = EXCLUDED.tracking_level
                 ''', (user_id, tracking_level))
+        # The privacy_settings_notify trigger tells the other workers on commit
         conn.commit()
+        
+        # Write through: drop any in-flight read, then cache the new level
+        invalidate_privacy_level(user_id)
+        _cache_privacy_level(user_id, tracking_level, _privacy_generation)
         return True
     except Exception as e:
         logger.error(f"Error updating privacy level: {e}")
         conn.rollback()
-        return False
\ No newline at end of file
+        return False
+
+def _listen_for_privacy_changes():
+    """Listener thread: drop cached levels on NOTIFY privacy_changed."""
+    global _listener_connected
+    
+    while not _listener_stop.is_set():
+        conn = None
+        try:
+            # A dropped connection must fail fast: until it does, cached
+            # levels are served without invalidations
+            ping_seconds = PRIVACY_CACHE_CONFIG['ping_seconds']
+            conn = psycopg2.connect(**DB_CONFIG, keepalives=1, keepalives_idle=ping_seconds,
+                                    keepalives_interval=max(ping_seconds // 3, 1), keepalives_count=3)
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {PRIVACY_CHANNEL}")
+            
+            # Changes made while we were not listening may have been missed
+            invalidate_privacy_level()
+            _listener_connected = True
+            logger.info("Listening for privacy level changes")
+            
+            last_activity = time.time()
+            while not _listener_stop.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    if time.time() - last_activity < ping_seconds:
+                        continue
+                    # Raises if the server went away, so we reconnect
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1")
+                else:
+                    conn.poll()
+                last_activity = time.time()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    invalidate_privacy_level(notify.payload)
+        except Exception as e:
+            logger.warning(f"Privacy change listener disconnected: {e}")
+        finally:
+            # Stop serving cached levels until we are listening again
+            _listener_connected = False
+            invalidate_privacy_level()
+            if conn is not None:
+                conn.close()
+        
+        _listener_stop.wait(PRIVACY_CACHE_CONFIG['reconnect_seconds'])
+
+def start_privacy_listener():
+    """
+    Start the background thread that keeps this worker's privacy cache coherent.
+    
+    Does nothing with the in-memory database, when listening is disabled, or
+    if the listener is already running.
+    """
+    global _listener_thread
+    
+    if USE_IN_MEMORY_DB or not PRIVACY_CACHE_CONFIG['listen'] or _listener_thread is not None:
+        return
+    
+    _listener_stop.clear()
+    _listener_thread = threading.Thread(target=_listen_for_privacy_changes, daemon=True)
+    _listener_thread.start()
+    logger.info("Privacy change listener thread started")
+
+def stop_privacy_listener():
+    """Stop the privacy change listener thread."""
+    global _listener_thread
+    
+    if _listener_thread is None:
+        return
+    _listener_stop.set()
+    _listener_thread.join(timeout=5)
+    _listener_thread = None
@@ -14,6 +14,7 @@ from datetime import datetime, timedelta
 
 from db.connection import get_db_connection
 from utils.privacy import generate_user_alias
+from utils.cold_start_store import get_cold_start_store
 from core.ranking_algorithm import generate_rankings_for_user
 from utils.metrics import track_recommendation_score
 
@@ -27,26 +28,21 @@ COLD_START_DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)),
 
 def load_cold_start_posts() -> List[Dict]:
     """
-    Load cold start posts from the JSON file.
+    Load cold start posts from the JSON file (cached until it changes).
     
     Returns:
         List of pre-formatted cold start posts
     """
-    try:
-        with open(COLD_START_DATA_PATH, 'r') as f:
-            cold_start_posts = json.load(f)
-            logger.info(f"Loaded {len(cold_start_posts)} cold start posts")
-            
-            # No need to track metrics here as it will be tracked by the calling functions
-            # This function just loads data; the decision to use it is what we track
-            
-            return cold_start_posts
-    except Exception as e:
-        logger.error(f"Error loading cold start posts: {e}")
+    store = get_cold_start_store(COLD_START_DATA_PATH)
+    cold_start_posts = store.posts()
+    if store.last_error:
         # Track the failure to load cold start posts
         from utils.metrics import FALLBACK_USAGE_TOTAL
         FALLBACK_USAGE_TOTAL.labels(reason='cold_start_load_error').inc()
-        return []
+    
+    # No need to track metrics here as it will be tracked by the calling functions
+    # This function just loads data; the decision to use it is what we track
+    return cold_start_posts
 
 
 def is_new_user(user_id: str) -> bool:
@@ -144,7 +140,8 @@ def get_ranked_recommendations(user_id: str, limit: int = 10) -> List[Dict]:
         ranked_posts.sort(key=lambda x: x.get('ranking_score', 0), reverse=True)
         ranked_posts = ranked_posts[:limit]
         
-        # Transform ranked posts into Mastodon-compatible format
+        # Transform ranked records into Mastodon-compatible format; this is the
+        # only place ranked candidates become response dictionaries
         mastodon_posts = []
         
         for post in ranked_posts:
@@ -167,9 +164,10 @@ def get_ranked_recommendations(user_id: str, limit: int = 10) -> List[Dict]:
             except Exception as e:
                 logger.error(f"Error fetching Mastodon post data for {post['post_id']}: {e}")
             
-            # If we have a stored Mastodon post, use it as the base
+            # If we have a stored Mastodon post, use it as the base. The JSONB
+            # value is decoded fresh for this query, so it is safe to update in place.
             if mastodon_post:
-                formatted_post = mastodon_post.copy() if isinstance(mastodon_post, dict) else {}
+                formatted_post = mastodon_post if isinstance(mastodon_post, dict) else {}
             else:
                 # Otherwise, create a new Mastodon-compatible post
                 formatted_post = {
@@ -0,0 +1,282 @@
+"""
+Seen filter module for the Corgi Recommender Service.
+
+This module keeps a compact per-user set of posts the user has already seen
+(interacted with or been shown), so candidate posts can be filtered in memory
+instead of passing the whole history to the database as a NOT IN list.
+
+Each user's set is a pair of Bloom filters covering the recent history
+window: new posts go into the current filter, and when it is half a window
+old or holds SEEN_FILTER_CONFIG['capacity'] posts it becomes the previous
+filter and a fresh one starts. Membership checks cost the same regardless of
+history size, and since neither generation grows past its capacity the
+false-positive rate stays bounded (a false positive only hides one candidate
+post). Heavy users cover less than the full window instead.
+
+The database row is the source of truth, shared by all worker processes:
+mark_seen() locks it, adds the posts to the stored filter and writes it back
+in one transaction, so marks from other workers are never overwritten.
+Cached copies used for reads are reloaded after cache_ttl_seconds.
+A stored filter that cannot be decoded is rebuilt from interactions.
+"""
+
+import hashlib
+import logging
+import math
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from config import SEEN_FILTER_CONFIG
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">IIdI")  # bit count, hash count, rotated_at, current count
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over string keys."""
+
+    __slots__ = ("num_bits", "num_hashes", "bits")
+
+    def __init__(self, num_bits: int, num_hashes: int, bits: Optional[bytes] = None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray(bits) if bits is not None else bytearray((num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, fp_rate: float) -> "BloomFilter":
+        """Create a filter sized for `capacity` keys at `fp_rate` false positives."""
+        num_bits = max(8, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+        num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+        return cls(num_bits, num_hashes)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key)
+        )
+
+
+class SeenFilter:
+    """Two-generation Bloom filter of the posts a user has seen."""
+
+    __slots__ = ("current", "previous", "rotated_at", "count")
+
+    def __init__(
+        self,
+        current: BloomFilter = None,
+        previous: BloomFilter = None,
+        rotated_at: Optional[float] = None,
+        count: int = 0,
+    ):
+        self.current = current or BloomFilter.for_capacity(
+            SEEN_FILTER_CONFIG["capacity"], SEEN_FILTER_CONFIG["fp_rate"]
+        )
+        self.previous = previous or BloomFilter(self.current.num_bits, self.current.num_hashes)
+        self.rotated_at = rotated_at if rotated_at is not None else time.time()
+        self.count = count  # posts added to the current generation
+
+    def _rotate(self, now: float) -> None:
+        self.previous = self.current
+        self.current = BloomFilter(self.previous.num_bits, self.previous.num_hashes)
+        self.rotated_at = now
+        self.count = 0
+
+    def rotate_if_due(self, now: Optional[float] = None) -> bool:
+        """Start a new generation once the current one is half a window old."""
+        now = now or time.time()
+        if now - self.rotated_at < SEEN_FILTER_CONFIG["window_days"] * 86400 / 2:
+            return False
+        self._rotate(now)
+        return True
+
+    def add(self, post_id: str) -> None:
+        post_id = str(post_id)
+        if post_id in self.current:
+            return
+        if self.count >= SEEN_FILTER_CONFIG["capacity"]:
+            # Full: more posts would push the false-positive rate past fp_rate
+            self._rotate(time.time())
+        self.current.add(post_id)
+        self.count += 1
+
+    def __contains__(self, post_id: str) -> bool:
+        post_id = str(post_id)
+        return post_id in self.current or post_id in self.previous
+
+    def to_bytes(self) -> bytes:
+        """Serialize both generations for storage."""
+        return (
+            _HEADER.pack(
+                self.current.num_bits, self.current.num_hashes, self.rotated_at, self.count
+            )
+            + bytes(self.current.bits)
+            + bytes(self.previous.bits)
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SeenFilter":
+        """Deserialize a filter written by to_bytes."""
+        num_bits, num_hashes, rotated_at, count = _HEADER.unpack_from(data)
+        size = (num_bits + 7) // 8
+        offset = _HEADER.size
+        if len(data) != offset + 2 * size or not num_hashes:
+            raise ValueError(f"Seen filter is {len(data)} bytes, expected {offset + 2 * size}")
+        current = BloomFilter(num_bits, num_hashes, data[offset : offset + size])
+        previous = BloomFilter(num_bits, num_hashes, data[offset + size : offset + 2 * size])
+        return cls(current, previous, rotated_at, count)
+
+
+# In-memory cache of user filters with thread safety
+_filter_lock = threading.Lock()
+_filters = OrderedDict()  # user_alias -> (SeenFilter, loaded_at), least recently used first
+
+
+def _cache_put(user_alias: str, seen: SeenFilter) -> None:
+    _filters[user_alias] = (seen, time.time())
+    _filters.move_to_end(user_alias)
+    while len(_filters) > SEEN_FILTER_CONFIG["cache_size"]:
+        _filters.popitem(last=False)
+
+
+def _persist(cur, user_alias: str, filter_data: bytes) -> None:
+    cur.execute(
+        """
+        INSERT INTO user_seen_filters (user_alias, filter_data, updated_at)
+        VALUES (%s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (user_alias)
+        DO UPDATE SET filter_data = EXCLUDED.filter_data, updated_at = CURRENT_TIMESTAMP
+    """,
+        (user_alias, filter_data),
+    )
+
+
+def _decode(user_alias: str, data) -> Optional[SeenFilter]:
+    if not data:
+        return None
+    try:
+        return SeenFilter.from_bytes(bytes(data))
+    except (struct.error, ValueError) as e:
+        logger.warning(f"Rebuilding unreadable seen filter for {user_alias}: {e}")
+        return None
+
+
+def _rebuild(cur, user_alias: str) -> SeenFilter:
+    """Build a user's filter from the interaction history."""
+    cur.execute(
+        """
+        SELECT post_id FROM interactions
+        WHERE user_alias = %s
+        AND created_at > NOW() - INTERVAL '%s days'
+    """,
+        (user_alias, SEEN_FILTER_CONFIG["window_days"]),
+    )
+    post_ids = [post_id for (post_id,) in cur.fetchall()]
+
+    seen = SeenFilter()
+    for post_id in post_ids:
+        seen.add(post_id)
+    logger.debug(f"Built seen filter for {user_alias} from {len(post_ids)} interactions")
+    return seen
+
+
+def _load(conn, user_alias: str) -> SeenFilter:
+    """Load a user's filter from the database, building it from interactions if missing or unreadable."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT filter_data FROM user_seen_filters WHERE user_alias = %s", (user_alias,)
+        )
+        row = cur.fetchone()
+        seen = _decode(user_alias, row[0] if row else None)
+        if seen is not None:
+            return seen
+
+        seen = _rebuild(cur, user_alias)
+        _persist(cur, user_alias, seen.to_bytes())
+    conn.commit()
+    return seen
+
+
+def get_seen_filter(conn, user_alias: str) -> SeenFilter:
+    """
+    Get the seen-post filter for a user.
+
+    Args:
+        conn: Database connection
+        user_alias: Pseudonymized user ID
+
+    Returns:
+        SeenFilter supporting `post_id in seen`
+    """
+    with _filter_lock:
+        entry = _filters.get(user_alias)
+        if entry is not None and time.time() - entry[1] < SEEN_FILTER_CONFIG["cache_ttl_seconds"]:
+            _filters.move_to_end(user_alias)
+            return entry[0]
+
+    seen = _load(conn, user_alias)
+    with _filter_lock:
+        _cache_put(user_alias, seen)
+    return seen
+
+
+def mark_seen(conn, user_alias: str, post_ids: Iterable[str]) -> bool:
+    """
+    Record posts as seen by a user (interactions and impressions).
+
+    The stored filter is read under a row lock and updated in the same
+    transaction, so concurrent writers in other processes merge in turn.
+
+    Args:
+        conn: Database connection
+        user_alias: Pseudonymized user ID
+        post_ids: IDs of posts the user interacted with or was shown
+
+    Returns:
+        bool: True if successful, False on error
+    """
+    post_ids = [post_id for post_id in post_ids if post_id]
+    if not post_ids:
+        return True
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT filter_data FROM user_seen_filters WHERE user_alias = %s FOR UPDATE",
+                (user_alias,),
+            )
+            row = cur.fetchone()
+            seen = _decode(user_alias, row[0] if row else None) or _rebuild(cur, user_alias)
+            seen.rotate_if_due()
+            for post_id in post_ids:
+                seen.add(post_id)
+            _persist(cur, user_alias, seen.to_bytes())
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error updating seen filter for {user_alias}: {e}")
+        conn.rollback()
+        return False
+
+    with _filter_lock:
+        _cache_put(user_alias, seen)
+    return True
+
+
+def clear_seen_filters() -> None:
+    """Drop all cached filters (they are reloaded from the database on demand)."""
+    with _filter_lock:
+        _filters.clear()
@@ -0,0 +1,458 @@
+"""
+Streaming module for the Corgi Recommender Service.
+
+Relays Mastodon's streaming API (/api/v1/streaming) so clients can receive
+timeline updates pushed by their instance instead of polling through the
+proxy. The async proxy serves both client flavours, Server-Sent Events and
+WebSocket; upstream, every stream is read over SSE:
+
+- StreamingHub keeps one upstream connection per viewer (credentials hash)
+  and stream, shared by all of that viewer's client connections (tabs, SSE
+  and WebSocket alike). Each viewer may hold max_streams_per_viewer of them;
+  unauthenticated clients share their connections and are capped together
+  by max_anonymous_streams. A connection stays open linger_seconds after
+  its last subscriber leaves, so a client that reconnects finds it open,
+  and is re-established with backoff when the instance drops it.
+- Each client subscription buffers at most queue_size events; a client too
+  slow to drain them is disconnected rather than buffered without limit.
+- RecommendationInterleaver occasionally pushes a recommendation into a
+  home stream as an update event.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from urllib.parse import urlencode
+
+import httpx
+
+from config import PROXY_TIMEOUT, STREAMING_CONFIG
+from utils import instance_health
+from utils.instance_health import InstanceUnavailable
+
+logger = logging.getLogger(__name__)
+
+# One server-sent event; injected marks recommendations the proxy added
+StreamEvent = namedtuple("StreamEvent", ["event", "data", "injected"], defaults=(False,))
+
+# Viewer scope of clients without credentials
+ANONYMOUS_VIEWER = "anonymous"
+
+# Upstream SSE paths under /api/v1/streaming/ that can be relayed
+STREAM_PATHS = frozenset(
+    [
+        "user",
+        "user/notification",
+        "direct",
+        "public",
+        "public/local",
+        "public/remote",
+        "hashtag",
+        "hashtag/local",
+        "list",
+    ]
+)
+
+# Parameter that selects the stream, for streams that need one
+_STREAM_ARGUMENTS = {"hashtag": "tag", "hashtag/local": "tag", "list": "list"}
+
+_stats_lock = threading.Lock()
+_stats = {
+    "client_streams": 0,
+    "upstream_streams": 0,
+    "events": 0,
+    "injected": 0,
+    "reconnects": 0,
+    "overflows": 0,
+    "rejected": 0,
+}
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+class StreamRejected(Exception):
+    """The instance refused a stream, or couldn't be reached to open it."""
+
+    def __init__(self, status_code, body=b""):
+        super().__init__(f"Upstream stream rejected with status {status_code}")
+        self.status_code = status_code
+        self.body = body
+
+
+class StreamLimitExceeded(Exception):
+    """The viewer already holds max_streams_per_viewer upstream streams
+    (max_anonymous_streams for unauthenticated clients)."""
+
+
+def stream_request(stream: str, params: dict):
+    """
+    Translate a WebSocket stream name into its upstream SSE request.
+
+    Args:
+        stream: Stream name as in a WebSocket subscribe message
+            (e.g. 'user', 'public:local:media', 'hashtag')
+        params: The message or query parameters (tag, list)
+
+    Returns:
+        tuple: (SSE path, SSE params, stream labels for relayed messages),
+        or None if the stream is unknown or lacks its argument
+    """
+    if not isinstance(stream, str):
+        return None
+    media = stream.endswith(":media")
+    path = (stream[: -len(":media")] if media else stream).replace(":", "/")
+    if path not in STREAM_PATHS:
+        return None
+    sse_params = {"only_media": "true"} if media else {}
+    labels = [stream]
+    argument = _STREAM_ARGUMENTS.get(path)
+    if argument:
+        value = params.get(argument)
+        if not value:
+            return None
+        sse_params[argument] = str(value)
+        labels.append(str(value))
+    return path, sse_params, labels
+
+
+async def parse_sse(lines):
+    """
+    Parse server-sent events from a stream of lines.
+
+    Args:
+        lines: Async iterator of lines without their line breaks
+
+    Yields:
+        StreamEvent: Each complete event; comments (heartbeats) are skipped
+    """
+    event, data = None, []
+    async for line in lines:
+        if not line:
+            if data:
+                yield StreamEvent(event or "message", "\n".join(data))
+            event, data = None, []
+        elif line.startswith(":"):
+            continue
+        else:
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "event":
+                event = value
+            elif field == "data":
+                data.append(value)
+
+
+def format_sse(event: StreamEvent) -> str:
+    """Format an event for an SSE client."""
+    data = "".join(f"data: {line}\n" for line in event.data.split("\n"))
+    return f"event: {event.event}\n{data}\n"
+
+
+def viewer_scope(headers: dict) -> str:
+    """Hash of the credentials a request authenticates with, or ANONYMOUS_VIEWER."""
+    auth = next((value for name, value in headers.items() if name.lower() == "authorization"), "")
+    if not auth:
+        return ANONYMOUS_VIEWER
+    return hashlib.sha256(auth.encode()).hexdigest()
+
+
+class Subscription:
+    """A client's view of an upstream stream: a bounded buffer of pending events."""
+
+    def __init__(self, hub, upstream):
+        self.hub = hub
+        self.upstream = upstream
+        self.closed_reason = None
+        self._pending = deque()
+        self._wakeup = asyncio.Event()
+
+    def push(self, event: StreamEvent) -> None:
+        """Queue an event, disconnecting the client if it has fallen too far behind."""
+        if self.closed_reason:
+            return
+        if len(self._pending) >= STREAMING_CONFIG["queue_size"]:
+            self._pending.clear()
+            _count("overflows")
+            self.finish("overflow")
+            return
+        self._pending.append(event)
+        self._wakeup.set()
+
+    def finish(self, reason: str) -> None:
+        """End the subscription once its pending events are consumed."""
+        if not self.closed_reason:
+            self.closed_reason = reason
+            self._wakeup.set()
+
+    async def next(self):
+        """
+        Wait for the next event.
+
+        Returns:
+            StreamEvent, or None once the subscription has ended
+        """
+        while not self._pending:
+            if self.closed_reason:
+                return None
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        return self._pending.popleft()
+
+    def close(self) -> None:
+        """Leave the upstream stream; safe to call more than once."""
+        self.finish("closed")
+        self.hub.unsubscribe(self)
+
+
+class _Upstream:
+    """One upstream SSE connection and the subscriptions it feeds."""
+
+    def __init__(self, key, url, params, headers):
+        self.key = key
+        self.url = url
+        self.params = params
+        self.headers = headers
+        self.subscribers = set()
+        self.ready = asyncio.get_running_loop().create_future()
+        self.task = None
+        self.linger = None
+
+    def publish(self, event):
+        for subscription in list(self.subscribers):
+            subscription.push(event)
+
+
+class StreamingHub:
+    """
+    Shares upstream streaming connections between client connections.
+
+    Must be used from a single event loop.
+
+    Args:
+        client: httpx.AsyncClient used for upstream connections
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._upstreams = {}
+        self._viewer_streams = Counter()
+
+    async def subscribe(self, url: str, params: dict, headers: dict) -> Subscription:
+        """
+        Subscribe to an upstream stream, connecting to it if nobody is yet.
+
+        Args:
+            url: Upstream SSE URL (https://instance/api/v1/streaming/...)
+            params: Query parameters selecting the stream
+            headers: Headers sent upstream, including the viewer's credentials
+
+        Returns:
+            Subscription: Call close() when the client goes away
+
+        Raises:
+            StreamRejected: If the instance refused or failed the connection
+            StreamLimitExceeded: If the viewer holds too many streams
+        """
+        scope = viewer_scope(headers)
+        key = (scope, url, urlencode(sorted(params.items())))
+        upstream = self._upstreams.get(key)
+        if upstream is None:
+            limit = STREAMING_CONFIG[
+                "max_anonymous_streams" if scope == ANONYMOUS_VIEWER else "max_streams_per_viewer"
+            ]
+            if self._viewer_streams[scope] >= limit:
+                _count("rejected")
+                raise StreamLimitExceeded(scope)
+            upstream = self._upstreams[key] = _Upstream(key, url, params, headers)
+            self._viewer_streams[scope] += 1
+            _count("upstream_streams")
+            upstream.task = asyncio.ensure_future(self._run(upstream))
+        elif upstream.linger:
+            upstream.linger.cancel()
+            upstream.linger = None
+
+        subscription = Subscription(self, upstream)
+        upstream.subscribers.add(subscription)
+        _count("client_streams")
+        try:
+            await asyncio.shield(upstream.ready)
+        except BaseException:
+            subscription.close()
+            raise
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Detach a subscription; the upstream lingers if it was the last one."""
+        upstream = subscription.upstream
+        if subscription not in upstream.subscribers:
+            return
+        upstream.subscribers.discard(subscription)
+        _count("client_streams", -1)
+        if upstream.subscribers or upstream.task.done():
+            return
+        linger = STREAMING_CONFIG["linger_seconds"]
+        if linger > 0:
+            upstream.linger = asyncio.get_running_loop().call_later(linger, upstream.task.cancel)
+        else:
+            upstream.task.cancel()
+
+    async def _connect(self, upstream):
+        instance_health.acquire(upstream.url)
+        start = time.perf_counter()
+        timeout = httpx.Timeout(PROXY_TIMEOUT, read=STREAMING_CONFIG["read_timeout"])
+        request = self.client.build_request(
+            "GET", upstream.url, params=upstream.params, headers=upstream.headers, timeout=timeout
+        )
+        try:
+            response = await self.client.send(request, stream=True, follow_redirects=True)
+        except httpx.HTTPError:
+            instance_health.record_failure(upstream.url)
+            raise
+        instance_health.record_response(
+            upstream.url, response.status_code, time.perf_counter() - start
+        )
+        if response.status_code != 200:
+            body = await response.aread()
+            await response.aclose()
+            raise StreamRejected(response.status_code, body)
+        return response
+
+    def _fail(self, upstream, error):
+        if not upstream.ready.done():
+            upstream.ready.set_exception(error)
+            # Subscribers may all be gone; don't warn about an unretrieved exception
+            upstream.ready.exception()
+
+    async def _run(self, upstream):
+        backoff = 0
+        try:
+            while True:
+                try:
+                    response = await self._connect(upstream)
+                except StreamRejected as e:
+                    if e.status_code < 500 or not upstream.ready.done():
+                        logger.warning(f"Upstream stream {upstream.url} rejected: {e.status_code}")
+                        self._fail(upstream, e)
+                        return
+                    logger.warning(f"Upstream stream {upstream.url} failed: {e.status_code}")
+                except InstanceUnavailable as e:
+                    if not upstream.ready.done():
+                        self._fail(
+                            upstream, StreamRejected(503, json.dumps({"error": str(e)}).encode())
+                        )
+                        return
+                except httpx.HTTPError as e:
+                    if not upstream.ready.done():
+                        self._fail(
+                            upstream, StreamRejected(502, json.dumps({"error": str(e)}).encode())
+                        )
+                        return
+                    logger.warning(f"Upstream stream {upstream.url} failed: {e}")
+                else:
+                    if not upstream.ready.done():
+                        upstream.ready.set_result(None)
+                    backoff = 0
+                    try:
+                        async for event in parse_sse(response.aiter_lines()):
+                            _count("events")
+                            upstream.publish(event)
+                    except httpx.HTTPError as e:
+                        logger.warning(f"Upstream stream {upstream.url} interrupted: {e}")
+                    finally:
+                        await response.aclose()
+
+                # The instance closed the stream; reconnect while anyone is listening
+                _count("reconnects")
+                backoff = min(
+                    STREAMING_CONFIG["max_backoff_seconds"],
+                    max(STREAMING_CONFIG["min_backoff_seconds"], backoff * 2),
+                )
+                await asyncio.sleep(backoff)
+        finally:
+            self._fail(upstream, StreamRejected(502))
+            if self._upstreams.get(upstream.key) is upstream:
+                del self._upstreams[upstream.key]
+                self._viewer_streams[upstream.key[0]] -= 1
+                if not self._viewer_streams[upstream.key[0]]:
+                    del self._viewer_streams[upstream.key[0]]
+                _count("upstream_streams", -1)
+            for subscription in list(upstream.subscribers):
+                subscription.finish("upstream_closed")
+
+    async def close(self) -> None:
+        """Close every upstream connection."""
+        tasks = [upstream.task for upstream in self._upstreams.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class RecommendationInterleaver:
+    """
+    Occasionally pushes a recommendation into a home stream subscription.
+
+    A recommendation is injected after every inject_every_updates upstream
+    updates, at most once per inject_min_interval_seconds, and never twice
+    on the same connection.
+
+    Args:
+        subscription: The client's home stream subscription
+        fetch: Coroutine function returning candidate posts; it is
+            responsible for the user's privacy checks
+    """
+
+    def __init__(self, subscription, fetch):
+        self.subscription = subscription
+        self.fetch = fetch
+        self.updates = 0
+        self.last_injected = 0
+        self.sent_ids = set()
+        self.task = None
+
+    def observe(self, event: StreamEvent) -> None:
+        """Count a relayed event and start an injection when one is due."""
+        if event.event != "update" or event.injected:
+            return
+        self.updates += 1
+        if self.updates < STREAMING_CONFIG["inject_every_updates"]:
+            return
+        if time.time() - self.last_injected < STREAMING_CONFIG["inject_min_interval_seconds"]:
+            return
+        if self.task and not self.task.done():
+            return
+        self.updates = 0
+        self.last_injected = time.time()
+        self.task = asyncio.ensure_future(self._inject())
+
+    async def _inject(self):
+        try:
+            recommendations = await self.fetch()
+        except Exception as e:
+            logger.warning(f"Stream recommendation fetch failed: {e}")
+            return
+        for rec in recommendations:
+            if rec.get("id") in self.sent_ids:
+                continue
+            self.sent_ids.add(rec.get("id"))
+            self.subscription.push(
+                StreamEvent("update", json.dumps(rec, default=str), injected=True)
+            )
+            _count("injected")
+            return
+
+    def close(self) -> None:
+        if self.task:
+            self.task.cancel()
+
+
+def get_streaming_stats() -> dict:
+    """Get open stream counts and relayed event counters."""
+    with _stats_lock:
+        return dict(_stats)
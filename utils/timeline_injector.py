@@ -11,6 +11,8 @@ from typing import List, Dict, Optional, Callable
 from datetime import datetime, timedelta
 from copy import deepcopy
 
+from utils.interning import intern_id, lookup_id
+
 logger = logging.getLogger(__name__)
 
 def get_post_timestamp(post: Dict) -> datetime:
@@ -127,12 +129,26 @@ def check_time_gap(
         logger.debug(f"Gap of {gap_minutes:.1f} minutes is sufficient for injection (min: {min_gap_minutes})")
     return meets_requirement
 
+def injectable_tag_ids(post: Dict) -> frozenset:
+    """Get the interned ids of an injectable post's hashtags."""
+    return frozenset(intern_id("tag", tag) for tag in extract_tags(post))
+
+def timeline_tag_ids(post: Dict) -> frozenset:
+    """
+    Get the interned ids of a timeline post's hashtags.
+    
+    Tags that were never interned cannot match an injectable post, so they are
+    skipped rather than added to the registry.
+    """
+    ids = (lookup_id("tag", tag) for tag in extract_tags(post))
+    return frozenset(ident for ident in ids if ident is not None)
+
 def has_matching_tags(real_post: Dict, injected_post: Dict) -> bool:
     """Check if posts share any hashtags."""
-    real_tags = extract_tags(real_post)
-    injected_tags = extract_tags(injected_post)
+    injected_tags = injectable_tag_ids(injected_post)
+    real_tags = timeline_tag_ids(real_post)
     
-    return bool(set(real_tags) & set(injected_tags))
+    return not injected_tags.isdisjoint(real_tags)
 
 def uniform_injection_points(
     num_real_posts: int, 
@@ -288,6 +304,9 @@ def inject_into_timeline(
     
     # Special handling for tag_match strategy
     if strategy_type == "tag_match":
+        # Intern each injectable's tags once; kept in step with available_injections
+        available_tag_ids = [injectable_tag_ids(post) for post in available_injections]
+        
         # Build timeline with tag matching logic
         for i, real_post in enumerate(sorted_real_posts):
             merged_timeline.append(real_post)
@@ -298,10 +317,12 @@ def inject_into_timeline(
                 
             # Try to find a post with matching tags
             matched_idx = None
-            for j, injectable in enumerate(available_injections):
-                if has_matching_tags(real_post, injectable):
-                    matched_idx = j
-                    break
+            real_tag_ids = timeline_tag_ids(real_post)
+            if real_tag_ids:
+                for j, tag_ids in enumerate(available_tag_ids):
+                    if not tag_ids.isdisjoint(real_tag_ids):
+                        matched_idx = j
+                        break
             
             # If we found a match and we're not at the end of the list
             if matched_idx is not None and i < len(sorted_real_posts) - 1:
@@ -313,6 +334,7 @@ def inject_into_timeline(
                 
                 # Inject the post
                 injectable = available_injections.pop(matched_idx)
+                available_tag_ids.pop(matched_idx)
                 
                 # Harmonize timestamp and tag as injected
                 injectable = harmonize_timestamp(injectable, real_post, next_post)
@@ -0,0 +1,312 @@
+"""
+Timeline micro-cache module for the Corgi Recommender Service.
+
+Clients such as Elk poll the home timeline every few seconds, often from
+several tabs at once. This module keeps what a poll costs for a few seconds:
+
+- upstream_timelines: the instance's timeline response, per viewer
+  (credentials hash), upstream URL and query parameters (since_id, max_id,
+  limit, ...). Only 200 responses are kept.
+- enrichment: the posts and recommendations blended into a user's timeline.
+
+Concurrent requests for a key that is being fetched wait for that fetch
+instead of starting their own, in threads (get_or_fetch) and on the async
+proxy's event loop (aget_or_fetch). Each cache is bounded by the approximate
+size of its values and evicts least recently stored entries first. A
+viewer's timelines are dropped as soon as they write through the proxy
+(post, boost, favourite, follow), so their own actions are never hidden by
+the cache.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from config import TIMELINE_MICROCACHE_CONFIG
+
+# Query parameters the proxy consumes itself; they don't change the upstream page
+PROXY_ONLY_PARAMS = frozenset(
+    ["inject", "inject_recommendations", "strategy", "cold_start", "user_id"]
+)
+
+
+class _Flight:
+    """A fetch in progress that other threads may wait for."""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class MicroCache:
+    """
+    Few-second cache that coalesces concurrent fetches of the same key.
+
+    Args:
+        name: Name used in stats
+        max_bytes: Bound on the total size of cached values
+        sizeof: Callable returning a value's approximate size in bytes
+    """
+
+    def __init__(self, name, max_bytes, sizeof):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._lock = threading.Lock()
+        # key -> (expires_at, size, value), least recently stored first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._flights = {}
+        # key -> asyncio.Future, only touched from the event loop
+        self._async_flights = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "stores": 0, "evictions": 0}
+
+    def _lookup(self, key):
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= time.time():
+            self._bytes -= entry[1]
+            del self._entries[key]
+            return False, None
+        self._stats["hits"] += 1
+        return True, entry[2]
+
+    def _store(self, key, value, cacheable):
+        if cacheable is not None and not cacheable(value):
+            return
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._bytes -= old[1]
+            while self._entries and self._bytes + size > self.max_bytes:
+                _, (expires_at, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                if expires_at > now:
+                    self._stats["evictions"] += 1
+            self._entries[key] = (now + TIMELINE_MICROCACHE_CONFIG["ttl_seconds"], size, value)
+            self._bytes += size
+            self._stats["stores"] += 1
+
+    def get_or_fetch(self, key, fetch, cacheable=None):
+        """
+        Get a cached value, or fetch it once for all concurrent callers.
+
+        Args:
+            key: Hashable cache key
+            fetch: Callable producing the value
+            cacheable: Optional predicate; values it rejects are returned
+                but not stored
+
+        Returns:
+            The cached or fetched value
+
+        Raises:
+            Whatever fetch raised, also in callers that waited for it
+        """
+        if not TIMELINE_MICROCACHE_CONFIG["enabled"]:
+            return fetch()
+
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            if not flight.done.wait(TIMELINE_MICROCACHE_CONFIG["coalesce_timeout_seconds"]):
+                return fetch()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fetch()
+            self._store(key, flight.value, cacheable)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def aget_or_fetch(self, key, fetch, cacheable=None):
+        """
+        Async variant of get_or_fetch for the async proxy.
+
+        Args:
+            key: Hashable cache key
+            fetch: Coroutine function producing the value
+            cacheable: Optional predicate; values it rejects are returned
+                but not stored
+
+        Returns:
+            The cached or fetched value
+        """
+        if not TIMELINE_MICROCACHE_CONFIG["enabled"]:
+            return await fetch()
+
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            future = self._async_flights.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+            else:
+                self._stats["misses"] += 1
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self._async_flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await fetch()
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Nobody may be waiting; don't warn about an unretrieved exception
+                future.exception()
+            else:
+                future.cancel()
+            raise
+        else:
+            future.set_result(value)
+            self._store(key, value, cacheable)
+            return value
+        finally:
+            self._async_flights.pop(key, None)
+
+    def invalidate(self, predicate) -> int:
+        """Drop entries whose key matches predicate; returns how many."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._bytes -= self._entries.pop(key)[1]
+        return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._stats, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for name in self._stats:
+                self._stats[name] = 0
+
+
+def _viewer_scope(headers):
+    auth = next((value for name, value in headers.items() if name.lower() == "authorization"), "")
+    return hashlib.sha256(auth.encode()).hexdigest()
+
+
+def _response_size(response):
+    # Body plus a rough allowance for the response object and headers
+    return len(response.content) + 1024
+
+
+def _json_size(value):
+    return len(json.dumps(value, default=str))
+
+
+upstream_timelines = MicroCache(
+    "upstream_timelines", TIMELINE_MICROCACHE_CONFIG["max_bytes"], _response_size
+)
+enrichment = MicroCache(
+    "enrichment", TIMELINE_MICROCACHE_CONFIG["max_enrichment_bytes"], _json_size
+)
+
+
+def timeline_key(url: str, params: dict, headers: dict) -> tuple:
+    """
+    Get the micro-cache key of an upstream timeline request.
+
+    Args:
+        url: Upstream timeline URL without the query string
+        params: Query parameters of the client request
+        headers: Headers sent upstream; their credentials scope the key
+
+    Returns:
+        tuple: (viewer scope, url, query) with proxy-only parameters removed
+    """
+    query = urlencode(
+        sorted((name, value) for name, value in params.items() if name not in PROXY_ONLY_PARAMS)
+    )
+    return (_viewer_scope(headers), url, query)
+
+
+def _is_ok(response):
+    return response.status_code == 200
+
+
+def fetch_timeline(url: str, params: dict, headers: dict, fetch):
+    """
+    Fetch an upstream timeline page through the micro-cache.
+
+    Args:
+        url: Upstream timeline URL without the query string
+        params: Query parameters
+        headers: Headers sent upstream
+        fetch: Callable making the upstream request
+
+    Returns:
+        The upstream response (requests), possibly shared with other polls
+    """
+    return upstream_timelines.get_or_fetch(timeline_key(url, params, headers), fetch, _is_ok)
+
+
+async def afetch_timeline(url: str, params: dict, headers: dict, fetch):
+    """Async variant of fetch_timeline; fetch is a coroutine function returning an httpx response."""
+    return await upstream_timelines.aget_or_fetch(timeline_key(url, params, headers), fetch, _is_ok)
+
+
+def invalidate_viewer(headers: dict) -> int:
+    """
+    Drop the cached timelines of the viewer a request authenticates as.
+
+    Args:
+        headers: Headers of a request that changed the viewer's state
+
+    Returns:
+        int: Number of entries dropped
+    """
+    scope = _viewer_scope(headers)
+    return upstream_timelines.invalidate(lambda key: key[0] == scope)
+
+
+def get_microcache_stats() -> dict:
+    """Get hit, coalescing and size counters of each micro-cache."""
+    return {
+        "enabled": TIMELINE_MICROCACHE_CONFIG["enabled"],
+        upstream_timelines.name: upstream_timelines.stats(),
+        enrichment.name: enrichment.stats(),
+    }
+
+
+def clear_microcaches() -> None:
+    """Forget all cached timelines and enrichment."""
+    upstream_timelines.clear()
+    enrichment.clear()
@@ -0,0 +1,270 @@
+"""
+Timeline prefetch module for the Corgi Recommender Service.
+
+Clients page through the augmented home timeline with max_id. After a page
+is served, the proxy can fetch the next page from the user's instance in the
+background, together with the next slice of recommendations, so a
+scroll-down request is answered from memory.
+
+Two things are kept per page cursor, keyed by the viewer (user ID and a
+hash of their credentials), the upstream URL and the query parameters
+including max_id, so an entry only answers the exact request it expects:
+
+- injection state: where the page's first post sits in the scrolled
+  timeline and which recommendations earlier pages showed. It is kept for
+  state_ttl_seconds whether or not prefetching is enabled, so injection
+  positions stay on one grid across pages and recommendations don't repeat.
+- prefetched pages: the upstream page and its recommendations, kept for
+  page_ttl_seconds and served at most once. Pages are bounded by total
+  body bytes and evicted least recently stored first.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from config import TIMELINE_PREFETCH_CONFIG
+
+logger = logging.getLogger(__name__)
+
+InjectionState = namedtuple("InjectionState", ["position", "rec_ids"])
+INITIAL_STATE = InjectionState(0, ())
+
+# An upstream timeline page fetched ahead of the request for it; quacks like
+# the upstream response for parse_upstream_timeline
+PrefetchedPage = namedtuple("PrefetchedPage", ["status_code", "content", "link", "recommendations"])
+
+# Cursors that page upwards; only max_id paging is prefetched
+_UPWARD_CURSORS = ("min_id", "since_id")
+_NEXT_LINK = re.compile(r'<([^>]*)>\s*;\s*rel="?next"?')
+
+_lock = threading.Lock()
+# key -> (expires_at, InjectionState)
+_states = OrderedDict()
+# key -> (expires_at, PrefetchedPage)
+_pages = OrderedDict()
+_page_bytes = 0
+_in_flight = set()
+_stats = {
+    "prefetched": 0,
+    "hits": 0,
+    "misses": 0,
+    "expired": 0,
+    "failed": 0,
+    "skipped": 0,
+    "evictions": 0,
+}
+
+_executor = ThreadPoolExecutor(
+    max_workers=TIMELINE_PREFETCH_CONFIG["workers"], thread_name_prefix="timeline-prefetch"
+)
+
+
+def page_key(user_id: str, url: str, params: dict, headers: dict) -> tuple:
+    """
+    Get the cache key of a timeline page request.
+
+    Args:
+        user_id: Authenticated user ID
+        url: Upstream timeline URL without the query string
+        params: Query parameters, including the max_id cursor if any
+        headers: Headers sent upstream; their credentials scope the key
+
+    Returns:
+        tuple: Hashable key
+    """
+    auth = next((value for name, value in headers.items() if name.lower() == "authorization"), "")
+    return (
+        user_id,
+        hashlib.sha256(auth.encode()).hexdigest(),
+        url,
+        urlencode(sorted(params.items())),
+    )
+
+
+def next_page_params(params: dict, link: str, last_id: str = None):
+    """
+    Get the query parameters of the page after this one.
+
+    Args:
+        params: This page's query parameters
+        link: The upstream Link header, if any
+        last_id: ID of this page's last upstream post, used when the Link
+            header has no next page
+
+    Returns:
+        dict: Parameters with the next max_id, or None if there is no next
+        page or this request didn't page downwards
+    """
+    if any(name in params for name in _UPWARD_CURSORS):
+        return None
+    cursor = None
+    match = _NEXT_LINK.search(link) if isinstance(link, str) else None
+    if match:
+        cursor = parse_qs(urlparse(match.group(1)).query).get("max_id", [None])[0]
+    cursor = cursor or last_id
+    if not cursor:
+        return None
+    return dict(params, max_id=str(cursor))
+
+
+def get_injection_state(key: tuple) -> InjectionState:
+    """Get the injection state of a page, or INITIAL_STATE if unknown."""
+    with _lock:
+        entry = _states.get(key)
+        if entry and entry[0] > time.time():
+            return entry[1]
+    return INITIAL_STATE
+
+
+def advance_injection_state(state: InjectionState, post_count: int, shown_ids) -> InjectionState:
+    """
+    Get the injection state of the page after one that was served.
+
+    Args:
+        state: The served page's state
+        post_count: Number of upstream posts on the served page
+        shown_ids: IDs of the recommendations injected into it
+
+    Returns:
+        InjectionState: State for the next page
+    """
+    rec_ids = (state.rec_ids + tuple(shown_ids))[-TIMELINE_PREFETCH_CONFIG["max_rec_ids"] :]
+    return InjectionState(state.position + post_count, rec_ids)
+
+
+def save_injection_state(key: tuple, state: InjectionState) -> None:
+    """Remember the injection state of a page that may be requested next."""
+    now = time.time()
+    with _lock:
+        _states[key] = (now + TIMELINE_PREFETCH_CONFIG["state_ttl_seconds"], state)
+        _states.move_to_end(key)
+        while len(_states) > TIMELINE_PREFETCH_CONFIG["max_states"]:
+            _states.popitem(last=False)
+
+
+def take_page(key: tuple):
+    """
+    Remove and return the prefetched page for a request.
+
+    Args:
+        key: Page key, see page_key()
+
+    Returns:
+        PrefetchedPage: The page, or None if none was prefetched or it expired
+    """
+    global _page_bytes
+    with _lock:
+        entry = _pages.pop(key, None)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        _page_bytes -= len(entry[1].content)
+        if entry[0] <= time.time():
+            _stats["expired"] += 1
+            return None
+        _stats["hits"] += 1
+        return entry[1]
+
+
+def _store_page(key, page):
+    global _page_bytes
+    size = len(page.content)
+    now = time.time()
+    with _lock:
+        _in_flight.discard(key)
+        if size > TIMELINE_PREFETCH_CONFIG["max_bytes"]:
+            return
+        for expired_key in [k for k, (expires_at, _) in _pages.items() if expires_at <= now]:
+            _page_bytes -= len(_pages.pop(expired_key)[1].content)
+        while _pages and _page_bytes + size > TIMELINE_PREFETCH_CONFIG["max_bytes"]:
+            _, (_, evicted) = _pages.popitem(last=False)
+            _page_bytes -= len(evicted.content)
+            _stats["evictions"] += 1
+        _pages[key] = (now + TIMELINE_PREFETCH_CONFIG["page_ttl_seconds"], page)
+        _page_bytes += size
+        _stats["prefetched"] += 1
+
+
+def start_prefetch(key: tuple, fetch) -> bool:
+    """
+    Fetch a page in the background unless it is already cached or in flight.
+
+    Args:
+        key: Key of the page to fetch
+        fetch: Callable returning the PrefetchedPage; runs on a prefetch
+            worker thread
+
+    Returns:
+        bool: True if a fetch was started
+    """
+    if not TIMELINE_PREFETCH_CONFIG["enabled"]:
+        return False
+    with _lock:
+        if key in _pages or key in _in_flight:
+            return False
+        if len(_in_flight) >= TIMELINE_PREFETCH_CONFIG["max_in_flight"]:
+            _stats["skipped"] += 1
+            return False
+        _in_flight.add(key)
+
+    def run():
+        try:
+            page = fetch()
+        except Exception as e:
+            logger.warning(f"Timeline prefetch failed: {e}")
+            page = None
+        if page is None or page.status_code != 200:
+            with _lock:
+                _in_flight.discard(key)
+                _stats["failed"] += 1
+            return
+        _store_page(key, page)
+
+    _executor.submit(run)
+    return True
+
+
+def flush_prefetch(timeout: float = 5.0) -> bool:
+    """
+    Wait until in-flight prefetches finish.
+
+    Args:
+        timeout: Seconds to wait
+
+    Returns:
+        bool: True if nothing is in flight
+    """
+    deadline = time.time() + timeout
+    while _in_flight and time.time() < deadline:
+        time.sleep(0.005)
+    return not _in_flight
+
+
+def get_prefetch_stats() -> dict:
+    """Get prefetch counters and cache sizes."""
+    with _lock:
+        return dict(
+            _stats,
+            enabled=TIMELINE_PREFETCH_CONFIG["enabled"],
+            pages=len(_pages),
+            page_bytes=_page_bytes,
+            states=len(_states),
+            in_flight=len(_in_flight),
+        )
+
+
+def clear_prefetch_cache() -> None:
+    """Forget prefetched pages, injection state and counters."""
+    global _page_bytes
+    with _lock:
+        _pages.clear()
+        _states.clear()
+        _page_bytes = 0
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,144 @@
+"""
+Timeline splicing module for the Corgi Recommender Service.
+
+This module injects recommendations into an upstream timeline without
+decoding it. The upstream JSON array is scanned once for the byte spans of
+its top-level elements; the blended timeline is then written by joining
+those spans with pre-serialized recommendation bytes. Upstream posts are
+never parsed or re-encoded, and no Python objects are built for them.
+
+The scan is made of whole-buffer bytes operations (replace, translate,
+find, count), which run in C; Python code only runs once per brace, to
+track nesting and to skip braces inside strings by quote parity. The
+Python-level work therefore depends on the number and shape of the posts,
+not on the length of their text.
+"""
+
+import json
+import re
+
+_WHITESPACE = re.compile(rb"[ \t\r\n]*")
+
+# Marks every brace with \x01, which cannot appear unescaped in JSON
+_MARK_BRACES = bytes.maketrans(b"{}", b"\x01\x01")
+
+
+def find_elements(data: bytes) -> list:
+    """
+    Find the top-level objects of a JSON array of objects.
+
+    Args:
+        data: JSON array bytes, e.g. an upstream timeline
+
+    Returns:
+        list: (start, end) byte offsets of each object
+
+    Raises:
+        ValueError: If data is not a JSON array of objects
+    """
+    # Blank out escape pairs so every remaining quote delimits a string;
+    # escapes are two bytes, so offsets are unchanged
+    quoted = data.replace(b"\\\\", b"__").replace(b'\\"', b"__")
+    find = data.translate(_MARK_BRACES).find
+    count = quoted.count
+
+    spans = []
+    depth = 0
+    start = 0
+    quotes = 0
+    previous = 0
+    pos = find(b"\x01")
+    while pos != -1:
+        quotes += count(b'"', previous, pos)
+        previous = pos
+        if not quotes & 1:
+            if data[pos] == ord("{"):
+                if depth == 0:
+                    start = pos
+                depth += 1
+            elif data[pos] == ord("}"):
+                depth -= 1
+                if depth == 0:
+                    spans.append((start, pos + 1))
+                elif depth < 0:
+                    raise ValueError(f"Unbalanced '}}' at byte {pos}")
+        pos = find(b"\x01", pos + 1)
+    if depth or (quotes + count(b'"', previous)) & 1:
+        raise ValueError("Unterminated timeline")
+
+    # Everything between the objects must be the array's own punctuation
+    end = _WHITESPACE.match(data).end()
+    if data[end : end + 1] != b"[":
+        raise ValueError("Timeline is not a JSON array")
+    end += 1
+    for index, (start, stop) in enumerate(spans):
+        if data[end:start].strip(b" \t\r\n") != (b"," if index else b""):
+            raise ValueError(f"Unexpected top-level value at byte {end}")
+        end = stop
+    if data[end:].strip(b" \t\r\n") != b"]":
+        raise ValueError(f"Unexpected top-level value at byte {end}")
+    return spans
+
+
+class RawTimeline:
+    """
+    An upstream timeline kept as the JSON bytes it arrived in.
+
+    Args:
+        data: JSON array of post objects
+        post_fields: Serialized object members added to every post on
+            output, e.g. b'"is_real_mastodon_post":true'
+
+    Raises:
+        ValueError: If data is not a JSON array of objects
+    """
+
+    def __init__(self, data: bytes, post_fields: bytes = b""):
+        self.data = data
+        self.spans = find_elements(data)
+        self.post_fields = post_fields
+
+    def __len__(self):
+        return len(self.spans)
+
+    def post(self, index: int) -> dict:
+        """Decode one post, e.g. to read the last post's ID."""
+        start, end = self.spans[index]
+        return json.loads(self.data[start:end])
+
+    def _post(self, view, index, out):
+        start, end = self.spans[index]
+        if not self.post_fields:
+            out.append(view[start:end])
+            return
+        out.append(b"{")
+        out.append(self.post_fields)
+        if self.data[_WHITESPACE.match(self.data, start + 1).end()] != ord("}"):
+            out.append(b",")
+        out.append(view[start + 1 : end])
+
+    def to_json(self, order=None, inserts=()) -> bytes:
+        """
+        Serialize the timeline, optionally with other elements spliced in.
+
+        Args:
+            order: (is_insert, index) pairs in output order; every post in
+                its original order if None
+            inserts: Serialized JSON elements referenced by insert pairs
+
+        Returns:
+            bytes: JSON array
+        """
+        if order is None:
+            order = [(False, index) for index in range(len(self.spans))]
+        view = memoryview(self.data)
+        out = [b"["]
+        for position, (is_insert, index) in enumerate(order):
+            if position:
+                out.append(b",")
+            if is_insert:
+                out.append(inserts[index])
+            else:
+                self._post(view, index, out)
+        out.append(b"]")
+        return b"".join(out)
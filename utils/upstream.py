@@ -0,0 +1,408 @@
+"""
+Upstream client module for the Corgi Recommender Service.
+
+This module is the single HTTP client used to talk to Mastodon instances.
+Each instance host gets its own pooled keep-alive `requests.Session`, so
+proxied calls reuse open TCP/TLS connections instead of paying a new
+handshake per request. Host lookups are cached for a short TTL, and
+connection reuse and setup time are tracked per host.
+
+Every request goes through the host's circuit breaker and gets an adaptive
+timeout (see utils/instance_health.py). When hedging is enabled, a GET that
+has not answered within the host's p95 latency is sent a second time and
+the first response wins.
+"""
+
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http.cookiejar import DefaultCookiePolicy
+from socket import timeout as SocketTimeout
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import (
+    ConnectTimeoutError,
+    EmptyPoolError,
+    NameResolutionError,
+    NewConnectionError,
+)
+from urllib3.util import connection
+
+from config import INSTANCE_HEALTH_CONFIG, UPSTREAM_POOL_CONFIG
+from utils import instance_health
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Hop-by-hop headers from the client must not reach the instance; a
+# forwarded "Connection: close" would defeat keep-alive
+HOP_BY_HOP_HEADERS = frozenset(
+    [
+        "connection",
+        "keep-alive",
+        "proxy-connection",
+        "te",
+        "trailer",
+        "transfer-encoding",
+        "upgrade",
+    ]
+)
+
+# DNS cache: (host, port) -> (expires_at, [ip addresses])
+_dns_lock = threading.Lock()
+_dns_cache = {}
+
+# Per-host connection metrics
+_metrics_lock = threading.Lock()
+_host_metrics = defaultdict(
+    lambda: {
+        "requests": 0,
+        "new_connections": 0,
+        "connect_time_total": 0.0,
+        "connect_time_max": 0.0,
+    }
+)
+
+# Sessions keyed by (scheme, netloc), least recently used first
+_session_lock = threading.Lock()
+_sessions = OrderedDict()
+
+# Hedged GETs run both copies here; each holds a slot until both copies finish
+_hedge_executor = ThreadPoolExecutor(
+    max_workers=INSTANCE_HEALTH_CONFIG["hedge_workers"], thread_name_prefix="upstream-hedge"
+)
+_hedge_slots = threading.BoundedSemaphore(max(1, INSTANCE_HEALTH_CONFIG["hedge_workers"] // 2))
+
+
+def _resolve(host: str, port: int) -> list:
+    """Resolve a host to IP addresses, caching the answer for dns_ttl_seconds."""
+    key = (host, port)
+    now = time.time()
+    with _dns_lock:
+        entry = _dns_cache.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+    infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    addresses = list(OrderedDict.fromkeys(info[4][0] for info in infos))
+    with _dns_lock:
+        _dns_cache[key] = (now + UPSTREAM_POOL_CONFIG["dns_ttl_seconds"], addresses)
+    return addresses
+
+
+def _forget(host: str, port: int) -> None:
+    with _dns_lock:
+        _dns_cache.pop((host, port), None)
+
+
+def _record_connection(host: str, seconds: float) -> None:
+    with _metrics_lock:
+        stats = _host_metrics[host]
+        stats["new_connections"] += 1
+        stats["connect_time_total"] += seconds
+        stats["connect_time_max"] = max(stats["connect_time_max"], seconds)
+
+
+class _TrackedConnectionMixin:
+    """Resolves through the DNS cache and records connection setup time."""
+
+    def _new_conn(self):
+        try:
+            addresses = _resolve(self._dns_host, self.port)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+
+        last_error = None
+        for address in addresses:
+            try:
+                return connection.create_connection(
+                    (address, self.port),
+                    self.timeout,
+                    source_address=self.source_address,
+                    socket_options=self.socket_options,
+                )
+            except SocketTimeout as e:
+                last_error = e
+            except OSError as e:
+                last_error = e
+
+        # The cached addresses may be stale; resolve again next time
+        _forget(self._dns_host, self.port)
+        if isinstance(last_error, SocketTimeout):
+            raise ConnectTimeoutError(
+                self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})"
+            ) from last_error
+        raise NewConnectionError(
+            self, f"Failed to establish a new connection: {last_error}"
+        ) from last_error
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        # Includes the TLS handshake for HTTPS connections
+        _record_connection(self.host, time.perf_counter() - start)
+
+
+class _TrackedHTTPConnection(_TrackedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TrackedHTTPSConnection(_TrackedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _BoundedWaitMixin:
+    """Never waits forever for a free connection in a blocking pool."""
+
+    def _get_conn(self, timeout=None):
+        # requests does not pass a pool timeout, which would mean no limit
+        if timeout is None:
+            timeout = UPSTREAM_POOL_CONFIG["pool_timeout_seconds"]
+        return super()._get_conn(timeout=timeout)
+
+
+class _TrackedHTTPConnectionPool(_BoundedWaitMixin, HTTPConnectionPool):
+    ConnectionCls = _TrackedHTTPConnection
+
+
+class _TrackedHTTPSConnectionPool(_BoundedWaitMixin, HTTPSConnectionPool):
+    ConnectionCls = _TrackedHTTPSConnection
+
+
+class UpstreamAdapter(HTTPAdapter):
+    """HTTPAdapter with TCP keep-alive and tracked, DNS-cached connections."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        socket_options = list(HTTPConnection.default_socket_options)
+        socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            socket_options.append(
+                (
+                    socket.IPPROTO_TCP,
+                    socket.TCP_KEEPIDLE,
+                    UPSTREAM_POOL_CONFIG["keepalive_idle_seconds"],
+                )
+            )
+        kwargs["socket_options"] = socket_options
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TrackedHTTPConnectionPool,
+            "https": _TrackedHTTPSConnectionPool,
+        }
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    # Sessions are shared between users, so never carry cookies across requests
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = UpstreamAdapter(
+        pool_connections=1,
+        pool_maxsize=UPSTREAM_POOL_CONFIG["pool_maxsize"],
+        pool_block=UPSTREAM_POOL_CONFIG["pool_block"],
+        max_retries=0,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    Get the pooled session for the instance serving a URL.
+
+    Args:
+        url: Any URL on the upstream instance
+
+    Returns:
+        requests.Session shared by all requests to that host
+    """
+    parsed = urlparse(url)
+    key = (parsed.scheme, parsed.netloc)
+    with _session_lock:
+        session = _sessions.get(key)
+        if session is not None:
+            _sessions.move_to_end(key)
+            return session
+
+        session = _create_session()
+        _sessions[key] = session
+        while len(_sessions) > UPSTREAM_POOL_CONFIG["max_hosts"]:
+            # Other threads may still be using the evicted session, so it is
+            # not closed here; its pools close their connections once collected
+            _sessions.popitem(last=False)
+        return session
+
+
+def _send(method, url, headers, kwargs):
+    """Send one request and record its outcome in the host's health."""
+    adaptive = instance_health.is_adaptive(method)
+    start = time.perf_counter()
+    try:
+        response = get_session(url).request(method=method, url=url, headers=headers, **kwargs)
+    except EmptyPoolError as e:
+        # Our own pool is saturated; that says nothing about the instance
+        raise requests.ConnectionError(f"No free connection to {urlparse(url).netloc}") from e
+    except requests.Timeout:
+        # A slow non-GET may have gone through; it says little about the instance
+        if adaptive:
+            instance_health.record_failure(url, time.perf_counter() - start)
+        raise
+    except requests.RequestException:
+        instance_health.record_failure(url)
+        raise
+    instance_health.record_response(
+        url, response.status_code, time.perf_counter() - start if adaptive else None
+    )
+    return response
+
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _release_slot_when_done(futures):
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            _hedge_slots.release()
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def _hedged_request(method, url, headers, kwargs, delay):
+    """Send a GET, and a second copy if the first has not answered after delay."""
+    futures = [_hedge_executor.submit(_send, method, url, headers, kwargs)]
+    if not wait(futures, timeout=delay).done:
+        futures.append(_hedge_executor.submit(_send, method, url, headers, kwargs))
+    _release_slot_when_done(futures)
+
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        winners = [future for future in done if future.exception() is None]
+        if winners:
+            winner = winners[0]
+            for future in winners[1:]:
+                _close_response(future)
+            for future in pending:
+                future.add_done_callback(_close_response)
+            if len(futures) > 1:
+                instance_health.record_hedge(url, won=winner is futures[1])
+            return winner.result()
+        error = next(iter(done)).exception()
+    raise error
+
+
+def upstream_request(method: str, url: str, headers: dict = None, **kwargs) -> requests.Response:
+    """
+    Send a request to a Mastodon instance over its pooled session.
+
+    Takes the same keyword arguments as `requests.request`. Without an
+    explicit timeout, GETs use the host's adaptive timeout and other
+    methods PROXY_TIMEOUT.
+
+    Args:
+        method: HTTP method
+        url: Target URL on the instance
+        headers: Request headers (hop-by-hop headers are dropped)
+
+    Returns:
+        requests.Response from the instance
+
+    Raises:
+        InstanceUnavailable: If the instance's circuit is open
+    """
+    if headers:
+        headers = {
+            key: value for key, value in headers.items() if key.lower() not in HOP_BY_HOP_HEADERS
+        }
+
+    with _metrics_lock:
+        _host_metrics[urlparse(url).hostname or ""]["requests"] += 1
+
+    timeout = instance_health.acquire(url, method)
+    kwargs.setdefault("timeout", timeout)
+
+    if method.upper() == "GET" and INSTANCE_HEALTH_CONFIG["hedge_enabled"]:
+        delay = instance_health.hedge_delay(url)
+        if delay is not None and _hedge_slots.acquire(blocking=False):
+            return _hedged_request(method, url, headers, kwargs, delay)
+
+    return _send(method, url, headers, kwargs)
+
+
+def get_upstream_metrics() -> dict:
+    """
+    Get connection reuse and setup-time metrics for upstream hosts.
+
+    Returns:
+        dict: Totals and per-host reuse rate and connection setup time
+    """
+    with _metrics_lock:
+        hosts = {}
+        total_requests = 0
+        total_connections = 0
+        total_connect_time = 0.0
+        for host, stats in _host_metrics.items():
+            requests_count = stats["requests"]
+            connections = stats["new_connections"]
+            total_requests += requests_count
+            total_connections += connections
+            total_connect_time += stats["connect_time_total"]
+            hosts[host] = {
+                "requests": requests_count,
+                "new_connections": connections,
+                "reuse_rate": max(0.0, 1 - connections / requests_count) if requests_count else 0.0,
+                "avg_connect_ms": (
+                    stats["connect_time_total"] / connections * 1000 if connections else 0.0
+                ),
+                "max_connect_ms": stats["connect_time_max"] * 1000,
+            }
+
+    with _session_lock:
+        session_count = len(_sessions)
+    with _dns_lock:
+        dns_entries = len(_dns_cache)
+
+    return {
+        "requests": total_requests,
+        "new_connections": total_connections,
+        "reuse_rate": max(0.0, 1 - total_connections / total_requests) if total_requests else 0.0,
+        "avg_connect_ms": (
+            total_connect_time / total_connections * 1000 if total_connections else 0.0
+        ),
+        "sessions": session_count,
+        "dns_cache_entries": dns_entries,
+        "hosts": hosts,
+    }
+
+
+def reset_upstream_metrics() -> None:
+    """Reset upstream connection metrics."""
+    with _metrics_lock:
+        _host_metrics.clear()
+
+
+def close_sessions() -> None:
+    """Close all pooled sessions and clear the DNS cache."""
+    with _session_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+    with _dns_lock:
+        _dns_cache.clear()
@@ -0,0 +1,338 @@
+"""
+Upstream response cache module for the Corgi Recommender Service.
+
+This module caches GET responses from Mastodon instances for the pass-through
+proxy. It follows the instance's Cache-Control headers and revalidates stale
+entries with If-None-Match / If-Modified-Since, so a 304 saves the body
+transfer even when nothing may be served without asking.
+
+Entries are scoped so authenticated bodies are never shared: a response is
+stored in the shared scope only for anonymous requests or for routes whose
+bodies do not depend on the viewer (PUBLIC_ROUTES), and never when it is
+marked private or sets a cookie. Anything else is stored per token, keyed by
+a hash of the request's credentials (Authorization, else Cookie). The cache is bounded by total body bytes
+and evicts least recently used entries first.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlencode
+
+from config import UPSTREAM_CACHE_CONFIG
+from utils.upstream import HOP_BY_HOP_HEADERS
+
+# Routes whose responses are the same for every viewer
+PUBLIC_ROUTES = re.compile(
+    r"^(instance(/[a-z_]+)?|custom_emojis|accounts/lookup|accounts/\d+|trends(/[a-z]+)?|directory)$"
+)
+
+# Statuses that may be stored
+CACHEABLE_STATUSES = frozenset([200, 203, 301, 404, 410])
+
+# Response headers that describe the stored body rather than one transfer
+_UNCACHED_HEADERS = frozenset(["set-cookie", "age", "date", "x-cache"])
+
+CachedResponse = namedtuple(
+    "CachedResponse",
+    ["status_code", "headers", "body", "stored_at", "expires_at", "etag", "last_modified", "vary"],
+)
+
+# Cache entries keyed by (scope, url, query), least recently used first
+_cache_lock = threading.Lock()
+_entries = OrderedDict()
+_cache_bytes = 0
+_stats = {"hits": 0, "revalidated": 0, "stale": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def parse_cache_control(value: str) -> dict:
+    """Parse a Cache-Control header into {directive: value or True}."""
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else True
+    return directives
+
+
+def _header(headers, name):
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _credentials(request_headers):
+    """What identifies the viewer to the instance, if anything."""
+    return _header(request_headers, "authorization") or _header(request_headers, "cookie")
+
+
+def _scopes(path, request_headers):
+    """Cache scopes a request may be served from, shared scope first."""
+    auth = _credentials(request_headers)
+    scopes = []
+    if not auth or PUBLIC_ROUTES.match(path):
+        scopes.append("public")
+    if auth:
+        scopes.append("token:" + hashlib.sha256(auth.encode()).hexdigest())
+    return scopes
+
+
+def _key(scope, url, params):
+    return (scope, url, urlencode(sorted((params or {}).items())))
+
+
+def _vary_values(vary, request_headers):
+    return tuple((name, _header(request_headers, name)) for name in vary)
+
+
+def _freshness(cc, response_headers, shared):
+    """Seconds a response may be served without revalidation."""
+    if "no-cache" in cc:
+        return 0
+    for directive in ("s-maxage", "max-age") if shared else ("max-age",):
+        if directive in cc:
+            try:
+                return max(0, int(cc[directive]))
+            except (TypeError, ValueError):
+                return 0
+    expires = _header(response_headers, "expires")
+    date = _header(response_headers, "date")
+    if expires and date:
+        try:
+            return max(
+                0,
+                int((parsedate_to_datetime(expires) - parsedate_to_datetime(date)).total_seconds()),
+            )
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+
+def lookup(path, url, params, request_headers):
+    """
+    Find the cached response for a GET request.
+
+    Args:
+        path: The API path after /api/v1/
+        url: Upstream URL without the query string
+        params: Query parameters
+        request_headers: Headers that will be sent upstream
+
+    Returns:
+        CachedResponse: The entry, fresh or stale, or None
+    """
+    with _cache_lock:
+        for scope in _scopes(path, request_headers):
+            key = _key(scope, url, params)
+            entry = _entries.get(key)
+            if entry and entry.vary == _vary_values(
+                [name for name, _ in entry.vary], request_headers
+            ):
+                _entries.move_to_end(key)
+                return entry
+        _stats["misses"] += 1
+    return None
+
+
+def is_fresh(entry) -> bool:
+    """Whether an entry may be served without asking the instance."""
+    return entry.expires_at > time.time()
+
+
+def record_hit(revalidated=False, stale=False) -> None:
+    """Count a response served from the cache; stale ones were served because the instance was unreachable."""
+    with _cache_lock:
+        _stats["stale" if stale else "revalidated" if revalidated else "hits"] += 1
+
+
+def record_miss() -> None:
+    """Count a stale entry the instance replaced with a new body."""
+    with _cache_lock:
+        _stats["misses"] += 1
+
+
+def conditional_headers(entry) -> dict:
+    """Validators to revalidate a stale entry with."""
+    headers = {}
+    if entry.etag:
+        headers["If-None-Match"] = entry.etag
+    if entry.last_modified:
+        headers["If-Modified-Since"] = entry.last_modified
+    return headers
+
+
+def _storage_scope(path, request_headers, response_headers):
+    """Scope a response may be stored in, or None if it may not be stored."""
+    cc = parse_cache_control(_header(response_headers, "cache-control"))
+    if "no-store" in cc:
+        return None
+    vary = _header(response_headers, "vary") or ""
+    if vary.strip() == "*":
+        return None
+    auth = _credentials(request_headers)
+    shared = (
+        (not auth or PUBLIC_ROUTES.match(path))
+        and "private" not in cc
+        and _header(response_headers, "set-cookie") is None
+    )
+    if shared:
+        return "public"
+    if auth and _header(response_headers, "set-cookie") is None:
+        return "token:" + hashlib.sha256(auth.encode()).hexdigest()
+    return None
+
+
+def is_storable(path, request_headers, status_code, response_headers) -> bool:
+    """
+    Check whether a response can be cached before its body is read.
+
+    Args:
+        path: The API path after /api/v1/
+        request_headers: Headers that were sent upstream
+        status_code: Upstream response status
+        response_headers: Upstream response headers
+
+    Returns:
+        bool: True if the body should be read and stored
+    """
+    if status_code not in CACHEABLE_STATUSES:
+        return False
+    length = _header(response_headers, "content-length")
+    if (
+        length is None
+        or not length.isdigit()
+        or int(length) > UPSTREAM_CACHE_CONFIG["max_entry_bytes"]
+    ):
+        return False
+    scope = _storage_scope(path, request_headers, response_headers)
+    if scope is None:
+        return False
+    cc = parse_cache_control(_header(response_headers, "cache-control"))
+    has_validators = _header(response_headers, "etag") or _header(response_headers, "last-modified")
+    return bool(_freshness(cc, response_headers, scope == "public") or has_validators)
+
+
+def _build_entry(scope, request_headers, status_code, response_headers, body, now):
+    cc = parse_cache_control(_header(response_headers, "cache-control"))
+    # The raw body is stored, so its encoding must match what the client accepts
+    vary = ["accept-encoding"] + [
+        name.strip().lower()
+        for name in (_header(response_headers, "vary") or "").split(",")
+        if name.strip().lower() not in ("", "authorization", "accept-encoding")
+    ]
+    return CachedResponse(
+        status_code=status_code,
+        headers=[
+            (key, value)
+            for key, value in response_headers.items()
+            if key.lower() not in _UNCACHED_HEADERS and key.lower() not in HOP_BY_HOP_HEADERS
+        ],
+        body=body,
+        stored_at=now,
+        expires_at=now + _freshness(cc, response_headers, scope == "public"),
+        etag=_header(response_headers, "etag"),
+        last_modified=_header(response_headers, "last-modified"),
+        vary=_vary_values(vary, request_headers),
+    )
+
+
+def store(path, url, params, request_headers, status_code, response_headers, body):
+    """
+    Store an upstream response.
+
+    Args:
+        path: The API path after /api/v1/
+        url: Upstream URL without the query string
+        params: Query parameters
+        request_headers: Headers that were sent upstream
+        status_code: Upstream response status
+        response_headers: Upstream response headers
+        body: Raw (still encoded) response body
+
+    Returns:
+        CachedResponse: The stored entry, or None if it was not stored
+    """
+    global _cache_bytes
+
+    scope = _storage_scope(path, request_headers, response_headers)
+    if scope is None or len(body) > UPSTREAM_CACHE_CONFIG["max_entry_bytes"]:
+        return None
+
+    entry = _build_entry(scope, request_headers, status_code, response_headers, body, time.time())
+    key = _key(scope, url, params)
+    with _cache_lock:
+        previous = _entries.pop(key, None)
+        if previous:
+            _cache_bytes -= len(previous.body)
+        _entries[key] = entry
+        _cache_bytes += len(body)
+        _stats["stores"] += 1
+        while _cache_bytes > UPSTREAM_CACHE_CONFIG["max_bytes"] and _entries:
+            _, evicted = _entries.popitem(last=False)
+            _cache_bytes -= len(evicted.body)
+            _stats["evictions"] += 1
+    return entry
+
+
+def revalidate(path, url, params, request_headers, entry, response_headers):
+    """
+    Refresh a stale entry after the instance answered 304 Not Modified.
+
+    Args:
+        path: The API path after /api/v1/
+        url: Upstream URL without the query string
+        params: Query parameters
+        request_headers: Headers that were sent upstream
+        entry: The stale CachedResponse
+        response_headers: Headers of the 304 response
+
+    Returns:
+        CachedResponse: The refreshed entry
+    """
+    # A 304 carries the current caching headers; the body is unchanged
+    merged = OrderedDict((key, value) for key, value in entry.headers)
+    for key, value in response_headers.items():
+        if key.lower() in ("cache-control", "expires", "etag", "last-modified", "vary", "date"):
+            merged[key] = value
+    refreshed = store(path, url, params, request_headers, entry.status_code, merged, entry.body)
+    return refreshed or entry
+
+
+def response_headers_for(entry, cache_status):
+    """Headers to serve a cached entry with."""
+    age = int(time.time() - entry.stored_at)
+    return entry.headers + [("Age", str(age)), ("X-Cache", cache_status)]
+
+
+def get_upstream_cache_metrics() -> dict:
+    """Get cache hit rate, size and eviction counters."""
+    with _cache_lock:
+        lookups = _stats["hits"] + _stats["revalidated"] + _stats["misses"]
+        return dict(
+            _stats,
+            entries=len(_entries),
+            bytes=_cache_bytes,
+            max_bytes=UPSTREAM_CACHE_CONFIG["max_bytes"],
+            hit_rate=(_stats["hits"] + _stats["revalidated"]) / lookups if lookups else 0.0,
+        )
+
+
+def reset_upstream_cache_metrics() -> None:
+    """Reset cache counters without dropping entries."""
+    with _cache_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+def clear_upstream_cache() -> None:
+    """Drop every cached response and reset the counters."""
+    global _cache_bytes
+    with _cache_lock:
+        _entries.clear()
+        _cache_bytes = 0
+        for name in _stats:
+            _stats[name] = 0
@@ -14,6 +14,8 @@ from typing import Dict, List, Any, Optional, Set, Tuple
 import threading
 
 from utils.privacy import generate_user_alias
+from utils.interning import intern_id, resolve_id
+from utils.log_pipeline import log_event
 from db.connection import get_db_connection
 
 # Set up logging
@@ -28,6 +30,8 @@ _signal_history = defaultdict(list)  # Track signal history for analysis
 
 # Constants
 SIGNAL_TYPES = ["tags", "vibe", "tone", "account_type", "post_type", "category"]
+# High-cardinality signal types whose counters are keyed by interned ids
+INTERNED_SIGNAL_TYPES = {"tags": "tag", "category": "category"}
 SIGNAL_WEIGHTS = {
     "favorite": 1.0,  # Standard weight for favorites
     "reblog": 1.5,    # Higher weight for reblogs (stronger signal)
@@ -68,6 +72,29 @@ except Exception as e:
     _CONFIG = _DEFAULT_WEIGHTS
 
 
+def _signal_key(signal_type: str, value: Any) -> Any:
+    """Map a signal value to the key used in the in-memory counters."""
+    namespace = INTERNED_SIGNAL_TYPES.get(signal_type)
+    if namespace is not None and isinstance(value, str):
+        return intern_id(namespace, value)
+    return value
+
+
+def _deintern_signals(signals: Dict[str, Counter]) -> Dict[str, Counter]:
+    """Copy a signal profile with interned keys mapped back to strings."""
+    result = {}
+    for signal_type, counter in signals.items():
+        namespace = INTERNED_SIGNAL_TYPES.get(signal_type)
+        if namespace is None:
+            result[signal_type] = Counter(counter)
+        else:
+            result[signal_type] = Counter({
+                resolve_id(namespace, key) if isinstance(key, int) else key: count
+                for key, count in counter.items()
+            })
+    return result
+
+
 def get_user_signals(user_id: str) -> Dict[str, Counter]:
     """
     Get a user's signal profile with their content preferences.
@@ -91,8 +118,8 @@ def get_user_signals(user_id: str) -> Dict[str, Counter]:
                 signal_type: Counter() for signal_type in SIGNAL_TYPES
             }
             
-        # Return a copy to prevent external modification
-        return {k: Counter(v) for k, v in _user_signals[user_alias].items()}
+        # Return a string-keyed copy to prevent external modification
+        return _deintern_signals(_user_signals[user_alias])
 
 
 def update_user_signals(user_id: str, post_metadata: Dict[str, Any], 
@@ -142,20 +169,22 @@ def update_user_signals(user_id: str, post_metadata: Dict[str, Any],
                 tags = post_metadata["tags"]
                 if isinstance(tags, list):
                     for tag in tags:
-                        _user_signals[user_alias][signal_type][tag] += weight
+                        key = _signal_key(signal_type, tag)
+                        _user_signals[user_alias][signal_type][key] += weight
                         # Log changes for this update
                         if signal_type not in signal_updates:
                             signal_updates[signal_type] = {}
-                        signal_updates[signal_type][tag] = _user_signals[user_alias][signal_type][tag]
+                        signal_updates[signal_type][tag] = _user_signals[user_alias][signal_type][key]
             
             # Handle category separately (common field)
             elif signal_type == "category" and "category" in post_metadata:
                 category = post_metadata["category"]
-                _user_signals[user_alias][signal_type][category] += weight
+                key = _signal_key(signal_type, category)
+                _user_signals[user_alias][signal_type][key] += weight
                 # Log changes
                 if signal_type not in signal_updates:
                     signal_updates[signal_type] = {}
-                signal_updates[signal_type][category] = _user_signals[user_alias][signal_type][category]
+                signal_updates[signal_type][category] = _user_signals[user_alias][signal_type][key]
             
             # Handle scalar fields (vibe, tone, etc.)
             elif signal_type in post_metadata:
@@ -177,8 +206,8 @@ def update_user_signals(user_id: str, post_metadata: Dict[str, Any],
         # Check if user should be promoted out of cold start
         check_promotion_status(user_alias)
         
-        # Return a copy of the updated signals
-        return {k: Counter(v) for k, v in _user_signals[user_alias].items()}
+        # Return a string-keyed copy of the updated signals
+        return _deintern_signals(_user_signals[user_alias])
 
 
 def check_promotion_status(user_alias: str) -> bool:
@@ -231,12 +260,9 @@ def check_promotion_status(user_alias: str) -> bool:
         if should_promote:
             _promotion_status[user_alias] = True
             # Log promotion event
-            cold_start_logger = logging.getLogger('cold_start_interactions')
-            cold_start_logger.info(
-                f"{user_alias} | COLD_START_PROMOTED | " +
-                f"interactions={total_interactions} | " +
-                f"unique_tags_with_multiple={tags_with_multiple}"
-            )
+            log_event(logging.getLogger('cold_start_interactions'), 'COLD_START_PROMOTED', 'User promoted',
+                      user_alias=user_alias, interactions=total_interactions,
+                      unique_tags_with_multiple=tags_with_multiple)
             
         return should_promote
 
@@ -433,15 +459,10 @@ def log_post_selection(user_alias: str, selected_posts: List[Dict[str, Any]],
             post_tags[post.get("id", "unknown")] = post["tags"]
     
     # Create log message with key info for analysis
-    cold_start_logger = logging.getLogger('cold_start_interactions')
-    cold_start_logger.info(
-        f"{user_alias} | COLD_START_FEED_SELECTION | " +
-        f"random_ratio={random_ratio:.2f} | weighted_ratio={weighted_ratio:.2f} | " +
-        f"post_count={len(selected_posts)} | " +
-        f"post_ids={','.join(post_ids)} | " +
-        f"categories={json.dumps(post_categories)} | " +
-        f"interaction_count={len(_signal_history.get(user_alias, []))}"
-    )
+    log_event(logging.getLogger('cold_start_interactions'), 'COLD_START_FEED_SELECTION', 'Feed selected',
+              user_alias=user_alias, random_ratio=random_ratio, weighted_ratio=weighted_ratio,
+              post_count=len(selected_posts), post_ids=post_ids, categories=post_categories,
+              interaction_count=len(_signal_history.get(user_alias, [])))
 
 
 def should_exit_cold_start(user_id: str) -> bool:
@@ -528,9 +549,9 @@ def export_user_signals_to_db() -> bool:
                         if not any(signals.values()):
                             continue
                             
-                        # Convert to JSON-compatible format
+                        # Convert to JSON-compatible format (ids are process-local)
                         json_data = {
-                            k: dict(v) for k, v in signals.items() if v
+                            k: dict(v) for k, v in _deintern_signals(signals).items() if v
                         }
                         
                         # Get last active timestamp
@@ -609,9 +630,10 @@ def import_user_signals_from_db() -> bool:
                         # Parse JSON data
                         signal_dict = json.loads(signal_data)
                         
-                        # Convert to Counter objects
+                        # Convert to Counter objects keyed like live signals
                         _user_signals[user_alias] = {
-                            k: Counter(v) for k, v in signal_dict.items()
+                            k: Counter({_signal_key(k, key): count for key, count in v.items()})
+                            for k, v in signal_dict.items()
                         }
                         
                         # Set promotion status